@@ -14,11 +14,9 @@ import webbrowser
 import json
 import hashlib
 import threading
-import csv
-from datetime import datetime
-from collections import defaultdict
-from decimal import Decimal, ROUND_HALF_UP
-from flask import Flask, render_template, render_template_string, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template_string, request, redirect, url_for, session, flash
+
+import armazenamento as pex3_armazenamento_dm
 
 # ============================================================================
 # CONFIGURAÇÃO DE DIRETÓRIOS PARA PYINSTALLER
@@ -50,6 +48,10 @@ pex3_DB_FILE_dm = os.path.join(pex3_BASE_DIR_dm, 'database.json')
 pex3_PRODUTOS_CSV_dm = os.path.join(pex3_BASE_DIR_dm, 'produtos.csv')
 pex3_ESTOQUE_DB_dm = os.path.join(pex3_BASE_DIR_dm, 'estoque_db.json')
 
+# Banco SQLite (usado apenas com PEX3_BACKEND=sqlite) também fica ao lado do executável
+if not os.path.isabs(pex3_armazenamento_dm.pex3_SQLITE_DB_dm):
+    pex3_armazenamento_dm.pex3_SQLITE_DB_dm = os.path.join(pex3_BASE_DIR_dm, pex3_armazenamento_dm.pex3_SQLITE_DB_dm)
+
 print(f"📁 Diretório base: {pex3_BASE_DIR_dm}")
 print(f"📁 Diretório recursos: {pex3_RESOURCE_DIR_dm}")
 
@@ -386,389 +388,6 @@ def pex3_logout_dm():
     return redirect(url_for('pex3_login_dm'))
 
 
-# ============================================================================
-# APLICAÇÃO FINANCEIRO (PORTA 5000)
-# ============================================================================
-
-pex3_app_financeiro_dm = Flask(__name__, template_folder=os.path.join(pex3_RESOURCE_DIR_dm, 'templates'))
-
-def pex3_init_financeiro_db_dm():
-    if not os.path.exists(pex3_DB_FILE_dm):
-        pex3_data_dm = {
-            "transactions": [],
-            "categories": [
-                {"nome": "Salário", "tipo": "receita"},
-                {"nome": "Venda", "tipo": "receita"},
-                {"nome": "Alimentação", "tipo": "despesa"},
-                {"nome": "Limpeza", "tipo": "despesa"},
-                {"nome": "Aluguel", "tipo": "despesa"},
-                {"nome": "Diversos", "tipo": "ambos"}
-            ],
-            "payment_methods": ["PIX", "Cartão", "Dinheiro", "Boleto", "Outros"]
-        }
-        with open(pex3_DB_FILE_dm, 'w', encoding='utf-8') as f:
-            json.dump(pex3_data_dm, f, indent=4, ensure_ascii=False)
-
-def pex3_load_financeiro_db_dm():
-    pex3_init_financeiro_db_dm()
-    with open(pex3_DB_FILE_dm, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def pex3_save_financeiro_db_dm(pex3_data_dm):
-    with open(pex3_DB_FILE_dm, 'w', encoding='utf-8') as f:
-        json.dump(pex3_data_dm, f, indent=4, ensure_ascii=False)
-
-def pex3_filtrar_financeiro_por_data_dm(pex3_transacoes_dm, pex3_data_inicio_dm, pex3_data_fim_dm):
-    if not pex3_data_inicio_dm and not pex3_data_fim_dm:
-        return pex3_transacoes_dm
-
-    pex3_filtradas_dm = []
-    for pex3_t_dm in pex3_transacoes_dm:
-        pex3_data_t_dm = pex3_t_dm.get('data_gasto', '')  # Formato YYYY-MM-DD
-        if pex3_data_inicio_dm and pex3_data_t_dm < pex3_data_inicio_dm:
-            continue
-        if pex3_data_fim_dm and pex3_data_t_dm > pex3_data_fim_dm:
-            continue
-        pex3_filtradas_dm.append(pex3_t_dm)
-    return pex3_filtradas_dm
-
-@pex3_app_financeiro_dm.route('/')
-def pex3_financeiro_index_dm():
-    pex3_db_dm = pex3_load_financeiro_db_dm()
-    pex3_data_inicio_dm = request.args.get('data_inicio', '')
-    pex3_data_fim_dm = request.args.get('data_fim', '')
-
-    pex3_transacoes_dm = pex3_filtrar_financeiro_por_data_dm(pex3_db_dm.get('transactions', []), pex3_data_inicio_dm, pex3_data_fim_dm)
-    pex3_receitas_dm = sum(pex3_t_dm['valor'] for pex3_t_dm in pex3_transacoes_dm if pex3_t_dm.get('tipo') == 'receber')
-    pex3_despesas_dm = sum(pex3_t_dm['valor'] for pex3_t_dm in pex3_transacoes_dm if pex3_t_dm.get('tipo') == 'pagar')
-
-    return render_template(
-        'index.html',
-        receitas=pex3_receitas_dm,
-        despesas=pex3_despesas_dm,
-        saldo=pex3_receitas_dm - pex3_despesas_dm,
-        data_inicio=pex3_data_inicio_dm,
-        data_fim=pex3_data_fim_dm,
-    )
-
-@pex3_app_financeiro_dm.route('/lancamentos')
-def pex3_financeiro_lancamentos_dm():
-    pex3_db_dm = pex3_load_financeiro_db_dm()
-    pex3_data_inicio_dm = request.args.get('data_inicio', '')
-    pex3_data_fim_dm = request.args.get('data_fim', '')
-
-    pex3_transacoes_dm = pex3_filtrar_financeiro_por_data_dm(pex3_db_dm.get('transactions', []), pex3_data_inicio_dm, pex3_data_fim_dm)
-    pex3_transacoes_dm.sort(key=lambda x: x.get('data_gasto', ''), reverse=True)
-
-    return render_template(
-        'lancamentos.html',
-        transactions=pex3_transacoes_dm,
-        data_inicio=pex3_data_inicio_dm,
-        data_fim=pex3_data_fim_dm,
-    )
-
-@pex3_app_financeiro_dm.route('/cadastrar/<pex3_tipo_dm>', methods=['GET', 'POST'])
-def pex3_financeiro_cadastrar_dm(pex3_tipo_dm):
-    pex3_db_dm = pex3_load_financeiro_db_dm()
-    if request.method == 'POST':
-        pex3_nova_transacao_dm = {
-            "id": len(pex3_db_dm['transactions']) + 1,
-            "tipo": pex3_tipo_dm,
-            "data_gasto": request.form['data_gasto'],
-            "data_criacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "valor": float(request.form['valor']),
-            "categoria": request.form['categoria'],
-            "forma_pagamento": request.form.get('forma_pagamento', 'N/A'),
-            "descricao": request.form['descricao'],
-        }
-        pex3_db_dm['transactions'].append(pex3_nova_transacao_dm)
-        pex3_save_financeiro_db_dm(pex3_db_dm)
-        return redirect(url_for('pex3_financeiro_lancamentos_dm'))
-
-    if pex3_tipo_dm == 'receber':
-        pex3_categorias_dm = [c['nome'] for c in pex3_db_dm['categories'] if c['tipo'] in ['receita', 'ambos']]
-    else:
-        pex3_categorias_dm = [c['nome'] for c in pex3_db_dm['categories'] if c['tipo'] in ['despesa', 'ambos']]
-
-    return render_template(
-        'form_lancamento.html',
-        tipo=pex3_tipo_dm,
-        categorias=pex3_categorias_dm,
-        metodos=pex3_db_dm['payment_methods'],
-    )
-
-@pex3_app_financeiro_dm.route('/categorias', methods=['GET', 'POST'])
-def pex3_financeiro_categorias_dm():
-    pex3_db_dm = pex3_load_financeiro_db_dm()
-    if request.method == 'POST':
-        pex3_db_dm['categories'].append({"nome": request.form['nome'], "tipo": request.form['tipo']})
-        pex3_save_financeiro_db_dm(pex3_db_dm)
-        return redirect(url_for('pex3_financeiro_categorias_dm'))
-    return render_template('categorias.html', categorias=pex3_db_dm['categories'])
-
-@pex3_app_financeiro_dm.route('/analytics')
-def pex3_financeiro_analytics_dm():
-    pex3_db_dm = pex3_load_financeiro_db_dm()
-    pex3_data_inicio_dm = request.args.get('data_inicio', '')
-    pex3_data_fim_dm = request.args.get('data_fim', '')
-
-    pex3_transactions_dm = pex3_filtrar_financeiro_por_data_dm(pex3_db_dm.get('transactions', []), pex3_data_inicio_dm, pex3_data_fim_dm)
-    pex3_transactions_dm.sort(key=lambda x: x.get('data_gasto', ''))
-
-    pex3_gastos_por_categoria_dm = defaultdict(float)
-    pex3_mensal_rec_desp_dm = defaultdict(lambda: {"receita": 0, "despesa": 0})
-    pex3_evolucao_datas_dm = []
-    pex3_evolucao_saldo_dm = []
-    pex3_saldo_acumulado_dm = 0
-    pex3_pagamentos_receita_data_dm = defaultdict(float)
-    pex3_mensal_categoria_dm = defaultdict(lambda: defaultdict(float))
-
-    for pex3_t_dm in pex3_transactions_dm:
-        pex3_data_dt_dm = pex3_t_dm['data_gasto']
-        pex3_mes_ano_dm = pex3_data_dt_dm[:7]
-        pex3_valor_dm = pex3_t_dm['valor']
-
-        if pex3_t_dm['tipo'] == 'receber':
-            pex3_saldo_acumulado_dm += pex3_valor_dm
-            pex3_mensal_rec_desp_dm[pex3_mes_ano_dm]["receita"] += pex3_valor_dm
-            pex3_pagamentos_receita_data_dm[pex3_t_dm['forma_pagamento']] += pex3_valor_dm
-        else:
-            pex3_saldo_acumulado_dm -= pex3_valor_dm
-            pex3_mensal_rec_desp_dm[pex3_mes_ano_dm]["despesa"] += pex3_valor_dm
-            pex3_gastos_por_categoria_dm[pex3_t_dm['categoria']] += pex3_valor_dm
-            pex3_mensal_categoria_dm[pex3_mes_ano_dm][pex3_t_dm['categoria']] += pex3_valor_dm
-
-        pex3_evolucao_datas_dm.append(pex3_data_dt_dm)
-        pex3_evolucao_saldo_dm.append(pex3_saldo_acumulado_dm)
-
-    pex3_meses_ordenados_dm = sorted(pex3_mensal_rec_desp_dm.keys())
-    pex3_todas_categorias_gastos_dm = list(pex3_gastos_por_categoria_dm.keys())
-    pex3_dados_mensais_cat_dm = {
-        pex3_cat_dm: [pex3_mensal_categoria_dm[pex3_mes_dm][pex3_cat_dm] for pex3_mes_dm in pex3_meses_ordenados_dm]
-        for pex3_cat_dm in pex3_todas_categorias_gastos_dm
-    }
-
-    return render_template(
-        'analytics.html',
-        cat_labels=list(pex3_gastos_por_categoria_dm.keys()),
-        cat_values=list(pex3_gastos_por_categoria_dm.values()),
-        pag_labels=list(pex3_pagamentos_receita_data_dm.keys()),
-        pag_values=list(pex3_pagamentos_receita_data_dm.values()),
-        meses_labels=pex3_meses_ordenados_dm,
-        mensal_receitas=[pex3_mensal_rec_desp_dm[pex3_m_dm]["receita"] for pex3_m_dm in pex3_meses_ordenados_dm],
-        mensal_despesas=[pex3_mensal_rec_desp_dm[pex3_m_dm]["despesa"] for pex3_m_dm in pex3_meses_ordenados_dm],
-        evolucao_datas=pex3_evolucao_datas_dm,
-        evolucao_saldo=pex3_evolucao_saldo_dm,
-        dados_mensais_cat=pex3_dados_mensais_cat_dm,
-        categorias_lista=pex3_todas_categorias_gastos_dm,
-        data_inicio=pex3_data_inicio_dm,
-        data_fim=pex3_data_fim_dm,
-    )
-
-
-# ============================================================================
-# APLICAÇÃO ESTOQUE (PORTA 5001)
-# ============================================================================
-
-pex3_app_estoque_dm = Flask(__name__, template_folder=os.path.join(pex3_RESOURCE_DIR_dm, 'templates'))
-pex3_app_estoque_dm.secret_key = 'estoque_secret_key_2025'
-
-def pex3_init_produtos_csv_dm():
-    if not os.path.exists(pex3_PRODUTOS_CSV_dm):
-        with open(pex3_PRODUTOS_CSV_dm, 'w', newline='', encoding='utf-8') as f:
-            pex3_writer_dm = csv.writer(f, delimiter=';')
-            pex3_writer_dm.writerow(['codigo_barras', 'nome', 'saldo', 'preco_venda', 'preco_compra'])
-            pex3_writer_dm.writerow(['7891234567890', 'Produto Exemplo 1', '10', '25.90', '15.50'])
-            pex3_writer_dm.writerow(['7891234567891', 'Produto Exemplo 2', '5', '49.90', '30.00'])
-
-def pex3_init_estoque_db_dm():
-    if not os.path.exists(pex3_ESTOQUE_DB_dm):
-        pex3_data_dm = {"movimentacoes": [], "vendas": [], "compras": []}
-        with open(pex3_ESTOQUE_DB_dm, 'w', encoding='utf-8') as f:
-            json.dump(pex3_data_dm, f, indent=4, ensure_ascii=False)
-
-def pex3_load_produtos_dm():
-    pex3_produtos_dm = []
-    if os.path.exists(pex3_PRODUTOS_CSV_dm):
-        with open(pex3_PRODUTOS_CSV_dm, 'r', encoding='utf-8') as f:
-            pex3_reader_dm = csv.DictReader(f, delimiter=';')
-            for pex3_row_dm in pex3_reader_dm:
-                pex3_row_dm['saldo'] = int(pex3_row_dm['saldo'])
-                pex3_row_dm['preco_venda'] = float(pex3_row_dm['preco_venda'])
-                pex3_row_dm['preco_compra'] = float(pex3_row_dm['preco_compra'])
-                pex3_produtos_dm.append(pex3_row_dm)
-    return pex3_produtos_dm
-
-def pex3_save_produtos_dm(pex3_produtos_dm):
-    with open(pex3_PRODUTOS_CSV_dm, 'w', newline='', encoding='utf-8') as f:
-        pex3_writer_dm = csv.writer(f, delimiter=';')
-        pex3_writer_dm.writerow(['codigo_barras', 'nome', 'saldo', 'preco_venda', 'preco_compra'])
-        for pex3_p_dm in pex3_produtos_dm:
-            pex3_writer_dm.writerow([pex3_p_dm['codigo_barras'], pex3_p_dm['nome'], pex3_p_dm['saldo'], pex3_p_dm['preco_venda'], pex3_p_dm['preco_compra']])
-
-def pex3_load_estoque_db_dm():
-    with open(pex3_ESTOQUE_DB_dm, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def pex3_save_estoque_db_dm(pex3_data_dm):
-    with open(pex3_ESTOQUE_DB_dm, 'w', encoding='utf-8') as f:
-        json.dump(pex3_data_dm, f, indent=4, ensure_ascii=False)
-
-@pex3_app_estoque_dm.route('/')
-def pex3_estoque_index_dm():
-    pex3_init_produtos_csv_dm()
-    pex3_init_estoque_db_dm()
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    
-    pex3_total_produtos_dm = len(pex3_produtos_dm)
-    pex3_valor_total_dm = sum(pex3_p_dm['saldo'] * pex3_p_dm['preco_venda'] for pex3_p_dm in pex3_produtos_dm)
-    pex3_produtos_baixo_estoque_dm = [pex3_p_dm for pex3_p_dm in pex3_produtos_dm if pex3_p_dm['saldo'] < 5]
-    
-    return render_template('estoque/index.html',
-                         produtos=pex3_produtos_dm,
-                         total_produtos=pex3_total_produtos_dm,
-                         valor_total=pex3_valor_total_dm,
-                         produtos_baixo_estoque=pex3_produtos_baixo_estoque_dm)
-
-@pex3_app_estoque_dm.route('/produtos')
-def pex3_estoque_produtos_dm():
-    pex3_init_produtos_csv_dm()
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    return render_template('estoque/produtos.html', produtos=pex3_produtos_dm)
-
-@pex3_app_estoque_dm.route('/produtos/adicionar', methods=['GET', 'POST'])
-def pex3_estoque_adicionar_produto_dm():
-    if request.method == 'POST':
-        pex3_produtos_dm = pex3_load_produtos_dm()
-        pex3_novo_produto_dm = {
-            'codigo_barras': request.form['codigo_barras'],
-            'nome': request.form['nome'],
-            'saldo': int(request.form['saldo']),
-            'preco_venda': float(request.form['preco_venda']),
-            'preco_compra': float(request.form['preco_compra'])
-        }
-        pex3_produtos_dm.append(pex3_novo_produto_dm)
-        pex3_save_produtos_dm(pex3_produtos_dm)
-        flash('Produto adicionado com sucesso!', 'success')
-        return redirect(url_for('pex3_estoque_produtos_dm'))
-    
-    return render_template('estoque/adicionar_produto.html')
-
-@pex3_app_estoque_dm.route('/produtos/editar/<pex3_codigo_dm>', methods=['GET', 'POST'])
-def pex3_estoque_editar_produto_dm(pex3_codigo_dm):
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    pex3_produto_dm = next((pex3_p_dm for pex3_p_dm in pex3_produtos_dm if pex3_p_dm['codigo_barras'] == pex3_codigo_dm), None)
-    
-    if not pex3_produto_dm:
-        flash('Produto não encontrado!', 'error')
-        return redirect(url_for('pex3_estoque_produtos_dm'))
-    
-    if request.method == 'POST':
-        pex3_produto_dm['nome'] = request.form['nome']
-        pex3_produto_dm['saldo'] = int(request.form['saldo'])
-        pex3_produto_dm['preco_venda'] = float(request.form['preco_venda'])
-        pex3_produto_dm['preco_compra'] = float(request.form['preco_compra'])
-        pex3_save_produtos_dm(pex3_produtos_dm)
-        flash('Produto atualizado com sucesso!', 'success')
-        return redirect(url_for('pex3_estoque_produtos_dm'))
-    
-    return render_template('estoque/editar_produto.html', produto=pex3_produto_dm)
-
-@pex3_app_estoque_dm.route('/produtos/excluir/<pex3_codigo_dm>')
-def pex3_estoque_excluir_produto_dm(pex3_codigo_dm):
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    pex3_produtos_dm = [pex3_p_dm for pex3_p_dm in pex3_produtos_dm if pex3_p_dm['codigo_barras'] != pex3_codigo_dm]
-    pex3_save_produtos_dm(pex3_produtos_dm)
-    flash('Produto excluído com sucesso!', 'success')
-    return redirect(url_for('pex3_estoque_produtos_dm'))
-
-@pex3_app_estoque_dm.route('/venda', methods=['GET', 'POST'])
-def pex3_estoque_venda_dm():
-    pex3_init_produtos_csv_dm()
-    pex3_init_estoque_db_dm()
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    
-    if request.method == 'POST':
-        pex3_codigo_dm = request.form['codigo_barras']
-        pex3_quantidade_dm = int(request.form['quantidade'])
-        
-        pex3_produto_dm = next((pex3_p_dm for pex3_p_dm in pex3_produtos_dm if pex3_p_dm['codigo_barras'] == pex3_codigo_dm), None)
-        if pex3_produto_dm and pex3_produto_dm['saldo'] >= pex3_quantidade_dm:
-            pex3_produto_dm['saldo'] -= pex3_quantidade_dm
-            pex3_save_produtos_dm(pex3_produtos_dm)
-            
-            # Registrar venda
-            pex3_db_dm = pex3_load_estoque_db_dm()
-            pex3_venda_dm = {
-                'data': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'codigo_barras': pex3_codigo_dm,
-                'nome': pex3_produto_dm['nome'],
-                'quantidade': pex3_quantidade_dm,
-                'preco_unitario': pex3_produto_dm['preco_venda'],
-                'total': pex3_quantidade_dm * pex3_produto_dm['preco_venda']
-            }
-            pex3_db_dm['vendas'].append(pex3_venda_dm)
-            pex3_save_estoque_db_dm(pex3_db_dm)
-            
-            flash(f'Venda realizada: {pex3_quantidade_dm}x {pex3_produto_dm["nome"]}', 'success')
-        else:
-            flash('Estoque insuficiente ou produto não encontrado!', 'error')
-        
-        return redirect(url_for('pex3_estoque_venda_dm'))
-    
-    return render_template('estoque/venda.html', produtos=pex3_produtos_dm)
-
-@pex3_app_estoque_dm.route('/compra', methods=['GET', 'POST'])
-def pex3_estoque_compra_dm():
-    pex3_init_produtos_csv_dm()
-    pex3_init_estoque_db_dm()
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    
-    if request.method == 'POST':
-        pex3_codigo_dm = request.form['codigo_barras']
-        pex3_quantidade_dm = int(request.form['quantidade'])
-        
-        pex3_produto_dm = next((pex3_p_dm for pex3_p_dm in pex3_produtos_dm if pex3_p_dm['codigo_barras'] == pex3_codigo_dm), None)
-        if pex3_produto_dm:
-            pex3_produto_dm['saldo'] += pex3_quantidade_dm
-            pex3_save_produtos_dm(pex3_produtos_dm)
-            
-            # Registrar compra
-            pex3_db_dm = pex3_load_estoque_db_dm()
-            pex3_compra_dm = {
-                'data': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'codigo_barras': pex3_codigo_dm,
-                'nome': pex3_produto_dm['nome'],
-                'quantidade': pex3_quantidade_dm,
-                'preco_unitario': pex3_produto_dm['preco_compra'],
-                'total': pex3_quantidade_dm * pex3_produto_dm['preco_compra']
-            }
-            pex3_db_dm['compras'].append(pex3_compra_dm)
-            pex3_save_estoque_db_dm(pex3_db_dm)
-            
-            flash(f'Compra registrada: {pex3_quantidade_dm}x {pex3_produto_dm["nome"]}', 'success')
-        else:
-            flash('Produto não encontrado!', 'error')
-        
-        return redirect(url_for('pex3_estoque_compra_dm'))
-    
-    return render_template('estoque/compra.html', produtos=pex3_produtos_dm)
-
-@pex3_app_estoque_dm.route('/relatorios')
-def pex3_estoque_relatorios_dm():
-    pex3_init_estoque_db_dm()
-    pex3_db_dm = pex3_load_estoque_db_dm()
-    
-    pex3_total_vendas_dm = sum(pex3_v_dm['total'] for pex3_v_dm in pex3_db_dm.get('vendas', []))
-    pex3_total_compras_dm = sum(pex3_c_dm['total'] for pex3_c_dm in pex3_db_dm.get('compras', []))
-    
-    return render_template('estoque/relatorios.html',
-                         vendas=pex3_db_dm.get('vendas', []),
-                         compras=pex3_db_dm.get('compras', []),
-                         total_vendas=pex3_total_vendas_dm,
-                         total_compras=pex3_total_compras_dm)
-
-
 # ============================================================================
 # FUNÇÕES PARA INICIAR SERVIDORES EM THREADS
 # ============================================================================
@@ -783,8 +402,21 @@ def pex3_run_login_server_dm():
 def pex3_run_financeiro_server_dm():
     """Executa o servidor financeiro na porta 5000"""
     from werkzeug.serving import make_server
-    pex3_init_financeiro_db_dm()
-    pex3_server_dm = make_server('127.0.0.1', 5000, pex3_app_financeiro_dm, threaded=True)
+    # Usa o sistema financeiro completo (financeiro.py), assim como o estoque usa estoque.py
+    import financeiro as pex3_financeiro_module_dm
+    from jinja2 import ChoiceLoader, FileSystemLoader
+
+    # Persistir dados ao lado do executável e carregar templates do RESOURCE_DIR
+    pex3_financeiro_module_dm.pex3_DB_FILE_dm = pex3_DB_FILE_dm
+
+    pex3_templates_root_dm = os.path.join(pex3_RESOURCE_DIR_dm, 'templates')
+    pex3_financeiro_module_dm.pex3_app_dm.jinja_loader = ChoiceLoader([
+        FileSystemLoader(pex3_templates_root_dm),
+        pex3_financeiro_module_dm.pex3_app_dm.jinja_loader,
+    ])
+
+    pex3_financeiro_module_dm.pex3_init_db_dm()
+    pex3_server_dm = make_server('127.0.0.1', 5000, pex3_financeiro_module_dm.pex3_app_dm, threaded=True)
     print("💰 Servidor Financeiro iniciado na porta 5000")
     pex3_server_dm.serve_forever()
 
@@ -808,6 +440,7 @@ def pex3_run_estoque_server_dm():
 
     pex3_estoque_module_dm.pex3_init_produtos_csv_dm()
     pex3_estoque_module_dm.pex3_init_estoque_db_dm()
+    pex3_estoque_module_dm.pex3_preparar_dados_dm()
     pex3_server_dm = make_server('127.0.0.1', 5001, pex3_estoque_module_dm.pex3_app_dm, threaded=True)
     print("📦 Servidor de Estoque iniciado na porta 5001")
     pex3_server_dm.serve_forever()
@@ -0,0 +1,1433 @@
+"""
+Camada de armazenamento compartilhada pelos sistemas Financeiro e de Estoque
+O backend é escolhido pela variável de ambiente PEX3_BACKEND:
+- 'json' (padrão): movimentações e financeiro em JSON, produtos em CSV. Cada gravação
+  lê e regrava o documento inteiro, então custa O(N) no tamanho do histórico
+- 'journal': os mesmos arquivos, mas novas movimentações/transações são acrescentadas a
+  um journal (<arquivo>.journal, uma linha JSON por registro) em tempo constante e
+  incorporadas periodicamente ao arquivo JSON (snapshot) por um compactador em segundo
+  plano. Arquivos JSON existentes servem como primeiro snapshot.
+- 'sqlite': um único banco SQLite em modo WAL (arquivo definido por PEX3_SQLITE_DB)
+
+Os módulos da aplicação continuam chamando suas funções pex3_load_*/pex3_save_*,
+que apenas delegam para as funções deste módulo.
+
+Nos backends de arquivo, toda leitura e escrita passa por uma trava entre processos
+(<arquivo>.lock): leituras compartilham a trava, escritas a tomam com exclusividade
+e gravam em um arquivo temporário substituído de uma vez com os.replace.
+
+As listagens paginadas (lançamentos, vendas, compras) e as exportações usam os
+cursores definidos no fim deste módulo sobre os índices ordenados que cada sistema
+mantém em memória; as importações em lote usam os auxiliares de leitura de CSV
+e gravam tudo de uma vez com pex3_anexar_registros_dm.
+
+Valores monetários são guardados em centavos (int). Dados gravados em reais por
+versões anteriores são convertidos uma única vez por pex3_migrar_centavos_dm.
+
+Produtos, transações, itens de vendas/compras e ajustes são lidos como registros
+compactos (classes com __slots__, ver pex3_Registro_dm), que também aceitam o
+acesso por chave dos dicts.
+"""
+
+import csv
+import io
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+pex3_BACKEND_dm = os.environ.get('PEX3_BACKEND', 'json').strip().lower()
+pex3_SQLITE_DB_dm = os.environ.get('PEX3_SQLITE_DB', 'pex3.db')
+pex3_INTERVALO_COMPACTACAO_dm = float(os.environ.get('PEX3_INTERVALO_COMPACTACAO', '300'))  # segundos
+pex3_SNAPSHOT_A_CADA_dm = int(os.environ.get('PEX3_SNAPSHOT_A_CADA', '1000'))  # registros no journal
+
+pex3_CAMPOS_PRODUTO_dm = ['codigo_barras', 'nome', 'saldo', 'preco_venda', 'preco_compra', 'estoque_minimo']
+pex3_ESTOQUE_MINIMO_PADRAO_dm = 5.0  # ponto de reposição de produtos sem valor próprio (e de CSVs antigos)
+
+# Valores monetários de cada coleção, guardados em centavos (int). No produtos.csv
+# as colunas de preço levam o sufixo _centavos, o que distingue o CSV do formato antigo.
+pex3_FORMATO_DADOS_dm = 2  # 1: valores em reais (float); 2: valores em centavos (int)
+pex3_CAMPOS_MONETARIOS_dm = {
+    'produtos': ('preco_venda', 'preco_compra'),
+    'vendas': ('valor_bruto', 'desconto', 'valor_total', 'custo_total', 'lucro'),
+    'compras': ('valor_total',),
+    'transactions': ('valor',)
+}
+pex3_CAMPOS_MONETARIOS_ITEM_dm = ('preco_unitario', 'preco_custo', 'subtotal')  # itens de vendas e compras
+pex3_COLUNAS_CSV_PRODUTO_dm = [pex3_c_dm + '_centavos' if pex3_c_dm in pex3_CAMPOS_MONETARIOS_dm['produtos'] else pex3_c_dm
+                               for pex3_c_dm in pex3_CAMPOS_PRODUTO_dm]
+
+# Coleções de cada documento e as colunas indexadas de cada coleção no SQLite.
+# O registro completo é guardado em JSON na coluna 'dados'.
+pex3_COLECOES_dm = {
+    'estoque': ['vendas', 'compras', 'ajustes'],
+    'financeiro': ['transactions', 'categories', 'payment_methods']
+}
+pex3_COLUNAS_SQLITE_dm = {
+    'vendas': ['id', 'data'],
+    'compras': ['id', 'data'],
+    'ajustes': ['id', 'data'],
+    'transactions': ['id', 'tipo', 'data_gasto', 'categoria', 'forma_pagamento', 'valor'],
+    'categories': ['nome', 'tipo'],
+    'payment_methods': []
+}
+
+pex3_SCHEMA_SQLITE_dm = '''
+CREATE TABLE IF NOT EXISTS produtos (
+    codigo_barras TEXT PRIMARY KEY,
+    nome TEXT NOT NULL,
+    saldo REAL NOT NULL,
+    preco_venda INTEGER NOT NULL,
+    preco_compra INTEGER NOT NULL,
+    estoque_minimo REAL NOT NULL DEFAULT 5
+);
+CREATE INDEX IF NOT EXISTS idx_produtos_nome ON produtos (nome);
+
+CREATE TABLE IF NOT EXISTS vendas (seq INTEGER PRIMARY KEY AUTOINCREMENT, id INTEGER, data TEXT, dados TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_vendas_id ON vendas (id);
+CREATE INDEX IF NOT EXISTS idx_vendas_data ON vendas (data);
+
+CREATE TABLE IF NOT EXISTS compras (seq INTEGER PRIMARY KEY AUTOINCREMENT, id INTEGER, data TEXT, dados TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_compras_id ON compras (id);
+CREATE INDEX IF NOT EXISTS idx_compras_data ON compras (data);
+
+CREATE TABLE IF NOT EXISTS ajustes (seq INTEGER PRIMARY KEY AUTOINCREMENT, id INTEGER, data TEXT, dados TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_ajustes_id ON ajustes (id);
+CREATE INDEX IF NOT EXISTS idx_ajustes_data ON ajustes (data);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER,
+    tipo TEXT,
+    data_gasto TEXT,
+    categoria TEXT,
+    forma_pagamento TEXT,
+    valor INTEGER,
+    dados TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_id ON transactions (id);
+CREATE INDEX IF NOT EXISTS idx_transactions_data ON transactions (data_gasto, id);
+CREATE INDEX IF NOT EXISTS idx_transactions_tipo_data ON transactions (tipo, data_gasto);
+CREATE INDEX IF NOT EXISTS idx_transactions_categoria ON transactions (categoria);
+
+CREATE TABLE IF NOT EXISTS categories (seq INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT, tipo TEXT, dados TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS payment_methods (seq INTEGER PRIMARY KEY AUTOINCREMENT, dados TEXT NOT NULL);
+
+-- Versão de cada conjunto de dados, usada para invalidar caches em memória
+-- (e, em 'formato:<conjunto>', o formato dos valores gravados)
+CREATE TABLE IF NOT EXISTS versoes (nome TEXT PRIMARY KEY, versao INTEGER NOT NULL);
+
+-- Último id entregue para cada coleção (alocador de ids)
+CREATE TABLE IF NOT EXISTS sequencias (colecao TEXT PRIMARY KEY, valor INTEGER NOT NULL);
+'''
+
+# ============== REGISTROS COMPACTOS (__slots__) ==============
+# Produtos, transações, itens de vendas/compras e ajustes são os registros que
+# ficam aos milhares (ou milhões) em memória. Em vez de um dict por registro, cada
+# um é um objeto com __slots__: os valores ficam num vetor fixo dentro do objeto,
+# sem tabela de hash, o que custa bem menos memória que um dict com as mesmas chaves.
+# Os laços pesados leem os campos como atributos (t.valor); o restante do código e
+# os templates continuam usando registro['campo'] e .get(), pois os registros se
+# comportam como mapeamentos. Chaves fora dos campos previstos (dados editados à
+# mão ou de outras versões) vão para um dict à parte, criado só quando necessário,
+# e são gravadas de volta sem perda.
+
+pex3_AUSENTE_dm = object()  # campo ainda não preenchido (a chave não existe no registro)
+
+class pex3_Registro_dm(MutableMapping):
+    """Base dos registros compactos: campos em __slots__, lidos como atributo ou como chave"""
+    __slots__ = ('pex3_extras_dm',)
+    pex3_CAMPOS_dm = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.pex3_CONJUNTO_CAMPOS_dm = frozenset(cls.pex3_CAMPOS_dm)
+
+    def __init__(self, *pex3_valores_dm, **pex3_campos_dm):
+        """Valores posicionais na ordem de pex3_CAMPOS_dm; os nomeados podem ser qualquer chave"""
+        self.pex3_extras_dm = None
+        for pex3_campo_dm, pex3_valor_dm in zip(self.pex3_CAMPOS_dm, pex3_valores_dm):
+            setattr(self, pex3_campo_dm, pex3_valor_dm)
+        for pex3_chave_dm, pex3_valor_dm in pex3_campos_dm.items():
+            self[pex3_chave_dm] = pex3_valor_dm
+
+    @classmethod
+    def pex3_de_dict_dm(cls, pex3_dados_dm):
+        """Novo registro com as chaves de um dict (ou de outro registro)"""
+        pex3_registro_dm = cls.__new__(cls)
+        pex3_registro_dm.pex3_extras_dm = None
+        pex3_conjunto_dm = cls.pex3_CONJUNTO_CAMPOS_dm
+        for pex3_chave_dm, pex3_valor_dm in pex3_dados_dm.items():
+            if pex3_chave_dm in pex3_conjunto_dm:
+                setattr(pex3_registro_dm, pex3_chave_dm, pex3_valor_dm)
+            else:
+                pex3_registro_dm[pex3_chave_dm] = pex3_valor_dm
+        return pex3_registro_dm
+
+    def __getitem__(self, pex3_chave_dm):
+        if pex3_chave_dm in self.pex3_CONJUNTO_CAMPOS_dm:
+            pex3_valor_dm = getattr(self, pex3_chave_dm, pex3_AUSENTE_dm)
+            if pex3_valor_dm is pex3_AUSENTE_dm:
+                raise KeyError(pex3_chave_dm)
+            return pex3_valor_dm
+        if self.pex3_extras_dm is None:
+            raise KeyError(pex3_chave_dm)
+        return self.pex3_extras_dm[pex3_chave_dm]
+
+    def __setitem__(self, pex3_chave_dm, pex3_valor_dm):
+        if pex3_chave_dm in self.pex3_CONJUNTO_CAMPOS_dm:
+            setattr(self, pex3_chave_dm, pex3_valor_dm)
+        else:
+            if self.pex3_extras_dm is None:
+                self.pex3_extras_dm = {}
+            self.pex3_extras_dm[pex3_chave_dm] = pex3_valor_dm
+
+    def __delitem__(self, pex3_chave_dm):
+        if pex3_chave_dm in self.pex3_CONJUNTO_CAMPOS_dm:
+            try:
+                delattr(self, pex3_chave_dm)
+            except AttributeError:
+                raise KeyError(pex3_chave_dm) from None
+            return
+        if self.pex3_extras_dm is None:
+            raise KeyError(pex3_chave_dm)
+        del self.pex3_extras_dm[pex3_chave_dm]
+        if not self.pex3_extras_dm:
+            self.pex3_extras_dm = None
+
+    def __contains__(self, pex3_chave_dm):
+        if pex3_chave_dm in self.pex3_CONJUNTO_CAMPOS_dm:
+            return hasattr(self, pex3_chave_dm)
+        return self.pex3_extras_dm is not None and pex3_chave_dm in self.pex3_extras_dm
+
+    def __iter__(self):
+        for pex3_campo_dm in self.pex3_CAMPOS_dm:
+            if hasattr(self, pex3_campo_dm):
+                yield pex3_campo_dm
+        if self.pex3_extras_dm is not None:
+            yield from self.pex3_extras_dm
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.pex3_como_dict_dm()!r})"
+
+    def __eq__(self, pex3_outro_dm):
+        # Entre registros do mesmo tipo, compara campo a campo e para na primeira diferença
+        if type(pex3_outro_dm) is type(self):
+            return (all(getattr(self, pex3_campo_dm, pex3_AUSENTE_dm) == getattr(pex3_outro_dm, pex3_campo_dm, pex3_AUSENTE_dm)
+                        for pex3_campo_dm in self.pex3_CAMPOS_dm)
+                    and self.pex3_extras_dm == pex3_outro_dm.pex3_extras_dm)
+        if isinstance(pex3_outro_dm, Mapping):
+            return self.pex3_como_dict_dm() == dict(pex3_outro_dm)
+        return NotImplemented
+
+    __hash__ = None
+
+    def get(self, pex3_chave_dm, pex3_padrao_dm=None):
+        if pex3_chave_dm in self.pex3_CONJUNTO_CAMPOS_dm:
+            return getattr(self, pex3_chave_dm, pex3_padrao_dm)
+        if self.pex3_extras_dm is None:
+            return pex3_padrao_dm
+        return self.pex3_extras_dm.get(pex3_chave_dm, pex3_padrao_dm)
+
+    def pex3_como_dict_dm(self):
+        """Dict com as chaves do registro (bem mais rápido que dict(registro), que lê chave a chave)"""
+        pex3_dados_dm = {}
+        for pex3_campo_dm in self.pex3_CAMPOS_dm:
+            pex3_valor_dm = getattr(self, pex3_campo_dm, pex3_AUSENTE_dm)
+            if pex3_valor_dm is not pex3_AUSENTE_dm:
+                pex3_dados_dm[pex3_campo_dm] = pex3_valor_dm
+        if self.pex3_extras_dm:
+            pex3_dados_dm.update(self.pex3_extras_dm)
+        return pex3_dados_dm
+
+    def copy(self):
+        """Cópia rasa, do mesmo tipo"""
+        pex3_copia_dm = type(self).__new__(type(self))
+        pex3_copia_dm.pex3_extras_dm = dict(self.pex3_extras_dm) if self.pex3_extras_dm else None
+        for pex3_campo_dm in self.pex3_CAMPOS_dm:
+            pex3_valor_dm = getattr(self, pex3_campo_dm, pex3_AUSENTE_dm)
+            if pex3_valor_dm is not pex3_AUSENTE_dm:
+                setattr(pex3_copia_dm, pex3_campo_dm, pex3_valor_dm)
+        return pex3_copia_dm
+
+class pex3_Produto_dm(pex3_Registro_dm):
+    """Produto do catálogo (preços em centavos)"""
+    pex3_CAMPOS_dm = tuple(pex3_CAMPOS_PRODUTO_dm)
+    __slots__ = pex3_CAMPOS_dm
+
+class pex3_Transacao_dm(pex3_Registro_dm):
+    """Lançamento do financeiro (valor em centavos)"""
+    pex3_CAMPOS_dm = ('id', 'tipo', 'data_gasto', 'data_criacao', 'valor', 'categoria', 'forma_pagamento', 'descricao')
+    __slots__ = pex3_CAMPOS_dm
+
+class pex3_ItemMovimentacao_dm(pex3_Registro_dm):
+    """Item de uma venda ou compra (as compras não têm preco_custo)"""
+    pex3_CAMPOS_dm = ('codigo_barras', 'nome_produto', 'quantidade', 'preco_unitario', 'preco_custo', 'subtotal')
+    __slots__ = pex3_CAMPOS_dm
+
+class pex3_Ajuste_dm(pex3_Registro_dm):
+    """Ajuste de estoque (inventário ou correção)"""
+    pex3_CAMPOS_dm = ('id', 'data', 'codigo_barras', 'nome_produto', 'tipo_ajuste', 'quantidade',
+                      'saldo_anterior', 'saldo_novo', 'motivo')
+    __slots__ = pex3_CAMPOS_dm
+
+# Coleções guardadas como registros compactos. Vendas e compras continuam dicts
+# (são poucas perto dos itens e das transações), mas seus itens viram registros.
+pex3_CLASSES_REGISTRO_dm = {'transactions': pex3_Transacao_dm, 'ajustes': pex3_Ajuste_dm}
+pex3_COLECOES_COM_ITENS_dm = ('vendas', 'compras')
+
+def pex3_registro_compacto_dm(pex3_colecao_dm, pex3_registro_dm):
+    """Registro lido do armazenamento na forma compacta da sua coleção"""
+    pex3_classe_dm = pex3_CLASSES_REGISTRO_dm.get(pex3_colecao_dm)
+    if pex3_classe_dm is not None:
+        return pex3_classe_dm.pex3_de_dict_dm(pex3_registro_dm)
+    if pex3_colecao_dm in pex3_COLECOES_COM_ITENS_dm and isinstance(pex3_registro_dm.get('itens'), list):
+        pex3_registro_dm['itens'] = [pex3_ItemMovimentacao_dm.pex3_de_dict_dm(pex3_item_dm)
+                                     for pex3_item_dm in pex3_registro_dm['itens']]
+    return pex3_registro_dm
+
+def pex3_compactar_registros_dm(pex3_colecao_dm, pex3_registros_dm):
+    """Converte, na própria lista, os registros da coleção (cada dict é liberado logo em seguida)"""
+    for pex3_pos_dm, pex3_registro_dm in enumerate(pex3_registros_dm):
+        pex3_registros_dm[pex3_pos_dm] = pex3_registro_compacto_dm(pex3_colecao_dm, pex3_registro_dm)
+    return pex3_registros_dm
+
+def pex3_compactar_documento_dm(pex3_dados_dm):
+    """Converte as coleções de um documento recém-lido para registros compactos"""
+    for pex3_colecao_dm, pex3_registros_dm in pex3_dados_dm.items():
+        if isinstance(pex3_registros_dm, list):
+            pex3_compactar_registros_dm(pex3_colecao_dm, pex3_registros_dm)
+    return pex3_dados_dm
+
+def pex3_json_padrao_dm(pex3_objeto_dm):
+    """Parâmetro default= de json.dump: registros compactos viram objetos JSON"""
+    if isinstance(pex3_objeto_dm, pex3_Registro_dm):
+        return pex3_objeto_dm.pex3_como_dict_dm()
+    raise TypeError(f"Objeto do tipo {type(pex3_objeto_dm).__name__} não é serializável em JSON")
+
+# ============== TRAVAS E GRAVAÇÃO ATÔMICA ==============
+# financeiro.py e estoque.py podem rodar em processos separados (iniciar_sistemas.py)
+# e ambos gravam database.json. A trava fica em um arquivo <caminho>.lock:
+# compartilhada para leitura e exclusiva para escrita (no Windows, msvcrt só
+# oferece trava exclusiva, então lá as leituras também são serializadas).
+
+pex3_travas_thread_dm = threading.local()
+
+def pex3_travar_arquivo_dm(pex3_arquivo_dm, pex3_exclusiva_dm):
+    """Bloqueia até obter a trava do arquivo de lock"""
+    if fcntl is not None:
+        fcntl.flock(pex3_arquivo_dm.fileno(), fcntl.LOCK_EX if pex3_exclusiva_dm else fcntl.LOCK_SH)
+        return
+    while True:
+        try:
+            pex3_arquivo_dm.seek(0)
+            msvcrt.locking(pex3_arquivo_dm.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(0.05)
+
+def pex3_destravar_arquivo_dm(pex3_arquivo_dm):
+    """Libera a trava do arquivo de lock"""
+    if fcntl is not None:
+        fcntl.flock(pex3_arquivo_dm.fileno(), fcntl.LOCK_UN)
+    else:
+        pex3_arquivo_dm.seek(0)
+        msvcrt.locking(pex3_arquivo_dm.fileno(), msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def pex3_trava_dm(pex3_caminho_dm, pex3_exclusiva_dm=True):
+    """Trava de leitura/escrita entre processos e threads para um arquivo de dados.
+    É reentrante: se a thread já detém a trava do caminho, apenas a reaproveita."""
+    pex3_ativas_dm = pex3_travas_thread_dm.__dict__.setdefault('ativas', {})
+    if pex3_caminho_dm in pex3_ativas_dm:
+        if pex3_exclusiva_dm and not pex3_ativas_dm[pex3_caminho_dm]:
+            raise RuntimeError(f"Trava de leitura de {pex3_caminho_dm} não pode ser promovida a escrita")
+        yield
+        return
+    with open(pex3_caminho_dm + '.lock', 'a+b') as pex3_arquivo_dm:
+        pex3_travar_arquivo_dm(pex3_arquivo_dm, pex3_exclusiva_dm)
+        pex3_ativas_dm[pex3_caminho_dm] = pex3_exclusiva_dm
+        try:
+            yield
+        finally:
+            del pex3_ativas_dm[pex3_caminho_dm]
+            pex3_destravar_arquivo_dm(pex3_arquivo_dm)
+
+@contextmanager
+def pex3_gravacao_atomica_dm(pex3_caminho_dm, **pex3_opcoes_dm):
+    """Abre um arquivo temporário para escrita e, ao final, o substitui pelo definitivo.
+    Leitores nunca veem um arquivo pela metade; em caso de erro o original é mantido."""
+    pex3_temp_dm = pex3_caminho_dm + '.tmp'
+    try:
+        with open(pex3_temp_dm, 'w', encoding='utf-8', **pex3_opcoes_dm) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pex3_temp_dm, pex3_caminho_dm)
+    finally:
+        if os.path.exists(pex3_temp_dm):
+            os.remove(pex3_temp_dm)
+
+def pex3_fatiar_desde_marcador_dm(pex3_registros_dm, pex3_marcador_dm, pex3_versao_dm, pex3_geracao_dm):
+    """Aplica um marcador (versão, geração, posição) a uma lista de registros em memória"""
+    pex3_novo_marcador_dm = (pex3_versao_dm, pex3_geracao_dm, len(pex3_registros_dm))
+    if (pex3_marcador_dm is not None and pex3_marcador_dm[1] == pex3_geracao_dm
+            and pex3_marcador_dm[2] <= len(pex3_registros_dm)):
+        return pex3_registros_dm[pex3_marcador_dm[2]:], pex3_novo_marcador_dm, False
+    return list(pex3_registros_dm), pex3_novo_marcador_dm, True
+
+# ============== BACKEND JSON/CSV ==============
+
+def pex3_json_ler_produtos_dm(pex3_caminho_dm):
+    """Lê todos os produtos do CSV (preços em centavos; os de um CSV antigo, em reais, são convertidos)"""
+    pex3_produtos_dm = []
+    with pex3_trava_dm(pex3_caminho_dm, pex3_exclusiva_dm=False), open(pex3_caminho_dm, 'r', encoding='utf-8') as f:
+        pex3_reader_dm = csv.DictReader(f, delimiter=';')
+        for pex3_row_dm in pex3_reader_dm:
+            pex3_produtos_dm.append(pex3_Produto_dm(
+                pex3_row_dm['codigo_barras'],
+                pex3_row_dm['nome'],
+                float(pex3_row_dm['saldo']),
+                pex3_preco_csv_dm(pex3_row_dm, 'preco_venda'),
+                pex3_preco_csv_dm(pex3_row_dm, 'preco_compra'),
+                float(pex3_row_dm.get('estoque_minimo') or pex3_ESTOQUE_MINIMO_PADRAO_dm)
+            ))
+    return pex3_produtos_dm
+
+def pex3_preco_csv_dm(pex3_row_dm, pex3_campo_dm):
+    """Preço em centavos de uma linha do produtos.csv, atual (<campo>_centavos) ou antigo (<campo>, em reais)"""
+    pex3_centavos_texto_dm = pex3_row_dm.get(pex3_campo_dm + '_centavos')
+    if pex3_centavos_texto_dm is not None:
+        return int(pex3_centavos_texto_dm)
+    # Gravado por float() das versões anteriores: o ponto é sempre decimal
+    return pex3_centavos_dm(float(pex3_row_dm[pex3_campo_dm]))
+
+def pex3_json_formato_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Formato dos valores gravados no arquivo: cabeçalho do CSV de produtos ou '_formato' do JSON"""
+    with pex3_trava_dm(pex3_caminho_dm, pex3_exclusiva_dm=False), open(pex3_caminho_dm, 'r', encoding='utf-8') as f:
+        if pex3_tipo_dm == 'produtos':
+            pex3_cabecalho_dm = next(csv.reader(f, delimiter=';'), [])
+            return pex3_FORMATO_DADOS_dm if 'preco_venda_centavos' in pex3_cabecalho_dm else 1
+        return json.load(f).get('_formato', 1)
+
+def pex3_valores_produto_dm(pex3_produto_dm):
+    """Valores do produto na ordem de pex3_CAMPOS_PRODUTO_dm"""
+    return [pex3_produto_dm.get('estoque_minimo', pex3_ESTOQUE_MINIMO_PADRAO_dm) if pex3_campo_dm == 'estoque_minimo'
+            else pex3_produto_dm[pex3_campo_dm] for pex3_campo_dm in pex3_CAMPOS_PRODUTO_dm]
+
+def pex3_json_gravar_produtos_dm(pex3_caminho_dm, pex3_produtos_dm, pex3_alterados_dm=None, pex3_removidos_dm=()):
+    """Grava a lista completa de produtos no CSV (o CSV não permite gravação parcial).
+    Retorna a assinatura do arquivo gravado, tomada antes de liberar a trava."""
+    with pex3_trava_dm(pex3_caminho_dm):
+        with pex3_gravacao_atomica_dm(pex3_caminho_dm, newline='') as f:
+            pex3_writer_dm = csv.writer(f, delimiter=';')
+            pex3_writer_dm.writerow(pex3_COLUNAS_CSV_PRODUTO_dm)
+            for pex3_p_dm in pex3_produtos_dm:
+                pex3_writer_dm.writerow(pex3_valores_produto_dm(pex3_p_dm))
+        return pex3_json_assinatura_dm('produtos', pex3_caminho_dm)
+
+def pex3_json_carregar_documento_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Carrega um documento JSON inteiro"""
+    with pex3_trava_dm(pex3_caminho_dm, pex3_exclusiva_dm=False), open(pex3_caminho_dm, 'r', encoding='utf-8') as f:
+        pex3_dados_dm = json.load(f)
+    # Marcadores internos (journal, geração e formato); não fazem parte dos dados
+    pex3_dados_dm.pop('_journal_seq', None)
+    pex3_dados_dm.pop('_geracao', None)
+    pex3_dados_dm.pop('_formato', None)
+    return pex3_compactar_documento_dm(pex3_dados_dm)
+
+# caminho -> (assinatura, geração) da última versão conhecida de cada documento
+pex3_json_geracoes_dm = {}
+
+def pex3_json_gravar_arquivo_dm(pex3_caminho_dm, pex3_dados_dm):
+    """Grava o documento (com seus marcadores internos) de forma atômica"""
+    with pex3_trava_dm(pex3_caminho_dm):
+        with pex3_gravacao_atomica_dm(pex3_caminho_dm) as f:
+            json.dump(pex3_dados_dm, f, indent=4, ensure_ascii=False, default=pex3_json_padrao_dm)
+        pex3_json_geracoes_dm[pex3_caminho_dm] = (pex3_json_assinatura_dm(None, pex3_caminho_dm),
+                                                  pex3_dados_dm.get('_geracao', 0))
+
+def pex3_json_geracao_atual_dm(pex3_caminho_dm):
+    """Geração gravada no documento (0 se o arquivo ainda não existe).
+    O JSON só é lido se a assinatura (mtime/tamanho) mudou desde a última gravação ou leitura."""
+    if not os.path.exists(pex3_caminho_dm):
+        return 0
+    pex3_assinatura_dm = pex3_json_assinatura_dm(None, pex3_caminho_dm)
+    pex3_cache_dm = pex3_json_geracoes_dm.get(pex3_caminho_dm)
+    if pex3_cache_dm is not None and pex3_cache_dm[0] == pex3_assinatura_dm:
+        return pex3_cache_dm[1]
+    with open(pex3_caminho_dm, 'r', encoding='utf-8') as f:
+        pex3_geracao_dm = json.load(f).get('_geracao', 0)
+    pex3_json_geracoes_dm[pex3_caminho_dm] = (pex3_assinatura_dm, pex3_geracao_dm)
+    return pex3_geracao_dm
+
+def pex3_json_salvar_documento_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm):
+    """Salva um documento JSON inteiro (nova geração: leitores incrementais recomeçam)"""
+    with pex3_trava_dm(pex3_caminho_dm):
+        pex3_documento_dm = dict(pex3_dados_dm)
+        pex3_documento_dm['_geracao'] = pex3_json_geracao_atual_dm(pex3_caminho_dm) + 1
+        pex3_documento_dm['_formato'] = pex3_FORMATO_DADOS_dm
+        pex3_json_gravar_arquivo_dm(pex3_caminho_dm, pex3_documento_dm)
+
+def pex3_json_migrar_centavos_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Regrava em centavos um arquivo ainda no formato antigo (sob a trava exclusiva,
+    para que dois processos não convertam o mesmo arquivo)"""
+    if not os.path.exists(pex3_caminho_dm):
+        return 0
+    with pex3_trava_dm(pex3_caminho_dm):
+        if pex3_json_formato_dm(pex3_tipo_dm, pex3_caminho_dm) >= pex3_FORMATO_DADOS_dm:
+            return 0
+        if pex3_tipo_dm == 'produtos':
+            pex3_produtos_dm = pex3_json_ler_produtos_dm(pex3_caminho_dm)
+            pex3_json_gravar_produtos_dm(pex3_caminho_dm, pex3_produtos_dm)
+            return len(pex3_produtos_dm)
+        pex3_dados_dm = pex3_json_carregar_documento_dm(pex3_tipo_dm, pex3_caminho_dm)
+        pex3_convertidos_dm = pex3_documento_em_centavos_dm(pex3_tipo_dm, pex3_dados_dm)
+        pex3_json_salvar_documento_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm)
+        return pex3_convertidos_dm
+
+# Estado em memória de cada documento JSON, para leituras incrementais e buscas por id:
+# caminho -> {'assinatura', 'geracao', 'marcadores', 'dados', 'indices'}. As gravações
+# deste processo o atualizam no lugar; uma gravação de outro processo muda a assinatura
+# (mtime/tamanho) e o documento é lido de novo por inteiro, uma vez.
+pex3_json_estado_lock_dm = threading.RLock()
+pex3_json_estado_dm = {}
+
+def pex3_json_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Estado em memória do documento, relido do arquivo só se a assinatura mudou
+    (chamar com pex3_json_estado_lock_dm e a trava do arquivo)"""
+    pex3_assinatura_dm = pex3_json_assinatura_dm(pex3_tipo_dm, pex3_caminho_dm)
+    pex3_estado_dm = pex3_json_estado_dm.get(pex3_caminho_dm)
+    if pex3_estado_dm is None or pex3_estado_dm['assinatura'] != pex3_assinatura_dm:
+        with open(pex3_caminho_dm, 'r', encoding='utf-8') as f:
+            pex3_dados_dm = json.load(f)
+        pex3_marcadores_dm = {pex3_chave_dm: pex3_dados_dm.pop(pex3_chave_dm)
+                              for pex3_chave_dm in ('_journal_seq', '_geracao', '_formato') if pex3_chave_dm in pex3_dados_dm}
+        pex3_estado_dm = {
+            'assinatura': pex3_assinatura_dm,
+            'geracao': pex3_marcadores_dm.get('_geracao', 0),
+            'marcadores': pex3_marcadores_dm,
+            'dados': pex3_compactar_documento_dm(pex3_dados_dm),
+            'indices': {}  # coleção -> {id: registro}, criado na primeira busca
+        }
+        pex3_json_estado_dm[pex3_caminho_dm] = pex3_estado_dm
+    return pex3_estado_dm
+
+def pex3_json_anexar_registros_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_registros_dm):
+    """Acrescenta registros a uma coleção regravando o documento uma única vez.
+    Custa O(N) no tamanho do documento (o JSON é regravado inteiro); o backend 'journal' é que
+    acrescenta sem regravar. O documento só é lido de novo se outro processo o alterou.
+    Leitura e gravação ocorrem sob a mesma trava exclusiva, sem perder gravações concorrentes."""
+    with pex3_json_estado_lock_dm, pex3_trava_dm(pex3_caminho_dm):
+        pex3_estado_dm = pex3_json_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm)
+        # Cópias: os registros do chamador não são convertidos no lugar
+        pex3_novos_dm = [pex3_registro_compacto_dm(pex3_colecao_dm, dict(pex3_r_dm) if isinstance(pex3_r_dm, Mapping) else pex3_r_dm)
+                         for pex3_r_dm in pex3_registros_dm]
+        pex3_documento_dm = dict(pex3_estado_dm['dados'])
+        pex3_documento_dm[pex3_colecao_dm] = pex3_documento_dm.get(pex3_colecao_dm, []) + pex3_novos_dm
+        pex3_documento_dm.update(pex3_estado_dm['marcadores'])
+        # Se a gravação falhar, o estado em memória continua igual ao arquivo
+        pex3_json_gravar_arquivo_dm(pex3_caminho_dm, pex3_documento_dm)
+        pex3_estado_dm['dados'].setdefault(pex3_colecao_dm, []).extend(pex3_novos_dm)
+        pex3_indice_dm = pex3_estado_dm['indices'].get(pex3_colecao_dm)
+        if pex3_indice_dm is not None:
+            pex3_indice_dm.update((pex3_r_dm['id'], pex3_r_dm) for pex3_r_dm in pex3_novos_dm if 'id' in pex3_r_dm)
+        pex3_estado_dm['assinatura'] = pex3_json_assinatura_dm(pex3_tipo_dm, pex3_caminho_dm)
+
+def pex3_json_ler_registros_desde_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_marcador_dm):
+    """Registros acrescentados à coleção desde o marcador (ver pex3_ler_registros_desde_dm).
+    Depois de gravações deste processo, custa só os registros novos; depois de uma gravação
+    de outro processo, o documento inteiro é lido de novo (o JSON não tem como informar
+    apenas o trecho novo: para isso existe o backend 'journal')."""
+    with pex3_json_estado_lock_dm, pex3_trava_dm(pex3_caminho_dm, pex3_exclusiva_dm=False):
+        pex3_estado_dm = pex3_json_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm)
+        return pex3_fatiar_desde_marcador_dm(pex3_estado_dm['dados'].get(pex3_colecao_dm, []), pex3_marcador_dm,
+                                             pex3_estado_dm['assinatura'], pex3_estado_dm['geracao'])
+
+def pex3_json_buscar_registro_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_id_dm):
+    """Busca um registro pelo id num índice id -> registro mantido junto com o estado em memória"""
+    with pex3_json_estado_lock_dm, pex3_trava_dm(pex3_caminho_dm, pex3_exclusiva_dm=False):
+        pex3_estado_dm = pex3_json_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm)
+        if pex3_colecao_dm not in pex3_estado_dm['indices']:
+            pex3_estado_dm['indices'][pex3_colecao_dm] = {
+                pex3_r_dm['id']: pex3_r_dm for pex3_r_dm in pex3_estado_dm['dados'].get(pex3_colecao_dm, [])}
+        return pex3_estado_dm['indices'][pex3_colecao_dm].get(pex3_id_dm)
+
+def pex3_json_remover_registros_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_ids_dm):
+    """Retira registros da coleção pelo id, regravando o documento (nova geração: leitores
+    incrementais recomeçam). Usado para desfazer uma pex3_transacao_dm que falhou."""
+    with pex3_json_estado_lock_dm, pex3_trava_dm(pex3_caminho_dm):
+        pex3_dados_dm = pex3_json_carregar_documento_dm(pex3_tipo_dm, pex3_caminho_dm)
+        pex3_dados_dm[pex3_colecao_dm] = [pex3_r_dm for pex3_r_dm in pex3_dados_dm.get(pex3_colecao_dm, [])
+                                          if pex3_r_dm.get('id') not in pex3_ids_dm]
+        pex3_json_salvar_documento_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm)
+
+def pex3_json_preparar_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Incorpora ao JSON um journal deixado pelo backend 'journal' (ao voltar para o 'json',
+    nenhum registro acrescentado fica de fora) e converte valores antigos para centavos"""
+    pex3_journal_dm = pex3_caminho_journal_dm(pex3_caminho_dm)
+    if pex3_tipo_dm != 'produtos' and os.path.exists(pex3_journal_dm) and os.path.getsize(pex3_journal_dm):
+        pex3_journal_compactar_dm(pex3_tipo_dm, pex3_caminho_dm)
+    return pex3_json_migrar_centavos_dm(pex3_tipo_dm, pex3_caminho_dm)
+
+def pex3_json_existe_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Verifica se o arquivo de dados existe"""
+    return os.path.exists(pex3_caminho_dm)
+
+def pex3_json_assinatura_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Assinatura do arquivo (caminho, mtime, tamanho) para invalidar caches"""
+    pex3_stat_dm = os.stat(pex3_caminho_dm)
+    return (pex3_caminho_dm, pex3_stat_dm.st_mtime_ns, pex3_stat_dm.st_size)
+
+def pex3_arquivo_proximo_id_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_quantidade_dm=1):
+    """Reserva os próximos ids da coleção no arquivo <caminho>.seq (backends 'json' e 'journal')
+    e retorna o primeiro. O arquivo guarda só o último id de cada coleção, então reservar
+    ids não depende do tamanho do histórico; na primeira vez a sequência parte do maior id existente."""
+    pex3_arquivo_seq_dm = pex3_caminho_dm + '.seq'
+    with pex3_trava_dm(pex3_arquivo_seq_dm):
+        pex3_sequencias_dm = {}
+        if os.path.exists(pex3_arquivo_seq_dm):
+            with open(pex3_arquivo_seq_dm, 'r', encoding='utf-8') as f:
+                pex3_sequencias_dm = json.load(f)
+        if pex3_colecao_dm not in pex3_sequencias_dm:
+            pex3_registros_dm = pex3_backend_dm()['carregar_documento'](pex3_tipo_dm, pex3_caminho_dm).get(pex3_colecao_dm, [])
+            pex3_sequencias_dm[pex3_colecao_dm] = max((pex3_r_dm['id'] for pex3_r_dm in pex3_registros_dm), default=0)
+        pex3_sequencias_dm[pex3_colecao_dm] += pex3_quantidade_dm
+        with pex3_gravacao_atomica_dm(pex3_arquivo_seq_dm) as f:
+            json.dump(pex3_sequencias_dm, f, indent=4)
+    return pex3_sequencias_dm[pex3_colecao_dm] - pex3_quantidade_dm + 1
+
+pex3_arquivo_transacao_local_dm = threading.local()  # 'anexados' da transação aberta na thread
+
+@contextmanager
+def pex3_arquivo_transacao_dm():
+    """Backends 'json' e 'journal': cada conjunto de dados é um arquivo próprio, sem transação
+    comum entre eles. Cada gravação continua atômica por si (os.replace ou linha do journal);
+    os registros acrescentados dentro do bloco são anotados e, se ele falhar, retirados de novo.
+    O catálogo de produtos não é desfeito: o chamador o grava por último."""
+    if getattr(pex3_arquivo_transacao_local_dm, 'anexados', None) is not None:
+        yield  # já dentro de uma transação da thread
+        return
+    pex3_arquivo_transacao_local_dm.anexados = []
+    try:
+        yield
+    except BaseException:
+        pex3_desfazer_anexados_dm(pex3_arquivo_transacao_local_dm.anexados)
+        raise
+    finally:
+        pex3_arquivo_transacao_local_dm.anexados = None
+
+def pex3_desfazer_anexados_dm(pex3_anexados_dm):
+    """Retira, do último para o primeiro, os registros acrescentados numa transação que falhou.
+    Uma falha aqui só é avisada: a exceção original é a que segue para o chamador."""
+    for pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_ids_dm in reversed(pex3_anexados_dm):
+        try:
+            pex3_backend_dm()['remover_registros'](pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_ids_dm)
+        except Exception as pex3_e_dm:
+            print(f"⚠️ Falha ao desfazer a gravação em {pex3_caminho_dm}: {pex3_e_dm}")
+
+# ============== BACKEND JSON COM JOURNAL ==============
+# O arquivo JSON passa a ser um snapshot que guarda em '_journal_seq' o último
+# registro do journal já incorporado. Cada registro novo vira uma linha
+# {"seq", "colecao", "registro"} no journal, gravada com um único write + fsync.
+# Leitores enxergam snapshot + journal; o estado em memória só lê o trecho novo.
+# Acrescentar custa o mesmo com 10 ou 1M registros: o snapshot é regravado em
+# segundo plano, a cada PEX3_SNAPSHOT_A_CADA registros ou PEX3_INTERVALO_COMPACTACAO segundos.
+
+pex3_journal_lock_dm = threading.RLock()
+pex3_journal_estado_dm = {}  # caminho -> {'snapshot', 'geracao', 'formato', 'base_seq', 'seq', 'offset', 'dados', 'indices'}
+pex3_journal_documentos_dm = set()  # (tipo, caminho) conhecidos pelo compactador
+pex3_compactador_dm = {'thread': None, 'acordar': threading.Event()}
+
+def pex3_caminho_journal_dm(pex3_caminho_dm):
+    """Caminho do journal de um documento"""
+    return pex3_caminho_dm + '.journal'
+
+def pex3_journal_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Atualiza o estado em memória do documento e o retorna.
+    O snapshot só é relido se tiver mudado; do journal são lidas apenas as linhas novas."""
+    pex3_garantir_compactador_dm(pex3_tipo_dm, pex3_caminho_dm)
+    pex3_estado_dm = pex3_journal_estado_dm.get(pex3_caminho_dm)
+    pex3_snapshot_dm = pex3_json_assinatura_dm(pex3_tipo_dm, pex3_caminho_dm)
+    if pex3_estado_dm is None or pex3_estado_dm['snapshot'] != pex3_snapshot_dm:
+        with open(pex3_caminho_dm, 'r', encoding='utf-8') as f:
+            pex3_dados_dm = json.load(f)
+        pex3_base_seq_dm = pex3_dados_dm.pop('_journal_seq', 0)
+        pex3_estado_dm = {
+            'snapshot': pex3_snapshot_dm,
+            'geracao': pex3_dados_dm.pop('_geracao', 0),
+            'formato': pex3_dados_dm.pop('_formato', 1),
+            'base_seq': pex3_base_seq_dm,
+            'seq': pex3_base_seq_dm,
+            'offset': 0,
+            'dados': pex3_compactar_documento_dm(pex3_dados_dm),
+            'indices': {}  # coleção -> {id: registro}, criado na primeira busca
+        }
+        pex3_journal_estado_dm[pex3_caminho_dm] = pex3_estado_dm
+    
+    pex3_journal_dm = pex3_caminho_journal_dm(pex3_caminho_dm)
+    if not os.path.exists(pex3_journal_dm):
+        return pex3_estado_dm
+    with open(pex3_journal_dm, 'rb') as f:
+        f.seek(pex3_estado_dm['offset'])
+        pex3_bloco_dm = f.read()
+    # Ignora uma última linha incompleta (escrita ainda em andamento)
+    pex3_fim_dm = pex3_bloco_dm.rfind(b'\n') + 1
+    for pex3_linha_dm in pex3_bloco_dm[:pex3_fim_dm].splitlines():
+        if not pex3_linha_dm.strip():
+            continue
+        pex3_entrada_dm = json.loads(pex3_linha_dm)
+        # Linhas com seq <= base_seq já estão no snapshot (compactação interrompida)
+        if pex3_entrada_dm['seq'] > pex3_estado_dm['base_seq']:
+            pex3_colecao_dm = pex3_entrada_dm['colecao']
+            pex3_registro_dm = pex3_registro_compacto_dm(pex3_colecao_dm, pex3_entrada_dm['registro'])
+            pex3_estado_dm['dados'].setdefault(pex3_colecao_dm, []).append(pex3_registro_dm)
+            pex3_estado_dm['seq'] = max(pex3_estado_dm['seq'], pex3_entrada_dm['seq'])
+            if pex3_colecao_dm in pex3_estado_dm['indices'] and 'id' in pex3_registro_dm:
+                pex3_estado_dm['indices'][pex3_colecao_dm][pex3_registro_dm['id']] = pex3_registro_dm
+    pex3_estado_dm['offset'] += pex3_fim_dm
+    return pex3_estado_dm
+
+def pex3_journal_carregar_documento_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Carrega snapshot + journal (listas copiadas para que o chamador possa alterá-las)"""
+    with pex3_journal_lock_dm, pex3_trava_dm(pex3_caminho_dm, pex3_exclusiva_dm=False):
+        pex3_estado_dm = pex3_journal_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm)
+        return {pex3_chave_dm: list(pex3_valor_dm) if isinstance(pex3_valor_dm, list) else pex3_valor_dm
+                for pex3_chave_dm, pex3_valor_dm in pex3_estado_dm['dados'].items()}
+
+def pex3_journal_buscar_registro_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_id_dm):
+    """Busca um registro pelo id no índice em memória (atualizado junto com o journal)"""
+    with pex3_journal_lock_dm, pex3_trava_dm(pex3_caminho_dm, pex3_exclusiva_dm=False):
+        pex3_estado_dm = pex3_journal_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm)
+        if pex3_colecao_dm not in pex3_estado_dm['indices']:
+            pex3_estado_dm['indices'][pex3_colecao_dm] = {
+                pex3_r_dm['id']: pex3_r_dm for pex3_r_dm in pex3_estado_dm['dados'].get(pex3_colecao_dm, [])}
+        return pex3_estado_dm['indices'][pex3_colecao_dm].get(pex3_id_dm)
+
+def pex3_journal_gravar_snapshot_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm, pex3_nova_geracao_dm):
+    """Grava um novo snapshot completo e descarta o journal já incorporado.
+    A compactação preserva a geração e o formato; uma gravação completa da aplicação
+    incrementa a geração e grava no formato atual."""
+    with pex3_journal_lock_dm, pex3_trava_dm(pex3_caminho_dm):
+        pex3_seq_dm = 0
+        pex3_geracao_dm = 0
+        pex3_formato_dm = pex3_FORMATO_DADOS_dm
+        if os.path.exists(pex3_caminho_dm):
+            pex3_estado_dm = pex3_journal_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm)
+            pex3_seq_dm = pex3_estado_dm['seq']
+            pex3_geracao_dm = pex3_estado_dm['geracao']
+            if not pex3_nova_geracao_dm:
+                pex3_formato_dm = pex3_estado_dm['formato']
+        pex3_snapshot_dm = dict(pex3_dados_dm)
+        pex3_snapshot_dm['_journal_seq'] = pex3_seq_dm
+        pex3_snapshot_dm['_geracao'] = pex3_geracao_dm + 1 if pex3_nova_geracao_dm else pex3_geracao_dm
+        pex3_snapshot_dm['_formato'] = pex3_formato_dm
+        with pex3_gravacao_atomica_dm(pex3_caminho_dm) as f:
+            json.dump(pex3_snapshot_dm, f, indent=4, ensure_ascii=False, default=pex3_json_padrao_dm)
+        # Só depois do snapshot gravado o journal pode ser esvaziado
+        open(pex3_caminho_journal_dm(pex3_caminho_dm), 'wb').close()
+        pex3_journal_estado_dm.pop(pex3_caminho_dm, None)
+
+def pex3_journal_salvar_documento_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm):
+    """Substitui o documento inteiro por um novo snapshot"""
+    pex3_journal_gravar_snapshot_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm, pex3_nova_geracao_dm=True)
+
+def pex3_journal_migrar_centavos_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Converte snapshot + journal para centavos num novo snapshot (o CSV de produtos, como no 'json')"""
+    if pex3_tipo_dm == 'produtos':
+        return pex3_json_migrar_centavos_dm(pex3_tipo_dm, pex3_caminho_dm)
+    if not os.path.exists(pex3_caminho_dm):
+        return 0
+    with pex3_journal_lock_dm, pex3_trava_dm(pex3_caminho_dm):
+        if pex3_journal_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm)['formato'] >= pex3_FORMATO_DADOS_dm:
+            return 0
+        pex3_dados_dm = pex3_journal_carregar_documento_dm(pex3_tipo_dm, pex3_caminho_dm)
+        pex3_convertidos_dm = pex3_documento_em_centavos_dm(pex3_tipo_dm, pex3_dados_dm)
+        pex3_journal_salvar_documento_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm)
+        return pex3_convertidos_dm
+
+def pex3_journal_ler_registros_desde_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_marcador_dm):
+    """Registros acrescentados à coleção desde o marcador, lidos do estado em memória"""
+    with pex3_journal_lock_dm, pex3_trava_dm(pex3_caminho_dm, pex3_exclusiva_dm=False):
+        pex3_estado_dm = pex3_journal_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm)
+        pex3_registros_dm = pex3_estado_dm['dados'].get(pex3_colecao_dm, [])
+        return pex3_fatiar_desde_marcador_dm(pex3_registros_dm, pex3_marcador_dm,
+                                             pex3_estado_dm['seq'], pex3_estado_dm['geracao'])
+
+def pex3_journal_anexar_registros_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_registros_dm):
+    """Acrescenta registros ao journal (uma linha cada) com um único write + fsync"""
+    with pex3_journal_lock_dm, pex3_trava_dm(pex3_caminho_dm):
+        pex3_estado_dm = pex3_journal_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm)
+        pex3_linhas_dm = ''.join(json.dumps({
+            'seq': pex3_estado_dm['seq'] + pex3_n_dm,
+            'colecao': pex3_colecao_dm,
+            'registro': pex3_registro_dm
+        }, ensure_ascii=False, default=pex3_json_padrao_dm) + '\n' for pex3_n_dm, pex3_registro_dm in enumerate(pex3_registros_dm, 1))
+        with open(pex3_caminho_journal_dm(pex3_caminho_dm), 'ab') as f:
+            f.write(pex3_linhas_dm.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        # Snapshot periódico: acorda o compactador quando o journal cresce demais
+        if pex3_estado_dm['seq'] + len(pex3_registros_dm) - pex3_estado_dm['base_seq'] >= pex3_SNAPSHOT_A_CADA_dm:
+            pex3_compactador_dm['acordar'].set()
+
+def pex3_journal_remover_registros_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_ids_dm):
+    """Retira registros da coleção pelo id num novo snapshot (nova geração), como no 'json'"""
+    with pex3_journal_lock_dm, pex3_trava_dm(pex3_caminho_dm):
+        pex3_dados_dm = pex3_journal_carregar_documento_dm(pex3_tipo_dm, pex3_caminho_dm)
+        pex3_dados_dm[pex3_colecao_dm] = [pex3_r_dm for pex3_r_dm in pex3_dados_dm.get(pex3_colecao_dm, [])
+                                          if pex3_r_dm.get('id') not in pex3_ids_dm]
+        pex3_journal_salvar_documento_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm)
+
+def pex3_journal_assinatura_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Assinatura do snapshot somada ao tamanho atual do journal (o CSV de produtos não tem journal)"""
+    if pex3_tipo_dm == 'produtos':
+        return pex3_json_assinatura_dm(pex3_tipo_dm, pex3_caminho_dm)
+    pex3_journal_dm = pex3_caminho_journal_dm(pex3_caminho_dm)
+    pex3_tamanho_dm = os.path.getsize(pex3_journal_dm) if os.path.exists(pex3_journal_dm) else 0
+    return pex3_json_assinatura_dm(pex3_tipo_dm, pex3_caminho_dm) + (pex3_tamanho_dm,)
+
+def pex3_journal_compactar_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Incorpora o journal ao snapshot. Retorna True se havia algo a compactar"""
+    with pex3_journal_lock_dm, pex3_trava_dm(pex3_caminho_dm):
+        pex3_journal_dm = pex3_caminho_journal_dm(pex3_caminho_dm)
+        if not os.path.exists(pex3_journal_dm) or os.path.getsize(pex3_journal_dm) == 0:
+            return False
+        pex3_dados_dm = pex3_journal_sincronizar_dm(pex3_tipo_dm, pex3_caminho_dm)['dados']
+        pex3_journal_gravar_snapshot_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm, pex3_nova_geracao_dm=False)
+        return True
+
+def pex3_loop_compactador_dm():
+    """Thread de segundo plano: compacta os journals periodicamente ou quando acordada"""
+    while True:
+        pex3_compactador_dm['acordar'].wait(pex3_INTERVALO_COMPACTACAO_dm)
+        pex3_compactador_dm['acordar'].clear()
+        for pex3_tipo_dm, pex3_caminho_dm in list(pex3_journal_documentos_dm):
+            try:
+                pex3_journal_compactar_dm(pex3_tipo_dm, pex3_caminho_dm)
+            except Exception as pex3_e_dm:
+                print(f"⚠️ Falha ao compactar o journal de {pex3_caminho_dm}: {pex3_e_dm}")
+
+def pex3_garantir_compactador_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Registra o documento no compactador, iniciando a thread na primeira chamada"""
+    pex3_journal_documentos_dm.add((pex3_tipo_dm, pex3_caminho_dm))
+    if pex3_compactador_dm['thread'] is None:
+        pex3_compactador_dm['thread'] = threading.Thread(target=pex3_loop_compactador_dm, daemon=True)
+        pex3_compactador_dm['thread'].start()
+
+# ============== BACKEND SQLITE ==============
+
+pex3_sqlite_local_dm = threading.local()
+
+def pex3_sqlite_conexao_dm():
+    """Retorna a conexão SQLite da thread atual, criando o schema na primeira vez"""
+    pex3_conexao_dm = getattr(pex3_sqlite_local_dm, 'conexao', None)
+    if pex3_conexao_dm is None or pex3_sqlite_local_dm.arquivo != pex3_SQLITE_DB_dm:
+        pex3_conexao_dm = sqlite3.connect(pex3_SQLITE_DB_dm, timeout=30)
+        pex3_conexao_dm.execute('PRAGMA journal_mode=WAL')
+        pex3_conexao_dm.execute('PRAGMA synchronous=NORMAL')
+        pex3_conexao_dm.executescript(pex3_SCHEMA_SQLITE_dm)
+        # Bancos migrados antes do ponto de reposição por produto
+        pex3_colunas_dm = {pex3_c_dm[1] for pex3_c_dm in pex3_conexao_dm.execute('PRAGMA table_info(produtos)')}
+        if 'estoque_minimo' not in pex3_colunas_dm:
+            pex3_conexao_dm.execute('ALTER TABLE produtos ADD COLUMN estoque_minimo REAL NOT NULL DEFAULT 5')
+        pex3_sqlite_local_dm.conexao = pex3_conexao_dm
+        pex3_sqlite_local_dm.arquivo = pex3_SQLITE_DB_dm
+    return pex3_conexao_dm
+
+@contextmanager
+def pex3_sqlite_escrita_dm():
+    """Transação de escrita na conexão da thread. Dentro de pex3_sqlite_transacao_dm apenas
+    participa da transação já aberta: o commit (ou rollback) fica para o fim dela."""
+    pex3_conexao_dm = pex3_sqlite_conexao_dm()
+    if getattr(pex3_sqlite_local_dm, 'transacoes', 0):
+        yield pex3_conexao_dm
+        return
+    with pex3_conexao_dm:
+        yield pex3_conexao_dm
+
+@contextmanager
+def pex3_sqlite_transacao_dm():
+    """Agrupa as gravações da thread (em qualquer conjunto de dados) numa única transação"""
+    pex3_conexao_dm = pex3_sqlite_conexao_dm()
+    pex3_abertas_dm = getattr(pex3_sqlite_local_dm, 'transacoes', 0)
+    pex3_sqlite_local_dm.transacoes = pex3_abertas_dm + 1
+    try:
+        if pex3_abertas_dm:
+            yield
+            return
+        with pex3_conexao_dm:
+            pex3_conexao_dm.execute('BEGIN IMMEDIATE')
+            yield
+    finally:
+        pex3_sqlite_local_dm.transacoes = pex3_abertas_dm
+
+def pex3_sqlite_formato_dm(pex3_conexao_dm, pex3_tipo_dm):
+    """Formato dos valores gravados no conjunto de dados (1 se nunca foi marcado)"""
+    pex3_linha_dm = pex3_conexao_dm.execute(
+        'SELECT versao FROM versoes WHERE nome = ?', ('formato:' + pex3_tipo_dm,)).fetchone()
+    return pex3_linha_dm[0] if pex3_linha_dm else 1
+
+def pex3_sqlite_definir_formato_dm(pex3_conexao_dm, pex3_tipo_dm):
+    """Marca o conjunto de dados como gravado no formato atual (dentro da transação corrente)"""
+    pex3_conexao_dm.execute('INSERT OR REPLACE INTO versoes (nome, versao) VALUES (?, ?)',
+                            ('formato:' + pex3_tipo_dm, pex3_FORMATO_DADOS_dm))
+
+def pex3_sqlite_incrementar_versao_dm(pex3_conexao_dm, pex3_nome_dm):
+    """Incrementa a versão de um conjunto de dados (dentro da transação corrente)"""
+    pex3_conexao_dm.execute(
+        'INSERT INTO versoes (nome, versao) VALUES (?, 1) '
+        'ON CONFLICT(nome) DO UPDATE SET versao = versao + 1', (pex3_nome_dm,))
+
+def pex3_sqlite_inserir_dm(pex3_conexao_dm, pex3_colecao_dm, pex3_registro_dm):
+    """Insere um registro na tabela da coleção"""
+    pex3_colunas_dm = pex3_COLUNAS_SQLITE_dm[pex3_colecao_dm]
+    pex3_valores_dm = [pex3_registro_dm.get(pex3_c_dm) for pex3_c_dm in pex3_colunas_dm]
+    pex3_valores_dm.append(json.dumps(pex3_registro_dm, ensure_ascii=False, default=pex3_json_padrao_dm))
+    pex3_marcadores_dm = ', '.join('?' * (len(pex3_colunas_dm) + 1))
+    pex3_conexao_dm.execute(
+        f"INSERT INTO {pex3_colecao_dm} ({', '.join(pex3_colunas_dm + ['dados'])}) VALUES ({pex3_marcadores_dm})",
+        pex3_valores_dm)
+
+def pex3_sqlite_ler_produtos_dm(pex3_caminho_dm):
+    """Lê todos os produtos da tabela produtos"""
+    # Bancos criados antes dos centavos têm colunas de preço REAL: o CAST devolve int
+    pex3_colunas_dm = [f'CAST({pex3_c_dm} AS INTEGER)' if pex3_c_dm in pex3_CAMPOS_MONETARIOS_dm['produtos'] else pex3_c_dm
+                       for pex3_c_dm in pex3_CAMPOS_PRODUTO_dm]
+    pex3_cursor_dm = pex3_sqlite_conexao_dm().execute(
+        f"SELECT {', '.join(pex3_colunas_dm)} FROM produtos ORDER BY rowid")
+    return [pex3_Produto_dm(*pex3_linha_dm) for pex3_linha_dm in pex3_cursor_dm]
+
+def pex3_sqlite_gravar_produtos_dm(pex3_caminho_dm, pex3_produtos_dm, pex3_alterados_dm=None, pex3_removidos_dm=()):
+    """Grava produtos: só os alterados/removidos quando informados, senão substitui a tabela.
+    Retorna a assinatura com a versão gravada, lida dentro da mesma transação."""
+    pex3_sql_dm = (f"INSERT OR REPLACE INTO produtos ({', '.join(pex3_CAMPOS_PRODUTO_dm)}) "
+                   f"VALUES ({', '.join('?' * len(pex3_CAMPOS_PRODUTO_dm))})")
+    with pex3_sqlite_escrita_dm() as pex3_conexao_dm:
+        if pex3_alterados_dm is None:
+            pex3_conexao_dm.execute('DELETE FROM produtos')
+            pex3_sqlite_definir_formato_dm(pex3_conexao_dm, 'produtos')  # tabela regravada no formato atual
+            pex3_alterados_dm = pex3_produtos_dm
+        pex3_conexao_dm.executemany('DELETE FROM produtos WHERE codigo_barras = ?',
+                                    [(pex3_codigo_dm,) for pex3_codigo_dm in pex3_removidos_dm])
+        pex3_conexao_dm.executemany(pex3_sql_dm, [pex3_valores_produto_dm(pex3_p_dm) for pex3_p_dm in pex3_alterados_dm])
+        pex3_sqlite_incrementar_versao_dm(pex3_conexao_dm, 'produtos')
+        return pex3_sqlite_assinatura_dm('produtos', pex3_caminho_dm)
+
+def pex3_sqlite_carregar_documento_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Monta o documento (dict de coleções) a partir das tabelas"""
+    pex3_conexao_dm = pex3_sqlite_conexao_dm()
+    pex3_dados_dm = {}
+    for pex3_colecao_dm in pex3_COLECOES_dm[pex3_tipo_dm]:
+        pex3_cursor_dm = pex3_conexao_dm.execute(f'SELECT dados FROM {pex3_colecao_dm} ORDER BY seq')
+        pex3_dados_dm[pex3_colecao_dm] = [pex3_registro_compacto_dm(pex3_colecao_dm, json.loads(pex3_linha_dm[0]))
+                                          for pex3_linha_dm in pex3_cursor_dm]
+    return pex3_dados_dm
+
+def pex3_sqlite_substituir_colecoes_dm(pex3_conexao_dm, pex3_tipo_dm, pex3_dados_dm):
+    """Troca o conteúdo de todas as coleções do documento (dentro da transação corrente)"""
+    for pex3_colecao_dm in pex3_COLECOES_dm[pex3_tipo_dm]:
+        pex3_conexao_dm.execute(f'DELETE FROM {pex3_colecao_dm}')
+        for pex3_registro_dm in pex3_dados_dm.get(pex3_colecao_dm, []):
+            pex3_sqlite_inserir_dm(pex3_conexao_dm, pex3_colecao_dm, pex3_registro_dm)
+    pex3_sqlite_incrementar_versao_dm(pex3_conexao_dm, pex3_tipo_dm)
+    pex3_sqlite_incrementar_versao_dm(pex3_conexao_dm, 'geracao:' + pex3_tipo_dm)
+    pex3_sqlite_definir_formato_dm(pex3_conexao_dm, pex3_tipo_dm)
+
+def pex3_sqlite_salvar_documento_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm):
+    """Substitui todas as coleções do documento"""
+    with pex3_sqlite_escrita_dm() as pex3_conexao_dm:
+        pex3_sqlite_substituir_colecoes_dm(pex3_conexao_dm, pex3_tipo_dm, pex3_dados_dm)
+
+def pex3_sqlite_ler_registros_desde_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_marcador_dm):
+    """Registros acrescentados à coleção desde o marcador (a posição é a coluna seq)"""
+    pex3_conexao_dm = pex3_sqlite_conexao_dm()
+    pex3_versoes_dm = dict(pex3_conexao_dm.execute(
+        'SELECT nome, versao FROM versoes WHERE nome IN (?, ?)', (pex3_tipo_dm, 'geracao:' + pex3_tipo_dm)))
+    pex3_versao_dm = pex3_versoes_dm.get(pex3_tipo_dm, 0)
+    pex3_geracao_dm = pex3_versoes_dm.get('geracao:' + pex3_tipo_dm, 0)
+    if pex3_marcador_dm is not None and pex3_marcador_dm[0] == pex3_versao_dm:
+        return [], pex3_marcador_dm, False
+    pex3_completo_dm = pex3_marcador_dm is None or pex3_marcador_dm[1] != pex3_geracao_dm
+    pex3_desde_dm = 0 if pex3_completo_dm else pex3_marcador_dm[2]
+    pex3_linhas_dm = pex3_conexao_dm.execute(
+        f'SELECT seq, dados FROM {pex3_colecao_dm} WHERE seq > ? ORDER BY seq', (pex3_desde_dm,)).fetchall()
+    pex3_posicao_dm = pex3_linhas_dm[-1][0] if pex3_linhas_dm else pex3_desde_dm
+    pex3_registros_dm = [pex3_registro_compacto_dm(pex3_colecao_dm, json.loads(pex3_linha_dm[1]))
+                         for pex3_linha_dm in pex3_linhas_dm]
+    return pex3_registros_dm, (pex3_versao_dm, pex3_geracao_dm, pex3_posicao_dm), pex3_completo_dm
+
+def pex3_sqlite_anexar_registros_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_registros_dm):
+    """Acrescenta registros com INSERTs numa única transação"""
+    with pex3_sqlite_escrita_dm() as pex3_conexao_dm:
+        for pex3_registro_dm in pex3_registros_dm:
+            pex3_sqlite_inserir_dm(pex3_conexao_dm, pex3_colecao_dm, pex3_registro_dm)
+        pex3_sqlite_incrementar_versao_dm(pex3_conexao_dm, pex3_tipo_dm)
+
+def pex3_sqlite_migrar_centavos_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Converte para centavos os produtos ou as coleções de um documento ainda no formato antigo.
+    BEGIN IMMEDIATE reserva a escrita antes de conferir o formato: só um processo converte."""
+    pex3_conexao_dm = pex3_sqlite_conexao_dm()
+    with pex3_conexao_dm:
+        pex3_conexao_dm.execute('BEGIN IMMEDIATE')
+        if (not pex3_sqlite_existe_dm(pex3_tipo_dm, pex3_caminho_dm)
+                or pex3_sqlite_formato_dm(pex3_conexao_dm, pex3_tipo_dm) >= pex3_FORMATO_DADOS_dm):
+            return 0
+        if pex3_tipo_dm == 'produtos':
+            pex3_linhas_dm = pex3_conexao_dm.execute(
+                'SELECT preco_venda, preco_compra, codigo_barras FROM produtos').fetchall()
+            pex3_conexao_dm.executemany(
+                'UPDATE produtos SET preco_venda = ?, preco_compra = ? WHERE codigo_barras = ?',
+                [(pex3_centavos_dm(pex3_venda_dm), pex3_centavos_dm(pex3_compra_dm), pex3_codigo_dm)
+                 for pex3_venda_dm, pex3_compra_dm, pex3_codigo_dm in pex3_linhas_dm])
+            pex3_sqlite_incrementar_versao_dm(pex3_conexao_dm, 'produtos')
+            pex3_sqlite_definir_formato_dm(pex3_conexao_dm, 'produtos')
+            return len(pex3_linhas_dm)
+        pex3_dados_dm = pex3_sqlite_carregar_documento_dm(pex3_tipo_dm, pex3_caminho_dm)
+        pex3_convertidos_dm = pex3_documento_em_centavos_dm(pex3_tipo_dm, pex3_dados_dm)
+        pex3_sqlite_substituir_colecoes_dm(pex3_conexao_dm, pex3_tipo_dm, pex3_dados_dm)
+        return pex3_convertidos_dm
+
+def pex3_sqlite_buscar_registro_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_id_dm):
+    """Busca um registro pelo id usando o índice da coluna id"""
+    pex3_linha_dm = pex3_sqlite_conexao_dm().execute(
+        f'SELECT dados FROM {pex3_colecao_dm} WHERE id = ? ORDER BY seq LIMIT 1', (pex3_id_dm,)).fetchone()
+    return pex3_registro_compacto_dm(pex3_colecao_dm, json.loads(pex3_linha_dm[0])) if pex3_linha_dm else None
+
+def pex3_sqlite_existe_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Verifica se o conjunto de dados já foi criado no banco"""
+    pex3_linha_dm = pex3_sqlite_conexao_dm().execute(
+        'SELECT 1 FROM versoes WHERE nome = ?', (pex3_tipo_dm,)).fetchone()
+    return pex3_linha_dm is not None
+
+def pex3_sqlite_proximo_id_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_quantidade_dm=1):
+    """Reserva os próximos ids da coleção na tabela sequencias (uma transação de escrita)
+    e retorna o primeiro"""
+    with pex3_sqlite_escrita_dm() as pex3_conexao_dm:
+        # Na primeira vez a sequência parte do maior id existente (índice da coluna id)
+        pex3_conexao_dm.execute(
+            f'INSERT OR IGNORE INTO sequencias (colecao, valor) '
+            f'SELECT ?, COALESCE(MAX(id), 0) FROM {pex3_colecao_dm}', (pex3_colecao_dm,))
+        pex3_conexao_dm.execute('UPDATE sequencias SET valor = valor + ? WHERE colecao = ?',
+                                (pex3_quantidade_dm, pex3_colecao_dm))
+        return pex3_conexao_dm.execute(
+            'SELECT valor FROM sequencias WHERE colecao = ?', (pex3_colecao_dm,)).fetchone()[0] - pex3_quantidade_dm + 1
+
+def pex3_sqlite_assinatura_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Assinatura do conjunto de dados (arquivo do banco e versão) para invalidar caches"""
+    pex3_linha_dm = pex3_sqlite_conexao_dm().execute(
+        'SELECT versao FROM versoes WHERE nome = ?', (pex3_tipo_dm,)).fetchone()
+    return (pex3_SQLITE_DB_dm, pex3_tipo_dm, pex3_linha_dm[0] if pex3_linha_dm else 0)
+
+# ============== FUNÇÕES PÚBLICAS (DESPACHAM PARA O BACKEND CONFIGURADO) ==============
+
+pex3_BACKENDS_dm = {
+    'json': {
+        'ler_produtos': pex3_json_ler_produtos_dm,
+        'gravar_produtos': pex3_json_gravar_produtos_dm,
+        'carregar_documento': pex3_json_carregar_documento_dm,
+        'salvar_documento': pex3_json_salvar_documento_dm,
+        'anexar_registros': pex3_json_anexar_registros_dm,
+        'buscar_registro': pex3_json_buscar_registro_dm,
+        'ler_registros_desde': pex3_json_ler_registros_desde_dm,
+        'existe': pex3_json_existe_dm,
+        'assinatura': pex3_json_assinatura_dm,
+        'proximo_id': pex3_arquivo_proximo_id_dm,
+        'migrar_centavos': pex3_json_migrar_centavos_dm,
+        'preparar': pex3_json_preparar_dm,
+        'transacao': pex3_arquivo_transacao_dm,
+        'remover_registros': pex3_json_remover_registros_dm
+    },
+    'journal': {
+        'ler_produtos': pex3_json_ler_produtos_dm,
+        'gravar_produtos': pex3_json_gravar_produtos_dm,
+        'carregar_documento': pex3_journal_carregar_documento_dm,
+        'salvar_documento': pex3_journal_salvar_documento_dm,
+        'anexar_registros': pex3_journal_anexar_registros_dm,
+        'buscar_registro': pex3_journal_buscar_registro_dm,
+        'ler_registros_desde': pex3_journal_ler_registros_desde_dm,
+        'existe': pex3_json_existe_dm,
+        'assinatura': pex3_journal_assinatura_dm,
+        'proximo_id': pex3_arquivo_proximo_id_dm,
+        'migrar_centavos': pex3_journal_migrar_centavos_dm,
+        'preparar': pex3_journal_migrar_centavos_dm,
+        'transacao': pex3_arquivo_transacao_dm,
+        'remover_registros': pex3_journal_remover_registros_dm
+    },
+    'sqlite': {
+        'ler_produtos': pex3_sqlite_ler_produtos_dm,
+        'gravar_produtos': pex3_sqlite_gravar_produtos_dm,
+        'carregar_documento': pex3_sqlite_carregar_documento_dm,
+        'salvar_documento': pex3_sqlite_salvar_documento_dm,
+        'anexar_registros': pex3_sqlite_anexar_registros_dm,
+        'buscar_registro': pex3_sqlite_buscar_registro_dm,
+        'ler_registros_desde': pex3_sqlite_ler_registros_desde_dm,
+        'existe': pex3_sqlite_existe_dm,
+        'assinatura': pex3_sqlite_assinatura_dm,
+        'proximo_id': pex3_sqlite_proximo_id_dm,
+        'migrar_centavos': pex3_sqlite_migrar_centavos_dm,
+        'preparar': pex3_sqlite_migrar_centavos_dm,
+        'transacao': pex3_sqlite_transacao_dm
+    }
+}
+
+def pex3_backend_dm():
+    """Retorna as funções do backend configurado em PEX3_BACKEND"""
+    if pex3_BACKEND_dm not in pex3_BACKENDS_dm:
+        raise ValueError(f"Backend de armazenamento inválido: {pex3_BACKEND_dm!r} "
+                         f"(use um de: {', '.join(pex3_BACKENDS_dm)})")
+    return pex3_BACKENDS_dm[pex3_BACKEND_dm]
+
+def pex3_ler_produtos_dm(pex3_caminho_dm):
+    """Lê todos os produtos do catálogo"""
+    return pex3_backend_dm()['ler_produtos'](pex3_caminho_dm)
+
+def pex3_gravar_produtos_dm(pex3_caminho_dm, pex3_produtos_dm, pex3_alterados_dm=None, pex3_removidos_dm=()):
+    """Grava o catálogo. pex3_alterados_dm/pex3_removidos_dm permitem gravação parcial quando o backend suporta.
+    Retorna a assinatura do catálogo gravado, obtida ainda sob a trava (ou transação) da gravação:
+    guardá-la no cache não encobre uma gravação de outro processo feita logo em seguida."""
+    return pex3_backend_dm()['gravar_produtos'](pex3_caminho_dm, pex3_produtos_dm, pex3_alterados_dm, pex3_removidos_dm)
+
+def pex3_carregar_documento_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Carrega um documento ('estoque' ou 'financeiro') inteiro"""
+    return pex3_backend_dm()['carregar_documento'](pex3_tipo_dm, pex3_caminho_dm)
+
+def pex3_salvar_documento_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm):
+    """Salva um documento ('estoque' ou 'financeiro') inteiro"""
+    pex3_backend_dm()['salvar_documento'](pex3_tipo_dm, pex3_caminho_dm, pex3_dados_dm)
+
+def pex3_proximo_id_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_quantidade_dm=1):
+    """Reserva ids novos e únicos (entre processos) para a coleção do documento.
+    Com pex3_quantidade_dm > 1 reserva um bloco consecutivo; retorna o primeiro id."""
+    return pex3_backend_dm()['proximo_id'](pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_quantidade_dm)
+
+def pex3_anexar_registro_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_registro_dm, pex3_gerar_id_dm=False):
+    """Acrescenta um registro a uma coleção do documento.
+    Com pex3_gerar_id_dm, registro['id'] é reservado pelo alocador de ids antes da gravação.
+    Retorna o id do registro."""
+    pex3_anexar_registros_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, [pex3_registro_dm], pex3_gerar_id_dm)
+    return pex3_registro_dm.get('id')
+
+def pex3_anexar_registros_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_registros_dm, pex3_gerar_id_dm=False):
+    """Acrescenta vários registros de uma vez: uma única gravação no backend (um write no
+    journal, uma transação no SQLite ou, no 'json', uma regravação do documento inteiro). Com pex3_gerar_id_dm, os ids
+    são reservados num só bloco do alocador."""
+    if not pex3_registros_dm:
+        return
+    if pex3_gerar_id_dm:
+        pex3_primeiro_dm = pex3_proximo_id_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, len(pex3_registros_dm))
+        for pex3_id_dm, pex3_registro_dm in enumerate(pex3_registros_dm, pex3_primeiro_dm):
+            pex3_registro_dm['id'] = pex3_id_dm
+    pex3_backend_dm()['anexar_registros'](pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_registros_dm)
+    # Dentro de uma transação de arquivo, anota os ids para desfazer se ela falhar
+    pex3_anexados_dm = getattr(pex3_arquivo_transacao_local_dm, 'anexados', None)
+    pex3_ids_dm = {pex3_r_dm.get('id') for pex3_r_dm in pex3_registros_dm} - {None}
+    if pex3_anexados_dm is not None and pex3_ids_dm:
+        pex3_anexados_dm.append((pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_ids_dm))
+
+def pex3_buscar_registro_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_id_dm):
+    """Busca um único registro de uma coleção pelo id (None se não existir)"""
+    return pex3_backend_dm()['buscar_registro'](pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_id_dm)
+
+def pex3_ler_registros_desde_dm(pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_marcador_dm=None):
+    """Leitura incremental de uma coleção, para índices em memória mantidos pelos módulos.
+    Retorna (registros, marcador, completo): sem marcador (ou se o documento foi regravado
+    por inteiro desde ele) devolve a coleção toda com completo=True; caso contrário, apenas
+    os registros acrescentados depois do marcador informado."""
+    return pex3_backend_dm()['ler_registros_desde'](pex3_tipo_dm, pex3_caminho_dm, pex3_colecao_dm, pex3_marcador_dm)
+
+def pex3_migrar_centavos_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Converte para centavos um conjunto de dados ('produtos', 'estoque' ou 'financeiro')
+    gravado em reais por versões anteriores. O formato fica marcado no próprio armazenamento,
+    então chamar de novo (ou de outro processo) não converte duas vezes.
+    Retorna quantos registros foram convertidos."""
+    return pex3_backend_dm()['migrar_centavos'](pex3_tipo_dm, pex3_caminho_dm)
+
+def pex3_preparar_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Deixa um conjunto de dados existente pronto para o backend configurado, na inicialização:
+    o 'json' incorpora um journal pendente do backend 'journal' (o 'journal' já lê um JSON
+    simples como seu primeiro snapshot) e todos convertem valores antigos para centavos
+    (ver pex3_migrar_centavos_dm). Retorna quantos registros foram convertidos."""
+    return pex3_backend_dm()['preparar'](pex3_tipo_dm, pex3_caminho_dm)
+
+def pex3_transacao_dm():
+    """Gerenciador de contexto que agrupa gravações em vários conjuntos de dados.
+    No SQLite vira uma única transação (tudo ou nada, inclusive os ids reservados);
+    nos backends de arquivo, se o bloco falhar, os registros acrescentados nele são
+    retirados de novo (os ids reservados se perdem). O catálogo de produtos não é
+    desfeito nos arquivos, então o chamador deve deixá-lo por último."""
+    return pex3_backend_dm()['transacao']()
+
+def pex3_existe_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Verifica se o conjunto de dados ('produtos', 'estoque' ou 'financeiro') já existe"""
+    return pex3_backend_dm()['existe'](pex3_tipo_dm, pex3_caminho_dm)
+
+def pex3_assinatura_dm(pex3_tipo_dm, pex3_caminho_dm):
+    """Assinatura que muda sempre que o conjunto de dados é alterado"""
+    return pex3_backend_dm()['assinatura'](pex3_tipo_dm, pex3_caminho_dm)
+
+# ============== PAGINAÇÃO POR CURSOR (KEYSET) ==============
+# As listagens mostram do registro mais recente para o mais antigo. Em vez do
+# número da página, o link carrega a chave (data, id) do último registro exibido:
+# a próxima página é achada por bisect na lista de chaves ordenada, e custa
+# O(log N + por_pagina) qualquer que seja a distância do início do histórico.
+
+pex3_POR_PAGINA_PADRAO_dm = 50
+pex3_POR_PAGINA_MAXIMO_dm = 500
+
+def pex3_codificar_cursor_dm(pex3_chave_dm):
+    """Chave (data, id) -> texto usado na query string ('2025-01-31|42')"""
+    return f"{pex3_chave_dm[0]}|{pex3_chave_dm[1]}"
+
+def pex3_decodificar_cursor_dm(pex3_texto_dm):
+    """Texto do cursor -> chave (data, id); None se vazio ou inválido"""
+    pex3_data_dm, pex3_separador_dm, pex3_id_dm = (pex3_texto_dm or '').rpartition('|')
+    try:
+        return (pex3_data_dm, int(pex3_id_dm)) if pex3_separador_dm else None
+    except ValueError:
+        return None
+
+def pex3_paginar_dm(pex3_chaves_dm, pex3_registros_dm, pex3_inicio_dm, pex3_fim_dm,
+                    pex3_antes_dm=None, pex3_depois_dm=None, pex3_por_pagina_dm=pex3_POR_PAGINA_PADRAO_dm):
+    """Uma página de registros[inicio:fim] (ordenados pela chave), do mais recente ao mais antigo.
+    pex3_antes_dm pede os registros anteriores ao cursor (páginas seguintes) e pex3_depois_dm
+    os posteriores (voltar); sem cursor, a página mais recente.
+    Retorna (registros da página, {'antes', 'depois', 'por_pagina', 'total'}), em que antes/depois
+    são os cursores das páginas vizinhas (None quando não há mais registros naquele sentido)."""
+    pex3_por_pagina_dm = max(1, min(pex3_por_pagina_dm or pex3_POR_PAGINA_PADRAO_dm, pex3_POR_PAGINA_MAXIMO_dm))
+    pex3_depois_dm = pex3_decodificar_cursor_dm(pex3_depois_dm)
+    pex3_antes_dm = pex3_decodificar_cursor_dm(pex3_antes_dm)
+    if pex3_depois_dm is not None:
+        pex3_de_dm = max(pex3_inicio_dm, bisect_right(pex3_chaves_dm, pex3_depois_dm, pex3_inicio_dm, pex3_fim_dm))
+        pex3_ate_dm = min(pex3_fim_dm, pex3_de_dm + pex3_por_pagina_dm)
+    else:
+        pex3_ate_dm = pex3_fim_dm
+        if pex3_antes_dm is not None:
+            pex3_ate_dm = bisect_left(pex3_chaves_dm, pex3_antes_dm, pex3_inicio_dm, pex3_fim_dm)
+        pex3_de_dm = max(pex3_inicio_dm, pex3_ate_dm - pex3_por_pagina_dm)
+    
+    pex3_pagina_dm = {'antes': None, 'depois': None, 'por_pagina': pex3_por_pagina_dm,
+                      'total': pex3_fim_dm - pex3_inicio_dm}
+    if pex3_de_dm < pex3_ate_dm:
+        if pex3_de_dm > pex3_inicio_dm:
+            pex3_pagina_dm['antes'] = pex3_codificar_cursor_dm(pex3_chaves_dm[pex3_de_dm])
+        if pex3_ate_dm < pex3_fim_dm:
+            pex3_pagina_dm['depois'] = pex3_codificar_cursor_dm(pex3_chaves_dm[pex3_ate_dm - 1])
+    return pex3_registros_dm[pex3_de_dm:pex3_ate_dm][::-1], pex3_pagina_dm
+
+# ============== EXPORTAÇÃO EM FLUXO (CSV / NDJSON) ==============
+# A exportação percorre o índice em blocos, guardando só a chave do último
+# registro enviado: a trava do índice fica livre entre um bloco e outro e a
+# memória usada não depende do tamanho do período. Cada bloco vira um pedaço
+# de texto entregue de imediato à resposta HTTP.
+
+pex3_BLOCO_EXPORTACAO_dm = 1000
+pex3_FORMATOS_EXPORTACAO_dm = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def pex3_iterar_em_blocos_dm(pex3_trava_indice_dm, pex3_obter_faixa_dm, pex3_tamanho_dm=pex3_BLOCO_EXPORTACAO_dm):
+    """Registros de uma faixa ordenada, do mais antigo ao mais recente, lidos em blocos.
+    pex3_obter_faixa_dm() é chamada com a trava e retorna (chaves, registros, início, fim);
+    registros inseridos durante a exportação entram se ficarem depois do último enviado."""
+    pex3_ultima_dm = None
+    while True:
+        with pex3_trava_indice_dm:
+            pex3_chaves_dm, pex3_registros_dm, pex3_inicio_dm, pex3_fim_dm = pex3_obter_faixa_dm()
+            if pex3_ultima_dm is not None:
+                pex3_inicio_dm = bisect_right(pex3_chaves_dm, pex3_ultima_dm, pex3_inicio_dm, pex3_fim_dm)
+            pex3_ate_dm = min(pex3_fim_dm, pex3_inicio_dm + pex3_tamanho_dm)
+            pex3_bloco_dm = pex3_registros_dm[pex3_inicio_dm:pex3_ate_dm]
+            if pex3_bloco_dm:
+                pex3_ultima_dm = pex3_chaves_dm[pex3_ate_dm - 1]
+        if not pex3_bloco_dm:
+            return
+        yield from pex3_bloco_dm
+
+def pex3_linha_em_reais_dm(pex3_linha_dm, pex3_monetarios_dm):
+    """Cópia da linha com os campos monetários (centavos) escritos em reais"""
+    return {pex3_campo_dm: pex3_reais_dm(pex3_valor_dm)
+            if pex3_campo_dm in pex3_monetarios_dm and isinstance(pex3_valor_dm, int) else pex3_valor_dm
+            for pex3_campo_dm, pex3_valor_dm in pex3_linha_dm.items()}
+
+def pex3_fluxo_csv_dm(pex3_registros_dm, pex3_campos_dm, pex3_linhas_dm=None, pex3_monetarios_dm=()):
+    """CSV (separado por ';', como produtos.csv) gerado em pedaços de texto.
+    pex3_linhas_dm(registro) pode desdobrar um registro em várias linhas (ex.: uma por item);
+    os campos em pex3_monetarios_dm saem em reais ('12.90'), como as importações esperam."""
+    pex3_buffer_dm = io.StringIO()
+    pex3_writer_dm = csv.DictWriter(pex3_buffer_dm, fieldnames=pex3_campos_dm, delimiter=';', extrasaction='ignore')
+    pex3_writer_dm.writeheader()
+    for pex3_n_dm, pex3_registro_dm in enumerate(pex3_registros_dm, 1):
+        pex3_linhas_registro_dm = pex3_linhas_dm(pex3_registro_dm) if pex3_linhas_dm else (pex3_registro_dm,)
+        if pex3_monetarios_dm:
+            pex3_linhas_registro_dm = (pex3_linha_em_reais_dm(pex3_l_dm, pex3_monetarios_dm)
+                                       for pex3_l_dm in pex3_linhas_registro_dm)
+        pex3_writer_dm.writerows(pex3_linhas_registro_dm)
+        if pex3_n_dm % pex3_BLOCO_EXPORTACAO_dm == 1:
+            # O cabeçalho e o primeiro registro saem logo; depois, um pedaço por bloco
+            yield pex3_buffer_dm.getvalue()
+            pex3_buffer_dm.seek(0)
+            pex3_buffer_dm.truncate()
+    yield pex3_buffer_dm.getvalue()
+
+def pex3_fluxo_ndjson_dm(pex3_registros_dm):
+    """Um objeto JSON por linha, gerado em pedaços de texto"""
+    pex3_linhas_dm = []
+    for pex3_n_dm, pex3_registro_dm in enumerate(pex3_registros_dm, 1):
+        pex3_linhas_dm.append(json.dumps(pex3_registro_dm, ensure_ascii=False, default=pex3_json_padrao_dm))
+        if pex3_n_dm % pex3_BLOCO_EXPORTACAO_dm == 1:
+            # O primeiro registro sai logo, como no CSV; depois, um pedaço por bloco
+            yield '\n'.join(pex3_linhas_dm) + '\n'
+            pex3_linhas_dm = []
+    if pex3_linhas_dm:
+        yield '\n'.join(pex3_linhas_dm) + '\n'
+
+def pex3_fluxo_exportacao_dm(pex3_formato_dm, pex3_registros_dm, pex3_campos_dm, pex3_linhas_dm=None,
+                             pex3_monetarios_dm=()):
+    """Gerador de texto no formato pedido ('csv' ou 'ndjson'); o NDJSON leva os registros
+    completos, como gravados (valores em centavos)"""
+    if pex3_formato_dm == 'csv':
+        return pex3_fluxo_csv_dm(pex3_registros_dm, pex3_campos_dm, pex3_linhas_dm, pex3_monetarios_dm)
+    if pex3_formato_dm == 'ndjson':
+        return pex3_fluxo_ndjson_dm(pex3_registros_dm)
+    raise ValueError(f"Formato de exportação desconhecido: {pex3_formato_dm}")
+
+# ============== IMPORTAÇÃO DE CSV ==============
+# Auxiliares comuns às importações em lote (produtos no Estoque, extratos no
+# Financeiro): o arquivo é lido linha a linha e o separador é detectado pelo cabeçalho.
+# Uma célula que não pode ser convertida invalida só a sua linha.
+
+pex3_ERROS_CONVERSAO_dm = (ValueError, ArithmeticError)  # ArithmeticError inclui decimal.InvalidOperation
+
+def pex3_dobrar_texto_dm(pex3_texto_dm):
+    """Texto sem acentos e em minúsculas, para comparar nomes digitados de formas diferentes"""
+    pex3_decomposto_dm = unicodedata.normalize('NFKD', pex3_texto_dm or '')
+    return ''.join(pex3_c_dm for pex3_c_dm in pex3_decomposto_dm if not unicodedata.combining(pex3_c_dm)).casefold().strip()
+
+def pex3_numero_importacao_dm(pex3_texto_dm):
+    """Converte uma quantidade como '12.5', '12,5' ou '1.234,5' em float (ValueError se inválida).
+    Sem vírgula o ponto é decimal, como no float() dos formulários ('1.000' é 1). Valores
+    monetários usam pex3_centavos_dm, que recusa os textos ambíguos."""
+    pex3_texto_dm = pex3_texto_dm.replace(' ', '').strip()
+    if ',' in pex3_texto_dm:
+        pex3_texto_dm = pex3_texto_dm.replace('.', '').replace(',', '.')
+    pex3_numero_dm = float(pex3_texto_dm)
+    if not math.isfinite(pex3_numero_dm):
+        raise ValueError(pex3_texto_dm)  # 'nan' ou grande demais para um float ('1e400')
+    return pex3_numero_dm
+
+def pex3_leitor_csv_dm(pex3_arquivo_dm, pex3_apelidos_dm=None):
+    """Lê o cabeçalho de um CSV aberto em modo texto e retorna (campos, leitor).
+    Aceita ';' ou ',' como separador; os nomes das colunas são comparados sem acentos
+    nem maiúsculas e pex3_apelidos_dm pode traduzi-los para os nomes internos."""
+    pex3_cabecalho_dm = pex3_arquivo_dm.readline()
+    pex3_separador_dm = ';' if ';' in pex3_cabecalho_dm or ',' not in pex3_cabecalho_dm else ','
+    pex3_campos_dm = [pex3_dobrar_texto_dm(pex3_c_dm)
+                      for pex3_c_dm in next(csv.reader([pex3_cabecalho_dm], delimiter=pex3_separador_dm), [])]
+    if pex3_apelidos_dm:
+        pex3_campos_dm = [pex3_apelidos_dm.get(pex3_c_dm, pex3_c_dm) for pex3_c_dm in pex3_campos_dm]
+    return pex3_campos_dm, csv.DictReader(pex3_arquivo_dm, fieldnames=pex3_campos_dm, delimiter=pex3_separador_dm)
+
+# ============== VALORES MONETÁRIOS (CENTAVOS) ==============
+# Preços, subtotais e totais circulam como int em centavos: somas são exatas e os
+# agregados podem ser acumulados em arrays de inteiros. A conversão de reais passa
+# por Decimal (o float é lido pela sua representação mais curta, '12.9' -> 1290) e
+# só a exibição volta a ter casas decimais.
+# Textos digitados seguem o formato brasileiro ('1.234,56') ou só com ponto decimal
+# ('1234.56'). O que não dá para interpretar sem adivinhar ('1,234.56', '1.234')
+# é recusado com ValueError, assim como valores acima de pex3_MAX_CENTAVOS_dm.
+
+pex3_MAX_CENTAVOS_dm = 10 ** 13  # R$ 100 bilhões; acima disso é erro de digitação
+pex3_MILHARES_COM_VIRGULA_dm = re.compile(r'[+-]?\d{1,3}(?:\.\d{3})+(?:,\d*)?')
+pex3_MILHARES_SEM_VIRGULA_dm = re.compile(r'[+-]?[1-9]\d{0,2}(?:\.\d{3})+')
+
+def pex3_decimal_dm(pex3_valor_dm):
+    """Decimal de um número ou de um texto como '12.90', '12,90', '1.234,56' ou 'R$ -5,00'.
+    Textos ambíguos ('1,234.56', '1.234') geram ValueError."""
+    if isinstance(pex3_valor_dm, str):
+        pex3_texto_dm = pex3_valor_dm.replace('R$', '').replace(' ', '').strip()
+        if ',' in pex3_texto_dm:
+            # Com vírgula decimal, os pontos só podem separar milhares antes dela
+            if '.' in pex3_texto_dm and not pex3_MILHARES_COM_VIRGULA_dm.fullmatch(pex3_texto_dm):
+                raise ValueError(pex3_valor_dm)
+            pex3_texto_dm = pex3_texto_dm.replace('.', '').replace(',', '.')
+        elif pex3_texto_dm.count('.') > 1 or pex3_MILHARES_SEM_VIRGULA_dm.fullmatch(pex3_texto_dm):
+            raise ValueError(pex3_valor_dm)  # '1.234' pode ser mil e pouco ou um e pouco
+    else:
+        pex3_texto_dm = repr(pex3_valor_dm) if isinstance(pex3_valor_dm, float) else pex3_valor_dm
+    try:
+        pex3_numero_dm = Decimal(pex3_texto_dm)
+    except (InvalidOperation, TypeError):
+        raise ValueError(pex3_valor_dm) from None
+    if not pex3_numero_dm.is_finite():
+        raise ValueError(pex3_valor_dm)
+    return pex3_numero_dm
+
+def pex3_arredondar_centavos_dm(pex3_valor_dm, pex3_original_dm):
+    """Decimal em centavos -> int, com meio centavo arredondado para cima.
+    Valores acima de pex3_MAX_CENTAVOS_dm geram ValueError."""
+    if abs(pex3_valor_dm) > pex3_MAX_CENTAVOS_dm:
+        raise ValueError(pex3_original_dm)
+    try:
+        return int(pex3_valor_dm.quantize(Decimal(1), ROUND_HALF_UP))
+    except InvalidOperation:
+        raise ValueError(pex3_original_dm) from None
+
+def pex3_centavos_dm(pex3_reais_dm):
+    """Valor em reais (número ou texto) -> centavos (int), com meio centavo arredondado para cima"""
+    return pex3_arredondar_centavos_dm(pex3_decimal_dm(pex3_reais_dm) * 100, pex3_reais_dm)
+
+def pex3_multiplicar_centavos_dm(pex3_quantidade_dm, pex3_centavos_unitario_dm):
+    """Quantidade (pode ser fracionária) x preço em centavos, arredondado ao centavo"""
+    return pex3_arredondar_centavos_dm(pex3_decimal_dm(pex3_quantidade_dm) * pex3_centavos_unitario_dm, pex3_quantidade_dm)
+
+def pex3_reais_dm(pex3_centavos_valor_dm):
+    """Centavos -> texto em reais com ponto decimal ('1234.50'), para campos de formulário e CSV"""
+    pex3_inteiro_dm, pex3_resto_dm = divmod(abs(int(pex3_centavos_valor_dm)), 100)
+    return f"{'-' if pex3_centavos_valor_dm < 0 else ''}{pex3_inteiro_dm}.{pex3_resto_dm:02d}"
+
+def pex3_formatar_moeda_dm(pex3_centavos_valor_dm):
+    """Formata centavos para moeda brasileira ('R$ 1.234,50'); registrado como filtro 'moeda' nos templates"""
+    pex3_inteiro_dm, pex3_resto_dm = divmod(abs(int(pex3_centavos_valor_dm)), 100)
+    pex3_sinal_dm = '-' if pex3_centavos_valor_dm < 0 else ''
+    return f"R$ {pex3_sinal_dm}{pex3_inteiro_dm:,}".replace(',', '.') + f",{pex3_resto_dm:02d}"
+
+def pex3_registro_em_centavos_dm(pex3_colecao_dm, pex3_registro_dm):
+    """Cópia de um registro do formato antigo com os valores monetários (e os dos itens) em centavos"""
+    pex3_novo_dm = dict(pex3_registro_dm)
+    for pex3_campo_dm in pex3_CAMPOS_MONETARIOS_dm.get(pex3_colecao_dm, ()):
+        if pex3_novo_dm.get(pex3_campo_dm) is not None:
+            pex3_novo_dm[pex3_campo_dm] = pex3_centavos_dm(pex3_novo_dm[pex3_campo_dm])
+    if isinstance(pex3_novo_dm.get('itens'), list):
+        pex3_novo_dm['itens'] = [
+            {pex3_chave_dm: pex3_centavos_dm(pex3_valor_dm)
+             if pex3_chave_dm in pex3_CAMPOS_MONETARIOS_ITEM_dm and pex3_valor_dm is not None else pex3_valor_dm
+             for pex3_chave_dm, pex3_valor_dm in pex3_item_dm.items()}
+            for pex3_item_dm in pex3_novo_dm['itens']]
+    return pex3_novo_dm
+
+def pex3_documento_em_centavos_dm(pex3_tipo_dm, pex3_dados_dm):
+    """Converte (no dict do documento) as coleções com valores monetários.
+    Retorna quantos registros foram convertidos."""
+    pex3_convertidos_dm = 0
+    for pex3_colecao_dm in pex3_COLECOES_dm[pex3_tipo_dm]:
+        if pex3_colecao_dm in pex3_CAMPOS_MONETARIOS_dm and pex3_dados_dm.get(pex3_colecao_dm):
+            pex3_dados_dm[pex3_colecao_dm] = [pex3_registro_em_centavos_dm(pex3_colecao_dm, pex3_r_dm)
+                                              for pex3_r_dm in pex3_dados_dm[pex3_colecao_dm]]
+            pex3_convertidos_dm += len(pex3_dados_dm[pex3_colecao_dm])
+    return pex3_convertidos_dm
@@ -0,0 +1,143 @@
+"""
+Benchmark do cálculo dos agregados do Analytics (financeiro.py)
+Compara a montagem dos baldes por dia/mês com o motor colunar (NumPy) e com a
+soma transação a transação (usada quando o NumPy não está instalado).
+Mede também a chegada de um lote de transações novas (ex.: importação de extrato)
+a um índice já montado: inserção uma a uma x intercalação em lote (Python e NumPy).
+
+Uso: python benchmark_analytics.py [quantidades...]
+     padrão: 10000 100000 1000000
+"""
+
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import armazenamento as pex3_armazenamento_dm
+import financeiro as pex3_financeiro_dm
+
+pex3_CATEGORIAS_dm = ['Salário', 'Venda', 'Alimentação', 'Limpeza', 'Aluguel', 'Diversos',
+                      'Venda de Produtos', 'Compra de Produtos']
+pex3_FORMAS_dm = ['PIX', 'Cartão', 'Dinheiro', 'Boleto', 'Outros']
+pex3_TAMANHO_LOTE_dm = 10000
+
+def pex3_gerar_transacoes_dm(pex3_quantidade_dm):
+    """Transações sintéticas (registros compactos, como no índice) espalhadas por cinco anos, já ordenadas"""
+    pex3_aleatorio_dm = random.Random(42)
+    pex3_inicio_dm = date(2021, 1, 1)
+    pex3_transacoes_dm = []
+    for pex3_id_dm in range(1, pex3_quantidade_dm + 1):
+        pex3_transacoes_dm.append(pex3_armazenamento_dm.pex3_Transacao_dm.pex3_de_dict_dm({
+            "id": pex3_id_dm,
+            "tipo": pex3_aleatorio_dm.choice(['receber', 'pagar']),
+            "data_gasto": (pex3_inicio_dm + timedelta(days=pex3_aleatorio_dm.randrange(5 * 365))).isoformat(),
+            "valor": pex3_aleatorio_dm.randrange(100, 100001),  # centavos
+            "categoria": pex3_aleatorio_dm.choice(pex3_CATEGORIAS_dm),
+            "forma_pagamento": pex3_aleatorio_dm.choice(pex3_FORMAS_dm),
+            "descricao": ""
+        }))
+    pex3_transacoes_dm.sort(key=pex3_financeiro_dm.pex3_chave_transacao_dm)
+    return pex3_transacoes_dm
+
+def pex3_medir_dm(pex3_transacoes_dm, pex3_usar_numpy_dm):
+    """Monta os baldes com o motor indicado e retorna (segundos, índice)"""
+    pex3_indice_dm = pex3_financeiro_dm.pex3_indice_vazio_dm()
+    pex3_indice_dm['transacoes'] = pex3_transacoes_dm
+    pex3_inicio_dm = time.perf_counter()
+    pex3_financeiro_dm.pex3_construir_baldes_dm(pex3_indice_dm, pex3_usar_numpy_dm)
+    return time.perf_counter() - pex3_inicio_dm, pex3_indice_dm
+
+def pex3_separar_lote_dm(pex3_transacoes_dm, pex3_tamanho_lote_dm, pex3_espalhado_dm):
+    """Separa (índice já montado, lote novo). O lote é sorteado ao longo de todo o período
+    (pex3_espalhado_dm) ou são as transações mais recentes, como num extrato do mês."""
+    if not pex3_espalhado_dm:
+        return pex3_transacoes_dm[:-pex3_tamanho_lote_dm], pex3_transacoes_dm[-pex3_tamanho_lote_dm:]
+    pex3_sorteadas_dm = set(random.Random(7).sample(range(len(pex3_transacoes_dm)), pex3_tamanho_lote_dm))
+    pex3_base_dm, pex3_lote_dm = [], []
+    for pex3_i_dm, pex3_t_dm in enumerate(pex3_transacoes_dm):
+        (pex3_lote_dm if pex3_i_dm in pex3_sorteadas_dm else pex3_base_dm).append(pex3_t_dm)
+    return pex3_base_dm, pex3_lote_dm
+
+def pex3_medir_lote_dm(pex3_base_dm, pex3_lote_dm, pex3_motor_dm):
+    """Incorpora o lote a um índice montado com pex3_base_dm e retorna (segundos, índice).
+    pex3_motor_dm: 'um_a_um', 'python' ou 'numpy'"""
+    pex3_indice_dm = pex3_financeiro_dm.pex3_indice_vazio_dm()
+    pex3_indice_dm['transacoes'] = list(pex3_base_dm)
+    pex3_indice_dm['chaves'] = [pex3_financeiro_dm.pex3_chave_transacao_dm(pex3_t_dm) for pex3_t_dm in pex3_base_dm]
+    pex3_financeiro_dm.pex3_construir_baldes_dm(pex3_indice_dm)
+    pex3_inicio_dm = time.perf_counter()
+    if pex3_motor_dm == 'um_a_um':
+        for pex3_t_dm in pex3_lote_dm:
+            pex3_financeiro_dm.pex3_incorporar_transacao_dm(pex3_indice_dm, pex3_t_dm)
+    else:
+        pex3_financeiro_dm.pex3_incorporar_lote_dm(pex3_indice_dm, pex3_lote_dm, pex3_motor_dm == 'numpy')
+    return time.perf_counter() - pex3_inicio_dm, pex3_indice_dm
+
+def pex3_mesmos_totais_dm(pex3_a_dm, pex3_b_dm):
+    """Confere se os dois motores chegaram exatamente aos mesmos totais mensais (em centavos)"""
+    if pex3_a_dm['lista_meses'] != pex3_b_dm['lista_meses']:
+        return False
+    for pex3_mes_dm in pex3_a_dm['lista_meses']:
+        pex3_ma_dm, pex3_mb_dm = pex3_a_dm['meses'][pex3_mes_dm], pex3_b_dm['meses'][pex3_mes_dm]
+        for pex3_campo_dm in ('receita', 'despesa'):
+            if pex3_ma_dm[pex3_campo_dm] != pex3_mb_dm[pex3_campo_dm]:
+                return False
+        for pex3_campo_dm in ('despesa_categoria', 'receita_pagamento'):
+            for pex3_chave_dm, pex3_valor_dm in pex3_ma_dm[pex3_campo_dm].items():
+                if pex3_valor_dm != pex3_mb_dm[pex3_campo_dm].get(pex3_chave_dm, 0):
+                    return False
+    return True
+
+def main():
+    print("=" * 60)
+    print("📊 Benchmark - Agregados do Analytics (PEX III)")
+    print("=" * 60)
+
+    pex3_quantidades_dm = [int(pex3_arg_dm) for pex3_arg_dm in sys.argv[1:]] or [10000, 100000, 1000000]
+    pex3_tem_numpy_dm = pex3_financeiro_dm.np is not None
+    if not pex3_tem_numpy_dm:
+        print("\n⚠️  NumPy não instalado: medindo apenas a soma transação a transação.")
+        print("   Instale com: pip install numpy")
+
+    print(f"\n{'Transações':>12} | {'Python (s)':>10} | {'NumPy (s)':>10} | {'Ganho':>7}")
+    print("-" * 50)
+    for pex3_quantidade_dm in pex3_quantidades_dm:
+        pex3_transacoes_dm = pex3_gerar_transacoes_dm(pex3_quantidade_dm)
+        pex3_tempo_dict_dm, pex3_indice_dict_dm = pex3_medir_dm(pex3_transacoes_dm, False)
+        if pex3_tem_numpy_dm:
+            pex3_tempo_numpy_dm, pex3_indice_numpy_dm = pex3_medir_dm(pex3_transacoes_dm, True)
+            if not pex3_mesmos_totais_dm(pex3_indice_dict_dm, pex3_indice_numpy_dm):
+                print(f"❌ Totais divergentes com {pex3_quantidade_dm} transações")
+                return 1
+            print(f"{pex3_quantidade_dm:>12,} | {pex3_tempo_dict_dm:>10.3f} | {pex3_tempo_numpy_dm:>10.3f} | "
+                  f"{pex3_tempo_dict_dm / pex3_tempo_numpy_dm:>6.1f}x")
+        else:
+            print(f"{pex3_quantidade_dm:>12,} | {pex3_tempo_dict_dm:>10.3f} | {'-':>10} | {'-':>7}")
+
+    pex3_motores_dm = ['um_a_um', 'python'] + (['numpy'] if pex3_tem_numpy_dm else [])
+    for pex3_espalhado_dm, pex3_titulo_dm in ((False, 'mais recentes'), (True, 'espalhadas pelo período')):
+        print(f"\nLote de {pex3_TAMANHO_LOTE_dm:,} transações novas ({pex3_titulo_dm}) incorporado ao índice")
+        print(f"\n{'Transações':>12} | {'Um a um (s)':>11} | {'Lote Py (s)':>11} | {'Lote NumPy (s)':>14}")
+        print("-" * 58)
+        for pex3_quantidade_dm in pex3_quantidades_dm:
+            pex3_base_dm, pex3_lote_dm = pex3_separar_lote_dm(
+                pex3_gerar_transacoes_dm(pex3_quantidade_dm + pex3_TAMANHO_LOTE_dm), pex3_TAMANHO_LOTE_dm, pex3_espalhado_dm)
+            pex3_tempos_dm, pex3_indices_dm = [], []
+            for pex3_motor_dm in pex3_motores_dm:
+                pex3_tempo_dm, pex3_indice_dm = pex3_medir_lote_dm(pex3_base_dm, pex3_lote_dm, pex3_motor_dm)
+                pex3_tempos_dm.append(pex3_tempo_dm)
+                pex3_indices_dm.append(pex3_indice_dm)
+            for pex3_indice_dm in pex3_indices_dm[1:]:
+                if (pex3_indice_dm['chaves'] != pex3_indices_dm[0]['chaves']
+                        or not pex3_mesmos_totais_dm(pex3_indices_dm[0], pex3_indice_dm)):
+                    print(f"❌ Índices divergentes com {pex3_quantidade_dm} transações")
+                    return 1
+            pex3_colunas_dm = [f"{pex3_tempo_dm:.3f}" for pex3_tempo_dm in pex3_tempos_dm] + ['-'] * (3 - len(pex3_tempos_dm))
+            print(f"{pex3_quantidade_dm:>12,} | {pex3_colunas_dm[0]:>11} | {pex3_colunas_dm[1]:>11} | {pex3_colunas_dm[2]:>14}")
+
+    print("\n✅ Benchmark concluído!")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Benchmark de memória dos registros em memória (armazenamento.py)
+Compara o espaço ocupado por transações guardadas como dict (como saem do json.load)
+e como registros compactos com __slots__ (pex3_Transacao_dm), além do tempo de
+leitura do valor de todas elas.
+
+Uso: python benchmark_memoria.py [quantidades...]
+     padrão: 1000000
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import armazenamento as pex3_armazenamento_dm
+
+pex3_CATEGORIAS_dm = ['Salário', 'Venda', 'Alimentação', 'Limpeza', 'Aluguel', 'Diversos',
+                      'Venda de Produtos', 'Compra de Produtos']
+pex3_FORMAS_dm = ['PIX', 'Cartão', 'Dinheiro', 'Boleto', 'Outros']
+pex3_CAMPOS_dm = pex3_armazenamento_dm.pex3_Transacao_dm.pex3_CAMPOS_dm
+
+def pex3_gerar_valores_dm(pex3_quantidade_dm):
+    """Valores de cada transação na ordem de pex3_CAMPOS_dm. Os mesmos objetos são usados
+    pelas duas representações, então a diferença medida é só a da estrutura de cada registro."""
+    pex3_aleatorio_dm = random.Random(42)
+    pex3_inicio_dm = date(2021, 1, 1)
+    pex3_datas_dm = [(pex3_inicio_dm + timedelta(days=pex3_d_dm)).isoformat() for pex3_d_dm in range(5 * 365)]
+    return [(pex3_id_dm,
+             pex3_aleatorio_dm.choice(['receber', 'pagar']),
+             pex3_aleatorio_dm.choice(pex3_datas_dm),
+             '',
+             pex3_aleatorio_dm.randrange(100, 100001),
+             pex3_aleatorio_dm.choice(pex3_CATEGORIAS_dm),
+             pex3_aleatorio_dm.choice(pex3_FORMAS_dm),
+             '')
+            for pex3_id_dm in range(1, pex3_quantidade_dm + 1)]
+
+def pex3_medir_memoria_dm(pex3_montar_dm, pex3_valores_dm):
+    """Monta os registros e retorna (bytes alocados, registros)"""
+    tracemalloc.start()
+    pex3_antes_dm = tracemalloc.get_traced_memory()[0]
+    pex3_registros_dm = pex3_montar_dm(pex3_valores_dm)
+    pex3_depois_dm = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return pex3_depois_dm - pex3_antes_dm, pex3_registros_dm
+
+def pex3_montar_dicts_dm(pex3_valores_dm):
+    return [dict(zip(pex3_CAMPOS_dm, pex3_linha_dm)) for pex3_linha_dm in pex3_valores_dm]
+
+def pex3_montar_registros_dm(pex3_valores_dm):
+    return [pex3_armazenamento_dm.pex3_Transacao_dm(*pex3_linha_dm) for pex3_linha_dm in pex3_valores_dm]
+
+def pex3_medir_leitura_dm(pex3_ler_valor_dm, pex3_registros_dm):
+    """Segundos para somar o valor de todos os registros"""
+    pex3_inicio_dm = time.perf_counter()
+    pex3_total_dm = 0
+    for pex3_r_dm in pex3_registros_dm:
+        pex3_total_dm += pex3_ler_valor_dm(pex3_r_dm)
+    return time.perf_counter() - pex3_inicio_dm, pex3_total_dm
+
+def main():
+    print("=" * 60)
+    print("🧮 Benchmark - Memória por registro (PEX III)")
+    print("=" * 60)
+
+    pex3_quantidades_dm = [int(pex3_arg_dm) for pex3_arg_dm in sys.argv[1:]] or [1000000]
+    for pex3_quantidade_dm in pex3_quantidades_dm:
+        pex3_valores_dm = pex3_gerar_valores_dm(pex3_quantidade_dm)
+
+        pex3_bytes_dict_dm, pex3_dicts_dm = pex3_medir_memoria_dm(pex3_montar_dicts_dm, pex3_valores_dm)
+        pex3_tempo_dict_dm, pex3_soma_dict_dm = pex3_medir_leitura_dm(lambda r: r['valor'], pex3_dicts_dm)
+        del pex3_dicts_dm
+
+        pex3_bytes_slots_dm, pex3_registros_dm = pex3_medir_memoria_dm(pex3_montar_registros_dm, pex3_valores_dm)
+        pex3_tempo_attr_dm, pex3_soma_attr_dm = pex3_medir_leitura_dm(lambda r: r.valor, pex3_registros_dm)
+        pex3_tempo_chave_dm, pex3_soma_chave_dm = pex3_medir_leitura_dm(lambda r: r['valor'], pex3_registros_dm)
+        del pex3_registros_dm
+
+        if not pex3_soma_dict_dm == pex3_soma_attr_dm == pex3_soma_chave_dm:
+            print(f"❌ Somas divergentes com {pex3_quantidade_dm} transações")
+            return 1
+
+        print(f"\n{pex3_quantidade_dm:,} transações ({len(pex3_CAMPOS_dm)} campos cada)")
+        print(f"{'Estrutura':>20} | {'Bytes/registro':>14} | {'Total (MB)':>10}")
+        print("-" * 50)
+        for pex3_nome_dm, pex3_bytes_dm in (('dict', pex3_bytes_dict_dm), ('__slots__', pex3_bytes_slots_dm)):
+            print(f"{pex3_nome_dm:>20} | {pex3_bytes_dm / pex3_quantidade_dm:>14.1f} | {pex3_bytes_dm / 2**20:>10.1f}")
+        print(f"   Economia: {1 - pex3_bytes_slots_dm / pex3_bytes_dict_dm:.0%} da memória das estruturas")
+        print(f"   Soma dos valores: dict['valor'] {pex3_tempo_dict_dm:.3f}s | registro.valor {pex3_tempo_attr_dm:.3f}s"
+              f" | registro['valor'] {pex3_tempo_chave_dm:.3f}s")
+
+    print("\n✅ Benchmark concluído!")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
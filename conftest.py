@@ -0,0 +1,48 @@
+"""
+Fixtures compartilhadas pelos testes automatizados (pytest)
+Cada teste roda com os arquivos de dados em um diretório temporário,
+uma vez para cada backend de armazenamento (json, journal e sqlite).
+"""
+
+from collections import deque
+
+import pytest
+
+import armazenamento as pex3_armazenamento_dm
+import estoque as pex3_estoque_dm
+import financeiro as pex3_financeiro_dm
+
+
+@pytest.fixture(params=sorted(pex3_armazenamento_dm.pex3_BACKENDS_dm))
+def pex3_backend_dm(request, tmp_path, monkeypatch):
+    """Seleciona o backend do parâmetro, aponta os arquivos de dados para tmp_path
+    e zera os caches em memória. Retorna o nome do backend."""
+    monkeypatch.chdir(tmp_path)  # caminhos relativos esquecidos também caem no diretório temporário
+    monkeypatch.setattr(pex3_armazenamento_dm, 'pex3_BACKEND_dm', request.param)
+    monkeypatch.setattr(pex3_armazenamento_dm, 'pex3_SQLITE_DB_dm', str(tmp_path / 'pex3.db'))
+    monkeypatch.setattr(pex3_armazenamento_dm, 'pex3_json_estado_dm', {})
+    monkeypatch.setattr(pex3_armazenamento_dm, 'pex3_json_geracoes_dm', {})
+    monkeypatch.setattr(pex3_armazenamento_dm, 'pex3_journal_estado_dm', {})
+    monkeypatch.setattr(pex3_armazenamento_dm, 'pex3_journal_documentos_dm', set())
+
+    monkeypatch.setattr(pex3_estoque_dm, 'pex3_PRODUTOS_CSV_dm', str(tmp_path / 'produtos.csv'))
+    monkeypatch.setattr(pex3_estoque_dm, 'pex3_ESTOQUE_DB_dm', str(tmp_path / 'estoque_db.json'))
+    monkeypatch.setattr(pex3_estoque_dm, 'pex3_FINANCEIRO_DB_dm', str(tmp_path / 'database.json'))
+    monkeypatch.setattr(pex3_estoque_dm, 'pex3_catalogo_dm', {
+        'assinatura': None, 'produtos': [], 'indice': {}, 'busca': None, 'reposicao': None, 'totais': None})
+    monkeypatch.setattr(pex3_estoque_dm, 'pex3_indices_movimentacoes_dm', {})
+    monkeypatch.setattr(pex3_estoque_dm, 'pex3_alertas_dm', {
+        'epoca': None, 'versao': 0, 'base': 0, 'mudancas': deque(maxlen=pex3_estoque_dm.pex3_MAX_LOG_ALERTAS_dm)})
+
+    monkeypatch.setattr(pex3_financeiro_dm, 'pex3_DB_FILE_dm', str(tmp_path / 'database.json'))
+    monkeypatch.setattr(pex3_financeiro_dm, 'pex3_indice_transacoes_dm', pex3_financeiro_dm.pex3_indice_vazio_dm())
+    return request.param
+
+
+@pytest.fixture
+def pex3_sistemas_dm(pex3_backend_dm):
+    """Inicializa os dados do Financeiro e do Estoque (produtos de exemplo inclusos)
+    e retorna os dois módulos"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_estoque_dm.pex3_init_app_dm()
+    return pex3_estoque_dm, pex3_financeiro_dm
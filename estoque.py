@@ -1,637 +1,1442 @@
-"""
-Sistema de Controle de Estoque, Compra e Venda
-Desenvolvido em Flask com banco de dados CSV (produtos) e JSON (movimentações)
-"""
-
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-import json
-import csv
-import os
-from datetime import datetime
-from decimal import Decimal, ROUND_HALF_UP
-
-pex3_app_dm = Flask(__name__)
-pex3_app_dm.secret_key = 'estoque_secret_key_2025'
-
-# Arquivos de dados
-pex3_PRODUTOS_CSV_dm = 'produtos.csv'
-pex3_ESTOQUE_DB_dm = 'estoque_db.json'
-pex3_FINANCEIRO_DB_dm = 'database.json'
-
-# ============== FUNÇÕES AUXILIARES ==============
-
-def pex3_init_produtos_csv_dm():
-    """Inicializa o arquivo CSV de produtos se não existir"""
-    if not os.path.exists(pex3_PRODUTOS_CSV_dm):
-        with open(pex3_PRODUTOS_CSV_dm, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f, delimiter=';')
-            writer.writerow(['codigo_barras', 'nome', 'saldo', 'preco_venda', 'preco_compra'])
-            # Produtos de exemplo
-            writer.writerow(['7891234567890', 'Produto Exemplo 1', '10', '25.90', '15.50'])
-            writer.writerow(['7891234567891', 'Produto Exemplo 2', '5', '49.90', '30.00'])
-
-def pex3_init_estoque_db_dm():
-    """Inicializa o arquivo JSON de movimentações se não existir"""
-    if not os.path.exists(pex3_ESTOQUE_DB_dm):
-        pex3_data_dm = {
-            "vendas": [],
-            "compras": [],
-            "ajustes": []
-        }
-        with open(pex3_ESTOQUE_DB_dm, 'w', encoding='utf-8') as f:
-            json.dump(pex3_data_dm, f, indent=4, ensure_ascii=False)
-
-def pex3_load_produtos_dm():
-    """Carrega todos os produtos do CSV"""
-    pex3_init_produtos_csv_dm()
-    pex3_produtos_dm = []
-    with open(pex3_PRODUTOS_CSV_dm, 'r', encoding='utf-8') as f:
-        pex3_reader_dm = csv.DictReader(f, delimiter=';')
-        for pex3_row_dm in pex3_reader_dm:
-            pex3_produtos_dm.append({
-                'codigo_barras': pex3_row_dm['codigo_barras'],
-                'nome': pex3_row_dm['nome'],
-                'saldo': float(pex3_row_dm['saldo']),
-                'preco_venda': float(pex3_row_dm['preco_venda']),
-                'preco_compra': float(pex3_row_dm['preco_compra'])
-            })
-    return pex3_produtos_dm
-
-def pex3_save_produtos_dm(pex3_produtos_dm):
-    """Salva todos os produtos no CSV"""
-    with open(pex3_PRODUTOS_CSV_dm, 'w', newline='', encoding='utf-8') as f:
-        pex3_writer_dm = csv.writer(f, delimiter=';')
-        pex3_writer_dm.writerow(['codigo_barras', 'nome', 'saldo', 'preco_venda', 'preco_compra'])
-        for pex3_p_dm in pex3_produtos_dm:
-            pex3_writer_dm.writerow([
-                pex3_p_dm['codigo_barras'],
-                pex3_p_dm['nome'],
-                pex3_p_dm['saldo'],
-                pex3_p_dm['preco_venda'],
-                pex3_p_dm['preco_compra']
-            ])
-
-def pex3_buscar_produto_por_codigo_dm(pex3_codigo_barras_dm):
-    """Busca um produto pelo código de barras"""
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    for pex3_p_dm in pex3_produtos_dm:
-        if pex3_p_dm['codigo_barras'] == pex3_codigo_barras_dm:
-            return pex3_p_dm
-    return None
-
-def pex3_atualizar_saldo_produto_dm(pex3_codigo_barras_dm, pex3_quantidade_dm, pex3_operacao_dm='adicionar'):
-    """Atualiza o saldo de um produto"""
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    for pex3_p_dm in pex3_produtos_dm:
-        if pex3_p_dm['codigo_barras'] == pex3_codigo_barras_dm:
-            if pex3_operacao_dm == 'adicionar':
-                pex3_p_dm['saldo'] = float(pex3_p_dm['saldo']) + float(pex3_quantidade_dm)
-            elif pex3_operacao_dm == 'subtrair':
-                pex3_p_dm['saldo'] = float(pex3_p_dm['saldo']) - float(pex3_quantidade_dm)
-            elif pex3_operacao_dm == 'definir':
-                pex3_p_dm['saldo'] = float(pex3_quantidade_dm)
-            break
-    pex3_save_produtos_dm(pex3_produtos_dm)
-
-def pex3_atualizar_preco_compra_produto_dm(pex3_codigo_barras_dm, pex3_novo_preco_dm):
-    """Atualiza o preço de compra de um produto"""
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    for pex3_p_dm in pex3_produtos_dm:
-        if pex3_p_dm['codigo_barras'] == pex3_codigo_barras_dm:
-            pex3_p_dm['preco_compra'] = float(pex3_novo_preco_dm)
-            break
-    pex3_save_produtos_dm(pex3_produtos_dm)
-
-def pex3_load_estoque_db_dm():
-    """Carrega o banco de dados de movimentações"""
-    pex3_init_estoque_db_dm()
-    with open(pex3_ESTOQUE_DB_dm, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def pex3_save_estoque_db_dm(pex3_data_dm):
-    """Salva o banco de dados de movimentações"""
-    with open(pex3_ESTOQUE_DB_dm, 'w', encoding='utf-8') as f:
-        json.dump(pex3_data_dm, f, indent=4, ensure_ascii=False)
-
-def pex3_load_financeiro_db_dm():
-    """Carrega o banco de dados financeiro"""
-    with open(pex3_FINANCEIRO_DB_dm, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def pex3_save_financeiro_db_dm(pex3_data_dm):
-    """Salva o banco de dados financeiro"""
-    with open(pex3_FINANCEIRO_DB_dm, 'w', encoding='utf-8') as f:
-        json.dump(pex3_data_dm, f, indent=4, ensure_ascii=False)
-
-def pex3_gerar_lancamento_financeiro_dm(pex3_tipo_dm, pex3_valor_dm, pex3_descricao_dm, pex3_categoria_dm, pex3_forma_pagamento_dm="A Definir"):
-    """Gera um lançamento no sistema financeiro"""
-    pex3_db_dm = pex3_load_financeiro_db_dm()
-    
-    pex3_novo_id_dm = max([pex3_t_dm['id'] for pex3_t_dm in pex3_db_dm['transactions']], default=0) + 1
-    
-    pex3_lancamento_dm = {
-        "id": pex3_novo_id_dm,
-        "tipo": pex3_tipo_dm,  # 'pagar' para despesa, 'receber' para receita
-        "data_gasto": datetime.now().strftime("%Y-%m-%d"),
-        "data_criacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "valor": float(pex3_valor_dm),
-        "categoria": pex3_categoria_dm,
-        "forma_pagamento": pex3_forma_pagamento_dm,
-        "descricao": pex3_descricao_dm
-    }
-    
-    pex3_db_dm['transactions'].append(pex3_lancamento_dm)
-    pex3_save_financeiro_db_dm(pex3_db_dm)
-    return pex3_novo_id_dm
-
-def pex3_formatar_moeda_dm(pex3_valor_dm):
-    """Formata valor para moeda brasileira"""
-    return f"R$ {pex3_valor_dm:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-
-# ============== ROTAS PRINCIPAIS ==============
-
-@pex3_app_dm.route('/')
-def pex3_index_dm():
-    """Página inicial - Dashboard do estoque"""
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    pex3_db_dm = pex3_load_estoque_db_dm()
-    
-    # Estatísticas
-    pex3_total_produtos_dm = len(pex3_produtos_dm)
-    pex3_total_itens_dm = sum(pex3_p_dm['saldo'] for pex3_p_dm in pex3_produtos_dm)
-    pex3_valor_estoque_dm = sum(pex3_p_dm['saldo'] * pex3_p_dm['preco_compra'] for pex3_p_dm in pex3_produtos_dm)
-    pex3_valor_venda_potencial_dm = sum(pex3_p_dm['saldo'] * pex3_p_dm['preco_venda'] for pex3_p_dm in pex3_produtos_dm)
-    
-    # Produtos com estoque baixo (menos de 5 unidades)
-    pex3_produtos_baixo_estoque_dm = [pex3_p_dm for pex3_p_dm in pex3_produtos_dm if pex3_p_dm['saldo'] < 5]
-    
-    # Últimas movimentações
-    pex3_ultimas_vendas_dm = sorted(pex3_db_dm.get('vendas', []), key=lambda x: x['data'], reverse=True)[:5]
-    pex3_ultimas_compras_dm = sorted(pex3_db_dm.get('compras', []), key=lambda x: x['data'], reverse=True)[:5]
-    
-    return render_template('estoque/index.html',
-                          total_produtos=pex3_total_produtos_dm,
-                          total_itens=pex3_total_itens_dm,
-                          valor_estoque=pex3_valor_estoque_dm,
-                          valor_venda_potencial=pex3_valor_venda_potencial_dm,
-                          produtos_baixo_estoque=pex3_produtos_baixo_estoque_dm,
-                          ultimas_vendas=pex3_ultimas_vendas_dm,
-                          ultimas_compras=pex3_ultimas_compras_dm)
-
-# ============== ROTAS DE PRODUTOS ==============
-
-@pex3_app_dm.route('/produtos')
-def pex3_listar_produtos_dm():
-    """Lista todos os produtos cadastrados"""
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    pex3_busca_dm = request.args.get('busca', '')
-    
-    if pex3_busca_dm:
-        pex3_produtos_dm = [pex3_p_dm for pex3_p_dm in pex3_produtos_dm if pex3_busca_dm.lower() in pex3_p_dm['nome'].lower() or pex3_busca_dm in pex3_p_dm['codigo_barras']]
-    
-    return render_template('estoque/produtos.html', produtos=pex3_produtos_dm, busca=pex3_busca_dm)
-
-@pex3_app_dm.route('/produtos/cadastrar', methods=['GET', 'POST'])
-def pex3_cadastrar_produto_dm():
-    """Cadastra um novo produto"""
-    if request.method == 'POST':
-        pex3_codigo_barras_dm = request.form['codigo_barras'].strip()
-        pex3_nome_dm = request.form['nome'].strip()
-        pex3_saldo_dm = float(request.form.get('saldo', 0))
-        pex3_preco_venda_dm = float(request.form['preco_venda'])
-        pex3_preco_compra_dm = float(request.form['preco_compra'])
-        
-        # Verifica se já existe produto com este código
-        if pex3_buscar_produto_por_codigo_dm(pex3_codigo_barras_dm):
-            flash('Já existe um produto com este código de barras!', 'error')
-            return redirect(url_for('pex3_cadastrar_produto_dm'))
-        
-        pex3_produtos_dm = pex3_load_produtos_dm()
-        pex3_produtos_dm.append({
-            'codigo_barras': pex3_codigo_barras_dm,
-            'nome': pex3_nome_dm,
-            'saldo': pex3_saldo_dm,
-            'preco_venda': pex3_preco_venda_dm,
-            'preco_compra': pex3_preco_compra_dm
-        })
-        pex3_save_produtos_dm(pex3_produtos_dm)
-        
-        flash('Produto cadastrado com sucesso!', 'success')
-        return redirect(url_for('pex3_listar_produtos_dm'))
-    
-    return render_template('estoque/form_produto.html', produto=None, acao='Cadastrar')
-
-@pex3_app_dm.route('/produtos/editar/<pex3_codigo_barras_dm>', methods=['GET', 'POST'])
-def pex3_editar_produto_dm(pex3_codigo_barras_dm):
-    """Edita um produto existente"""
-    pex3_produto_dm = pex3_buscar_produto_por_codigo_dm(pex3_codigo_barras_dm)
-    
-    if not pex3_produto_dm:
-        flash('Produto não encontrado!', 'error')
-        return redirect(url_for('pex3_listar_produtos_dm'))
-    
-    if request.method == 'POST':
-        pex3_produtos_dm = pex3_load_produtos_dm()
-        for pex3_p_dm in pex3_produtos_dm:
-            if pex3_p_dm['codigo_barras'] == pex3_codigo_barras_dm:
-                pex3_p_dm['nome'] = request.form['nome'].strip()
-                pex3_p_dm['preco_venda'] = float(request.form['preco_venda'])
-                pex3_p_dm['preco_compra'] = float(request.form['preco_compra'])
-                break
-        pex3_save_produtos_dm(pex3_produtos_dm)
-        
-        flash('Produto atualizado com sucesso!', 'success')
-        return redirect(url_for('pex3_listar_produtos_dm'))
-    
-    return render_template('estoque/form_produto.html', produto=pex3_produto_dm, acao='Editar')
-
-@pex3_app_dm.route('/produtos/excluir/<pex3_codigo_barras_dm>', methods=['POST'])
-def pex3_excluir_produto_dm(pex3_codigo_barras_dm):
-    """Exclui um produto"""
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    pex3_produtos_dm = [pex3_p_dm for pex3_p_dm in pex3_produtos_dm if pex3_p_dm['codigo_barras'] != pex3_codigo_barras_dm]
-    pex3_save_produtos_dm(pex3_produtos_dm)
-    
-    flash('Produto exluído com sucesso!', 'success')
-    return redirect(url_for('pex3_listar_produtos_dm'))
-
-# ============== ROTAS DE AJUSTE DE ESTOQUE ==============
-
-@pex3_app_dm.route('/ajuste-estoque', methods=['GET', 'POST'])
-def pex3_ajuste_estoque_dm():
-    """Ajuste/Correção de saldo do estoque"""
-    if request.method == 'POST':
-        pex3_codigo_barras_dm = request.form['codigo_barras'].strip()
-        pex3_quantidade_dm = float(request.form['quantidade'])
-        pex3_tipo_ajuste_dm = request.form['tipo_ajuste']  # 'entrada', 'saida', 'definir'
-        pex3_motivo_dm = request.form.get('motivo', '')
-        
-        pex3_produto_dm = pex3_buscar_produto_por_codigo_dm(pex3_codigo_barras_dm)
-        if not pex3_produto_dm:
-            flash('Produto não encontrado!', 'error')
-            return redirect(url_for('pex3_ajuste_estoque_dm'))
-        
-        pex3_saldo_anterior_dm = pex3_produto_dm['saldo']
-        
-        if pex3_tipo_ajuste_dm == 'entrada':
-            pex3_atualizar_saldo_produto_dm(pex3_codigo_barras_dm, pex3_quantidade_dm, 'adicionar')
-            pex3_novo_saldo_dm = pex3_saldo_anterior_dm + pex3_quantidade_dm
-        elif pex3_tipo_ajuste_dm == 'saida':
-            if pex3_quantidade_dm > pex3_saldo_anterior_dm:
-                flash('Quantidade de saída maior que o saldo disponível!', 'error')
-                return redirect(url_for('pex3_ajuste_estoque_dm'))
-            pex3_atualizar_saldo_produto_dm(pex3_codigo_barras_dm, pex3_quantidade_dm, 'subtrair')
-            pex3_novo_saldo_dm = pex3_saldo_anterior_dm - pex3_quantidade_dm
-        else:  # definir
-            pex3_atualizar_saldo_produto_dm(pex3_codigo_barras_dm, pex3_quantidade_dm, 'definir')
-            pex3_novo_saldo_dm = pex3_quantidade_dm
-        
-        # Registra o ajuste
-        pex3_db_dm = pex3_load_estoque_db_dm()
-        pex3_ajuste_dm = {
-            'id': len(pex3_db_dm.get('ajustes', [])) + 1,
-            'data': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'codigo_barras': pex3_codigo_barras_dm,
-            'nome_produto': pex3_produto_dm['nome'],
-            'tipo_ajuste': pex3_tipo_ajuste_dm,
-            'quantidade': pex3_quantidade_dm,
-            'saldo_anterior': pex3_saldo_anterior_dm,
-            'saldo_novo': pex3_novo_saldo_dm,
-            'motivo': pex3_motivo_dm
-        }
-        
-        if 'ajustes' not in pex3_db_dm:
-            pex3_db_dm['ajustes'] = []
-        pex3_db_dm['ajustes'].append(pex3_ajuste_dm)
-        pex3_save_estoque_db_dm(pex3_db_dm)
-        
-        flash(f'Estoque ajustado com sucesso! Novo saldo: {pex3_novo_saldo_dm}', 'success')
-        return redirect(url_for('pex3_ajuste_estoque_dm'))
-    
-    return render_template('estoque/ajuste_estoque.html')
-
-# ============== ROTAS DE COMPRAS ==============
-
-@pex3_app_dm.route('/compras')
-def pex3_listar_compras_dm():
-    """Lista todas as compras realizadas"""
-    pex3_db_dm = pex3_load_estoque_db_dm()
-    pex3_compras_dm = sorted(pex3_db_dm.get('compras', []), key=lambda x: x['data'], reverse=True)
-    
-    pex3_data_inicio_dm = request.args.get('data_inicio', '')
-    pex3_data_fim_dm = request.args.get('data_fim', '')
-    
-    if pex3_data_inicio_dm:
-        pex3_compras_dm = [pex3_c_dm for pex3_c_dm in pex3_compras_dm if pex3_c_dm['data'][:10] >= pex3_data_inicio_dm]
-    if pex3_data_fim_dm:
-        pex3_compras_dm = [pex3_c_dm for pex3_c_dm in pex3_compras_dm if pex3_c_dm['data'][:10] <= pex3_data_fim_dm]
-    
-    return render_template('estoque/compras.html', compras=pex3_compras_dm, 
-                          data_inicio=pex3_data_inicio_dm, data_fim=pex3_data_fim_dm)
-
-@pex3_app_dm.route('/compras/nova', methods=['GET', 'POST'])
-def pex3_nova_compra_dm():
-    """Registra uma nova compra"""
-    if request.method == 'POST':
-        pex3_fornecedor_dm = request.form.get('fornecedor', '')
-        pex3_numero_nf_dm = request.form.get('numero_nf', '')
-        pex3_observacao_dm = request.form.get('observacao', '')
-        pex3_forma_pagamento_dm = request.form.get('forma_pagamento', 'A Definir')
-        
-        # Processa os itens da compra
-        pex3_itens_dm = []
-        pex3_codigos_dm = request.form.getlist('item_codigo[]')
-        pex3_quantidades_dm = request.form.getlist('item_quantidade[]')
-        pex3_precos_dm = request.form.getlist('item_preco[]')
-        
-        pex3_valor_total_dm = 0
-        
-        for pex3_i_dm, pex3_codigo_dm in enumerate(pex3_codigos_dm):
-            if pex3_codigo_dm.strip():
-                pex3_produto_dm = pex3_buscar_produto_por_codigo_dm(pex3_codigo_dm.strip())
-                if pex3_produto_dm:
-                    pex3_qtd_dm = float(pex3_quantidades_dm[pex3_i_dm]) if pex3_quantidades_dm[pex3_i_dm] else 0
-                    pex3_preco_dm = float(pex3_precos_dm[pex3_i_dm]) if pex3_precos_dm[pex3_i_dm] else pex3_produto_dm['preco_compra']
-                    pex3_subtotal_dm = pex3_qtd_dm * pex3_preco_dm
-                    
-                    pex3_itens_dm.append({
-                        'codigo_barras': pex3_codigo_dm.strip(),
-                        'nome_produto': pex3_produto_dm['nome'],
-                        'quantidade': pex3_qtd_dm,
-                        'preco_unitario': pex3_preco_dm,
-                        'subtotal': pex3_subtotal_dm
-                    })
-                    
-                    pex3_valor_total_dm += pex3_subtotal_dm
-                    
-                    # Atualiza o estoque e o preço de compra
-                    pex3_atualizar_saldo_produto_dm(pex3_codigo_dm.strip(), pex3_qtd_dm, 'adicionar')
-                    pex3_atualizar_preco_compra_produto_dm(pex3_codigo_dm.strip(), pex3_preco_dm)
-        
-        if not pex3_itens_dm:
-            flash('Nenhum item válido na compra!', 'error')
-            return redirect(url_for('pex3_nova_compra_dm'))
-        
-        # Registra a compra
-        pex3_db_dm = pex3_load_estoque_db_dm()
-        pex3_compra_dm = {
-            'id': len(pex3_db_dm.get('compras', [])) + 1,
-            'data': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'fornecedor': pex3_fornecedor_dm,
-            'numero_nf': pex3_numero_nf_dm,
-            'itens': pex3_itens_dm,
-            'valor_total': pex3_valor_total_dm,
-            'forma_pagamento': pex3_forma_pagamento_dm,
-            'observacao': pex3_observacao_dm
-        }
-        
-        if 'compras' not in pex3_db_dm:
-            pex3_db_dm['compras'] = []
-        pex3_db_dm['compras'].append(pex3_compra_dm)
-        pex3_save_estoque_db_dm(pex3_db_dm)
-        
-        # Gera lançamento financeiro de despesa
-        pex3_descricao_fin_dm = f"Compra #{pex3_compra_dm['id']}"
-        if pex3_fornecedor_dm:
-            pex3_descricao_fin_dm += f" - {pex3_fornecedor_dm}"
-        if pex3_numero_nf_dm:
-            pex3_descricao_fin_dm += f" - NF: {pex3_numero_nf_dm}"
-        
-        pex3_gerar_lancamento_financeiro_dm('pagar', pex3_valor_total_dm, pex3_descricao_fin_dm, 'Compra de Produtos', pex3_forma_pagamento_dm)
-        
-        flash(f'Compra registrada com sucesso! Total: R$ {pex3_valor_total_dm:.2f}', 'success')
-        return redirect(url_for('pex3_listar_compras_dm'))
-    
-    return render_template('estoque/form_compra.html')
-
-@pex3_app_dm.route('/compras/detalhes/<int:pex3_compra_id_dm>')
-def pex3_detalhes_compra_dm(pex3_compra_id_dm):
-    """Mostra detalhes de uma compra"""
-    pex3_db_dm = pex3_load_estoque_db_dm()
-    pex3_compra_dm = next((pex3_c_dm for pex3_c_dm in pex3_db_dm.get('compras', []) if pex3_c_dm['id'] == pex3_compra_id_dm), None)
-    
-    if not pex3_compra_dm:
-        flash('Compra não encontrada!', 'error')
-        return redirect(url_for('pex3_listar_compras_dm'))
-    
-    return render_template('estoque/detalhes_compra.html', compra=pex3_compra_dm)
-
-# ============== ROTAS DE VENDAS ==============
-
-@pex3_app_dm.route('/vendas')
-def pex3_listar_vendas_dm():
-    """Lista todas as vendas realizadas"""
-    pex3_db_dm = pex3_load_estoque_db_dm()
-    pex3_vendas_dm = sorted(pex3_db_dm.get('vendas', []), key=lambda x: x['data'], reverse=True)
-    
-    pex3_data_inicio_dm = request.args.get('data_inicio', '')
-    pex3_data_fim_dm = request.args.get('data_fim', '')
-    
-    if pex3_data_inicio_dm:
-        pex3_vendas_dm = [pex3_v_dm for pex3_v_dm in pex3_vendas_dm if pex3_v_dm['data'][:10] >= pex3_data_inicio_dm]
-    if pex3_data_fim_dm:
-        pex3_vendas_dm = [pex3_v_dm for pex3_v_dm in pex3_vendas_dm if pex3_v_dm['data'][:10] <= pex3_data_fim_dm]
-    
-    return render_template('estoque/vendas.html', vendas=pex3_vendas_dm,
-                          data_inicio=pex3_data_inicio_dm, data_fim=pex3_data_fim_dm)
-
-@pex3_app_dm.route('/vendas/nova', methods=['GET', 'POST'])
-def pex3_nova_venda_dm():
-    """Registra uma nova venda"""
-    if request.method == 'POST':
-        pex3_cliente_dm = request.form.get('cliente', '')
-        pex3_observacao_dm = request.form.get('observacao', '')
-        pex3_desconto_dm = float(request.form.get('desconto', 0))
-        pex3_forma_pagamento_dm = request.form.get('forma_pagamento', 'A Definir')
-        
-        # Processa os itens da venda
-        pex3_itens_dm = []
-        pex3_codigos_dm = request.form.getlist('item_codigo[]')
-        pex3_quantidades_dm = request.form.getlist('item_quantidade[]')
-        pex3_precos_dm = request.form.getlist('item_preco[]')
-        
-        pex3_valor_bruto_dm = 0
-        
-        for pex3_i_dm, pex3_codigo_dm in enumerate(pex3_codigos_dm):
-            if pex3_codigo_dm.strip():
-                pex3_produto_dm = pex3_buscar_produto_por_codigo_dm(pex3_codigo_dm.strip())
-                if pex3_produto_dm:
-                    pex3_qtd_dm = float(pex3_quantidades_dm[pex3_i_dm]) if pex3_quantidades_dm[pex3_i_dm] else 0
-                    pex3_preco_dm = float(pex3_precos_dm[pex3_i_dm]) if pex3_precos_dm[pex3_i_dm] else pex3_produto_dm['preco_venda']
-                    
-                    # Verifica estoque disponível
-                    if pex3_qtd_dm > pex3_produto_dm['saldo']:
-                        flash(f'Estoque insuficiente para {pex3_produto_dm["nome"]}! Disponível: {pex3_produto_dm["saldo"]}', 'error')
-                        return redirect(url_for('pex3_nova_venda_dm'))
-                    
-                    pex3_subtotal_dm = pex3_qtd_dm * pex3_preco_dm
-                    
-                    pex3_itens_dm.append({
-                        'codigo_barras': pex3_codigo_dm.strip(),
-                        'nome_produto': pex3_produto_dm['nome'],
-                        'quantidade': pex3_qtd_dm,
-                        'preco_unitario': pex3_preco_dm,
-                        'preco_custo': pex3_produto_dm['preco_compra'],
-                        'subtotal': pex3_subtotal_dm
-                    })
-                    
-                    pex3_valor_bruto_dm += pex3_subtotal_dm
-                    
-                    # Atualiza o estoque
-                    pex3_atualizar_saldo_produto_dm(pex3_codigo_dm.strip(), pex3_qtd_dm, 'subtrair')
-        
-        if not pex3_itens_dm:
-            flash('Nenhum item válido na venda!', 'error')
-            return redirect(url_for('pex3_nova_venda_dm'))
-        
-        pex3_valor_total_dm = pex3_valor_bruto_dm - pex3_desconto_dm
-        
-        # Calcula o lucro
-        pex3_custo_total_dm = sum(pex3_item_dm['quantidade'] * pex3_item_dm['preco_custo'] for pex3_item_dm in pex3_itens_dm)
-        pex3_lucro_dm = pex3_valor_total_dm - pex3_custo_total_dm
-        
-        # Registra a venda
-        pex3_db_dm = pex3_load_estoque_db_dm()
-        pex3_venda_dm = {
-            'id': len(pex3_db_dm.get('vendas', [])) + 1,
-            'data': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'cliente': pex3_cliente_dm,
-            'itens': pex3_itens_dm,
-            'valor_bruto': pex3_valor_bruto_dm,
-            'desconto': pex3_desconto_dm,
-            'valor_total': pex3_valor_total_dm,
-            'custo_total': pex3_custo_total_dm,
-            'lucro': pex3_lucro_dm,
-            'forma_pagamento': pex3_forma_pagamento_dm,
-            'observacao': pex3_observacao_dm
-        }
-        
-        if 'vendas' not in pex3_db_dm:
-            pex3_db_dm['vendas'] = []
-        pex3_db_dm['vendas'].append(pex3_venda_dm)
-        pex3_save_estoque_db_dm(pex3_db_dm)
-        
-        # Gera lançamento financeiro de receita (contas a receber)
-        pex3_descricao_fin_dm = f"Venda #{pex3_venda_dm['id']}"
-        if pex3_cliente_dm:
-            pex3_descricao_fin_dm += f" - {pex3_cliente_dm}"
-        
-        pex3_gerar_lancamento_financeiro_dm('receber', pex3_valor_total_dm, pex3_descricao_fin_dm, 'Venda de Produtos', pex3_forma_pagamento_dm)
-        
-        flash(f'Venda registrada com sucesso! Total: R$ {pex3_valor_total_dm:.2f}', 'success')
-        return redirect(url_for('pex3_listar_vendas_dm'))
-    
-    return render_template('estoque/form_venda.html')
-
-@pex3_app_dm.route('/vendas/detalhes/<int:pex3_venda_id_dm>')
-def pex3_detalhes_venda_dm(pex3_venda_id_dm):
-    """Mostra detalhes de uma venda"""
-    pex3_db_dm = pex3_load_estoque_db_dm()
-    pex3_venda_dm = next((pex3_v_dm for pex3_v_dm in pex3_db_dm.get('vendas', []) if pex3_v_dm['id'] == pex3_venda_id_dm), None)
-    
-    if not pex3_venda_dm:
-        flash('Venda não encontrada!', 'error')
-        return redirect(url_for('pex3_listar_vendas_dm'))
-    
-    return render_template('estoque/detalhes_venda.html', venda=pex3_venda_dm)
-
-# ============== ROTAS DE API (AJAX) ==============
-
-@pex3_app_dm.route('/api/produto/<pex3_codigo_barras_dm>')
-def pex3_api_buscar_produto_dm(pex3_codigo_barras_dm):
-    """API para buscar produto por código de barras"""
-    pex3_produto_dm = pex3_buscar_produto_por_codigo_dm(pex3_codigo_barras_dm)
-    if pex3_produto_dm:
-        return jsonify({
-            'success': True,
-            'produto': pex3_produto_dm
-        })
-    return jsonify({
-        'success': False,
-        'message': 'Produto não encontrado'
-    })
-
-@pex3_app_dm.route('/api/produtos/buscar')
-def pex3_api_buscar_produtos_dm():
-    """API para buscar produtos por nome ou código"""
-    pex3_termo_dm = request.args.get('termo', '')
-    pex3_produtos_dm = pex3_load_produtos_dm()
-    
-    if pex3_termo_dm:
-        pex3_produtos_dm = [pex3_p_dm for pex3_p_dm in pex3_produtos_dm if pex3_termo_dm.lower() in pex3_p_dm['nome'].lower() or pex3_termo_dm in pex3_p_dm['codigo_barras']]
-    
-    return jsonify({
-        'success': True,
-        'produtos': pex3_produtos_dm[:10]  # Limita a 10 resultados
-    })
-
-# ============== RELATÓRIOS ==============
-
-@pex3_app_dm.route('/relatorios')
-def pex3_relatorios_dm():
-    """Página de relatórios"""
-    return render_template('estoque/relatorios.html')
-
-@pex3_app_dm.route('/relatorios/movimentacao')
-def pex3_relatorio_movimentacao_dm():
-    """Relatório de movimentação de estoque"""
-    pex3_db_dm = pex3_load_estoque_db_dm()
-    pex3_data_inicio_dm = request.args.get('data_inicio', '')
-    pex3_data_fim_dm = request.args.get('data_fim', '')
-    
-    pex3_vendas_dm = pex3_db_dm.get('vendas', [])
-    pex3_compras_dm = pex3_db_dm.get('compras', [])
-    pex3_ajustes_dm = pex3_db_dm.get('ajustes', [])
-    
-    if pex3_data_inicio_dm:
-        pex3_vendas_dm = [pex3_v_dm for pex3_v_dm in pex3_vendas_dm if pex3_v_dm['data'][:10] >= pex3_data_inicio_dm]
-        pex3_compras_dm = [pex3_c_dm for pex3_c_dm in pex3_compras_dm if pex3_c_dm['data'][:10] >= pex3_data_inicio_dm]
-        pex3_ajustes_dm = [pex3_a_dm for pex3_a_dm in pex3_ajustes_dm if pex3_a_dm['data'][:10] >= pex3_data_inicio_dm]
-    
-    if pex3_data_fim_dm:
-        pex3_vendas_dm = [pex3_v_dm for pex3_v_dm in pex3_vendas_dm if pex3_v_dm['data'][:10] <= pex3_data_fim_dm]
-        pex3_compras_dm = [pex3_c_dm for pex3_c_dm in pex3_compras_dm if pex3_c_dm['data'][:10] <= pex3_data_fim_dm]
-        pex3_ajustes_dm = [pex3_a_dm for pex3_a_dm in pex3_ajustes_dm if pex3_a_dm['data'][:10] <= pex3_data_fim_dm]
-    
-    pex3_total_vendas_dm = sum(pex3_v_dm['valor_total'] for pex3_v_dm in pex3_vendas_dm)
-    pex3_total_compras_dm = sum(pex3_c_dm['valor_total'] for pex3_c_dm in pex3_compras_dm)
-    pex3_total_lucro_dm = sum(pex3_v_dm.get('lucro', 0) for pex3_v_dm in pex3_vendas_dm)
-    
-    return render_template('estoque/relatorio_movimentacao.html',
-                          vendas=pex3_vendas_dm,
-                          compras=pex3_compras_dm,
-                          ajustes=pex3_ajustes_dm,
-                          total_vendas=pex3_total_vendas_dm,
-                          total_compras=pex3_total_compras_dm,
-                          total_lucro=pex3_total_lucro_dm,
-                          data_inicio=pex3_data_inicio_dm,
-                          data_fim=pex3_data_fim_dm)
-
-# ============== INICIALIZAÇÃO ==============
-
-def pex3_init_app_dm():
-    """Inicializa os arquivos necessários"""
-    pex3_init_produtos_csv_dm()
-    pex3_init_estoque_db_dm()
-    
-    # Verifica e adiciona categorias financeiras se necessário
-    try:
-        pex3_db_dm = pex3_load_financeiro_db_dm()
-        pex3_categorias_existentes_dm = [pex3_c_dm['nome'] for pex3_c_dm in pex3_db_dm.get('categories', [])]
-        
-        pex3_novas_categorias_dm = [
-            {"nome": "Compra de Produtos", "tipo": "despesa"},
-            {"nome": "Venda de Produtos", "tipo": "receita"}
-        ]
-        
-        for pex3_cat_dm in pex3_novas_categorias_dm:
-            if pex3_cat_dm['nome'] not in pex3_categorias_existentes_dm:
-                pex3_db_dm['categories'].append(pex3_cat_dm)
-        
-        pex3_save_financeiro_db_dm(pex3_db_dm)
-    except:
-        pass  # Se o arquivo financeiro não existir, ignora
-
-if __name__ == '__main__':
-    pex3_init_app_dm()
-    pex3_app_dm.run(debug=True, port=5001)
+"""
+Sistema de Controle de Estoque, Compra e Venda
+Desenvolvido em Flask com banco de dados CSV (produtos) e JSON (movimentações)
+ou SQLite, conforme o backend configurado em armazenamento.py
+"""
+
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
+import click
+import csv
+import io
+import math
+import os
+import threading
+from collections import deque
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+
+import armazenamento as pex3_armazenamento_dm
+
+pex3_app_dm = Flask(__name__)
+pex3_app_dm.secret_key = 'estoque_secret_key_2025'
+pex3_app_dm.add_template_filter(pex3_armazenamento_dm.pex3_formatar_moeda_dm, 'moeda')
+pex3_app_dm.add_template_filter(pex3_armazenamento_dm.pex3_reais_dm, 'reais')
+
+# Arquivos de dados
+pex3_PRODUTOS_CSV_dm = 'produtos.csv'
+pex3_ESTOQUE_DB_dm = 'estoque_db.json'
+pex3_FINANCEIRO_DB_dm = 'database.json'
+
+# Catálogo de produtos em memória, compartilhado entre as threads do servidor.
+# Só é relido quando a assinatura do armazenamento (mtime/tamanho do CSV ou versão no SQLite) muda.
+pex3_catalogo_lock_dm = threading.RLock()
+pex3_catalogo_dm = {
+    'assinatura': None,
+    'produtos': [],
+    'indice': {},  # codigo_barras -> produto
+    'busca': None,  # índice de busca (montado na primeira busca após cada recarga)
+    'reposicao': None,  # produtos ordenados pela folga até o estoque mínimo (idem)
+    'totais': None  # totais de itens e valores do estoque, mantidos por diferença (idem)
+}
+
+# ============== FUNÇÕES AUXILIARES ==============
+
+def pex3_init_produtos_csv_dm():
+    """Inicializa o arquivo CSV de produtos se não existir"""
+    if not pex3_armazenamento_dm.pex3_existe_dm('produtos', pex3_PRODUTOS_CSV_dm):
+        pex3_armazenamento_dm.pex3_gravar_produtos_dm(pex3_PRODUTOS_CSV_dm, [
+            # Produtos de exemplo (preços em centavos)
+            {'codigo_barras': '7891234567890', 'nome': 'Produto Exemplo 1', 'saldo': 10.0, 'preco_venda': 2590, 'preco_compra': 1550},
+            {'codigo_barras': '7891234567891', 'nome': 'Produto Exemplo 2', 'saldo': 5.0, 'preco_venda': 4990, 'preco_compra': 3000}
+        ])
+
+def pex3_init_estoque_db_dm():
+    """Inicializa o arquivo JSON de movimentações se não existir"""
+    if not pex3_armazenamento_dm.pex3_existe_dm('estoque', pex3_ESTOQUE_DB_dm):
+        pex3_data_dm = {
+            "vendas": [],
+            "compras": [],
+            "ajustes": []
+        }
+        pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', pex3_ESTOQUE_DB_dm, pex3_data_dm)
+
+def pex3_preparar_dados_dm():
+    """Incorpora o journal pendente de outro backend e converte valores gravados em reais
+    por versões anteriores. Só na inicialização: a conferência lê os arquivos inteiros e
+    toma a trava exclusiva. O financeiro entra aqui porque o Estoque grava lançamentos
+    nele mesmo rodando sozinho."""
+    for pex3_tipo_dm, pex3_caminho_dm in (('produtos', pex3_PRODUTOS_CSV_dm), ('estoque', pex3_ESTOQUE_DB_dm),
+                                          ('financeiro', pex3_FINANCEIRO_DB_dm)):
+        pex3_armazenamento_dm.pex3_preparar_dm(pex3_tipo_dm, pex3_caminho_dm)
+
+def pex3_assinatura_produtos_dm():
+    """Retorna a assinatura atual do catálogo no armazenamento"""
+    return pex3_armazenamento_dm.pex3_assinatura_dm('produtos', pex3_PRODUTOS_CSV_dm)
+
+def pex3_definir_catalogo_dm(pex3_produtos_dm, pex3_assinatura_dm):
+    """Substitui o conteúdo do catálogo em memória e reconstrói o índice.
+    pex3_assinatura_dm é a assinatura do armazenamento correspondente a esses produtos."""
+    for pex3_p_dm in pex3_produtos_dm:
+        pex3_p_dm.setdefault('estoque_minimo', pex3_armazenamento_dm.pex3_ESTOQUE_MINIMO_PADRAO_dm)
+    pex3_catalogo_dm['produtos'] = pex3_produtos_dm
+    pex3_catalogo_dm['indice'] = {pex3_p_dm['codigo_barras']: pex3_p_dm for pex3_p_dm in pex3_produtos_dm}
+    pex3_catalogo_dm['busca'] = None
+    pex3_catalogo_dm['reposicao'] = None
+    pex3_catalogo_dm['totais'] = None
+    pex3_catalogo_dm['assinatura'] = pex3_assinatura_dm
+
+def pex3_obter_catalogo_dm():
+    """Retorna o catálogo em cache, recarregando o CSV apenas se o arquivo mudou"""
+    pex3_init_produtos_csv_dm()
+    with pex3_catalogo_lock_dm:
+        # A assinatura é tomada antes da leitura: se outro processo gravar no meio,
+        # o cache fica com a assinatura antiga e a próxima chamada relê o catálogo
+        pex3_assinatura_dm = pex3_assinatura_produtos_dm()
+        if pex3_catalogo_dm['assinatura'] != pex3_assinatura_dm:
+            pex3_definir_catalogo_dm(pex3_armazenamento_dm.pex3_ler_produtos_dm(pex3_PRODUTOS_CSV_dm), pex3_assinatura_dm)
+        return pex3_catalogo_dm
+
+def pex3_load_produtos_dm():
+    """Carrega todos os produtos (cópias, para que o chamador possa alterá-las livremente)"""
+    with pex3_catalogo_lock_dm:
+        return [pex3_p_dm.pex3_como_dict_dm() for pex3_p_dm in pex3_obter_catalogo_dm()['produtos']]
+
+def pex3_save_produtos_dm(pex3_produtos_dm):
+    """Salva todos os produtos e atualiza o catálogo em memória"""
+    with pex3_catalogo_lock_dm:
+        pex3_assinatura_dm = pex3_armazenamento_dm.pex3_gravar_produtos_dm(pex3_PRODUTOS_CSV_dm, pex3_produtos_dm)
+        pex3_definir_catalogo_dm([pex3_armazenamento_dm.pex3_Produto_dm.pex3_de_dict_dm(pex3_p_dm) for pex3_p_dm in pex3_produtos_dm],
+                                 pex3_assinatura_dm)
+
+def pex3_persistir_catalogo_dm(pex3_alterados_dm=None, pex3_removidos_dm=()):
+    """Grava o catálogo em memória após alterações feitas pelo índice.
+    Informar os produtos alterados/removidos permite gravação parcial no SQLite
+    e atualização pontual do índice de reposição e dos totais do estoque."""
+    with pex3_catalogo_lock_dm:
+        pex3_catalogo_dm['assinatura'] = pex3_armazenamento_dm.pex3_gravar_produtos_dm(
+            pex3_PRODUTOS_CSV_dm, pex3_catalogo_dm['produtos'], pex3_alterados_dm, pex3_removidos_dm)
+        if pex3_alterados_dm is None:
+            pex3_catalogo_dm['reposicao'] = None
+            pex3_catalogo_dm['totais'] = None
+            return
+        for pex3_produto_dm in pex3_alterados_dm:
+            pex3_reposicionar_produto_dm(pex3_produto_dm['codigo_barras'], pex3_produto_dm)
+            pex3_ajustar_totais_dm(pex3_produto_dm['codigo_barras'], pex3_produto_dm)
+        for pex3_codigo_dm in pex3_removidos_dm:
+            pex3_reposicionar_produto_dm(pex3_codigo_dm, None)
+            pex3_ajustar_totais_dm(pex3_codigo_dm, None)
+
+def pex3_descartar_catalogo_dm():
+    """Descarta alterações feitas no catálogo em memória que não chegaram (ou foram
+    desfeitas) no armazenamento: o próximo acesso relê o catálogo gravado"""
+    with pex3_catalogo_lock_dm:
+        pex3_catalogo_dm['assinatura'] = None
+
+def pex3_buscar_produto_por_codigo_dm(pex3_codigo_barras_dm):
+    """Busca um produto pelo código de barras (O(1) pelo índice do catálogo)"""
+    with pex3_catalogo_lock_dm:
+        pex3_produto_dm = pex3_obter_catalogo_dm()['indice'].get(pex3_codigo_barras_dm)
+        return pex3_produto_dm.pex3_como_dict_dm() if pex3_produto_dm else None
+
+def pex3_inserir_produto_dm(pex3_produto_dm):
+    """Insere um produto no catálogo e no índice. Retorna False se o código já existir"""
+    with pex3_catalogo_lock_dm:
+        pex3_catalogo_atual_dm = pex3_obter_catalogo_dm()
+        if pex3_produto_dm['codigo_barras'] in pex3_catalogo_atual_dm['indice']:
+            return False
+        pex3_novo_dm = pex3_armazenamento_dm.pex3_Produto_dm.pex3_de_dict_dm(pex3_produto_dm)
+        pex3_novo_dm.setdefault('estoque_minimo', pex3_armazenamento_dm.pex3_ESTOQUE_MINIMO_PADRAO_dm)
+        pex3_catalogo_atual_dm['produtos'].append(pex3_novo_dm)
+        pex3_catalogo_atual_dm['indice'][pex3_novo_dm['codigo_barras']] = pex3_novo_dm
+        pex3_indexar_busca_dm(pex3_novo_dm)
+        pex3_persistir_catalogo_dm([pex3_novo_dm])
+        return True
+
+def pex3_alterar_produto_dm(pex3_codigo_barras_dm, **pex3_campos_dm):
+    """Altera campos de um produto diretamente no índice. Retorna False se não existir"""
+    with pex3_catalogo_lock_dm:
+        pex3_produto_dm = pex3_obter_catalogo_dm()['indice'].get(pex3_codigo_barras_dm)
+        if pex3_produto_dm is None:
+            return False
+        pex3_desindexar_busca_dm(pex3_produto_dm)
+        pex3_produto_dm.update(pex3_campos_dm)
+        pex3_indexar_busca_dm(pex3_produto_dm)
+        pex3_persistir_catalogo_dm([pex3_produto_dm])
+        return True
+
+def pex3_remover_produto_dm(pex3_codigo_barras_dm):
+    """Remove um produto do catálogo e do índice"""
+    with pex3_catalogo_lock_dm:
+        pex3_catalogo_atual_dm = pex3_obter_catalogo_dm()
+        pex3_produto_dm = pex3_catalogo_atual_dm['indice'].pop(pex3_codigo_barras_dm, None)
+        if pex3_produto_dm is None:
+            return False
+        # Procura pela identidade: list.remove compararia campo a campo (__eq__) com cada produto anterior
+        pex3_produtos_dm = pex3_catalogo_atual_dm['produtos']
+        del pex3_produtos_dm[next(pex3_i_dm for pex3_i_dm, pex3_p_dm in enumerate(pex3_produtos_dm)
+                                  if pex3_p_dm is pex3_produto_dm)]
+        pex3_desindexar_busca_dm(pex3_produto_dm)
+        pex3_persistir_catalogo_dm([], [pex3_codigo_barras_dm])
+        return True
+
+def pex3_atualizar_saldo_produto_dm(pex3_codigo_barras_dm, pex3_quantidade_dm, pex3_operacao_dm='adicionar'):
+    """Atualiza o saldo de um produto"""
+    with pex3_catalogo_lock_dm:
+        pex3_p_dm = pex3_obter_catalogo_dm()['indice'].get(pex3_codigo_barras_dm)
+        if pex3_p_dm is None:
+            return
+        if pex3_operacao_dm == 'adicionar':
+            pex3_p_dm['saldo'] = float(pex3_p_dm['saldo']) + float(pex3_quantidade_dm)
+        elif pex3_operacao_dm == 'subtrair':
+            pex3_p_dm['saldo'] = float(pex3_p_dm['saldo']) - float(pex3_quantidade_dm)
+        elif pex3_operacao_dm == 'definir':
+            pex3_p_dm['saldo'] = float(pex3_quantidade_dm)
+        pex3_persistir_catalogo_dm([pex3_p_dm])
+
+def pex3_atualizar_preco_compra_produto_dm(pex3_codigo_barras_dm, pex3_novo_preco_dm):
+    """Atualiza o preço de compra de um produto (em centavos)"""
+    pex3_alterar_produto_dm(pex3_codigo_barras_dm, preco_compra=int(pex3_novo_preco_dm))
+
+# ============== ÍNDICE DE BUSCA DE PRODUTOS ==============
+# Um produto casa se o código de barras contém o termo ou se o nome (sem acentos,
+# em minúsculas) contém cada palavra do termo em qualquer posição, como na busca
+# por trecho que havia antes do índice. Cada trecho de 1 a 3 letras das palavras
+# do nome ("arroz" -> "a", "ar", "arr", "r", "rr", "rro", ...) e de 1 a 3 dígitos
+# do código de barras aponta para a lista, em ordem alfabética, dos produtos que o
+# contêm. Uma palavra do termo com até 3 letras é ela própria um trecho; uma mais
+# longa só pode estar nos nomes que têm todos os seus trigramas. A busca percorre
+# só a menor dessas listas e, como ela já está na ordem do ranking (ou quase, no
+# caso dos nomes), para assim que os primeiros resultados estão garantidos: nunca
+# percorre o catálogo inteiro.
+# Códigos de barras e nomes também ficam em listas ordenadas, então "começa com" é
+# uma faixa contígua achada com bisect.
+# O índice é montado na primeira busca depois de cada recarga do catálogo e,
+# a partir daí, acompanha cada inclusão, alteração e exclusão deste processo.
+
+pex3_LIMITE_BUSCA_dm = 10
+pex3_LIMITE_BUSCA_MAXIMO_dm = 50
+
+def pex3_nome_busca_dm(pex3_texto_dm):
+    """Nome como é comparado na busca: sem acentos, minúsculo e com espaços simples"""
+    return ' '.join(pex3_armazenamento_dm.pex3_dobrar_texto_dm(pex3_texto_dm).split())
+
+def pex3_gramas_palavra_dm(pex3_palavra_dm):
+    """Trechos de 1 a 3 caracteres de uma palavra (ou de um código de barras)"""
+    return {pex3_palavra_dm[pex3_i_dm:pex3_i_dm + pex3_n_dm]
+            for pex3_n_dm in (1, 2, 3) for pex3_i_dm in range(len(pex3_palavra_dm) - pex3_n_dm + 1)}
+
+def pex3_gramas_nome_dm(pex3_nome_dm):
+    """Trechos de 1 a 3 letras de todas as palavras do nome"""
+    pex3_gramas_dm = set()
+    for pex3_palavra_dm in pex3_nome_dm.split():
+        pex3_gramas_dm.update(pex3_gramas_palavra_dm(pex3_palavra_dm))
+    return pex3_gramas_dm
+
+def pex3_gramas_termo_dm(pex3_palavra_dm):
+    """Trechos que um texto precisa ter para conter a palavra: ela mesma (até 3 caracteres) ou seus trigramas"""
+    if len(pex3_palavra_dm) <= 3:
+        return {pex3_palavra_dm}
+    return {pex3_palavra_dm[pex3_i_dm:pex3_i_dm + 3] for pex3_i_dm in range(len(pex3_palavra_dm) - 2)}
+
+def pex3_menor_lista_dm(pex3_listas_dm, pex3_gramas_dm):
+    """A menor das listas dos trechos exigidos (vazia se algum trecho não está no índice)"""
+    return min((pex3_listas_dm.get(pex3_g_dm, []) for pex3_g_dm in pex3_gramas_dm), key=len)
+
+def pex3_montar_busca_dm(pex3_produtos_dm):
+    """Índice de busca de uma lista de produtos"""
+    pex3_nomes_dm = {pex3_p_dm['codigo_barras']: pex3_nome_busca_dm(pex3_p_dm['nome']) for pex3_p_dm in pex3_produtos_dm}
+    pex3_busca_dm = {'nomes': pex3_nomes_dm, 'gramas_nome': {}, 'gramas_codigo': {},
+                     'ordenados': sorted((pex3_n_dm, pex3_c_dm) for pex3_c_dm, pex3_n_dm in pex3_nomes_dm.items()),
+                     'codigos': sorted(pex3_nomes_dm)}
+    # Percorrer os produtos já ordenados deixa cada lista de trechos ordenada sem outro sort
+    for pex3_entrada_dm in pex3_busca_dm['ordenados']:
+        for pex3_g_dm in pex3_gramas_nome_dm(pex3_entrada_dm[0]):
+            pex3_busca_dm['gramas_nome'].setdefault(pex3_g_dm, []).append(pex3_entrada_dm)
+    for pex3_codigo_dm in pex3_busca_dm['codigos']:
+        for pex3_g_dm in pex3_gramas_palavra_dm(pex3_codigo_dm):
+            pex3_busca_dm['gramas_codigo'].setdefault(pex3_g_dm, []).append(pex3_codigo_dm)
+    return pex3_busca_dm
+
+def pex3_indexar_busca_dm(pex3_produto_dm):
+    """Inclui um produto no índice de busca (se o índice já estiver montado)"""
+    pex3_busca_dm = pex3_catalogo_dm['busca']
+    if pex3_busca_dm is None:
+        return
+    pex3_codigo_dm = pex3_produto_dm['codigo_barras']
+    pex3_entrada_dm = (pex3_nome_busca_dm(pex3_produto_dm['nome']), pex3_codigo_dm)
+    pex3_busca_dm['nomes'][pex3_codigo_dm] = pex3_entrada_dm[0]
+    insort(pex3_busca_dm['ordenados'], pex3_entrada_dm)
+    insort(pex3_busca_dm['codigos'], pex3_codigo_dm)
+    for pex3_g_dm in pex3_gramas_nome_dm(pex3_entrada_dm[0]):
+        insort(pex3_busca_dm['gramas_nome'].setdefault(pex3_g_dm, []), pex3_entrada_dm)
+    for pex3_g_dm in pex3_gramas_palavra_dm(pex3_codigo_dm):
+        insort(pex3_busca_dm['gramas_codigo'].setdefault(pex3_g_dm, []), pex3_codigo_dm)
+
+def pex3_retirar_ordenado_dm(pex3_listas_dm, pex3_chave_dm, pex3_item_dm):
+    """Retira um item de uma lista ordenada do índice, apagando a lista se ela esvaziar"""
+    pex3_lista_dm = pex3_listas_dm[pex3_chave_dm]
+    del pex3_lista_dm[bisect_left(pex3_lista_dm, pex3_item_dm)]
+    if not pex3_lista_dm:
+        del pex3_listas_dm[pex3_chave_dm]
+
+def pex3_desindexar_busca_dm(pex3_produto_dm):
+    """Retira um produto do índice de busca (se o índice já estiver montado)"""
+    pex3_busca_dm = pex3_catalogo_dm['busca']
+    if pex3_busca_dm is None:
+        return
+    pex3_codigo_dm = pex3_produto_dm['codigo_barras']
+    pex3_nome_dm = pex3_busca_dm['nomes'].pop(pex3_codigo_dm, None)
+    if pex3_nome_dm is None:
+        return
+    for pex3_g_dm in pex3_gramas_nome_dm(pex3_nome_dm):
+        pex3_retirar_ordenado_dm(pex3_busca_dm['gramas_nome'], pex3_g_dm, (pex3_nome_dm, pex3_codigo_dm))
+    for pex3_g_dm in pex3_gramas_palavra_dm(pex3_codigo_dm):
+        pex3_retirar_ordenado_dm(pex3_busca_dm['gramas_codigo'], pex3_g_dm, pex3_codigo_dm)
+    del pex3_busca_dm['ordenados'][bisect_left(pex3_busca_dm['ordenados'], (pex3_nome_dm, pex3_codigo_dm))]
+    del pex3_busca_dm['codigos'][bisect_left(pex3_busca_dm['codigos'], pex3_codigo_dm)]
+
+def pex3_obter_indice_busca_dm():
+    """Índice de busca do catálogo atual, montado se ainda não existir"""
+    with pex3_catalogo_lock_dm:
+        pex3_catalogo_atual_dm = pex3_obter_catalogo_dm()
+        if pex3_catalogo_atual_dm['busca'] is None:
+            pex3_catalogo_atual_dm['busca'] = pex3_montar_busca_dm(pex3_catalogo_atual_dm['produtos'])
+        return pex3_catalogo_atual_dm['busca']
+
+def pex3_buscar_produtos_dm(pex3_termo_dm, pex3_limite_dm=pex3_LIMITE_BUSCA_dm):
+    """Produtos (cópias) cujo código de barras contém o termo ou cujo nome contém suas
+    palavras, do mais relevante ao menos relevante. pex3_limite_dm=None retorna todos.
+    Ordem: código exato, prefixo do código, nome que começa pelo termo, palavra que
+    começa pelo termo, termo inteiro no meio do nome, palavras do termo espalhadas pelo
+    nome e, por último, termo no meio do código; empates em ordem alfabética."""
+    pex3_codigo_termo_dm = pex3_termo_dm.strip()
+    pex3_nome_termo_dm = pex3_nome_busca_dm(pex3_termo_dm)
+    if not pex3_nome_termo_dm:
+        return []
+    pex3_falta_dm = pex3_limite_dm if pex3_limite_dm is not None else float('inf')
+    with pex3_catalogo_lock_dm:
+        pex3_busca_dm = pex3_obter_indice_busca_dm()
+        pex3_indice_dm = pex3_catalogo_dm['indice']
+        pex3_encontrados_dm = []  # códigos, já na ordem do ranking
+
+        # 1) Códigos de barras com o prefixo digitado (o código exato vem primeiro na faixa)
+        pex3_codigos_dm = pex3_busca_dm['codigos']
+        pex3_posicao_dm = bisect_left(pex3_codigos_dm, pex3_codigo_termo_dm)
+        while (len(pex3_encontrados_dm) < pex3_falta_dm and pex3_posicao_dm < len(pex3_codigos_dm)
+               and pex3_codigos_dm[pex3_posicao_dm].startswith(pex3_codigo_termo_dm)):
+            pex3_encontrados_dm.append(pex3_codigos_dm[pex3_posicao_dm])
+            pex3_posicao_dm += 1
+        pex3_vistos_dm = set(pex3_encontrados_dm)
+
+        # 2) Nomes que começam pelo termo, em ordem alfabética
+        pex3_ordenados_dm = pex3_busca_dm['ordenados']
+        pex3_posicao_dm = bisect_left(pex3_ordenados_dm, (pex3_nome_termo_dm,))
+        while (len(pex3_encontrados_dm) < pex3_falta_dm and pex3_posicao_dm < len(pex3_ordenados_dm)
+               and pex3_ordenados_dm[pex3_posicao_dm][0].startswith(pex3_nome_termo_dm)):
+            pex3_codigo_dm = pex3_ordenados_dm[pex3_posicao_dm][1]
+            if pex3_codigo_dm not in pex3_vistos_dm:
+                pex3_encontrados_dm.append(pex3_codigo_dm)
+                pex3_vistos_dm.add(pex3_codigo_dm)
+            pex3_posicao_dm += 1
+
+        # 3) Demais nomes com as palavras do termo, percorrendo em ordem alfabética a menor
+        #    lista de trechos exigidos. Cada nome cai numa faixa do ranking; quando a melhor
+        #    faixa já tem os resultados que faltam, nenhum nome seguinte pode passar à frente.
+        if len(pex3_encontrados_dm) < pex3_falta_dm:
+            pex3_palavras_dm = pex3_nome_termo_dm.split()
+            pex3_gramas_dm = set().union(*(pex3_gramas_termo_dm(pex3_p_dm) for pex3_p_dm in pex3_palavras_dm))
+            pex3_inicio_palavra_dm = ' ' + pex3_nome_termo_dm
+            pex3_resta_dm = pex3_falta_dm - len(pex3_encontrados_dm)
+            # termo no início de uma palavra, termo inteiro no meio, palavras espalhadas
+            pex3_faixas_dm = ([], [], [])
+            for pex3_nome_dm, pex3_codigo_dm in pex3_menor_lista_dm(pex3_busca_dm['gramas_nome'], pex3_gramas_dm):
+                if len(pex3_faixas_dm[0]) >= pex3_resta_dm:
+                    break
+                # Os trigramas só filtram: confere se as palavras aparecem de fato no nome
+                if pex3_codigo_dm in pex3_vistos_dm or not all(pex3_p_dm in pex3_nome_dm for pex3_p_dm in pex3_palavras_dm):
+                    continue
+                if pex3_inicio_palavra_dm in ' ' + pex3_nome_dm:
+                    pex3_faixas_dm[0].append(pex3_codigo_dm)
+                elif pex3_nome_termo_dm in pex3_nome_dm:
+                    pex3_faixas_dm[1].append(pex3_codigo_dm)
+                else:
+                    pex3_faixas_dm[2].append(pex3_codigo_dm)
+            pex3_restantes_dm = pex3_faixas_dm[0] + pex3_faixas_dm[1] + pex3_faixas_dm[2]
+            if pex3_limite_dm is not None:
+                pex3_restantes_dm = pex3_restantes_dm[:pex3_resta_dm]
+            pex3_encontrados_dm.extend(pex3_restantes_dm)
+            pex3_vistos_dm.update(pex3_restantes_dm)
+
+        # 4) Códigos de barras com o termo no meio (só se ainda faltarem resultados),
+        #    percorrendo em ordem a menor lista de trechos exigidos
+        if len(pex3_encontrados_dm) < pex3_falta_dm:
+            for pex3_codigo_dm in pex3_menor_lista_dm(pex3_busca_dm['gramas_codigo'], pex3_gramas_termo_dm(pex3_codigo_termo_dm)):
+                if len(pex3_encontrados_dm) >= pex3_falta_dm:
+                    break
+                if pex3_codigo_termo_dm in pex3_codigo_dm and pex3_codigo_dm not in pex3_vistos_dm:
+                    pex3_encontrados_dm.append(pex3_codigo_dm)
+
+        return [pex3_indice_dm[pex3_codigo_dm].pex3_como_dict_dm() for pex3_codigo_dm in pex3_encontrados_dm]
+
+# ============== ÍNDICE DE REPOSIÇÃO (ESTOQUE BAIXO) ==============
+# Cada produto tem seu estoque mínimo (ponto de reposição). Os produtos ficam
+# ordenados pela folga (saldo - estoque mínimo), então os que estão abaixo do
+# mínimo são o começo da lista: listá-los custa O(log N + k). Toda alteração de
+# produto passa por pex3_persistir_catalogo_dm, que reposiciona só os produtos
+# alterados. Cada entrada ou saída da lista de alertas (ou mudança de um produto
+# nela) ganha uma versão, para que painéis peçam apenas o que mudou.
+# A versão enviada ao cliente leva a época do índice ('<época>.<versão>'): a época
+# é sorteada a cada montagem do índice (ao iniciar o processo ou recarregar o
+# catálogo), então uma versão de outra época (antes de reiniciar, de outro worker)
+# nunca é confundida com uma desta e o cliente recebe a lista completa.
+
+pex3_MAX_LOG_ALERTAS_dm = 1000  # mudanças guardadas para respostas incrementais
+
+# Época e versão dos alertas e as últimas mudanças (versão, código). Com 'base' maior que a
+# versão do cliente, as mudanças intermediárias já se perderam e a lista vai completa.
+pex3_alertas_dm = {'epoca': None, 'versao': 0, 'base': 0, 'mudancas': deque(maxlen=pex3_MAX_LOG_ALERTAS_dm)}
+
+def pex3_folga_dm(pex3_produto_dm):
+    """Quanto falta (negativo) ou sobra até o estoque mínimo do produto"""
+    return float(pex3_produto_dm['saldo']) - float(
+        pex3_produto_dm.get('estoque_minimo', pex3_armazenamento_dm.pex3_ESTOQUE_MINIMO_PADRAO_dm))
+
+def pex3_registrar_mudanca_alerta_dm(pex3_codigo_dm):
+    """Avança a versão dos alertas e guarda no log a mudança do produto"""
+    pex3_mudancas_dm = pex3_alertas_dm['mudancas']
+    if len(pex3_mudancas_dm) == pex3_mudancas_dm.maxlen:
+        pex3_alertas_dm['base'] = pex3_mudancas_dm[0][0]
+    pex3_alertas_dm['versao'] += 1
+    pex3_mudancas_dm.append((pex3_alertas_dm['versao'], pex3_codigo_dm))
+
+def pex3_reposicionar_produto_dm(pex3_codigo_dm, pex3_produto_dm):
+    """Atualiza a posição de um produto no índice de reposição (pex3_produto_dm=None: removido)"""
+    pex3_reposicao_dm = pex3_catalogo_dm['reposicao']
+    if pex3_reposicao_dm is None:
+        return
+    pex3_anterior_dm = pex3_reposicao_dm['folgas_por_codigo'].pop(pex3_codigo_dm, None)
+    if pex3_anterior_dm is not None:
+        pex3_folgas_dm = pex3_reposicao_dm['folgas']
+        del pex3_folgas_dm[bisect_left(pex3_folgas_dm, (pex3_anterior_dm, pex3_codigo_dm))]
+    pex3_atual_dm = None
+    if pex3_produto_dm is not None:
+        pex3_atual_dm = pex3_folga_dm(pex3_produto_dm)
+        insort(pex3_reposicao_dm['folgas'], (pex3_atual_dm, pex3_codigo_dm))
+        pex3_reposicao_dm['folgas_por_codigo'][pex3_codigo_dm] = pex3_atual_dm
+    if (pex3_anterior_dm is not None and pex3_anterior_dm < 0) or (pex3_atual_dm is not None and pex3_atual_dm < 0):
+        pex3_registrar_mudanca_alerta_dm(pex3_codigo_dm)
+
+def pex3_obter_reposicao_dm():
+    """Índice de reposição do catálogo atual, montado se ainda não existir.
+    Montar de novo (após recarregar o catálogo) invalida as versões anteriores."""
+    with pex3_catalogo_lock_dm:
+        pex3_catalogo_atual_dm = pex3_obter_catalogo_dm()
+        if pex3_catalogo_atual_dm['reposicao'] is None:
+            pex3_folgas_por_codigo_dm = {pex3_p_dm['codigo_barras']: pex3_folga_dm(pex3_p_dm)
+                                         for pex3_p_dm in pex3_catalogo_atual_dm['produtos']}
+            pex3_catalogo_atual_dm['reposicao'] = {
+                'folgas': sorted((pex3_f_dm, pex3_c_dm) for pex3_c_dm, pex3_f_dm in pex3_folgas_por_codigo_dm.items()),
+                'folgas_por_codigo': pex3_folgas_por_codigo_dm
+            }
+            pex3_alertas_dm['epoca'] = os.urandom(6).hex()
+            pex3_alertas_dm['versao'] += 1
+            pex3_alertas_dm['base'] = pex3_alertas_dm['versao']
+            pex3_alertas_dm['mudancas'].clear()
+        return pex3_catalogo_atual_dm['reposicao']
+
+def pex3_produtos_abaixo_minimo_dm():
+    """Produtos (cópias) com saldo abaixo do estoque mínimo, do mais crítico ao menos crítico"""
+    with pex3_catalogo_lock_dm:
+        pex3_folgas_dm = pex3_obter_reposicao_dm()['folgas']
+        pex3_fim_dm = bisect_left(pex3_folgas_dm, (0.0,))
+        return [pex3_catalogo_dm['indice'][pex3_c_dm].pex3_como_dict_dm() for _, pex3_c_dm in pex3_folgas_dm[:pex3_fim_dm]]
+
+def pex3_versao_do_cliente_dm(pex3_token_dm):
+    """Versão (int) de um token '<época>.<versão>' da época atual; None se for de outra
+    época, vazio ou ilegível"""
+    pex3_epoca_dm, _, pex3_versao_dm = (pex3_token_dm or '').rpartition('.')
+    if pex3_epoca_dm != pex3_alertas_dm['epoca'] or not pex3_versao_dm.isdigit():
+        return None
+    return int(pex3_versao_dm)
+
+def pex3_alertas_desde_dm(pex3_token_cliente_dm=None):
+    """Alertas de estoque baixo para um cliente que já conhece a versão informada
+    (token '<época>.<versão>' devolvido numa resposta anterior).
+    Retorna (token atual, completo, alertas, removidos): sem token (ou com um de outra
+    época ou antigo demais) vem a lista completa; senão, só os produtos que mudaram desde então."""
+    with pex3_catalogo_lock_dm:
+        pex3_folgas_por_codigo_dm = pex3_obter_reposicao_dm()['folgas_por_codigo']
+        pex3_versao_dm = pex3_alertas_dm['versao']
+        pex3_token_dm = f"{pex3_alertas_dm['epoca']}.{pex3_versao_dm}"
+        pex3_versao_cliente_dm = pex3_versao_do_cliente_dm(pex3_token_cliente_dm)
+        if (pex3_versao_cliente_dm is None or pex3_versao_cliente_dm < pex3_alertas_dm['base']
+                or pex3_versao_cliente_dm > pex3_versao_dm):
+            return pex3_token_dm, True, pex3_produtos_abaixo_minimo_dm(), []
+        pex3_alterados_dm = {}
+        for pex3_versao_mudanca_dm, pex3_codigo_dm in reversed(pex3_alertas_dm['mudancas']):
+            if pex3_versao_mudanca_dm <= pex3_versao_cliente_dm:
+                break
+            pex3_alterados_dm.setdefault(pex3_codigo_dm, pex3_versao_mudanca_dm)
+        pex3_alertas_lista_dm, pex3_removidos_dm = [], []
+        for pex3_codigo_dm in pex3_alterados_dm:
+            if pex3_folgas_por_codigo_dm.get(pex3_codigo_dm, 0.0) < 0:
+                pex3_alertas_lista_dm.append(pex3_catalogo_dm['indice'][pex3_codigo_dm].pex3_como_dict_dm())
+            else:
+                pex3_removidos_dm.append(pex3_codigo_dm)
+        return pex3_token_dm, False, pex3_alertas_lista_dm, pex3_removidos_dm
+
+# ============== TOTAIS DO ESTOQUE (VALORIZAÇÃO) ==============
+# Itens em estoque, valor a preço de compra e valor potencial de venda são somas
+# mantidas por diferença: pex3_persistir_catalogo_dm troca a contribuição antiga
+# de cada produto alterado pela nova, então o Dashboard não percorre o catálogo.
+# Os valores são inteiros em centavos (exatos); os itens, que podem ser fracionários,
+# são float. Uma thread de conferência recalcula tudo periodicamente (PEX3_INTERVALO_CONFERENCIA,
+# em segundos), descarta o erro de arredondamento acumulado e avisa se houver divergência.
+
+pex3_INTERVALO_CONFERENCIA_dm = float(os.environ.get('PEX3_INTERVALO_CONFERENCIA', '600'))
+pex3_CAMPOS_TOTAIS_dm = ('total_itens', 'valor_estoque', 'valor_venda_potencial')
+pex3_conferencia_dm = {'thread': None, 'acordar': threading.Event()}
+
+def pex3_contribuicao_dm(pex3_produto_dm):
+    """(itens, valor a preço de compra, valor a preço de venda) de um produto, valores em centavos"""
+    pex3_saldo_dm = float(pex3_produto_dm['saldo'])
+    pex3_multiplicar_dm = pex3_armazenamento_dm.pex3_multiplicar_centavos_dm
+    return (pex3_saldo_dm, pex3_multiplicar_dm(pex3_saldo_dm, pex3_produto_dm['preco_compra']),
+            pex3_multiplicar_dm(pex3_saldo_dm, pex3_produto_dm['preco_venda']))
+
+def pex3_calcular_totais_dm(pex3_produtos_dm):
+    """Totais recalculados do zero (itens com math.fsum; centavos somados como int, já exatos)"""
+    pex3_por_codigo_dm = {pex3_p_dm['codigo_barras']: pex3_contribuicao_dm(pex3_p_dm) for pex3_p_dm in pex3_produtos_dm}
+    pex3_itens_dm, pex3_compra_dm, pex3_venda_dm = list(zip(*pex3_por_codigo_dm.values())) or [(), (), ()]
+    return {'somas': [math.fsum(pex3_itens_dm), sum(pex3_compra_dm), sum(pex3_venda_dm)], 'por_codigo': pex3_por_codigo_dm}
+
+def pex3_ajustar_totais_dm(pex3_codigo_dm, pex3_produto_dm):
+    """Troca a contribuição antiga do produto pela atual (pex3_produto_dm=None: removido)"""
+    pex3_totais_dm = pex3_catalogo_dm['totais']
+    if pex3_totais_dm is None:
+        return
+    pex3_anterior_dm = pex3_totais_dm['por_codigo'].pop(pex3_codigo_dm, (0.0, 0, 0))
+    pex3_atual_dm = (0.0, 0, 0)
+    if pex3_produto_dm is not None:
+        pex3_atual_dm = pex3_totais_dm['por_codigo'][pex3_codigo_dm] = pex3_contribuicao_dm(pex3_produto_dm)
+    for pex3_i_dm in range(3):
+        pex3_totais_dm['somas'][pex3_i_dm] += pex3_atual_dm[pex3_i_dm] - pex3_anterior_dm[pex3_i_dm]
+
+def pex3_obter_totais_dm():
+    """Totais do estoque ({total_itens, valor_estoque, valor_venda_potencial}) em O(1)"""
+    with pex3_catalogo_lock_dm:
+        pex3_catalogo_atual_dm = pex3_obter_catalogo_dm()
+        if pex3_catalogo_atual_dm['totais'] is None:
+            pex3_catalogo_atual_dm['totais'] = pex3_calcular_totais_dm(pex3_catalogo_atual_dm['produtos'])
+            pex3_garantir_conferencia_dm()
+        return dict(zip(pex3_CAMPOS_TOTAIS_dm, pex3_catalogo_atual_dm['totais']['somas']))
+
+def pex3_conferir_totais_dm():
+    """Compara os totais mantidos por diferença com um recálculo completo e fica com o recálculo.
+    Retorna False se havia divergência além do arredondamento."""
+    with pex3_catalogo_lock_dm:
+        pex3_catalogo_atual_dm = pex3_obter_catalogo_dm()
+        pex3_totais_dm = pex3_catalogo_atual_dm['totais']
+        if pex3_totais_dm is None:
+            return True
+        pex3_recalculados_dm = pex3_calcular_totais_dm(pex3_catalogo_atual_dm['produtos'])
+        pex3_consistente_dm = all(
+            math.isclose(pex3_mantido_dm, pex3_exato_dm, rel_tol=1e-9, abs_tol=1e-6)
+            for pex3_mantido_dm, pex3_exato_dm in zip(pex3_totais_dm['somas'], pex3_recalculados_dm['somas']))
+        if not pex3_consistente_dm:
+            print(f"⚠️ Totais do estoque divergentes: mantidos {pex3_totais_dm['somas']}, "
+                  f"recalculados {pex3_recalculados_dm['somas']} (corrigido)")
+        pex3_catalogo_atual_dm['totais'] = pex3_recalculados_dm
+        return pex3_consistente_dm
+
+def pex3_loop_conferencia_dm():
+    """Thread de segundo plano: confere os totais periodicamente ou quando acordada"""
+    while True:
+        pex3_conferencia_dm['acordar'].wait(pex3_INTERVALO_CONFERENCIA_dm)
+        pex3_conferencia_dm['acordar'].clear()
+        try:
+            pex3_conferir_totais_dm()
+        except Exception as pex3_e_dm:
+            print(f"⚠️ Falha ao conferir os totais do estoque: {pex3_e_dm}")
+
+def pex3_garantir_conferencia_dm():
+    """Inicia a thread de conferência na primeira chamada"""
+    if pex3_conferencia_dm['thread'] is None:
+        pex3_conferencia_dm['thread'] = threading.Thread(target=pex3_loop_conferencia_dm, daemon=True)
+        pex3_conferencia_dm['thread'].start()
+
+# ============== IMPORTAÇÃO DE PRODUTOS EM LOTE ==============
+# O arquivo é lido linha a linha (nunca inteiro em memória): cada linha é validada
+# e só as válidas são guardadas, por código de barras. No fim, todas entram no
+# catálogo em memória de uma vez e o armazenamento é gravado uma única vez.
+
+pex3_MAX_ERROS_IMPORTACAO_dm = 200  # erros detalhados no relatório (os demais só são contados)
+
+def pex3_validar_linhas_produtos_dm(pex3_arquivo_dm):
+    """Percorre um CSV de produtos (texto) e gera (número da linha, produto, erro).
+    Aceita ';' (como produtos.csv) ou ',' como separador. Colunas obrigatórias:
+    codigo_barras, nome, preco_venda e preco_compra (em reais, ou em centavos nas colunas
+    preco_venda_centavos e preco_compra_centavos do produtos.csv); saldo e estoque_minimo são opcionais."""
+    pex3_campos_dm, pex3_leitor_dm = pex3_armazenamento_dm.pex3_leitor_csv_dm(pex3_arquivo_dm)
+    pex3_faltando_dm = {'codigo_barras', 'nome'} - set(pex3_campos_dm)
+    pex3_faltando_dm |= {pex3_c_dm for pex3_c_dm in ('preco_venda', 'preco_compra')
+                         if pex3_c_dm not in pex3_campos_dm and pex3_c_dm + '_centavos' not in pex3_campos_dm}
+    if pex3_faltando_dm:
+        yield 1, None, f"Cabeçalho sem as colunas: {', '.join(sorted(pex3_faltando_dm))}"
+        return
+    
+    pex3_vistos_dm = set()
+    for pex3_row_dm in pex3_leitor_dm:
+        pex3_linha_dm = pex3_leitor_dm.line_num + 1  # o cabeçalho já foi lido
+        if not any((pex3_v_dm or '').strip() for pex3_k_dm, pex3_v_dm in pex3_row_dm.items() if pex3_k_dm):
+            continue  # linha em branco
+        pex3_codigo_dm = (pex3_row_dm.get('codigo_barras') or '').strip()
+        pex3_nome_dm = (pex3_row_dm.get('nome') or '').strip()
+        if not pex3_codigo_dm:
+            yield pex3_linha_dm, None, 'Código de barras vazio'
+            continue
+        if not pex3_nome_dm:
+            yield pex3_linha_dm, None, f'Produto {pex3_codigo_dm} sem nome'
+            continue
+        if pex3_codigo_dm in pex3_vistos_dm:
+            yield pex3_linha_dm, None, f'Código de barras {pex3_codigo_dm} repetido no arquivo'
+            continue
+        
+        pex3_produto_dm = {'codigo_barras': pex3_codigo_dm, 'nome': pex3_nome_dm}
+        pex3_erro_dm = None
+        for pex3_campo_dm in ('saldo', 'preco_venda', 'preco_compra', 'estoque_minimo'):
+            pex3_valor_dm = (pex3_row_dm.get(pex3_campo_dm) or '').strip()
+            if pex3_campo_dm in ('saldo', 'estoque_minimo'):
+                if not pex3_valor_dm:
+                    continue  # em branco: mantém o atual (ou o padrão, se o produto for novo)
+                pex3_converter_dm = pex3_armazenamento_dm.pex3_numero_importacao_dm
+            elif pex3_valor_dm:
+                pex3_converter_dm = pex3_armazenamento_dm.pex3_centavos_dm
+            else:
+                # Colunas do próprio produtos.csv, já em centavos
+                pex3_valor_dm = (pex3_row_dm.get(pex3_campo_dm + '_centavos') or '').strip()
+                pex3_converter_dm = int
+            try:
+                pex3_produto_dm[pex3_campo_dm] = pex3_converter_dm(pex3_valor_dm)
+            except pex3_armazenamento_dm.pex3_ERROS_CONVERSAO_dm:
+                pex3_erro_dm = f"Valor inválido em {pex3_campo_dm}: '{pex3_valor_dm}'"
+                break
+            if pex3_converter_dm is int and pex3_produto_dm[pex3_campo_dm] > pex3_armazenamento_dm.pex3_MAX_CENTAVOS_dm:
+                pex3_erro_dm = f"Valor inválido em {pex3_campo_dm}_centavos: '{pex3_valor_dm}'"
+                break
+            if pex3_produto_dm[pex3_campo_dm] < 0:
+                pex3_erro_dm = f'{pex3_campo_dm} negativo: {pex3_valor_dm}'
+                break
+        if pex3_erro_dm:
+            yield pex3_linha_dm, None, pex3_erro_dm
+            continue
+        pex3_vistos_dm.add(pex3_codigo_dm)
+        yield pex3_linha_dm, pex3_produto_dm, None
+
+def pex3_importar_produtos_dm(pex3_arquivo_dm, pex3_simular_dm=False):
+    """Importa (insere ou atualiza) os produtos de um CSV aberto em modo texto.
+    Linhas inválidas são puladas e relatadas; as válidas são gravadas de uma só vez.
+    Com pex3_simular_dm=True apenas valida. Retorna o resumo da importação."""
+    pex3_resumo_dm = {'linhas': 0, 'inseridos': 0, 'atualizados': 0, 'invalidos': 0, 'erros': []}
+    pex3_validos_dm = {}
+    try:
+        for pex3_linha_dm, pex3_produto_dm, pex3_erro_dm in pex3_validar_linhas_produtos_dm(pex3_arquivo_dm):
+            pex3_resumo_dm['linhas'] += 1
+            if pex3_erro_dm:
+                pex3_resumo_dm['invalidos'] += 1
+                if len(pex3_resumo_dm['erros']) < pex3_MAX_ERROS_IMPORTACAO_dm:
+                    pex3_resumo_dm['erros'].append((pex3_linha_dm, pex3_erro_dm))
+            else:
+                pex3_validos_dm[pex3_produto_dm['codigo_barras']] = pex3_produto_dm
+    except (UnicodeDecodeError, csv.Error) as pex3_excecao_dm:
+        # Arquivo ilegível: nada é importado
+        pex3_resumo_dm['erros'].append((None, f'Arquivo inválido: {pex3_excecao_dm}'))
+        pex3_resumo_dm['invalidos'] += 1
+        return pex3_resumo_dm
+    
+    with pex3_catalogo_lock_dm:
+        pex3_catalogo_atual_dm = pex3_obter_catalogo_dm()
+        pex3_indice_dm = pex3_catalogo_atual_dm['indice']
+        pex3_alterados_dm = []
+        for pex3_codigo_dm, pex3_produto_dm in pex3_validos_dm.items():
+            pex3_existente_dm = pex3_indice_dm.get(pex3_codigo_dm)
+            if pex3_existente_dm is not None:
+                pex3_resumo_dm['atualizados'] += 1
+                if not pex3_simular_dm:
+                    pex3_desindexar_busca_dm(pex3_existente_dm)
+                    pex3_existente_dm.update(pex3_produto_dm)
+                    pex3_indexar_busca_dm(pex3_existente_dm)
+                    pex3_alterados_dm.append(pex3_existente_dm)
+            else:
+                pex3_resumo_dm['inseridos'] += 1
+                if not pex3_simular_dm:
+                    pex3_produto_dm = pex3_armazenamento_dm.pex3_Produto_dm.pex3_de_dict_dm(pex3_produto_dm)
+                    pex3_produto_dm.setdefault('saldo', 0.0)
+                    pex3_produto_dm.setdefault('estoque_minimo', pex3_armazenamento_dm.pex3_ESTOQUE_MINIMO_PADRAO_dm)
+                    pex3_catalogo_atual_dm['produtos'].append(pex3_produto_dm)
+                    pex3_indice_dm[pex3_codigo_dm] = pex3_produto_dm
+                    pex3_indexar_busca_dm(pex3_produto_dm)
+                    pex3_alterados_dm.append(pex3_produto_dm)
+        if pex3_alterados_dm:
+            pex3_persistir_catalogo_dm(pex3_alterados_dm)
+    return pex3_resumo_dm
+
+def pex3_load_estoque_db_dm():
+    """Carrega o banco de dados de movimentações"""
+    pex3_init_estoque_db_dm()
+    return pex3_armazenamento_dm.pex3_carregar_documento_dm('estoque', pex3_ESTOQUE_DB_dm)
+
+def pex3_save_estoque_db_dm(pex3_data_dm):
+    """Salva o banco de dados de movimentações"""
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', pex3_ESTOQUE_DB_dm, pex3_data_dm)
+
+def pex3_anexar_movimentacao_dm(pex3_colecao_dm, pex3_registro_dm):
+    """Acrescenta uma venda, compra ou ajuste ao banco de movimentações"""
+    pex3_armazenamento_dm.pex3_anexar_registro_dm('estoque', pex3_ESTOQUE_DB_dm, pex3_colecao_dm, pex3_registro_dm)
+
+def pex3_buscar_movimentacao_dm(pex3_colecao_dm, pex3_id_dm):
+    """Busca uma venda, compra ou ajuste pelo id através do índice da camada de armazenamento"""
+    return pex3_armazenamento_dm.pex3_buscar_registro_dm('estoque', pex3_ESTOQUE_DB_dm, pex3_colecao_dm, pex3_id_dm)
+
+def pex3_proximo_id_movimentacao_dm(pex3_colecao_dm):
+    """Reserva o próximo id de venda, compra ou ajuste (sem carregar o histórico)"""
+    return pex3_armazenamento_dm.pex3_proximo_id_dm('estoque', pex3_ESTOQUE_DB_dm, pex3_colecao_dm)
+
+# ============== ÍNDICE DE MOVIMENTAÇÕES POR DATA ==============
+# Vendas, compras e ajustes ficam em memória ordenados por (data, id), uma lista por coleção.
+# As novas são lidas de forma incremental da camada de armazenamento e inseridas
+# com bisect, então listagens paginadas e exportações não precisam carregar nem ordenar o histórico.
+
+pex3_movimentacoes_lock_dm = threading.RLock()
+pex3_indices_movimentacoes_dm = {}  # coleção -> {'caminho', 'marcador', 'chaves', 'registros'}
+
+def pex3_chave_movimentacao_dm(pex3_registro_dm):
+    return (pex3_registro_dm['data'], pex3_registro_dm.get('id', 0))
+
+def pex3_obter_indice_movimentacoes_dm(pex3_colecao_dm):
+    """Incorpora ao índice da coleção os registros gravados desde a última leitura"""
+    with pex3_movimentacoes_lock_dm:
+        pex3_indice_dm = pex3_indices_movimentacoes_dm.setdefault(
+            pex3_colecao_dm, {'caminho': None, 'marcador': None, 'chaves': [], 'registros': []})
+        if pex3_indice_dm['caminho'] != pex3_ESTOQUE_DB_dm:
+            pex3_init_estoque_db_dm()
+            pex3_indice_dm.update(caminho=pex3_ESTOQUE_DB_dm, marcador=None)
+        pex3_novos_dm, pex3_marcador_dm, pex3_completo_dm = pex3_armazenamento_dm.pex3_ler_registros_desde_dm(
+            'estoque', pex3_ESTOQUE_DB_dm, pex3_colecao_dm, pex3_indice_dm['marcador'])
+        if pex3_completo_dm:
+            pex3_indice_dm['registros'] = sorted(pex3_novos_dm, key=pex3_chave_movimentacao_dm)
+            pex3_indice_dm['chaves'] = [pex3_chave_movimentacao_dm(pex3_r_dm) for pex3_r_dm in pex3_indice_dm['registros']]
+        else:
+            for pex3_r_dm in pex3_novos_dm:
+                pex3_chave_dm = pex3_chave_movimentacao_dm(pex3_r_dm)
+                pex3_pos_dm = bisect_right(pex3_indice_dm['chaves'], pex3_chave_dm)
+                pex3_indice_dm['chaves'].insert(pex3_pos_dm, pex3_chave_dm)
+                pex3_indice_dm['registros'].insert(pex3_pos_dm, pex3_r_dm)
+        pex3_indice_dm['marcador'] = pex3_marcador_dm
+        return pex3_indice_dm
+
+def pex3_faixa_movimentacoes_dm(pex3_indice_dm, pex3_data_inicio_dm, pex3_data_fim_dm):
+    """Posições (início, fim) em indice['registros'] dos registros do período"""
+    pex3_chaves_dm = pex3_indice_dm['chaves']
+    # 'data' tem hora ('AAAA-MM-DD HH:MM:SS'): o fim do período vai até o último instante do dia
+    pex3_inicio_dm = bisect_left(pex3_chaves_dm, (pex3_data_inicio_dm,)) if pex3_data_inicio_dm else 0
+    pex3_fim_dm = bisect_left(pex3_chaves_dm, (pex3_data_fim_dm + '\uffff',)) if pex3_data_fim_dm else len(pex3_chaves_dm)
+    return pex3_inicio_dm, pex3_fim_dm
+
+def pex3_pagina_movimentacoes_dm(pex3_colecao_dm, pex3_data_inicio_dm, pex3_data_fim_dm, pex3_antes_dm=None,
+                                 pex3_depois_dm=None, pex3_por_pagina_dm=pex3_armazenamento_dm.pex3_POR_PAGINA_PADRAO_dm):
+    """Uma página de vendas ou compras do período, da mais recente para a mais antiga"""
+    with pex3_movimentacoes_lock_dm:
+        pex3_indice_dm = pex3_obter_indice_movimentacoes_dm(pex3_colecao_dm)
+        pex3_inicio_dm, pex3_fim_dm = pex3_faixa_movimentacoes_dm(pex3_indice_dm, pex3_data_inicio_dm, pex3_data_fim_dm)
+        return pex3_armazenamento_dm.pex3_paginar_dm(pex3_indice_dm['chaves'], pex3_indice_dm['registros'],
+                                                     pex3_inicio_dm, pex3_fim_dm, pex3_antes_dm, pex3_depois_dm,
+                                                     pex3_por_pagina_dm)
+
+def pex3_ultimas_movimentacoes_dm(pex3_colecao_dm, pex3_quantidade_dm=5):
+    """As últimas vendas ou compras, da mais recente para a mais antiga.
+    Lidas do fim do índice ordenado, sem ordenar nem copiar o histórico inteiro. Pôr o índice
+    em dia custa só os registros novos; no backend 'json', só se gravados por este processo
+    (uma gravação de outro processo relê o arquivo, ver pex3_json_ler_registros_desde_dm)."""
+    with pex3_movimentacoes_lock_dm:
+        pex3_registros_dm = pex3_obter_indice_movimentacoes_dm(pex3_colecao_dm)['registros']
+        return pex3_registros_dm[:-pex3_quantidade_dm - 1:-1] if pex3_quantidade_dm > 0 else []
+
+def pex3_ler_pagina_requisicao_dm(pex3_colecao_dm):
+    """Página da coleção conforme a query string (data_inicio, data_fim, antes, depois, por_pagina)"""
+    pex3_data_inicio_dm = request.args.get('data_inicio', '')
+    pex3_data_fim_dm = request.args.get('data_fim', '')
+    pex3_registros_dm, pex3_pagina_dm = pex3_pagina_movimentacoes_dm(
+        pex3_colecao_dm, pex3_data_inicio_dm, pex3_data_fim_dm,
+        request.args.get('antes'), request.args.get('depois'),
+        request.args.get('por_pagina', pex3_armazenamento_dm.pex3_POR_PAGINA_PADRAO_dm, type=int))
+    return pex3_registros_dm, dict(pagina=pex3_pagina_dm, data_inicio=pex3_data_inicio_dm, data_fim=pex3_data_fim_dm)
+
+def pex3_load_financeiro_db_dm():
+    """Carrega o banco de dados financeiro"""
+    return pex3_armazenamento_dm.pex3_carregar_documento_dm('financeiro', pex3_FINANCEIRO_DB_dm)
+
+def pex3_save_financeiro_db_dm(pex3_data_dm):
+    """Salva o banco de dados financeiro"""
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('financeiro', pex3_FINANCEIRO_DB_dm, pex3_data_dm)
+
+def pex3_gerar_lancamento_financeiro_dm(pex3_tipo_dm, pex3_valor_dm, pex3_descricao_dm, pex3_categoria_dm, pex3_forma_pagamento_dm="A Definir"):
+    """Gera um lançamento no sistema financeiro"""
+    pex3_lancamento_dm = {
+        "tipo": pex3_tipo_dm,  # 'pagar' para despesa, 'receber' para receita
+        "data_gasto": datetime.now().strftime("%Y-%m-%d"),
+        "data_criacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "valor": int(pex3_valor_dm),  # centavos
+        "categoria": pex3_categoria_dm,
+        "forma_pagamento": pex3_forma_pagamento_dm,
+        "descricao": pex3_descricao_dm
+    }
+    
+    # O id é reservado pelo alocador da camada de armazenamento
+    return pex3_armazenamento_dm.pex3_anexar_registro_dm('financeiro', pex3_FINANCEIRO_DB_dm, 'transactions',
+                                                         pex3_lancamento_dm, pex3_gerar_id_dm=True)
+
+# ============== MOVIMENTAÇÕES EM LOTE ==============
+
+# Mensagem dos formulários quando um preço ou quantidade não dá para interpretar
+pex3_VALOR_INVALIDO_dm = 'Valor inválido! Use o formato 1234,56 ou 1234.56.'
+
+def pex3_ler_itens_formulario_dm():
+    """Lê os itens (código, quantidade, preço em centavos) enviados pelos formulários de compra/venda.
+    Quantidade ou preço que não dá para interpretar geram ValueError."""
+    pex3_codigos_dm = request.form.getlist('item_codigo[]')
+    pex3_quantidades_dm = request.form.getlist('item_quantidade[]')
+    pex3_precos_dm = request.form.getlist('item_preco[]')
+    
+    pex3_itens_dm = []
+    for pex3_i_dm, pex3_codigo_dm in enumerate(pex3_codigos_dm):
+        if pex3_codigo_dm.strip():
+            pex3_qtd_dm = float(pex3_quantidades_dm[pex3_i_dm]) if pex3_quantidades_dm[pex3_i_dm] else 0
+            pex3_preco_dm = pex3_armazenamento_dm.pex3_centavos_dm(pex3_precos_dm[pex3_i_dm]) if pex3_precos_dm[pex3_i_dm] else None
+            pex3_itens_dm.append((pex3_codigo_dm.strip(), pex3_qtd_dm, pex3_preco_dm))
+    return pex3_itens_dm
+
+def pex3_registrar_venda_dm(pex3_itens_solicitados_dm, pex3_cliente_dm='', pex3_desconto_dm=0,
+                            pex3_forma_pagamento_dm='A Definir', pex3_observacao_dm=''):
+    """Registra uma venda com todos os itens de uma vez (preços e desconto em centavos).
+    
+    Valida o saldo de todos os itens e monta a venda antes de alterar qualquer coisa.
+    Venda, lançamento financeiro e produtos são gravados uma única vez cada, nessa ordem,
+    dentro de pex3_transacao_dm, tudo ou nada: se alguma gravação falhar, o SQLite desfaz a
+    transação e, nos arquivos, a venda e o lançamento já gravados são retirados (o catálogo,
+    gravado por último, não chegou a mudar). As baixas feitas em memória são descartadas
+    e a exceção segue para o chamador.
+    Retorna (venda, None) ou (None, mensagem_de_erro).
+    """
+    with pex3_catalogo_lock_dm:
+        pex3_indice_dm = pex3_obter_catalogo_dm()['indice']
+        pex3_itens_dm = []
+        pex3_baixas_dm = {}  # codigo_barras -> quantidade total vendida
+        
+        for pex3_codigo_dm, pex3_qtd_dm, pex3_preco_dm in pex3_itens_solicitados_dm:
+            pex3_produto_dm = pex3_indice_dm.get(pex3_codigo_dm)
+            if not pex3_produto_dm:
+                continue
+            if pex3_preco_dm is None:
+                pex3_preco_dm = pex3_produto_dm['preco_venda']
+            
+            # Verifica estoque disponível (somando linhas repetidas do mesmo produto)
+            pex3_baixa_dm = pex3_baixas_dm.get(pex3_codigo_dm, 0) + pex3_qtd_dm
+            if pex3_baixa_dm > pex3_produto_dm['saldo']:
+                return None, f'Estoque insuficiente para {pex3_produto_dm["nome"]}! Disponível: {pex3_produto_dm["saldo"]}'
+            pex3_baixas_dm[pex3_codigo_dm] = pex3_baixa_dm
+            
+            pex3_itens_dm.append({
+                'codigo_barras': pex3_codigo_dm,
+                'nome_produto': pex3_produto_dm['nome'],
+                'quantidade': pex3_qtd_dm,
+                'preco_unitario': pex3_preco_dm,
+                'preco_custo': pex3_produto_dm['preco_compra'],
+                'subtotal': pex3_armazenamento_dm.pex3_multiplicar_centavos_dm(pex3_qtd_dm, pex3_preco_dm)
+            })
+        
+        if not pex3_itens_dm:
+            return None, 'Nenhum item válido na venda!'
+        
+        pex3_valor_bruto_dm = sum(pex3_item_dm['subtotal'] for pex3_item_dm in pex3_itens_dm)
+        pex3_valor_total_dm = pex3_valor_bruto_dm - pex3_desconto_dm
+        
+        # Calcula o lucro (tudo em centavos)
+        pex3_custo_total_dm = sum(pex3_armazenamento_dm.pex3_multiplicar_centavos_dm(pex3_item_dm['quantidade'], pex3_item_dm['preco_custo'])
+                                  for pex3_item_dm in pex3_itens_dm)
+        pex3_lucro_dm = pex3_valor_total_dm - pex3_custo_total_dm
+        
+        # Monta a venda (o id é reservado junto com as gravações)
+        pex3_venda_dm = {
+            'id': None,
+            'data': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'cliente': pex3_cliente_dm,
+            'itens': pex3_itens_dm,
+            'valor_bruto': pex3_valor_bruto_dm,
+            'desconto': pex3_desconto_dm,
+            'valor_total': pex3_valor_total_dm,
+            'custo_total': pex3_custo_total_dm,
+            'lucro': pex3_lucro_dm,
+            'forma_pagamento': pex3_forma_pagamento_dm,
+            'observacao': pex3_observacao_dm
+        }
+        
+        try:
+            with pex3_armazenamento_dm.pex3_transacao_dm():
+                pex3_venda_dm['id'] = pex3_proximo_id_movimentacao_dm('vendas')
+                pex3_anexar_movimentacao_dm('vendas', pex3_venda_dm)
+                
+                # Gera lançamento financeiro de receita (contas a receber)
+                pex3_descricao_fin_dm = f"Venda #{pex3_venda_dm['id']}"
+                if pex3_cliente_dm:
+                    pex3_descricao_fin_dm += f" - {pex3_cliente_dm}"
+                
+                pex3_gerar_lancamento_financeiro_dm('receber', pex3_valor_total_dm, pex3_descricao_fin_dm, 'Venda de Produtos', pex3_forma_pagamento_dm)
+                
+                # Aplica todas as baixas e grava o catálogo uma única vez
+                for pex3_codigo_dm, pex3_baixa_dm in pex3_baixas_dm.items():
+                    pex3_indice_dm[pex3_codigo_dm]['saldo'] = float(pex3_indice_dm[pex3_codigo_dm]['saldo']) - pex3_baixa_dm
+                pex3_persistir_catalogo_dm([pex3_indice_dm[pex3_codigo_dm] for pex3_codigo_dm in pex3_baixas_dm])
+        except Exception:
+            pex3_descartar_catalogo_dm()
+            raise
+        
+        return pex3_venda_dm, None
+
+def pex3_registrar_compra_dm(pex3_itens_solicitados_dm, pex3_fornecedor_dm='', pex3_numero_nf_dm='',
+                             pex3_forma_pagamento_dm='A Definir', pex3_observacao_dm=''):
+    """Registra uma compra (nota fiscal) com todos os itens de uma vez (preços em centavos).
+    
+    Monta a compra antes de alterar qualquer coisa e grava compra, lançamento financeiro
+    e produtos (saldo e preço de compra de cada item) uma única vez cada, nessa ordem,
+    dentro de pex3_transacao_dm, como em pex3_registrar_venda_dm.
+    Retorna (compra, None) ou (None, mensagem_de_erro).
+    """
+    with pex3_catalogo_lock_dm:
+        pex3_indice_dm = pex3_obter_catalogo_dm()['indice']
+        pex3_itens_dm = []
+        pex3_entradas_dm = {}  # codigo_barras -> [quantidade total comprada, último preço de compra]
+        
+        for pex3_codigo_dm, pex3_qtd_dm, pex3_preco_dm in pex3_itens_solicitados_dm:
+            pex3_produto_dm = pex3_indice_dm.get(pex3_codigo_dm)
+            if not pex3_produto_dm:
+                continue
+            if pex3_preco_dm is None:
+                pex3_preco_dm = pex3_produto_dm['preco_compra']
+            
+            pex3_itens_dm.append({
+                'codigo_barras': pex3_codigo_dm,
+                'nome_produto': pex3_produto_dm['nome'],
+                'quantidade': pex3_qtd_dm,
+                'preco_unitario': pex3_preco_dm,
+                'subtotal': pex3_armazenamento_dm.pex3_multiplicar_centavos_dm(pex3_qtd_dm, pex3_preco_dm)
+            })
+            
+            pex3_entrada_dm = pex3_entradas_dm.setdefault(pex3_codigo_dm, [0, pex3_preco_dm])
+            pex3_entrada_dm[0] += pex3_qtd_dm
+            pex3_entrada_dm[1] = pex3_preco_dm
+        
+        if not pex3_itens_dm:
+            return None, 'Nenhum item válido na compra!'
+        
+        pex3_valor_total_dm = sum(pex3_item_dm['subtotal'] for pex3_item_dm in pex3_itens_dm)
+        
+        # Monta a compra (o id é reservado junto com as gravações)
+        pex3_compra_dm = {
+            'id': None,
+            'data': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'fornecedor': pex3_fornecedor_dm,
+            'numero_nf': pex3_numero_nf_dm,
+            'itens': pex3_itens_dm,
+            'valor_total': pex3_valor_total_dm,
+            'forma_pagamento': pex3_forma_pagamento_dm,
+            'observacao': pex3_observacao_dm
+        }
+        
+        try:
+            with pex3_armazenamento_dm.pex3_transacao_dm():
+                pex3_compra_dm['id'] = pex3_proximo_id_movimentacao_dm('compras')
+                pex3_anexar_movimentacao_dm('compras', pex3_compra_dm)
+                
+                # Gera lançamento financeiro de despesa
+                pex3_descricao_fin_dm = f"Compra #{pex3_compra_dm['id']}"
+                if pex3_fornecedor_dm:
+                    pex3_descricao_fin_dm += f" - {pex3_fornecedor_dm}"
+                if pex3_numero_nf_dm:
+                    pex3_descricao_fin_dm += f" - NF: {pex3_numero_nf_dm}"
+                
+                pex3_gerar_lancamento_financeiro_dm('pagar', pex3_valor_total_dm, pex3_descricao_fin_dm, 'Compra de Produtos', pex3_forma_pagamento_dm)
+                
+                # Atualiza o estoque e o preço de compra e grava o catálogo uma única vez
+                for pex3_codigo_dm, (pex3_qtd_dm, pex3_preco_dm) in pex3_entradas_dm.items():
+                    pex3_indice_dm[pex3_codigo_dm]['saldo'] = float(pex3_indice_dm[pex3_codigo_dm]['saldo']) + pex3_qtd_dm
+                    pex3_indice_dm[pex3_codigo_dm]['preco_compra'] = pex3_preco_dm
+                pex3_persistir_catalogo_dm([pex3_indice_dm[pex3_codigo_dm] for pex3_codigo_dm in pex3_entradas_dm])
+        except Exception:
+            pex3_descartar_catalogo_dm()
+            raise
+        
+        return pex3_compra_dm, None
+
+# ============== ROTAS PRINCIPAIS ==============
+
+@pex3_app_dm.route('/')
+def pex3_index_dm():
+    """Página inicial - Dashboard do estoque"""
+    # Estatísticas: totais mantidos por diferença, sem percorrer o catálogo
+    with pex3_catalogo_lock_dm:
+        pex3_total_produtos_dm = len(pex3_obter_catalogo_dm()['produtos'])
+        pex3_totais_dm = pex3_obter_totais_dm()
+    
+    # Produtos abaixo do estoque mínimo, lidos do índice de reposição
+    pex3_produtos_baixo_estoque_dm = pex3_produtos_abaixo_minimo_dm()
+    
+    # Últimas movimentações, lidas do fim do índice de cada coleção
+    pex3_ultimas_vendas_dm = pex3_ultimas_movimentacoes_dm('vendas')
+    pex3_ultimas_compras_dm = pex3_ultimas_movimentacoes_dm('compras')
+    
+    return render_template('estoque/index.html',
+                          total_produtos=pex3_total_produtos_dm,
+                          **pex3_totais_dm,
+                          produtos_baixo_estoque=pex3_produtos_baixo_estoque_dm,
+                          ultimas_vendas=pex3_ultimas_vendas_dm,
+                          ultimas_compras=pex3_ultimas_compras_dm)
+
+# ============== ROTAS DE PRODUTOS ==============
+
+@pex3_app_dm.route('/produtos')
+def pex3_listar_produtos_dm():
+    """Lista todos os produtos cadastrados (com ?busca=, os que casam com o termo, por relevância)"""
+    pex3_busca_dm = request.args.get('busca', '')
+    
+    if pex3_busca_dm:
+        pex3_produtos_dm = pex3_buscar_produtos_dm(pex3_busca_dm, pex3_limite_dm=None)
+    else:
+        pex3_produtos_dm = pex3_load_produtos_dm()
+    
+    return render_template('estoque/produtos.html', produtos=pex3_produtos_dm, busca=pex3_busca_dm)
+
+@pex3_app_dm.route('/produtos/cadastrar', methods=['GET', 'POST'])
+def pex3_cadastrar_produto_dm():
+    """Cadastra um novo produto"""
+    if request.method == 'POST':
+        pex3_codigo_barras_dm = request.form['codigo_barras'].strip()
+        pex3_nome_dm = request.form['nome'].strip()
+        try:
+            pex3_saldo_dm = float(request.form.get('saldo', 0))
+            pex3_preco_venda_dm = pex3_armazenamento_dm.pex3_centavos_dm(request.form['preco_venda'])
+            pex3_preco_compra_dm = pex3_armazenamento_dm.pex3_centavos_dm(request.form['preco_compra'])
+            pex3_estoque_minimo_dm = float(request.form.get('estoque_minimo') or pex3_armazenamento_dm.pex3_ESTOQUE_MINIMO_PADRAO_dm)
+        except ValueError:
+            flash(pex3_VALOR_INVALIDO_dm, 'error')
+            return redirect(url_for('pex3_cadastrar_produto_dm'))
+        
+        # Insere pelo índice (falha se já existe produto com este código)
+        pex3_inserido_dm = pex3_inserir_produto_dm({
+            'codigo_barras': pex3_codigo_barras_dm,
+            'nome': pex3_nome_dm,
+            'saldo': pex3_saldo_dm,
+            'preco_venda': pex3_preco_venda_dm,
+            'preco_compra': pex3_preco_compra_dm,
+            'estoque_minimo': pex3_estoque_minimo_dm
+        })
+        if not pex3_inserido_dm:
+            flash('Já existe um produto com este código de barras!', 'error')
+            return redirect(url_for('pex3_cadastrar_produto_dm'))
+        
+        flash('Produto cadastrado com sucesso!', 'success')
+        return redirect(url_for('pex3_listar_produtos_dm'))
+    
+    return render_template('estoque/form_produto.html', produto=None, acao='Cadastrar')
+
+@pex3_app_dm.route('/produtos/importar', methods=['GET', 'POST'])
+def pex3_importar_produtos_rota_dm():
+    """Importação em lote de produtos a partir de um CSV enviado pelo usuário"""
+    pex3_resumo_dm = None
+    if request.method == 'POST':
+        pex3_upload_dm = request.files.get('arquivo')
+        if not pex3_upload_dm or not pex3_upload_dm.filename:
+            flash('Selecione um arquivo CSV para importar!', 'error')
+            return redirect(url_for('pex3_importar_produtos_rota_dm'))
+        # O upload é lido em fluxo, linha a linha, direto do stream da requisição
+        pex3_texto_dm = io.TextIOWrapper(pex3_upload_dm.stream, encoding='utf-8-sig', newline='')
+        try:
+            pex3_resumo_dm = pex3_importar_produtos_dm(pex3_texto_dm, pex3_simular_dm=bool(request.form.get('simular')))
+        finally:
+            # Solta o stream sem fechá-lo (fechar o wrapper fecharia o stream da requisição)
+            pex3_texto_dm.detach()
+    
+    return render_template('estoque/importar_produtos.html', resumo=pex3_resumo_dm)
+
+@pex3_app_dm.cli.command('importar-produtos')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--simular', is_flag=True, help='Apenas valida o arquivo, sem gravar.')
+def pex3_importar_produtos_cli_dm(arquivo, simular):
+    """Importa produtos de um CSV (flask --app estoque importar-produtos arquivo.csv)"""
+    with open(arquivo, 'r', encoding='utf-8-sig', newline='') as f:
+        pex3_resumo_dm = pex3_importar_produtos_dm(f, pex3_simular_dm=simular)
+    for pex3_linha_dm, pex3_erro_dm in pex3_resumo_dm['erros']:
+        click.echo(f"❌ Linha {pex3_linha_dm}: {pex3_erro_dm}" if pex3_linha_dm else f"❌ {pex3_erro_dm}")
+    if pex3_resumo_dm['invalidos'] > len(pex3_resumo_dm['erros']):
+        click.echo(f"   ... e mais {pex3_resumo_dm['invalidos'] - len(pex3_resumo_dm['erros'])} linha(s) inválida(s)")
+    click.echo(f"{'🔎 Simulação' if simular else '✅ Importação'}: {pex3_resumo_dm['inseridos']} novo(s), "
+               f"{pex3_resumo_dm['atualizados']} atualizado(s), {pex3_resumo_dm['invalidos']} inválido(s)")
+
+@pex3_app_dm.route('/produtos/editar/<pex3_codigo_barras_dm>', methods=['GET', 'POST'])
+def pex3_editar_produto_dm(pex3_codigo_barras_dm):
+    """Edita um produto existente"""
+    pex3_produto_dm = pex3_buscar_produto_por_codigo_dm(pex3_codigo_barras_dm)
+    
+    if not pex3_produto_dm:
+        flash('Produto não encontrado!', 'error')
+        return redirect(url_for('pex3_listar_produtos_dm'))
+    
+    if request.method == 'POST':
+        try:
+            pex3_preco_venda_dm = pex3_armazenamento_dm.pex3_centavos_dm(request.form['preco_venda'])
+            pex3_preco_compra_dm = pex3_armazenamento_dm.pex3_centavos_dm(request.form['preco_compra'])
+            pex3_estoque_minimo_dm = float(request.form.get('estoque_minimo') or pex3_armazenamento_dm.pex3_ESTOQUE_MINIMO_PADRAO_dm)
+        except ValueError:
+            flash(pex3_VALOR_INVALIDO_dm, 'error')
+            return redirect(url_for('pex3_editar_produto_dm', pex3_codigo_barras_dm=pex3_codigo_barras_dm))
+        pex3_alterar_produto_dm(
+            pex3_codigo_barras_dm,
+            nome=request.form['nome'].strip(),
+            preco_venda=pex3_preco_venda_dm,
+            preco_compra=pex3_preco_compra_dm,
+            estoque_minimo=pex3_estoque_minimo_dm
+        )
+        
+        flash('Produto atualizado com sucesso!', 'success')
+        return redirect(url_for('pex3_listar_produtos_dm'))
+    
+    return render_template('estoque/form_produto.html', produto=pex3_produto_dm, acao='Editar')
+
+@pex3_app_dm.route('/produtos/excluir/<pex3_codigo_barras_dm>', methods=['POST'])
+def pex3_excluir_produto_dm(pex3_codigo_barras_dm):
+    """Exclui um produto"""
+    pex3_remover_produto_dm(pex3_codigo_barras_dm)
+    
+    flash('Produto exluído com sucesso!', 'success')
+    return redirect(url_for('pex3_listar_produtos_dm'))
+
+# ============== ROTAS DE AJUSTE DE ESTOQUE ==============
+
+@pex3_app_dm.route('/ajuste-estoque', methods=['GET', 'POST'])
+def pex3_ajuste_estoque_dm():
+    """Ajuste/Correção de saldo do estoque"""
+    if request.method == 'POST':
+        pex3_codigo_barras_dm = request.form['codigo_barras'].strip()
+        pex3_quantidade_dm = float(request.form['quantidade'])
+        pex3_tipo_ajuste_dm = request.form['tipo_ajuste']  # 'entrada', 'saida', 'definir'
+        pex3_motivo_dm = request.form.get('motivo', '')
+        
+        pex3_produto_dm = pex3_buscar_produto_por_codigo_dm(pex3_codigo_barras_dm)
+        if not pex3_produto_dm:
+            flash('Produto não encontrado!', 'error')
+            return redirect(url_for('pex3_ajuste_estoque_dm'))
+        
+        pex3_saldo_anterior_dm = pex3_produto_dm['saldo']
+        
+        if pex3_tipo_ajuste_dm == 'entrada':
+            pex3_atualizar_saldo_produto_dm(pex3_codigo_barras_dm, pex3_quantidade_dm, 'adicionar')
+            pex3_novo_saldo_dm = pex3_saldo_anterior_dm + pex3_quantidade_dm
+        elif pex3_tipo_ajuste_dm == 'saida':
+            if pex3_quantidade_dm > pex3_saldo_anterior_dm:
+                flash('Quantidade de saída maior que o saldo disponível!', 'error')
+                return redirect(url_for('pex3_ajuste_estoque_dm'))
+            pex3_atualizar_saldo_produto_dm(pex3_codigo_barras_dm, pex3_quantidade_dm, 'subtrair')
+            pex3_novo_saldo_dm = pex3_saldo_anterior_dm - pex3_quantidade_dm
+        else:  # definir
+            pex3_atualizar_saldo_produto_dm(pex3_codigo_barras_dm, pex3_quantidade_dm, 'definir')
+            pex3_novo_saldo_dm = pex3_quantidade_dm
+        
+        # Registra o ajuste
+        pex3_ajuste_dm = {
+            'id': pex3_proximo_id_movimentacao_dm('ajustes'),
+            'data': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'codigo_barras': pex3_codigo_barras_dm,
+            'nome_produto': pex3_produto_dm['nome'],
+            'tipo_ajuste': pex3_tipo_ajuste_dm,
+            'quantidade': pex3_quantidade_dm,
+            'saldo_anterior': pex3_saldo_anterior_dm,
+            'saldo_novo': pex3_novo_saldo_dm,
+            'motivo': pex3_motivo_dm
+        }
+        
+        pex3_anexar_movimentacao_dm('ajustes', pex3_ajuste_dm)
+        
+        flash(f'Estoque ajustado com sucesso! Novo saldo: {pex3_novo_saldo_dm}', 'success')
+        return redirect(url_for('pex3_ajuste_estoque_dm'))
+    
+    return render_template('estoque/ajuste_estoque.html')
+
+# ============== ROTAS DE COMPRAS ==============
+
+@pex3_app_dm.route('/compras')
+def pex3_listar_compras_dm():
+    """Lista as compras realizadas, paginadas por cursor (mais recentes primeiro)"""
+    pex3_compras_dm, pex3_contexto_dm = pex3_ler_pagina_requisicao_dm('compras')
+    return render_template('estoque/compras.html', compras=pex3_compras_dm, **pex3_contexto_dm)
+
+@pex3_app_dm.route('/compras/nova', methods=['GET', 'POST'])
+def pex3_nova_compra_dm():
+    """Registra uma nova compra"""
+    if request.method == 'POST':
+        pex3_fornecedor_dm = request.form.get('fornecedor', '')
+        pex3_numero_nf_dm = request.form.get('numero_nf', '')
+        pex3_observacao_dm = request.form.get('observacao', '')
+        pex3_forma_pagamento_dm = request.form.get('forma_pagamento', 'A Definir')
+        try:
+            pex3_itens_dm = pex3_ler_itens_formulario_dm()
+        except ValueError:
+            flash(pex3_VALOR_INVALIDO_dm, 'error')
+            return redirect(url_for('pex3_nova_compra_dm'))
+        
+        pex3_compra_dm, pex3_erro_dm = pex3_registrar_compra_dm(
+            pex3_itens_dm,
+            pex3_fornecedor_dm=pex3_fornecedor_dm,
+            pex3_numero_nf_dm=pex3_numero_nf_dm,
+            pex3_forma_pagamento_dm=pex3_forma_pagamento_dm,
+            pex3_observacao_dm=pex3_observacao_dm
+        )
+        
+        if pex3_erro_dm:
+            flash(pex3_erro_dm, 'error')
+            return redirect(url_for('pex3_nova_compra_dm'))
+        
+        pex3_valor_total_dm = pex3_compra_dm['valor_total']
+        flash(f'Compra registrada com sucesso! Total: {pex3_armazenamento_dm.pex3_formatar_moeda_dm(pex3_valor_total_dm)}', 'success')
+        return redirect(url_for('pex3_listar_compras_dm'))
+    
+    return render_template('estoque/form_compra.html')
+
+@pex3_app_dm.route('/compras/detalhes/<int:pex3_compra_id_dm>')
+def pex3_detalhes_compra_dm(pex3_compra_id_dm):
+    """Mostra detalhes de uma compra"""
+    pex3_compra_dm = pex3_buscar_movimentacao_dm('compras', pex3_compra_id_dm)
+    
+    if not pex3_compra_dm:
+        flash('Compra não encontrada!', 'error')
+        return redirect(url_for('pex3_listar_compras_dm'))
+    
+    return render_template('estoque/detalhes_compra.html', compra=pex3_compra_dm)
+
+# ============== ROTAS DE VENDAS ==============
+
+@pex3_app_dm.route('/vendas')
+def pex3_listar_vendas_dm():
+    """Lista as vendas realizadas, paginadas por cursor (mais recentes primeiro)"""
+    pex3_vendas_dm, pex3_contexto_dm = pex3_ler_pagina_requisicao_dm('vendas')
+    return render_template('estoque/vendas.html', vendas=pex3_vendas_dm, **pex3_contexto_dm)
+
+@pex3_app_dm.route('/vendas/nova', methods=['GET', 'POST'])
+def pex3_nova_venda_dm():
+    """Registra uma nova venda"""
+    if request.method == 'POST':
+        pex3_cliente_dm = request.form.get('cliente', '')
+        pex3_observacao_dm = request.form.get('observacao', '')
+        pex3_forma_pagamento_dm = request.form.get('forma_pagamento', 'A Definir')
+        try:
+            pex3_desconto_dm = pex3_armazenamento_dm.pex3_centavos_dm(request.form.get('desconto') or 0)
+            pex3_itens_dm = pex3_ler_itens_formulario_dm()
+        except ValueError:
+            flash(pex3_VALOR_INVALIDO_dm, 'error')
+            return redirect(url_for('pex3_nova_venda_dm'))
+        
+        pex3_venda_dm, pex3_erro_dm = pex3_registrar_venda_dm(
+            pex3_itens_dm,
+            pex3_cliente_dm=pex3_cliente_dm,
+            pex3_desconto_dm=pex3_desconto_dm,
+            pex3_forma_pagamento_dm=pex3_forma_pagamento_dm,
+            pex3_observacao_dm=pex3_observacao_dm
+        )
+        
+        if pex3_erro_dm:
+            flash(pex3_erro_dm, 'error')
+            return redirect(url_for('pex3_nova_venda_dm'))
+        
+        pex3_valor_total_dm = pex3_venda_dm['valor_total']
+        flash(f'Venda registrada com sucesso! Total: {pex3_armazenamento_dm.pex3_formatar_moeda_dm(pex3_valor_total_dm)}', 'success')
+        return redirect(url_for('pex3_listar_vendas_dm'))
+    
+    return render_template('estoque/form_venda.html')
+
+@pex3_app_dm.route('/vendas/detalhes/<int:pex3_venda_id_dm>')
+def pex3_detalhes_venda_dm(pex3_venda_id_dm):
+    """Mostra detalhes de uma venda"""
+    pex3_venda_dm = pex3_buscar_movimentacao_dm('vendas', pex3_venda_id_dm)
+    
+    if not pex3_venda_dm:
+        flash('Venda não encontrada!', 'error')
+        return redirect(url_for('pex3_listar_vendas_dm'))
+    
+    return render_template('estoque/detalhes_venda.html', venda=pex3_venda_dm)
+
+# ============== ROTAS DE API (AJAX) ==============
+
+@pex3_app_dm.route('/api/produto/<pex3_codigo_barras_dm>')
+def pex3_api_buscar_produto_dm(pex3_codigo_barras_dm):
+    """API para buscar produto por código de barras"""
+    pex3_produto_dm = pex3_buscar_produto_por_codigo_dm(pex3_codigo_barras_dm)
+    if pex3_produto_dm:
+        return jsonify({
+            'success': True,
+            'produto': pex3_produto_dm
+        })
+    return jsonify({
+        'success': False,
+        'message': 'Produto não encontrado'
+    })
+
+@pex3_app_dm.route('/api/produtos/buscar')
+def pex3_api_buscar_produtos_dm():
+    """API para buscar produtos por nome ou código (resultados ordenados por relevância)"""
+    pex3_termo_dm = request.args.get('termo', '')
+    pex3_limite_dm = request.args.get('limite', pex3_LIMITE_BUSCA_dm, type=int)
+    pex3_limite_dm = max(1, min(pex3_limite_dm, pex3_LIMITE_BUSCA_MAXIMO_dm))
+    
+    if pex3_termo_dm.strip():
+        pex3_produtos_dm = pex3_buscar_produtos_dm(pex3_termo_dm, pex3_limite_dm)
+    else:
+        with pex3_catalogo_lock_dm:
+            pex3_produtos_dm = [pex3_p_dm.pex3_como_dict_dm() for pex3_p_dm in pex3_obter_catalogo_dm()['produtos'][:pex3_limite_dm]]
+    
+    return jsonify({
+        'success': True,
+        'produtos': pex3_produtos_dm
+    })
+
+@pex3_app_dm.route('/api/estoque/alertas')
+def pex3_api_alertas_estoque_dm():
+    """API com os produtos abaixo do estoque mínimo.
+    Com ?desde=<versão> (o campo 'versao' de uma resposta anterior), retorna só o que
+    mudou depois dela: os produtos que entraram ou continuam em alerta (alertas) e os
+    que saíram dele (removidos). Uma versão de antes de reiniciar o servidor (ou de
+    outro processo) recebe a lista completa."""
+    pex3_versao_dm, pex3_completo_dm, pex3_alertas_lista_dm, pex3_removidos_dm = pex3_alertas_desde_dm(
+        request.args.get('desde'))
+    return jsonify({
+        'success': True,
+        'versao': pex3_versao_dm,
+        'completo': pex3_completo_dm,
+        'alertas': pex3_alertas_lista_dm,
+        'removidos': pex3_removidos_dm
+    })
+
+# ============== RELATÓRIOS ==============
+
+@pex3_app_dm.route('/relatorios')
+def pex3_relatorios_dm():
+    """Página de relatórios"""
+    return render_template('estoque/relatorios.html')
+
+@pex3_app_dm.route('/relatorios/movimentacao')
+def pex3_relatorio_movimentacao_dm():
+    """Relatório de movimentação de estoque"""
+    pex3_db_dm = pex3_load_estoque_db_dm()
+    pex3_data_inicio_dm = request.args.get('data_inicio', '')
+    pex3_data_fim_dm = request.args.get('data_fim', '')
+    
+    pex3_vendas_dm = pex3_db_dm.get('vendas', [])
+    pex3_compras_dm = pex3_db_dm.get('compras', [])
+    pex3_ajustes_dm = pex3_db_dm.get('ajustes', [])
+    
+    if pex3_data_inicio_dm:
+        pex3_vendas_dm = [pex3_v_dm for pex3_v_dm in pex3_vendas_dm if pex3_v_dm['data'][:10] >= pex3_data_inicio_dm]
+        pex3_compras_dm = [pex3_c_dm for pex3_c_dm in pex3_compras_dm if pex3_c_dm['data'][:10] >= pex3_data_inicio_dm]
+        pex3_ajustes_dm = [pex3_a_dm for pex3_a_dm in pex3_ajustes_dm if pex3_a_dm['data'][:10] >= pex3_data_inicio_dm]
+    
+    if pex3_data_fim_dm:
+        pex3_vendas_dm = [pex3_v_dm for pex3_v_dm in pex3_vendas_dm if pex3_v_dm['data'][:10] <= pex3_data_fim_dm]
+        pex3_compras_dm = [pex3_c_dm for pex3_c_dm in pex3_compras_dm if pex3_c_dm['data'][:10] <= pex3_data_fim_dm]
+        pex3_ajustes_dm = [pex3_a_dm for pex3_a_dm in pex3_ajustes_dm if pex3_a_dm['data'][:10] <= pex3_data_fim_dm]
+    
+    pex3_total_vendas_dm = sum(pex3_v_dm['valor_total'] for pex3_v_dm in pex3_vendas_dm)
+    pex3_total_compras_dm = sum(pex3_c_dm['valor_total'] for pex3_c_dm in pex3_compras_dm)
+    pex3_total_lucro_dm = sum(pex3_v_dm.get('lucro', 0) for pex3_v_dm in pex3_vendas_dm)
+    
+    return render_template('estoque/relatorio_movimentacao.html',
+                          vendas=pex3_vendas_dm,
+                          compras=pex3_compras_dm,
+                          ajustes=pex3_ajustes_dm,
+                          total_vendas=pex3_total_vendas_dm,
+                          total_compras=pex3_total_compras_dm,
+                          total_lucro=pex3_total_lucro_dm,
+                          data_inicio=pex3_data_inicio_dm,
+                          data_fim=pex3_data_fim_dm)
+
+# ============== EXPORTAÇÃO ==============
+# No CSV, vendas e compras saem com uma linha por item (repetindo os dados do
+# cabeçalho da movimentação) e com os valores em reais; no NDJSON, cada movimentação
+# é uma linha completa, como gravada (valores em centavos).
+
+pex3_CAMPOS_ITEM_EXPORTACAO_dm = ['codigo_barras', 'nome_produto', 'quantidade', 'preco_unitario', 'subtotal']
+pex3_MONETARIOS_EXPORTACAO_dm = (pex3_armazenamento_dm.pex3_CAMPOS_MONETARIOS_dm['vendas']
+                                 + pex3_armazenamento_dm.pex3_CAMPOS_MONETARIOS_ITEM_dm)
+pex3_CAMPOS_EXPORTACAO_dm = {
+    'vendas': ['id', 'data', 'cliente', 'forma_pagamento', 'valor_bruto', 'desconto', 'valor_total', 'custo_total',
+               'lucro', 'observacao'] + pex3_CAMPOS_ITEM_EXPORTACAO_dm,
+    'compras': ['id', 'data', 'fornecedor', 'numero_nf', 'forma_pagamento', 'valor_total',
+                'observacao'] + pex3_CAMPOS_ITEM_EXPORTACAO_dm,
+    'ajustes': ['id', 'data', 'codigo_barras', 'nome_produto', 'tipo_ajuste', 'quantidade',
+                'saldo_anterior', 'saldo_novo', 'motivo']
+}
+
+def pex3_linhas_por_item_dm(pex3_registro_dm):
+    """Desdobra uma venda ou compra em uma linha por item"""
+    pex3_itens_dm = pex3_registro_dm.get('itens') or [{}]
+    return ({**pex3_registro_dm, **pex3_item_dm} for pex3_item_dm in pex3_itens_dm)
+
+def pex3_iterar_movimentacoes_dm(pex3_colecao_dm, pex3_data_inicio_dm, pex3_data_fim_dm):
+    """Registros da coleção no período em ordem crescente, lidos do índice em blocos"""
+    def pex3_obter_faixa_dm():
+        pex3_indice_dm = pex3_obter_indice_movimentacoes_dm(pex3_colecao_dm)
+        return (pex3_indice_dm['chaves'], pex3_indice_dm['registros'],
+                *pex3_faixa_movimentacoes_dm(pex3_indice_dm, pex3_data_inicio_dm, pex3_data_fim_dm))
+    return pex3_armazenamento_dm.pex3_iterar_em_blocos_dm(pex3_movimentacoes_lock_dm, pex3_obter_faixa_dm)
+
+@pex3_app_dm.route('/exportar/<pex3_colecao_dm>.<pex3_formato_dm>')
+def pex3_exportar_movimentacoes_dm(pex3_colecao_dm, pex3_formato_dm):
+    """Exporta vendas, compras ou ajustes do período (data_inicio/data_fim) em CSV ou NDJSON, em fluxo"""
+    if (pex3_colecao_dm not in pex3_CAMPOS_EXPORTACAO_dm
+            or pex3_formato_dm not in pex3_armazenamento_dm.pex3_FORMATOS_EXPORTACAO_dm):
+        abort(404)
+    pex3_registros_dm = pex3_iterar_movimentacoes_dm(pex3_colecao_dm, request.args.get('data_inicio', ''),
+                                                     request.args.get('data_fim', ''))
+    pex3_fluxo_dm = pex3_armazenamento_dm.pex3_fluxo_exportacao_dm(
+        pex3_formato_dm, pex3_registros_dm, pex3_CAMPOS_EXPORTACAO_dm[pex3_colecao_dm],
+        pex3_linhas_por_item_dm if pex3_colecao_dm != 'ajustes' else None, pex3_MONETARIOS_EXPORTACAO_dm)
+    return Response(stream_with_context(pex3_fluxo_dm),
+                    mimetype=pex3_armazenamento_dm.pex3_FORMATOS_EXPORTACAO_dm[pex3_formato_dm],
+                    headers={'Content-Disposition': f'attachment; filename={pex3_colecao_dm}.{pex3_formato_dm}'})
+
+# ============== INICIALIZAÇÃO ==============
+
+def pex3_init_app_dm():
+    """Inicializa os arquivos necessários"""
+    pex3_init_produtos_csv_dm()
+    pex3_init_estoque_db_dm()
+    pex3_preparar_dados_dm()
+    
+    # Verifica e adiciona categorias financeiras se necessário
+    try:
+        if not pex3_armazenamento_dm.pex3_existe_dm('financeiro', pex3_FINANCEIRO_DB_dm):
+            return
+        pex3_db_dm = pex3_load_financeiro_db_dm()
+        pex3_categorias_existentes_dm = [pex3_c_dm['nome'] for pex3_c_dm in pex3_db_dm.get('categories', [])]
+        
+        pex3_novas_categorias_dm = [
+            {"nome": "Compra de Produtos", "tipo": "despesa"},
+            {"nome": "Venda de Produtos", "tipo": "receita"}
+        ]
+        
+        for pex3_cat_dm in pex3_novas_categorias_dm:
+            if pex3_cat_dm['nome'] not in pex3_categorias_existentes_dm:
+                pex3_armazenamento_dm.pex3_anexar_registro_dm('financeiro', pex3_FINANCEIRO_DB_dm, 'categories', pex3_cat_dm)
+    except:
+        pass  # Se o arquivo financeiro não existir, ignora
+
+if __name__ == '__main__':
+    pex3_init_app_dm()
+    pex3_app_dm.run(debug=True, port=5001)
@@ -1,162 +1,738 @@
-from flask import Flask, render_template, request, redirect, url_for
-import json
-import os
-from datetime import datetime
-from collections import defaultdict
-
-pex3_app_dm = Flask(__name__)
-pex3_DB_FILE_dm = 'database.json'
-
-# Inicialização do Banco de Dados JSON
-def pex3_init_db_dm():
-    if not os.path.exists(pex3_DB_FILE_dm):
-        pex3_data_dm = {
-            "transactions": [],
-            "categories": [
-                {"nome": "Salário", "tipo": "receita"},
-                {"nome": "Venda", "tipo": "receita"},
-                {"nome": "Alimentação", "tipo": "despesa"},
-                {"nome": "Limpeza", "tipo": "despesa"},
-                {"nome": "Aluguel", "tipo": "despesa"},
-                {"nome": "Diversos", "tipo": "ambos"}
-            ],
-            "payment_methods": ["PIX", "Cartão", "Dinheiro", "Boleto", "Outros"]
-        }
-        with open(pex3_DB_FILE_dm, 'w', encoding='utf-8') as f:
-            json.dump(pex3_data_dm, f, indent=4, ensure_ascii=False)
-
-def pex3_load_db_dm():
-    with open(pex3_DB_FILE_dm, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def pex3_save_db_dm(pex3_data_dm):
-    with open(pex3_DB_FILE_dm, 'w', encoding='utf-8') as f:
-        json.dump(pex3_data_dm, f, indent=4, ensure_ascii=False)
-
-def pex3_filtrar_por_data_dm(pex3_transacoes_dm, pex3_data_inicio_dm, pex3_data_fim_dm):
-    if not pex3_data_inicio_dm and not pex3_data_fim_dm:
-        return pex3_transacoes_dm
-    
-    pex3_filtradas_dm = []
-    for pex3_t_dm in pex3_transacoes_dm:
-        pex3_data_t_dm = pex3_t_dm['data_gasto'] # Formato YYYY-MM-DD
-        if pex3_data_inicio_dm and pex3_data_t_dm < pex3_data_inicio_dm:
-            continue
-        if pex3_data_fim_dm and pex3_data_t_dm > pex3_data_fim_dm:
-            continue
-        pex3_filtradas_dm.append(pex3_t_dm)
-    return pex3_filtradas_dm
-
-@pex3_app_dm.route('/')
-def pex3_index_dm():
-    pex3_db_dm = pex3_load_db_dm()
-    pex3_data_inicio_dm = request.args.get('data_inicio', '')
-    pex3_data_fim_dm = request.args.get('data_fim', '')
-    
-    pex3_transacoes_dm = pex3_filtrar_por_data_dm(pex3_db_dm['transactions'], pex3_data_inicio_dm, pex3_data_fim_dm)
-    
-    pex3_receitas_dm = sum(pex3_t_dm['valor'] for pex3_t_dm in pex3_transacoes_dm if pex3_t_dm['tipo'] == 'receber')
-    pex3_despesas_dm = sum(pex3_t_dm['valor'] for pex3_t_dm in pex3_transacoes_dm if pex3_t_dm['tipo'] == 'pagar')
-    
-    return render_template('index.html', receitas=pex3_receitas_dm, despesas=pex3_despesas_dm, 
-                           saldo=pex3_receitas_dm-pex3_despesas_dm, data_inicio=pex3_data_inicio_dm, data_fim=pex3_data_fim_dm)
-
-@pex3_app_dm.route('/lancamentos')
-def pex3_lancamentos_dm():
-    pex3_db_dm = pex3_load_db_dm()
-    pex3_data_inicio_dm = request.args.get('data_inicio', '')
-    pex3_data_fim_dm = request.args.get('data_fim', '')
-    
-    pex3_transacoes_dm = pex3_filtrar_por_data_dm(pex3_db_dm['transactions'], pex3_data_inicio_dm, pex3_data_fim_dm)
-    # Ordenar por data decrescente
-    pex3_transacoes_dm.sort(key=lambda x: x['data_gasto'], reverse=True)
-    
-    return render_template('lancamentos.html', transactions=pex3_transacoes_dm, 
-                           data_inicio=pex3_data_inicio_dm, data_fim=pex3_data_fim_dm)
-
-@pex3_app_dm.route('/cadastrar/<pex3_tipo_dm>', methods=['GET', 'POST'])
-def pex3_cadastrar_dm(pex3_tipo_dm):
-    pex3_db_dm = pex3_load_db_dm()
-    if request.method == 'POST':
-        pex3_nova_transacao_dm = {
-            "id": len(pex3_db_dm['transactions']) + 1,
-            "tipo": pex3_tipo_dm,
-            "data_gasto": request.form['data_gasto'],
-            "data_criacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "valor": float(request.form['valor']),
-            "categoria": request.form['categoria'],
-            "forma_pagamento": request.form.get('forma_pagamento', 'N/A'),
-            "descricao": request.form['descricao']
-        }
-        pex3_db_dm['transactions'].append(pex3_nova_transacao_dm)
-        pex3_save_db_dm(pex3_db_dm)
-        return redirect(url_for('pex3_lancamentos_dm'))
-    
-    if pex3_tipo_dm == 'receber':
-        pex3_categorias_dm = [pex3_c_dm['nome'] for pex3_c_dm in pex3_db_dm['categories'] if pex3_c_dm['tipo'] in ['receita', 'ambos']]
-    else:
-        pex3_categorias_dm = [pex3_c_dm['nome'] for pex3_c_dm in pex3_db_dm['categories'] if pex3_c_dm['tipo'] in ['despesa', 'ambos']]
-        
-    return render_template('form_lancamento.html', tipo=pex3_tipo_dm, categorias=pex3_categorias_dm, metodos=pex3_db_dm['payment_methods'])
-
-@pex3_app_dm.route('/categorias', methods=['GET', 'POST'])
-def pex3_categorias_dm():
-    pex3_db_dm = pex3_load_db_dm()
-    if request.method == 'POST':
-        pex3_db_dm['categories'].append({"nome": request.form['nome'], "tipo": request.form['tipo']})
-        pex3_save_db_dm(pex3_db_dm)
-        return redirect(url_for('pex3_categorias_dm'))
-    return render_template('categorias.html', categorias=pex3_db_dm['categories'])
-
-@pex3_app_dm.route('/analytics')
-def pex3_analytics_dm():
-    pex3_db_dm = pex3_load_db_dm()
-    pex3_data_inicio_dm = request.args.get('data_inicio', '')
-    pex3_data_fim_dm = request.args.get('data_fim', '')
-    
-    pex3_transactions_dm = pex3_filtrar_por_data_dm(pex3_db_dm['transactions'], pex3_data_inicio_dm, pex3_data_fim_dm)
-    pex3_transactions_dm.sort(key=lambda x: x['data_gasto'])
-
-    pex3_gastos_por_categoria_dm = defaultdict(float)
-    pex3_mensal_rec_desp_dm = defaultdict(lambda: {"receita": 0, "despesa": 0})
-    pex3_evolucao_datas_dm = []
-    pex3_evolucao_saldo_dm = []
-    pex3_saldo_acumulado_dm = 0
-    pex3_pagamentos_receita_data_dm = defaultdict(float)
-    pex3_mensal_categoria_dm = defaultdict(lambda: defaultdict(float))
-
-    for pex3_t_dm in pex3_transactions_dm:
-        pex3_data_dt_dm = pex3_t_dm['data_gasto']
-        pex3_mes_ano_dm = pex3_data_dt_dm[:7]
-        pex3_valor_dm = pex3_t_dm['valor']
-        
-        if pex3_t_dm['tipo'] == 'receber':
-            pex3_saldo_acumulado_dm += pex3_valor_dm
-            pex3_mensal_rec_desp_dm[pex3_mes_ano_dm]["receita"] += pex3_valor_dm
-            pex3_pagamentos_receita_data_dm[pex3_t_dm['forma_pagamento']] += pex3_valor_dm
-        else:
-            pex3_saldo_acumulado_dm -= pex3_valor_dm
-            pex3_mensal_rec_desp_dm[pex3_mes_ano_dm]["despesa"] += pex3_valor_dm
-            pex3_gastos_por_categoria_dm[pex3_t_dm['categoria']] += pex3_valor_dm
-            pex3_mensal_categoria_dm[pex3_mes_ano_dm][pex3_t_dm['categoria']] += pex3_valor_dm
-        
-        pex3_evolucao_datas_dm.append(pex3_data_dt_dm)
-        pex3_evolucao_saldo_dm.append(pex3_saldo_acumulado_dm)
-
-    pex3_meses_ordenados_dm = sorted(pex3_mensal_rec_desp_dm.keys())
-    pex3_todas_categorias_gastos_dm = list(pex3_gastos_por_categoria_dm.keys())
-    pex3_dados_mensais_cat_dm = {pex3_cat_dm: [pex3_mensal_categoria_dm[pex3_mes_dm][pex3_cat_dm] for pex3_mes_dm in pex3_meses_ordenados_dm] for pex3_cat_dm in pex3_todas_categorias_gastos_dm}
-
-    return render_template('analytics.html', 
-        cat_labels=list(pex3_gastos_por_categoria_dm.keys()), cat_values=list(pex3_gastos_por_categoria_dm.values()),
-        pag_labels=list(pex3_pagamentos_receita_data_dm.keys()), pag_values=list(pex3_pagamentos_receita_data_dm.values()),
-        meses_labels=pex3_meses_ordenados_dm, 
-        mensal_receitas=[pex3_mensal_rec_desp_dm[pex3_m_dm]["receita"] for pex3_m_dm in pex3_meses_ordenados_dm],
-        mensal_despesas=[pex3_mensal_rec_desp_dm[pex3_m_dm]["despesa"] for pex3_m_dm in pex3_meses_ordenados_dm],
-        evolucao_datas=pex3_evolucao_datas_dm, evolucao_saldo=pex3_evolucao_saldo_dm,
-        dados_mensais_cat=pex3_dados_mensais_cat_dm, categorias_lista=pex3_todas_categorias_gastos_dm,
-        data_inicio=pex3_data_inicio_dm, data_fim=pex3_data_fim_dm)
-
-if __name__ == '__main__':
-    pex3_init_db_dm()
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
+from datetime import datetime, date
+from collections import Counter, defaultdict
+from bisect import bisect_left, bisect_right, insort
+from itertools import count
+from operator import attrgetter
+import click
+import csv
+import hashlib
+import io
+import threading
+
+import armazenamento as pex3_armazenamento_dm
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional (e fica fora do executável gerado pelo PyInstaller)
+    np = None
+
+# Os endpoints usam os nomes referenciados pelos templates (pex3_financeiro_*_dm),
+# o que permite ao PEX III.py servir esta mesma aplicação
+pex3_app_dm = Flask(__name__)
+pex3_app_dm.secret_key = 'financeiro_secret_key_2025'
+pex3_app_dm.add_template_filter(pex3_armazenamento_dm.pex3_formatar_moeda_dm, 'moeda')
+pex3_DB_FILE_dm = 'database.json'
+pex3_MAX_PONTOS_SALDO_dm = 500  # pontos padrão do gráfico de evolução do saldo
+pex3_LIMITE_PONTOS_SALDO_dm = 2000  # máximo aceito no parâmetro ?pontos=
+pex3_LOTE_INCREMENTAL_dm = 64  # a partir de quantas transações novas o índice as incorpora em lote
+
+# Inicialização do Banco de Dados JSON
+def pex3_init_db_dm():
+    if not pex3_armazenamento_dm.pex3_existe_dm('financeiro', pex3_DB_FILE_dm):
+        pex3_data_dm = {
+            "transactions": [],
+            "categories": [
+                {"nome": "Salário", "tipo": "receita"},
+                {"nome": "Venda", "tipo": "receita"},
+                {"nome": "Alimentação", "tipo": "despesa"},
+                {"nome": "Limpeza", "tipo": "despesa"},
+                {"nome": "Aluguel", "tipo": "despesa"},
+                {"nome": "Diversos", "tipo": "ambos"}
+            ],
+            "payment_methods": ["PIX", "Cartão", "Dinheiro", "Boleto", "Outros"]
+        }
+        pex3_save_db_dm(pex3_data_dm)
+    # Journal pendente de outro backend e valores gravados em reais por versões anteriores (uma única vez)
+    pex3_armazenamento_dm.pex3_preparar_dm('financeiro', pex3_DB_FILE_dm)
+
+def pex3_load_db_dm():
+    return pex3_armazenamento_dm.pex3_carregar_documento_dm('financeiro', pex3_DB_FILE_dm)
+
+def pex3_save_db_dm(pex3_data_dm):
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('financeiro', pex3_DB_FILE_dm, pex3_data_dm)
+
+def pex3_anexar_dm(pex3_colecao_dm, pex3_registro_dm, pex3_gerar_id_dm=False):
+    return pex3_armazenamento_dm.pex3_anexar_registro_dm('financeiro', pex3_DB_FILE_dm, pex3_colecao_dm, pex3_registro_dm, pex3_gerar_id_dm)
+
+# ============== ÍNDICE DE TRANSAÇÕES POR DATA ==============
+# As transações ficam em memória ordenadas por (data_gasto, id). As novas, gravadas
+# por este processo ou pelo Estoque, são lidas de forma incremental e inseridas com
+# bisect; filtrar um período custa O(log N + k) e o resultado já sai ordenado.
+# Um lote grande (a partir de pex3_LOTE_INCREMENTAL_dm) é intercalado de uma vez.
+# Cada transação é um registro compacto (armazenamento.pex3_Transacao_dm): os laços
+# abaixo leem os campos como atributos, sem passar pelo acesso por chave.
+
+def pex3_indice_vazio_dm():
+    return {'caminho': None, 'marcador': None, 'chaves': [], 'transacoes': [],
+            'dias': {}, 'meses': {}, 'lista_dias': [], 'lista_meses': [],
+            'prefixo': [], 'prefixo_valido': 0}
+
+pex3_transacoes_lock_dm = threading.RLock()
+pex3_indice_transacoes_dm = pex3_indice_vazio_dm()
+
+def pex3_chave_transacao_dm(pex3_t_dm):
+    return (pex3_t_dm.data_gasto, getattr(pex3_t_dm, 'id', 0))
+
+def pex3_obter_indice_transacoes_dm():
+    """Incorpora ao índice as transações gravadas desde a última leitura"""
+    with pex3_transacoes_lock_dm:
+        pex3_indice_dm = pex3_indice_transacoes_dm
+        if pex3_indice_dm['caminho'] != pex3_DB_FILE_dm:
+            pex3_init_db_dm()
+            pex3_indice_dm.update(caminho=pex3_DB_FILE_dm, marcador=None)
+        pex3_novas_dm, pex3_marcador_dm, pex3_completo_dm = pex3_armazenamento_dm.pex3_ler_registros_desde_dm(
+            'financeiro', pex3_DB_FILE_dm, 'transactions', pex3_indice_dm['marcador'])
+        if pex3_completo_dm:
+            pex3_indice_dm['transacoes'] = sorted(pex3_novas_dm, key=pex3_chave_transacao_dm)
+            pex3_indice_dm['chaves'] = [pex3_chave_transacao_dm(pex3_t_dm) for pex3_t_dm in pex3_indice_dm['transacoes']]
+            pex3_construir_baldes_dm(pex3_indice_dm)
+        elif len(pex3_novas_dm) >= pex3_LOTE_INCREMENTAL_dm:
+            pex3_incorporar_lote_dm(pex3_indice_dm, pex3_novas_dm)
+        else:
+            for pex3_t_dm in pex3_novas_dm:
+                pex3_incorporar_transacao_dm(pex3_indice_dm, pex3_t_dm)
+        pex3_indice_dm['marcador'] = pex3_marcador_dm
+        return pex3_indice_dm
+
+def pex3_incorporar_transacao_dm(pex3_indice_dm, pex3_t_dm):
+    """Insere uma transação na sua posição (bisect) e soma nos baldes"""
+    pex3_chave_dm = pex3_chave_transacao_dm(pex3_t_dm)
+    pex3_pos_dm = bisect_right(pex3_indice_dm['chaves'], pex3_chave_dm)
+    pex3_indice_dm['chaves'].insert(pex3_pos_dm, pex3_chave_dm)
+    pex3_indice_dm['transacoes'].insert(pex3_pos_dm, pex3_t_dm)
+    pex3_acumular_transacao_dm(pex3_indice_dm, pex3_t_dm)
+
+def pex3_incorporar_lote_dm(pex3_indice_dm, pex3_novas_dm, pex3_usar_numpy_dm=None):
+    """Incorpora um lote de transações novas (importação de extrato, gravações de
+    outro processo): uma intercalação com as listas ordenadas, em vez de uma inserção
+    O(N) por transação, e a soma por grupo do motor colunar nos baldes."""
+    pex3_novas_dm = sorted(pex3_novas_dm, key=pex3_chave_transacao_dm)
+    pex3_chaves_novas_dm = [pex3_chave_transacao_dm(pex3_t_dm) for pex3_t_dm in pex3_novas_dm]
+    pex3_chaves_dm, pex3_transacoes_dm = pex3_indice_dm['chaves'], pex3_indice_dm['transacoes']
+    if not pex3_chaves_dm or pex3_chaves_novas_dm[0] >= pex3_chaves_dm[-1]:
+        # Caso comum: o lote inteiro é posterior ao que já está no índice
+        pex3_chaves_dm.extend(pex3_chaves_novas_dm)
+        pex3_transacoes_dm.extend(pex3_novas_dm)
+    else:
+        pex3_res_chaves_dm, pex3_res_transacoes_dm = [], []
+        pex3_anterior_dm = 0
+        for pex3_chave_dm, pex3_t_dm in zip(pex3_chaves_novas_dm, pex3_novas_dm):
+            pex3_pos_dm = bisect_right(pex3_chaves_dm, pex3_chave_dm, pex3_anterior_dm)
+            pex3_res_chaves_dm.extend(pex3_chaves_dm[pex3_anterior_dm:pex3_pos_dm])
+            pex3_res_transacoes_dm.extend(pex3_transacoes_dm[pex3_anterior_dm:pex3_pos_dm])
+            pex3_res_chaves_dm.append(pex3_chave_dm)
+            pex3_res_transacoes_dm.append(pex3_t_dm)
+            pex3_anterior_dm = pex3_pos_dm
+        pex3_res_chaves_dm.extend(pex3_chaves_dm[pex3_anterior_dm:])
+        pex3_res_transacoes_dm.extend(pex3_transacoes_dm[pex3_anterior_dm:])
+        pex3_indice_dm.update(chaves=pex3_res_chaves_dm, transacoes=pex3_res_transacoes_dm)
+    pex3_somar_transacoes_dm(pex3_indice_dm, pex3_novas_dm, pex3_usar_numpy_dm)
+
+# ============== AGREGADOS POR DIA E POR MÊS ==============
+# Cada transação indexada soma seu valor nos baldes do seu dia e do seu mês
+# (receita/despesa, despesa por categoria, receita por forma de pagamento), em centavos.
+# Um período é respondido somando baldes: meses inteiros pelo balde do mês e
+# as pontas do período pelos baldes diários, sem percorrer as transações.
+
+def pex3_novo_balde_dm():
+    return {'receita': 0, 'despesa': 0, 'despesa_categoria': defaultdict(int), 'receita_pagamento': defaultdict(int)}
+
+def pex3_somar_balde_dm(pex3_destino_dm, pex3_balde_dm):
+    pex3_destino_dm['receita'] += pex3_balde_dm['receita']
+    pex3_destino_dm['despesa'] += pex3_balde_dm['despesa']
+    for pex3_cat_dm, pex3_valor_dm in pex3_balde_dm['despesa_categoria'].items():
+        pex3_destino_dm['despesa_categoria'][pex3_cat_dm] += pex3_valor_dm
+    for pex3_forma_dm, pex3_valor_dm in pex3_balde_dm['receita_pagamento'].items():
+        pex3_destino_dm['receita_pagamento'][pex3_forma_dm] += pex3_valor_dm
+
+def pex3_acumular_transacao_dm(pex3_indice_dm, pex3_t_dm):
+    """Soma a transação nos baldes do dia e do mês (criando-os na ordem cronológica)"""
+    pex3_dia_dm = pex3_t_dm.data_gasto[:10]
+    for pex3_chave_dm, pex3_baldes_dm, pex3_lista_dm in ((pex3_dia_dm, pex3_indice_dm['dias'], pex3_indice_dm['lista_dias']),
+                                                         (pex3_dia_dm[:7], pex3_indice_dm['meses'], pex3_indice_dm['lista_meses'])):
+        pex3_balde_dm = pex3_baldes_dm.get(pex3_chave_dm)
+        if pex3_balde_dm is None:
+            pex3_balde_dm = pex3_baldes_dm[pex3_chave_dm] = pex3_novo_balde_dm()
+            pex3_lista_dm.insert(bisect_left(pex3_lista_dm, pex3_chave_dm), pex3_chave_dm)
+        if pex3_t_dm.tipo == 'receber':
+            pex3_balde_dm['receita'] += pex3_t_dm.valor
+            pex3_balde_dm['receita_pagamento'][pex3_t_dm.forma_pagamento] += pex3_t_dm.valor
+        else:
+            pex3_balde_dm['despesa'] += pex3_t_dm.valor
+            pex3_balde_dm['despesa_categoria'][pex3_t_dm.categoria] += pex3_t_dm.valor
+    # O saldo acumulado deixa de valer a partir deste dia (em geral, o último)
+    pex3_pos_dm = bisect_left(pex3_indice_dm['lista_dias'], pex3_dia_dm)
+    pex3_indice_dm['prefixo_valido'] = min(pex3_indice_dm['prefixo_valido'], pex3_pos_dm)
+
+def pex3_faixa_dias_dm(pex3_indice_dm, pex3_data_inicio_dm, pex3_data_fim_dm):
+    """Posições (início, fim) em lista_dias dos dias com movimento dentro do período"""
+    pex3_lista_dm = pex3_indice_dm['lista_dias']
+    pex3_inicio_dm = bisect_left(pex3_lista_dm, pex3_data_inicio_dm) if pex3_data_inicio_dm else 0
+    pex3_fim_dm = bisect_right(pex3_lista_dm, pex3_data_fim_dm) if pex3_data_fim_dm else len(pex3_lista_dm)
+    return pex3_inicio_dm, pex3_fim_dm
+
+def pex3_construir_baldes_dm(pex3_indice_dm, pex3_usar_numpy_dm=None):
+    """Refaz todos os baldes a partir de indice['transacoes'] (já ordenadas por data).
+    Usa o motor colunar com NumPy quando disponível; senão, soma transação a transação."""
+    pex3_indice_dm.update(dias={}, meses={}, lista_dias=[], lista_meses=[], prefixo=[], prefixo_valido=0)
+    pex3_somar_transacoes_dm(pex3_indice_dm, pex3_indice_dm['transacoes'], pex3_usar_numpy_dm)
+
+def pex3_somar_transacoes_dm(pex3_indice_dm, pex3_transacoes_dm, pex3_usar_numpy_dm=None):
+    """Soma as transações nos baldes: pelos grupos do motor colunar quando há NumPy,
+    senão transação a transação"""
+    if pex3_usar_numpy_dm is None:
+        pex3_usar_numpy_dm = np is not None
+    if pex3_usar_numpy_dm and pex3_transacoes_dm:
+        try:
+            pex3_somas_dm = pex3_somas_por_grupo_dm(pex3_transacoes_dm)
+        except (TypeError, ValueError):
+            # Dados fora do formato esperado (ex.: valor não numérico): soma transação a transação
+            pex3_somas_dm = None
+        if pex3_somas_dm is not None:
+            pex3_somar_grupos_dm(pex3_indice_dm, pex3_somas_dm)
+            return
+    for pex3_t_dm in pex3_transacoes_dm:
+        pex3_acumular_transacao_dm(pex3_indice_dm, pex3_t_dm)
+
+def pex3_dias_do_periodo_dm(pex3_indice_dm, pex3_data_inicio_dm, pex3_data_fim_dm):
+    """Dias com movimento dentro do período, em ordem crescente"""
+    pex3_inicio_dm, pex3_fim_dm = pex3_faixa_dias_dm(pex3_indice_dm, pex3_data_inicio_dm, pex3_data_fim_dm)
+    return pex3_indice_dm['lista_dias'][pex3_inicio_dm:pex3_fim_dm]
+
+def pex3_agregar_periodo_dm(pex3_data_inicio_dm='', pex3_data_fim_dm=''):
+    """Totais do período somando baldes: total geral, um balde por mês e o saldo acumulado por dia"""
+    with pex3_transacoes_lock_dm:
+        pex3_indice_dm = pex3_obter_indice_transacoes_dm()
+        pex3_total_dm = pex3_novo_balde_dm()
+        pex3_meses_dm = {}
+        pex3_lista_meses_dm = pex3_indice_dm['lista_meses']
+        pex3_inicio_dm = bisect_left(pex3_lista_meses_dm, pex3_data_inicio_dm[:7]) if pex3_data_inicio_dm else 0
+        pex3_fim_dm = bisect_right(pex3_lista_meses_dm, pex3_data_fim_dm[:7]) if pex3_data_fim_dm else len(pex3_lista_meses_dm)
+        for pex3_mes_dm in pex3_lista_meses_dm[pex3_inicio_dm:pex3_fim_dm]:
+            pex3_mes_inteiro_dm = ((not pex3_data_inicio_dm or pex3_data_inicio_dm <= pex3_mes_dm + '-01') and
+                                   (not pex3_data_fim_dm or pex3_data_fim_dm >= pex3_mes_dm + '-31'))
+            # Cópia, para que o resultado não mude com transações novas
+            pex3_balde_mes_dm = pex3_novo_balde_dm()
+            if pex3_mes_inteiro_dm:
+                pex3_somar_balde_dm(pex3_balde_mes_dm, pex3_indice_dm['meses'][pex3_mes_dm])
+            else:
+                # Mês nas pontas do período: soma só os dias que estão dentro dele
+                pex3_dias_dm = pex3_dias_do_periodo_dm(pex3_indice_dm, max(pex3_data_inicio_dm, pex3_mes_dm + '-01'),
+                                                       min(pex3_data_fim_dm or '9999', pex3_mes_dm + '-31'))
+                if not pex3_dias_dm:
+                    continue
+                for pex3_dia_dm in pex3_dias_dm:
+                    pex3_somar_balde_dm(pex3_balde_mes_dm, pex3_indice_dm['dias'][pex3_dia_dm])
+            pex3_meses_dm[pex3_mes_dm] = pex3_balde_mes_dm
+            pex3_somar_balde_dm(pex3_total_dm, pex3_balde_mes_dm)
+        
+        return {'total': pex3_total_dm, 'meses': pex3_meses_dm,
+                'evolucao': pex3_serie_saldo_dm(pex3_data_inicio_dm, pex3_data_fim_dm)}
+
+# ============== MOTOR COLUNAR (NUMPY OPCIONAL) ==============
+# As transações viram duas colunas: o código do grupo (dia, tipo, categoria,
+# forma de pagamento) e o valor em centavos. A soma por grupo sai de um único
+# np.bincount e só os grupos distintos (bem menos que as transações) são percorridos
+# em Python. O bincount acumula em float64, que é exato para inteiros até 2**53
+# centavos; o resultado volta a int antes de entrar nos baldes.
+# Ler os campos das transações continua sendo a maior parte do custo; por isso a
+# chave do grupo é montada numa única passada com attrgetter (slots lidos em C).
+# O mesmo caminho reconstrói o índice inteiro e soma um lote de transações novas.
+
+pex3_CAMPOS_GRUPO_dm = attrgetter('data_gasto', 'tipo', 'categoria', 'forma_pagamento')
+
+def pex3_codificar_dm(pex3_valores_dm, pex3_quantidade_dm):
+    """Códigos inteiros por valor distinto, numerados na ordem da primeira aparição.
+    Usa um dict cujo valor padrão é o próximo código (tudo em C, sem ordenar)."""
+    pex3_codigos_dm = defaultdict(count().__next__)
+    pex3_array_dm = np.fromiter(map(pex3_codigos_dm.__getitem__, pex3_valores_dm), dtype=np.int64, count=pex3_quantidade_dm)
+    return list(pex3_codigos_dm), pex3_array_dm
+
+def pex3_colunas_transacoes_dm(pex3_transacoes_dm):
+    """Representação colunar das transações: (grupos distintos, código do grupo, valor)"""
+    pex3_n_dm = len(pex3_transacoes_dm)
+    pex3_grupos_dm, pex3_codigo_dm = pex3_codificar_dm(map(pex3_CAMPOS_GRUPO_dm, pex3_transacoes_dm), pex3_n_dm)
+    pex3_valor_dm = np.fromiter(map(attrgetter('valor'), pex3_transacoes_dm), dtype=np.int64, count=pex3_n_dm)
+    return pex3_grupos_dm, pex3_codigo_dm, pex3_valor_dm
+
+def pex3_somas_por_grupo_dm(pex3_transacoes_dm):
+    """Pares (grupo, soma em centavos) das transações, com um único np.bincount"""
+    pex3_grupos_dm, pex3_codigo_dm, pex3_valor_dm = pex3_colunas_transacoes_dm(pex3_transacoes_dm)
+    pex3_somas_dm = np.bincount(pex3_codigo_dm, weights=pex3_valor_dm, minlength=len(pex3_grupos_dm)).round().astype(np.int64)
+    return list(zip(pex3_grupos_dm, pex3_somas_dm.tolist()))
+
+def pex3_somar_grupos_dm(pex3_indice_dm, pex3_somas_dm):
+    """Soma os totais por grupo nos baldes do dia e do mês"""
+    pex3_dias_dm, pex3_meses_dm = pex3_indice_dm['dias'], pex3_indice_dm['meses']
+    pex3_primeiro_dia_dm = None
+    for (pex3_data_dm, pex3_tipo_dm, pex3_cat_dm, pex3_forma_dm), pex3_soma_dm in pex3_somas_dm:
+        pex3_dia_dm = pex3_data_dm[:10]
+        if pex3_primeiro_dia_dm is None or pex3_dia_dm < pex3_primeiro_dia_dm:
+            pex3_primeiro_dia_dm = pex3_dia_dm
+        for pex3_chave_dm, pex3_baldes_dm, pex3_lista_dm in ((pex3_dia_dm, pex3_dias_dm, pex3_indice_dm['lista_dias']),
+                                                             (pex3_dia_dm[:7], pex3_meses_dm, pex3_indice_dm['lista_meses'])):
+            pex3_balde_dm = pex3_baldes_dm.get(pex3_chave_dm)
+            if pex3_balde_dm is None:
+                pex3_balde_dm = pex3_baldes_dm[pex3_chave_dm] = pex3_novo_balde_dm()
+                # Com as transações ordenadas por data, os dias/meses novos entram no fim da lista
+                if not pex3_lista_dm or pex3_chave_dm > pex3_lista_dm[-1]:
+                    pex3_lista_dm.append(pex3_chave_dm)
+                else:
+                    insort(pex3_lista_dm, pex3_chave_dm)
+            if pex3_tipo_dm == 'receber':
+                pex3_balde_dm['receita'] += pex3_soma_dm
+                pex3_balde_dm['receita_pagamento'][pex3_forma_dm] += pex3_soma_dm
+            else:
+                pex3_balde_dm['despesa'] += pex3_soma_dm
+                pex3_balde_dm['despesa_categoria'][pex3_cat_dm] += pex3_soma_dm
+    if pex3_primeiro_dia_dm is not None:
+        pex3_pos_dm = bisect_left(pex3_indice_dm['lista_dias'], pex3_primeiro_dia_dm)
+        pex3_indice_dm['prefixo_valido'] = min(pex3_indice_dm['prefixo_valido'], pex3_pos_dm)
+
+# ============== SÉRIE DE SALDO (SOMAS DE PREFIXO) ==============
+# prefixo[i] é o saldo acumulado até lista_dias[i]. Uma transação só invalida o
+# prefixo a partir do seu dia; como quase sempre é o último, recalcular custa O(1).
+# A série não é gravada em arquivo: sai dos baldes diários, que o índice já monta ao
+# carregar as transações, em uma passada O(dias). Um arquivo à parte não pouparia essa
+# carga e poderia divergir dos dados quando outro processo grava.
+# A série enviada ao gráfico é reduzida (semana/mês ou LTTB) para ter tamanho limitado.
+
+def pex3_atualizar_prefixo_dm(pex3_indice_dm):
+    """Recalcula o saldo acumulado apenas a partir do primeiro dia invalidado"""
+    pex3_prefixo_dm = pex3_indice_dm['prefixo']
+    del pex3_prefixo_dm[pex3_indice_dm['prefixo_valido']:]
+    pex3_saldo_dm = pex3_prefixo_dm[-1] if pex3_prefixo_dm else 0
+    for pex3_dia_dm in pex3_indice_dm['lista_dias'][len(pex3_prefixo_dm):]:
+        pex3_balde_dm = pex3_indice_dm['dias'][pex3_dia_dm]
+        pex3_saldo_dm += pex3_balde_dm['receita'] - pex3_balde_dm['despesa']
+        pex3_prefixo_dm.append(pex3_saldo_dm)
+    pex3_indice_dm['prefixo_valido'] = len(pex3_prefixo_dm)
+    return pex3_prefixo_dm
+
+def pex3_serie_saldo_dm(pex3_data_inicio_dm='', pex3_data_fim_dm=''):
+    """Saldo acumulado ao fim de cada dia do período (partindo de zero no início do período)"""
+    with pex3_transacoes_lock_dm:
+        pex3_indice_dm = pex3_obter_indice_transacoes_dm()
+        pex3_prefixo_dm = pex3_atualizar_prefixo_dm(pex3_indice_dm)
+        pex3_inicio_dm, pex3_fim_dm = pex3_faixa_dias_dm(pex3_indice_dm, pex3_data_inicio_dm, pex3_data_fim_dm)
+        pex3_base_dm = pex3_prefixo_dm[pex3_inicio_dm - 1] if pex3_inicio_dm else 0
+        return [(pex3_indice_dm['lista_dias'][pex3_i_dm], pex3_prefixo_dm[pex3_i_dm] - pex3_base_dm)
+                for pex3_i_dm in range(pex3_inicio_dm, pex3_fim_dm)]
+
+def pex3_eixo_x_dm(pex3_serie_dm):
+    """Posição de cada ponto no tempo (dia ordinal), para que intervalos sem movimento contem"""
+    try:
+        return [date.fromisoformat(pex3_dia_dm[:10]).toordinal() for pex3_dia_dm, _ in pex3_serie_dm]
+    except ValueError:
+        return list(range(len(pex3_serie_dm)))
+
+def pex3_lttb_dm(pex3_serie_dm, pex3_limite_dm):
+    """Largest-Triangle-Three-Buckets: reduz a série a pex3_limite_dm pontos mantendo o formato"""
+    pex3_n_dm = len(pex3_serie_dm)
+    if pex3_limite_dm >= pex3_n_dm or pex3_limite_dm < 3:
+        return pex3_serie_dm
+    pex3_xs_dm = pex3_eixo_x_dm(pex3_serie_dm)
+    pex3_ys_dm = [pex3_saldo_dm for _, pex3_saldo_dm in pex3_serie_dm]
+    pex3_tamanho_dm = (pex3_n_dm - 2) / (pex3_limite_dm - 2)
+    pex3_amostra_dm = [pex3_serie_dm[0]]
+    pex3_a_dm = 0
+    for pex3_i_dm in range(pex3_limite_dm - 2):
+        # Média do próximo balde, usada como terceiro vértice do triângulo
+        pex3_prox_ini_dm = int((pex3_i_dm + 1) * pex3_tamanho_dm) + 1
+        pex3_prox_fim_dm = min(int((pex3_i_dm + 2) * pex3_tamanho_dm) + 1, pex3_n_dm)
+        pex3_qtd_dm = pex3_prox_fim_dm - pex3_prox_ini_dm
+        pex3_media_x_dm = sum(pex3_xs_dm[pex3_prox_ini_dm:pex3_prox_fim_dm]) / pex3_qtd_dm
+        pex3_media_y_dm = sum(pex3_ys_dm[pex3_prox_ini_dm:pex3_prox_fim_dm]) / pex3_qtd_dm
+        
+        pex3_melhor_dm, pex3_maior_area_dm = None, -1.0
+        for pex3_j_dm in range(int(pex3_i_dm * pex3_tamanho_dm) + 1, int((pex3_i_dm + 1) * pex3_tamanho_dm) + 1):
+            pex3_area_dm = abs((pex3_xs_dm[pex3_a_dm] - pex3_media_x_dm) * (pex3_ys_dm[pex3_j_dm] - pex3_ys_dm[pex3_a_dm])
+                               - (pex3_xs_dm[pex3_a_dm] - pex3_xs_dm[pex3_j_dm]) * (pex3_media_y_dm - pex3_ys_dm[pex3_a_dm]))
+            if pex3_area_dm > pex3_maior_area_dm:
+                pex3_melhor_dm, pex3_maior_area_dm = pex3_j_dm, pex3_area_dm
+        pex3_amostra_dm.append(pex3_serie_dm[pex3_melhor_dm])
+        pex3_a_dm = pex3_melhor_dm
+    pex3_amostra_dm.append(pex3_serie_dm[-1])
+    return pex3_amostra_dm
+
+def pex3_reduzir_serie_dm(pex3_serie_dm, pex3_resolucao_dm='dia', pex3_max_pontos_dm=pex3_MAX_PONTOS_SALDO_dm):
+    """Agrupa a série por 'semana' ou 'mes' (saldo no fim do período) e limita a quantidade de pontos"""
+    if pex3_resolucao_dm in ('semana', 'mes'):
+        pex3_grupos_dm = {}
+        for pex3_dia_dm, pex3_saldo_dm in pex3_serie_dm:
+            if pex3_resolucao_dm == 'mes':
+                pex3_chave_dm = pex3_rotulo_dm = pex3_dia_dm[:7]
+            else:
+                try:
+                    pex3_chave_dm = date.fromisoformat(pex3_dia_dm[:10]).isocalendar()[:2]
+                except ValueError:
+                    pex3_chave_dm = pex3_dia_dm
+                pex3_rotulo_dm = pex3_dia_dm
+            pex3_grupos_dm[pex3_chave_dm] = (pex3_rotulo_dm, pex3_saldo_dm)
+        pex3_serie_dm = list(pex3_grupos_dm.values())
+    return pex3_lttb_dm(pex3_serie_dm, pex3_max_pontos_dm)
+
+def pex3_faixa_transacoes_dm(pex3_indice_dm, pex3_data_inicio_dm, pex3_data_fim_dm):
+    """Posições (início, fim) em indice['transacoes'] das transações do período"""
+    pex3_chaves_dm = pex3_indice_dm['chaves']
+    pex3_inicio_dm = bisect_left(pex3_chaves_dm, (pex3_data_inicio_dm,)) if pex3_data_inicio_dm else 0
+    pex3_fim_dm = bisect_right(pex3_chaves_dm, (pex3_data_fim_dm, float('inf'))) if pex3_data_fim_dm else len(pex3_chaves_dm)
+    return pex3_inicio_dm, pex3_fim_dm
+
+def pex3_filtrar_por_data_dm(pex3_data_inicio_dm, pex3_data_fim_dm):
+    """Transações do período (datas YYYY-MM-DD, vazias = sem limite) em ordem crescente de data"""
+    with pex3_transacoes_lock_dm:
+        pex3_indice_dm = pex3_obter_indice_transacoes_dm()
+        pex3_inicio_dm, pex3_fim_dm = pex3_faixa_transacoes_dm(pex3_indice_dm, pex3_data_inicio_dm, pex3_data_fim_dm)
+        return pex3_indice_dm['transacoes'][pex3_inicio_dm:pex3_fim_dm]
+
+def pex3_pagina_transacoes_dm(pex3_data_inicio_dm, pex3_data_fim_dm, pex3_antes_dm=None, pex3_depois_dm=None,
+                              pex3_por_pagina_dm=pex3_armazenamento_dm.pex3_POR_PAGINA_PADRAO_dm):
+    """Uma página das transações do período, da mais recente para a mais antiga (ver pex3_paginar_dm)"""
+    with pex3_transacoes_lock_dm:
+        pex3_indice_dm = pex3_obter_indice_transacoes_dm()
+        pex3_inicio_dm, pex3_fim_dm = pex3_faixa_transacoes_dm(pex3_indice_dm, pex3_data_inicio_dm, pex3_data_fim_dm)
+        return pex3_armazenamento_dm.pex3_paginar_dm(pex3_indice_dm['chaves'], pex3_indice_dm['transacoes'],
+                                                     pex3_inicio_dm, pex3_fim_dm, pex3_antes_dm, pex3_depois_dm,
+                                                     pex3_por_pagina_dm)
+
+@pex3_app_dm.route('/', endpoint='pex3_financeiro_index_dm')
+def pex3_index_dm():
+    pex3_data_inicio_dm = request.args.get('data_inicio', '')
+    pex3_data_fim_dm = request.args.get('data_fim', '')
+    
+    pex3_total_dm = pex3_agregar_periodo_dm(pex3_data_inicio_dm, pex3_data_fim_dm)['total']
+    pex3_receitas_dm = pex3_total_dm['receita']
+    pex3_despesas_dm = pex3_total_dm['despesa']
+    
+    return render_template('index.html', receitas=pex3_receitas_dm, despesas=pex3_despesas_dm, 
+                           saldo=pex3_receitas_dm-pex3_despesas_dm, data_inicio=pex3_data_inicio_dm, data_fim=pex3_data_fim_dm)
+
+@pex3_app_dm.route('/lancamentos', endpoint='pex3_financeiro_lancamentos_dm')
+def pex3_lancamentos_dm():
+    pex3_data_inicio_dm = request.args.get('data_inicio', '')
+    pex3_data_fim_dm = request.args.get('data_fim', '')
+    
+    # Página por cursor sobre o índice ordenado: o custo não cresce com o histórico
+    pex3_transacoes_dm, pex3_pagina_dm = pex3_pagina_transacoes_dm(
+        pex3_data_inicio_dm, pex3_data_fim_dm,
+        request.args.get('antes'), request.args.get('depois'),
+        request.args.get('por_pagina', pex3_armazenamento_dm.pex3_POR_PAGINA_PADRAO_dm, type=int))
+    
+    return render_template('lancamentos.html', transactions=pex3_transacoes_dm, pagina=pex3_pagina_dm,
+                           data_inicio=pex3_data_inicio_dm, data_fim=pex3_data_fim_dm)
+
+@pex3_app_dm.route('/cadastrar/<pex3_tipo_dm>', methods=['GET', 'POST'], endpoint='pex3_financeiro_cadastrar_dm')
+def pex3_cadastrar_dm(pex3_tipo_dm):
+    if request.method == 'POST':
+        try:
+            pex3_valor_dm = pex3_armazenamento_dm.pex3_centavos_dm(request.form['valor'])
+        except ValueError:
+            flash('Valor inválido! Use o formato 1234,56 ou 1234.56.', 'error')
+            return redirect(url_for('pex3_financeiro_cadastrar_dm', pex3_tipo_dm=pex3_tipo_dm))
+        # O id é reservado pelo alocador da camada de armazenamento, sem carregar as transações
+        pex3_nova_transacao_dm = {
+            "tipo": pex3_tipo_dm,
+            "data_gasto": request.form['data_gasto'],
+            "data_criacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "valor": pex3_valor_dm,
+            "categoria": request.form['categoria'],
+            "forma_pagamento": request.form.get('forma_pagamento', 'N/A'),
+            "descricao": request.form['descricao']
+        }
+        pex3_anexar_dm('transactions', pex3_nova_transacao_dm, pex3_gerar_id_dm=True)
+        return redirect(url_for('pex3_financeiro_lancamentos_dm'))
+    
+    pex3_db_dm = pex3_load_db_dm()
+    if pex3_tipo_dm == 'receber':
+        pex3_categorias_dm = [pex3_c_dm['nome'] for pex3_c_dm in pex3_db_dm['categories'] if pex3_c_dm['tipo'] in ['receita', 'ambos']]
+    else:
+        pex3_categorias_dm = [pex3_c_dm['nome'] for pex3_c_dm in pex3_db_dm['categories'] if pex3_c_dm['tipo'] in ['despesa', 'ambos']]
+        
+    return render_template('form_lancamento.html', tipo=pex3_tipo_dm, categorias=pex3_categorias_dm, metodos=pex3_db_dm['payment_methods'])
+
+@pex3_app_dm.route('/categorias', methods=['GET', 'POST'], endpoint='pex3_financeiro_categorias_dm')
+def pex3_categorias_dm():
+    pex3_db_dm = pex3_load_db_dm()
+    if request.method == 'POST':
+        pex3_anexar_dm('categories', {"nome": request.form['nome'], "tipo": request.form['tipo']})
+        return redirect(url_for('pex3_financeiro_categorias_dm'))
+    return render_template('categorias.html', categorias=pex3_db_dm['categories'])
+
+def pex3_parametros_analytics_dm():
+    """(data_inicio, data_fim, resolucao, pontos) da query string, com pontos limitado"""
+    pex3_pontos_dm = request.args.get('pontos', pex3_MAX_PONTOS_SALDO_dm, type=int)
+    return (request.args.get('data_inicio', ''), request.args.get('data_fim', ''),
+            request.args.get('resolucao', 'dia'), max(3, min(pex3_pontos_dm, pex3_LIMITE_PONTOS_SALDO_dm)))
+
+def pex3_dados_analytics_dm(pex3_data_inicio_dm, pex3_data_fim_dm, pex3_resolucao_dm, pex3_pontos_dm):
+    """Totais e séries do período (em centavos), com os nomes usados pelo template analytics.html"""
+    pex3_agregados_dm = pex3_agregar_periodo_dm(pex3_data_inicio_dm, pex3_data_fim_dm)
+    pex3_receitas_dm = pex3_agregados_dm['total']['receita']
+    pex3_despesas_dm = pex3_agregados_dm['total']['despesa']
+    pex3_gastos_por_categoria_dm = pex3_agregados_dm['total']['despesa_categoria']
+    pex3_pagamentos_receita_data_dm = pex3_agregados_dm['total']['receita_pagamento']
+    pex3_mensal_dm = pex3_agregados_dm['meses']
+    pex3_evolucao_dm = pex3_reduzir_serie_dm(pex3_agregados_dm['evolucao'], pex3_resolucao_dm, pex3_pontos_dm)
+
+    pex3_meses_ordenados_dm = sorted(pex3_mensal_dm.keys())
+    pex3_todas_categorias_gastos_dm = list(pex3_gastos_por_categoria_dm.keys())
+    pex3_dados_mensais_cat_dm = {pex3_cat_dm: [pex3_mensal_dm[pex3_mes_dm]['despesa_categoria'].get(pex3_cat_dm, 0) for pex3_mes_dm in pex3_meses_ordenados_dm] for pex3_cat_dm in pex3_todas_categorias_gastos_dm}
+
+    return dict(
+        receitas=pex3_receitas_dm, despesas=pex3_despesas_dm, saldo=pex3_receitas_dm - pex3_despesas_dm,
+        cat_labels=list(pex3_gastos_por_categoria_dm.keys()), cat_values=list(pex3_gastos_por_categoria_dm.values()),
+        pag_labels=list(pex3_pagamentos_receita_data_dm.keys()), pag_values=list(pex3_pagamentos_receita_data_dm.values()),
+        meses_labels=pex3_meses_ordenados_dm, 
+        mensal_receitas=[pex3_mensal_dm[pex3_m_dm]["receita"] for pex3_m_dm in pex3_meses_ordenados_dm],
+        mensal_despesas=[pex3_mensal_dm[pex3_m_dm]["despesa"] for pex3_m_dm in pex3_meses_ordenados_dm],
+        evolucao_datas=[pex3_dia_dm for pex3_dia_dm, _ in pex3_evolucao_dm],
+        evolucao_saldo=[pex3_saldo_dm for _, pex3_saldo_dm in pex3_evolucao_dm],
+        dados_mensais_cat=pex3_dados_mensais_cat_dm, categorias_lista=pex3_todas_categorias_gastos_dm,
+        data_inicio=pex3_data_inicio_dm, data_fim=pex3_data_fim_dm, resolucao=pex3_resolucao_dm)
+
+@pex3_app_dm.route('/analytics', endpoint='pex3_financeiro_analytics_dm')
+def pex3_analytics_dm():
+    return render_template('analytics.html', **pex3_dados_analytics_dm(*pex3_parametros_analytics_dm()))
+
+# ============== API JSON (RESPOSTAS CONDICIONAIS) ==============
+# O ETag combina o marcador do índice de transações (que só muda quando há
+# transações novas ou o arquivo é regravado) com os parâmetros da consulta.
+# Um painel que repete a consulta com If-None-Match recebe 304 sem que nada
+# seja recalculado enquanto os dados não mudarem.
+
+def pex3_etag_analytics_dm(pex3_parametros_dm):
+    """ETag da versão atual do índice para os parâmetros informados"""
+    pex3_indice_dm = pex3_indice_transacoes_dm
+    pex3_chave_dm = repr((pex3_indice_dm['caminho'], pex3_indice_dm['marcador'], pex3_parametros_dm))
+    return hashlib.sha1(pex3_chave_dm.encode('utf-8')).hexdigest()
+
+@pex3_app_dm.route('/api/analytics', endpoint='pex3_financeiro_api_analytics_dm')
+def pex3_api_analytics_dm():
+    pex3_parametros_dm = pex3_parametros_analytics_dm()
+    with pex3_transacoes_lock_dm:
+        pex3_obter_indice_transacoes_dm()
+        pex3_etag_dm = pex3_etag_analytics_dm(pex3_parametros_dm)
+        if pex3_etag_dm in request.if_none_match:
+            pex3_resposta_dm = pex3_app_dm.response_class(status=304)
+        else:
+            pex3_resposta_dm = jsonify(pex3_dados_analytics_dm(*pex3_parametros_dm))
+            # Os agregados podem ter incorporado transações gravadas nesse meio tempo
+            pex3_etag_dm = pex3_etag_analytics_dm(pex3_parametros_dm)
+    pex3_resposta_dm.set_etag(pex3_etag_dm)
+    # O cliente pode guardar a resposta, mas deve revalidá-la a cada uso
+    pex3_resposta_dm.headers['Cache-Control'] = 'no-cache'
+    return pex3_resposta_dm
+
+# ============== EXPORTAÇÃO ==============
+
+pex3_CAMPOS_EXPORTACAO_dm = ['id', 'tipo', 'data_gasto', 'valor', 'categoria', 'forma_pagamento', 'descricao', 'data_criacao']
+pex3_MONETARIOS_EXPORTACAO_dm = pex3_armazenamento_dm.pex3_CAMPOS_MONETARIOS_dm['transactions']
+
+def pex3_iterar_transacoes_dm(pex3_data_inicio_dm, pex3_data_fim_dm):
+    """Transações do período em ordem crescente, lidas do índice em blocos"""
+    def pex3_obter_faixa_dm():
+        pex3_indice_dm = pex3_obter_indice_transacoes_dm()
+        return (pex3_indice_dm['chaves'], pex3_indice_dm['transacoes'],
+                *pex3_faixa_transacoes_dm(pex3_indice_dm, pex3_data_inicio_dm, pex3_data_fim_dm))
+    return pex3_armazenamento_dm.pex3_iterar_em_blocos_dm(pex3_transacoes_lock_dm, pex3_obter_faixa_dm)
+
+@pex3_app_dm.route('/exportar/transacoes.<pex3_formato_dm>', endpoint='pex3_financeiro_exportar_dm')
+def pex3_exportar_dm(pex3_formato_dm):
+    """Exporta as transações do período (data_inicio/data_fim) em CSV ou NDJSON, em fluxo"""
+    if pex3_formato_dm not in pex3_armazenamento_dm.pex3_FORMATOS_EXPORTACAO_dm:
+        abort(404)
+    pex3_transacoes_dm = pex3_iterar_transacoes_dm(request.args.get('data_inicio', ''), request.args.get('data_fim', ''))
+    pex3_fluxo_dm = pex3_armazenamento_dm.pex3_fluxo_exportacao_dm(pex3_formato_dm, pex3_transacoes_dm, pex3_CAMPOS_EXPORTACAO_dm,
+                                                                  pex3_monetarios_dm=pex3_MONETARIOS_EXPORTACAO_dm)
+    return Response(stream_with_context(pex3_fluxo_dm),
+                    mimetype=pex3_armazenamento_dm.pex3_FORMATOS_EXPORTACAO_dm[pex3_formato_dm],
+                    headers={'Content-Disposition': f'attachment; filename=transacoes.{pex3_formato_dm}'})
+
+# ============== IMPORTAÇÃO DE EXTRATO EM LOTE ==============
+# O extrato (CSV exportado pelo banco ou planilha) é lido linha a linha. Categorias
+# e formas de pagamento são casadas com as cadastradas sem diferenciar acentos e
+# maiúsculas. Linhas que já constam nas transações do período (mesma data, tipo,
+# valor e descrição) contam como duplicadas, de modo que importar o mesmo extrato
+# de novo não duplica nada. As transações válidas são gravadas num único lote.
+
+pex3_MAX_ERROS_IMPORTACAO_dm = 200  # erros detalhados no relatório (os demais só são contados)
+pex3_CATEGORIA_PADRAO_dm = 'Diversos'
+pex3_FORMA_PADRAO_dm = 'Outros'
+pex3_FORMATOS_DATA_dm = ('%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y', '%d-%m-%Y')
+pex3_COLUNAS_EXTRATO_dm = {
+    'data_gasto': 'data', 'data lancamento': 'data', 'data do lancamento': 'data',
+    'descricao': 'descricao', 'historico': 'descricao', 'memo': 'descricao', 'lancamento': 'descricao',
+    'forma_pagamento': 'forma', 'forma de pagamento': 'forma', 'pagamento': 'forma',
+}
+pex3_TIPOS_EXTRATO_dm = {
+    'receber': 'receber', 'receita': 'receber', 'entrada': 'receber', 'credito': 'receber', 'c': 'receber',
+    'pagar': 'pagar', 'despesa': 'pagar', 'saida': 'pagar', 'debito': 'pagar', 'd': 'pagar',
+}
+pex3_CATEGORIAS_DO_TIPO_dm = {'receber': ('receita', 'ambos'), 'pagar': ('despesa', 'ambos')}
+
+def pex3_chave_duplicidade_dm(pex3_t_dm):
+    return (pex3_t_dm['data_gasto'], pex3_t_dm['tipo'], pex3_t_dm['valor'],
+            pex3_armazenamento_dm.pex3_dobrar_texto_dm(pex3_t_dm.get('descricao', '')))
+
+def pex3_data_importacao_dm(pex3_texto_dm):
+    """Converte '2024-05-31', '31/05/2024' ou '31/05/24' para o formato ISO (ValueError se inválida)"""
+    for pex3_formato_dm in pex3_FORMATOS_DATA_dm:
+        try:
+            return datetime.strptime(pex3_texto_dm.strip(), pex3_formato_dm).date().isoformat()
+        except ValueError:
+            pass
+    raise ValueError(pex3_texto_dm)
+
+def pex3_validar_linhas_extrato_dm(pex3_arquivo_dm, pex3_db_dm):
+    """Percorre um extrato CSV (texto) e gera (número da linha, transação, erro).
+    Colunas obrigatórias: data e valor. Opcionais: descricao, tipo (sem ela, valores
+    negativos são despesas), categoria e forma_pagamento (sem elas, Diversos e Outros)."""
+    pex3_campos_dm, pex3_leitor_dm = pex3_armazenamento_dm.pex3_leitor_csv_dm(pex3_arquivo_dm, pex3_COLUNAS_EXTRATO_dm)
+    pex3_faltando_dm = {'data', 'valor'} - set(pex3_campos_dm)
+    if pex3_faltando_dm:
+        yield 1, None, f"Cabeçalho sem as colunas: {', '.join(sorted(pex3_faltando_dm))}"
+        return
+    
+    pex3_dobrar_dm = pex3_armazenamento_dm.pex3_dobrar_texto_dm
+    pex3_categorias_dm = {pex3_dobrar_dm(pex3_c_dm['nome']): pex3_c_dm for pex3_c_dm in pex3_db_dm['categories']}
+    pex3_formas_dm = {pex3_dobrar_dm(pex3_f_dm): pex3_f_dm for pex3_f_dm in pex3_db_dm['payment_methods']}
+    pex3_data_criacao_dm = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for pex3_row_dm in pex3_leitor_dm:
+        pex3_linha_dm = pex3_leitor_dm.line_num + 1  # o cabeçalho já foi lido
+        if not any((pex3_v_dm or '').strip() for pex3_k_dm, pex3_v_dm in pex3_row_dm.items() if pex3_k_dm):
+            continue  # linha em branco
+        pex3_texto_data_dm = (pex3_row_dm.get('data') or '').strip()
+        pex3_texto_valor_dm = (pex3_row_dm.get('valor') or '').strip()
+        try:
+            pex3_data_dm = pex3_data_importacao_dm(pex3_texto_data_dm)
+        except pex3_armazenamento_dm.pex3_ERROS_CONVERSAO_dm:
+            yield pex3_linha_dm, None, f"Data inválida: '{pex3_texto_data_dm}'"
+            continue
+        try:
+            pex3_valor_dm = pex3_armazenamento_dm.pex3_centavos_dm(pex3_texto_valor_dm)
+        except pex3_armazenamento_dm.pex3_ERROS_CONVERSAO_dm:
+            yield pex3_linha_dm, None, f"Valor inválido: '{pex3_texto_valor_dm}'"
+            continue
+        if pex3_valor_dm == 0:
+            yield pex3_linha_dm, None, 'Valor zerado'
+            continue
+        
+        pex3_texto_tipo_dm = (pex3_row_dm.get('tipo') or '').strip()
+        if pex3_texto_tipo_dm:
+            pex3_tipo_dm = pex3_TIPOS_EXTRATO_dm.get(pex3_dobrar_dm(pex3_texto_tipo_dm))
+            if pex3_tipo_dm is None:
+                yield pex3_linha_dm, None, f"Tipo desconhecido: '{pex3_texto_tipo_dm}'"
+                continue
+        else:
+            pex3_tipo_dm = 'pagar' if pex3_valor_dm < 0 else 'receber'
+        
+        pex3_nome_categoria_dm = (pex3_row_dm.get('categoria') or '').strip() or pex3_CATEGORIA_PADRAO_dm
+        pex3_categoria_dm = pex3_categorias_dm.get(pex3_dobrar_dm(pex3_nome_categoria_dm))
+        if pex3_categoria_dm is None:
+            yield pex3_linha_dm, None, f"Categoria não cadastrada: '{pex3_nome_categoria_dm}'"
+            continue
+        if pex3_categoria_dm['tipo'] not in pex3_CATEGORIAS_DO_TIPO_dm[pex3_tipo_dm]:
+            yield pex3_linha_dm, None, f"Categoria '{pex3_categoria_dm['nome']}' não aceita lançamentos a {pex3_tipo_dm}"
+            continue
+        pex3_nome_forma_dm = (pex3_row_dm.get('forma') or '').strip() or pex3_FORMA_PADRAO_dm
+        pex3_forma_dm = pex3_formas_dm.get(pex3_dobrar_dm(pex3_nome_forma_dm))
+        if pex3_forma_dm is None:
+            yield pex3_linha_dm, None, f"Forma de pagamento não cadastrada: '{pex3_nome_forma_dm}'"
+            continue
+        
+        yield pex3_linha_dm, {
+            "tipo": pex3_tipo_dm,
+            "data_gasto": pex3_data_dm,
+            "data_criacao": pex3_data_criacao_dm,
+            "valor": abs(pex3_valor_dm),
+            "categoria": pex3_categoria_dm['nome'],
+            "forma_pagamento": pex3_forma_dm,
+            "descricao": (pex3_row_dm.get('descricao') or '').strip()
+        }, None
+
+def pex3_importar_extrato_dm(pex3_arquivo_dm, pex3_simular_dm=False):
+    """Importa as transações de um extrato CSV aberto em modo texto.
+    Linhas inválidas são ignoradas e relatadas; as já existentes contam como duplicadas;
+    as demais são gravadas de uma só vez. Com pex3_simular_dm=True apenas valida.
+    Retorna o resumo da importação."""
+    pex3_resumo_dm = {'linhas': 0, 'importados': 0, 'duplicados': 0, 'ignorados': 0, 'erros': []}
+    pex3_validas_dm = []
+    try:
+        for pex3_linha_dm, pex3_transacao_dm, pex3_erro_dm in pex3_validar_linhas_extrato_dm(pex3_arquivo_dm, pex3_load_db_dm()):
+            pex3_resumo_dm['linhas'] += 1
+            if pex3_erro_dm:
+                pex3_resumo_dm['ignorados'] += 1
+                if len(pex3_resumo_dm['erros']) < pex3_MAX_ERROS_IMPORTACAO_dm:
+                    pex3_resumo_dm['erros'].append((pex3_linha_dm, pex3_erro_dm))
+            else:
+                pex3_validas_dm.append(pex3_transacao_dm)
+    except (UnicodeDecodeError, csv.Error) as pex3_excecao_dm:
+        # Arquivo ilegível: nada é importado
+        pex3_resumo_dm['erros'].append((None, f'Arquivo inválido: {pex3_excecao_dm}'))
+        pex3_resumo_dm['ignorados'] += 1
+        return pex3_resumo_dm
+    if not pex3_validas_dm:
+        return pex3_resumo_dm
+    
+    with pex3_transacoes_lock_dm:
+        # Só as transações entre a primeira e a última data do extrato são consultadas.
+        # Cada transação existente "consome" uma linha igual do extrato: duas compras
+        # idênticas no mesmo dia continuam sendo duas, mas reimportar não duplica.
+        pex3_indice_dm = pex3_obter_indice_transacoes_dm()
+        pex3_inicio_dm, pex3_fim_dm = pex3_faixa_transacoes_dm(
+            pex3_indice_dm, min(pex3_t_dm['data_gasto'] for pex3_t_dm in pex3_validas_dm),
+            max(pex3_t_dm['data_gasto'] for pex3_t_dm in pex3_validas_dm))
+        pex3_existentes_dm = Counter(map(pex3_chave_duplicidade_dm, pex3_indice_dm['transacoes'][pex3_inicio_dm:pex3_fim_dm]))
+        pex3_novas_dm = []
+        for pex3_transacao_dm in pex3_validas_dm:
+            pex3_chave_dm = pex3_chave_duplicidade_dm(pex3_transacao_dm)
+            if pex3_existentes_dm[pex3_chave_dm] > 0:
+                pex3_existentes_dm[pex3_chave_dm] -= 1
+                pex3_resumo_dm['duplicados'] += 1
+            else:
+                pex3_novas_dm.append(pex3_transacao_dm)
+        pex3_resumo_dm['importados'] = len(pex3_novas_dm)
+        if pex3_novas_dm and not pex3_simular_dm:
+            # Um único lote: os ids são reservados num bloco e o armazenamento é gravado uma vez
+            pex3_armazenamento_dm.pex3_anexar_registros_dm('financeiro', pex3_DB_FILE_dm, 'transactions',
+                                                           pex3_novas_dm, pex3_gerar_id_dm=True)
+    return pex3_resumo_dm
+
+@pex3_app_dm.route('/importar', methods=['GET', 'POST'], endpoint='pex3_financeiro_importar_dm')
+def pex3_importar_dm():
+    """Importação em lote de transações a partir de um extrato CSV enviado pelo usuário"""
+    pex3_resumo_dm = None
+    if request.method == 'POST':
+        pex3_upload_dm = request.files.get('arquivo')
+        if not pex3_upload_dm or not pex3_upload_dm.filename:
+            return redirect(url_for('pex3_financeiro_importar_dm'))
+        # O upload é lido em fluxo, linha a linha, direto do stream da requisição
+        pex3_texto_dm = io.TextIOWrapper(pex3_upload_dm.stream, encoding='utf-8-sig', newline='')
+        try:
+            pex3_resumo_dm = pex3_importar_extrato_dm(pex3_texto_dm, pex3_simular_dm=bool(request.form.get('simular')))
+        finally:
+            # Solta o stream sem fechá-lo (fechar o wrapper fecharia o stream da requisição)
+            pex3_texto_dm.detach()
+    
+    return render_template('importar.html', resumo=pex3_resumo_dm)
+
+@pex3_app_dm.cli.command('importar-extrato')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--simular', is_flag=True, help='Apenas valida o arquivo, sem gravar.')
+def pex3_importar_extrato_cli_dm(arquivo, simular):
+    """Importa transações de um extrato CSV (flask --app financeiro importar-extrato extrato.csv)"""
+    pex3_init_db_dm()
+    with open(arquivo, 'r', encoding='utf-8-sig', newline='') as f:
+        pex3_resumo_dm = pex3_importar_extrato_dm(f, pex3_simular_dm=simular)
+    for pex3_linha_dm, pex3_erro_dm in pex3_resumo_dm['erros']:
+        click.echo(f"❌ Linha {pex3_linha_dm}: {pex3_erro_dm}" if pex3_linha_dm else f"❌ {pex3_erro_dm}")
+    if pex3_resumo_dm['ignorados'] > len(pex3_resumo_dm['erros']):
+        click.echo(f"   ... e mais {pex3_resumo_dm['ignorados'] - len(pex3_resumo_dm['erros'])} linha(s) ignorada(s)")
+    click.echo(f"{'🔎 Simulação' if simular else '✅ Importação'}: {pex3_resumo_dm['importados']} importada(s), "
+               f"{pex3_resumo_dm['duplicados']} duplicada(s), {pex3_resumo_dm['ignorados']} ignorada(s)")
+
+if __name__ == '__main__':
+    pex3_init_db_dm()
     pex3_app_dm.run(debug=True)
\ No newline at end of file
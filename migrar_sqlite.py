@@ -0,0 +1,65 @@
+"""
+Migração única dos dados em JSON/CSV para o backend SQLite
+Lê produtos.csv, estoque_db.json e database.json e grava tudo no banco definido
+por PEX3_SQLITE_DB (padrão: pex3.db). Depois execute os sistemas com PEX3_BACKEND=sqlite.
+Valores ainda gravados em reais (versões anteriores) chegam ao banco já em centavos.
+
+Uso: python migrar_sqlite.py [--forcar]
+     --forcar  substitui os dados de um banco SQLite que já tenha sido migrado
+"""
+
+import os
+import sys
+
+import armazenamento as pex3_armazenamento_dm
+
+pex3_PRODUTOS_CSV_dm = 'produtos.csv'
+pex3_ESTOQUE_DB_dm = 'estoque_db.json'
+pex3_FINANCEIRO_DB_dm = 'database.json'
+
+def main():
+    print("=" * 60)
+    print("🗄️  Migração JSON/CSV -> SQLite - PEX III")
+    print("=" * 60)
+    print(f"\n📁 Banco de destino: {pex3_armazenamento_dm.pex3_SQLITE_DB_dm}")
+
+    pex3_forcar_dm = '--forcar' in sys.argv[1:]
+    pex3_ja_migrado_dm = any(
+        pex3_armazenamento_dm.pex3_sqlite_existe_dm(pex3_tipo_dm, None)
+        for pex3_tipo_dm in ('produtos', 'estoque', 'financeiro')
+    )
+    if pex3_ja_migrado_dm and not pex3_forcar_dm:
+        print("\n❌ O banco SQLite já contém dados. Use --forcar para substituí-los.")
+        return 1
+
+    if os.path.exists(pex3_PRODUTOS_CSV_dm):
+        pex3_produtos_dm = pex3_armazenamento_dm.pex3_json_ler_produtos_dm(pex3_PRODUTOS_CSV_dm)
+        pex3_armazenamento_dm.pex3_sqlite_gravar_produtos_dm(None, pex3_produtos_dm)
+        print(f"✅ Produtos migrados: {len(pex3_produtos_dm)}")
+    else:
+        print(f"⚠️  {pex3_PRODUTOS_CSV_dm} não encontrado (ignorado)")
+
+    for pex3_tipo_dm, pex3_caminho_dm in (('estoque', pex3_ESTOQUE_DB_dm), ('financeiro', pex3_FINANCEIRO_DB_dm)):
+        if not os.path.exists(pex3_caminho_dm):
+            print(f"⚠️  {pex3_caminho_dm} não encontrado (ignorado)")
+            continue
+        # Lido via journal para incluir movimentações ainda não compactadas (se houver)
+        pex3_dados_dm = pex3_armazenamento_dm.pex3_journal_carregar_documento_dm(pex3_tipo_dm, pex3_caminho_dm)
+        # Arquivos ainda em reais são convertidos para centavos no caminho (os originais não mudam)
+        if pex3_armazenamento_dm.pex3_json_formato_dm(pex3_tipo_dm, pex3_caminho_dm) < pex3_armazenamento_dm.pex3_FORMATO_DADOS_dm:
+            pex3_armazenamento_dm.pex3_documento_em_centavos_dm(pex3_tipo_dm, pex3_dados_dm)
+        pex3_armazenamento_dm.pex3_sqlite_salvar_documento_dm(pex3_tipo_dm, None, pex3_dados_dm)
+        pex3_resumo_dm = ', '.join(
+            f"{pex3_colecao_dm}: {len(pex3_dados_dm.get(pex3_colecao_dm, []))}"
+            for pex3_colecao_dm in pex3_armazenamento_dm.pex3_COLECOES_dm[pex3_tipo_dm]
+        )
+        print(f"✅ {pex3_caminho_dm} migrado ({pex3_resumo_dm})")
+
+    print("\n" + "=" * 60)
+    print("✅ Migração concluída!")
+    print("   Inicie os sistemas com PEX3_BACKEND=sqlite para usar o novo banco.")
+    print("=" * 60)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,458 @@
+"""
+Testes da camada de armazenamento (backends json, journal e sqlite)
+Executar com: python -m pytest
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+import armazenamento as pex3_armazenamento_dm
+
+
+# ============== BACKEND JSON: GERAÇÃO DO DOCUMENTO ==============
+
+@pytest.mark.parametrize('pex3_backend_dm', ['json'], indirect=True)
+def test_pex3_geracao_lida_sem_reabrir_o_json_dm(pex3_backend_dm, tmp_path, monkeypatch):
+    """Salvar de novo um documento que não mudou não volta a ler o JSON inteiro"""
+    pex3_caminho_dm = str(tmp_path / 'doc.json')
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', pex3_caminho_dm, {'vendas': []})
+    pex3_leituras_dm = []
+    pex3_load_dm = json.load
+    monkeypatch.setattr(json, 'load', lambda f: pex3_leituras_dm.append(f.name) or pex3_load_dm(f))
+
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', pex3_caminho_dm, {'vendas': []})
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', pex3_caminho_dm, {'vendas': []})
+
+    assert pex3_leituras_dm == []
+    assert pex3_armazenamento_dm.pex3_json_geracao_atual_dm(pex3_caminho_dm) == 3
+
+
+@pytest.mark.parametrize('pex3_backend_dm', ['json'], indirect=True)
+def test_pex3_geracao_relida_apos_gravacao_externa_dm(pex3_backend_dm, tmp_path):
+    """Se outro processo regravou o arquivo, a assinatura muda e a geração é relida"""
+    pex3_caminho_dm = str(tmp_path / 'doc.json')
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', pex3_caminho_dm, {'vendas': []})
+    with open(pex3_caminho_dm, 'w', encoding='utf-8') as f:
+        json.dump({'vendas': [], '_geracao': 41, '_formato': 2}, f)
+
+    assert pex3_armazenamento_dm.pex3_json_geracao_atual_dm(pex3_caminho_dm) == 41
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', pex3_caminho_dm, {'vendas': []})
+    assert pex3_armazenamento_dm.pex3_json_geracao_atual_dm(pex3_caminho_dm) == 42
+
+
+# ============== TROCA ENTRE OS BACKENDS JSON E JOURNAL ==============
+
+@pytest.mark.parametrize('pex3_backend_dm', ['json'], indirect=True)
+def test_pex3_journal_usa_json_existente_como_snapshot_dm(pex3_backend_dm, tmp_path, monkeypatch):
+    pex3_caminho_dm = str(tmp_path / 'database.json')
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('financeiro', pex3_caminho_dm, {'transactions': [{'id': 1, 'valor': 100}]})
+
+    monkeypatch.setattr(pex3_armazenamento_dm, 'pex3_BACKEND_dm', 'journal')
+    assert pex3_armazenamento_dm.pex3_preparar_dm('financeiro', pex3_caminho_dm) == 0
+    pex3_armazenamento_dm.pex3_anexar_registro_dm('financeiro', pex3_caminho_dm, 'transactions', {'valor': 250}, True)
+
+    pex3_transacoes_dm = pex3_armazenamento_dm.pex3_carregar_documento_dm('financeiro', pex3_caminho_dm)['transactions']
+    assert [(pex3_t_dm['id'], pex3_t_dm['valor']) for pex3_t_dm in pex3_transacoes_dm] == [(1, 100), (2, 250)]
+
+
+@pytest.mark.parametrize('pex3_backend_dm', ['journal'], indirect=True)
+def test_pex3_json_incorpora_journal_pendente_dm(pex3_backend_dm, tmp_path, monkeypatch):
+    """Voltar para PEX3_BACKEND=json não perde o que ainda estava só no journal"""
+    pex3_caminho_dm = str(tmp_path / 'estoque_db.json')
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', pex3_caminho_dm, {'vendas': [], 'compras': [], 'ajustes': []})
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('estoque', pex3_caminho_dm, 'ajustes',
+                                                   [{'motivo': 'a'}, {'motivo': 'b'}], True)
+    assert os.path.getsize(pex3_caminho_dm + '.journal') > 0
+
+    monkeypatch.setattr(pex3_armazenamento_dm, 'pex3_BACKEND_dm', 'json')
+    pex3_armazenamento_dm.pex3_preparar_dm('estoque', pex3_caminho_dm)
+
+    assert os.path.getsize(pex3_caminho_dm + '.journal') == 0
+    pex3_ajustes_dm = pex3_armazenamento_dm.pex3_carregar_documento_dm('estoque', pex3_caminho_dm)['ajustes']
+    assert [(pex3_a_dm['id'], pex3_a_dm['motivo']) for pex3_a_dm in pex3_ajustes_dm] == [(1, 'a'), (2, 'b')]
+
+
+# ============== PARIDADE ENTRE OS BACKENDS ==============
+
+def pex3_ids_dm(pex3_registros_dm):
+    return [pex3_r_dm['id'] for pex3_r_dm in pex3_registros_dm]
+
+
+def test_pex3_anexar_ler_desde_e_buscar_dm(pex3_backend_dm, tmp_path):
+    """json, journal e sqlite respondem igual a acréscimos, leituras incrementais e buscas por id"""
+    pex3_caminho_dm = str(tmp_path / 'estoque_db.json')
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', pex3_caminho_dm, {
+        'vendas': [], 'compras': [], 'ajustes': [{'id': 1, 'data': '2025-01-01 10:00:00', 'motivo': 'a'},
+                                                  {'id': 2, 'data': '2025-01-02 10:00:00', 'motivo': 'b'}]})
+
+    pex3_registros_dm, pex3_marcador_dm, pex3_completo_dm = pex3_armazenamento_dm.pex3_ler_registros_desde_dm(
+        'estoque', pex3_caminho_dm, 'ajustes')
+    assert (pex3_ids_dm(pex3_registros_dm), pex3_completo_dm) == ([1, 2], True)
+
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('estoque', pex3_caminho_dm, 'ajustes', [
+        {'data': '2025-01-03 10:00:00', 'motivo': 'c'}, {'data': '2025-01-04 10:00:00', 'motivo': 'd'}], True)
+    pex3_armazenamento_dm.pex3_anexar_registro_dm('estoque', pex3_caminho_dm, 'vendas', {'id': 7, 'data': '2025-01-05 10:00:00'})
+
+    pex3_registros_dm, pex3_marcador_dm, pex3_completo_dm = pex3_armazenamento_dm.pex3_ler_registros_desde_dm(
+        'estoque', pex3_caminho_dm, 'ajustes', pex3_marcador_dm)
+    assert (pex3_ids_dm(pex3_registros_dm), pex3_completo_dm) == ([3, 4], False)
+    assert [pex3_r_dm['motivo'] for pex3_r_dm in pex3_registros_dm] == ['c', 'd']
+
+    if pex3_backend_dm == 'journal':
+        assert pex3_armazenamento_dm.pex3_journal_compactar_dm('estoque', pex3_caminho_dm)
+    pex3_registros_dm, pex3_marcador_dm, pex3_completo_dm = pex3_armazenamento_dm.pex3_ler_registros_desde_dm(
+        'estoque', pex3_caminho_dm, 'ajustes', pex3_marcador_dm)
+    assert (pex3_registros_dm, pex3_completo_dm) == ([], False)
+
+    assert pex3_armazenamento_dm.pex3_buscar_registro_dm('estoque', pex3_caminho_dm, 'ajustes', 4)['motivo'] == 'd'
+    assert pex3_armazenamento_dm.pex3_buscar_registro_dm('estoque', pex3_caminho_dm, 'vendas', 7)['data'] == '2025-01-05 10:00:00'
+    assert pex3_armazenamento_dm.pex3_buscar_registro_dm('estoque', pex3_caminho_dm, 'ajustes', 99) is None
+
+    # Regravar o documento inteiro invalida o marcador: a próxima leitura vem completa
+    pex3_dados_dm = pex3_armazenamento_dm.pex3_carregar_documento_dm('estoque', pex3_caminho_dm)
+    assert pex3_ids_dm(pex3_dados_dm['ajustes']) == [1, 2, 3, 4]
+    pex3_dados_dm['ajustes'] = pex3_dados_dm['ajustes'][1:]
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', pex3_caminho_dm, pex3_dados_dm)
+    pex3_registros_dm, _, pex3_completo_dm = pex3_armazenamento_dm.pex3_ler_registros_desde_dm(
+        'estoque', pex3_caminho_dm, 'ajustes', pex3_marcador_dm)
+    assert (pex3_ids_dm(pex3_registros_dm), pex3_completo_dm) == ([2, 3, 4], True)
+    assert pex3_armazenamento_dm.pex3_buscar_registro_dm('estoque', pex3_caminho_dm, 'ajustes', 1) is None
+
+
+@pytest.mark.parametrize('pex3_backend_dm', ['json'], indirect=True)
+def test_pex3_json_le_so_o_trecho_novo_apos_gravacao_propria_dm(pex3_backend_dm, tmp_path, monkeypatch):
+    pex3_caminho_dm = str(tmp_path / 'database.json')
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('financeiro', pex3_caminho_dm, {'transactions': [{'id': 1, 'valor': 1}]})
+    _, pex3_marcador_dm, _ = pex3_armazenamento_dm.pex3_ler_registros_desde_dm('financeiro', pex3_caminho_dm, 'transactions')
+    pex3_armazenamento_dm.pex3_buscar_registro_dm('financeiro', pex3_caminho_dm, 'transactions', 1)
+    pex3_leituras_dm = []
+    pex3_load_dm = json.load
+    monkeypatch.setattr(json, 'load', lambda f: pex3_leituras_dm.append(f.name) or pex3_load_dm(f))
+
+    pex3_armazenamento_dm.pex3_anexar_registro_dm('financeiro', pex3_caminho_dm, 'transactions', {'id': 2, 'valor': 2})
+    pex3_registros_dm, pex3_marcador_dm, pex3_completo_dm = pex3_armazenamento_dm.pex3_ler_registros_desde_dm(
+        'financeiro', pex3_caminho_dm, 'transactions', pex3_marcador_dm)
+
+    assert (pex3_ids_dm(pex3_registros_dm), pex3_completo_dm) == ([2], False)
+    assert pex3_armazenamento_dm.pex3_buscar_registro_dm('financeiro', pex3_caminho_dm, 'transactions', 2)['valor'] == 2
+    assert [pex3_n_dm for pex3_n_dm in pex3_leituras_dm if pex3_n_dm == pex3_caminho_dm] == []
+
+
+@pytest.mark.parametrize('pex3_backend_dm', ['json'], indirect=True)
+def test_pex3_json_rele_apos_gravacao_de_outro_processo_dm(pex3_backend_dm, tmp_path):
+    pex3_caminho_dm = str(tmp_path / 'database.json')
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('financeiro', pex3_caminho_dm, {'transactions': [{'id': 1, 'valor': 1}]})
+    _, pex3_marcador_dm, _ = pex3_armazenamento_dm.pex3_ler_registros_desde_dm('financeiro', pex3_caminho_dm, 'transactions')
+
+    # Outro processo acrescenta uma transação regravando o arquivo
+    with open(pex3_caminho_dm, 'r', encoding='utf-8') as f:
+        pex3_documento_dm = json.load(f)
+    pex3_documento_dm['transactions'].append({'id': 2, 'valor': 5})
+    with open(pex3_caminho_dm, 'w', encoding='utf-8') as f:
+        json.dump(pex3_documento_dm, f)
+
+    pex3_registros_dm, _, pex3_completo_dm = pex3_armazenamento_dm.pex3_ler_registros_desde_dm(
+        'financeiro', pex3_caminho_dm, 'transactions', pex3_marcador_dm)
+    assert (pex3_ids_dm(pex3_registros_dm), pex3_completo_dm) == ([2], False)
+    assert pex3_armazenamento_dm.pex3_buscar_registro_dm('financeiro', pex3_caminho_dm, 'transactions', 2)['valor'] == 5
+
+
+# ============== VALORES EM CENTAVOS ==============
+
+@pytest.mark.parametrize('pex3_centavos_valor_dm', [0, 1, 5, 99, 100, 1050, 123456789, -5, -123450])
+def test_pex3_centavos_ida_e_volta_dm(pex3_centavos_valor_dm):
+    """Centavos -> reais (formulário/CSV) ou moeda formatada -> centavos, sem perda"""
+    pex3_reais_texto_dm = pex3_armazenamento_dm.pex3_reais_dm(pex3_centavos_valor_dm)
+    pex3_moeda_dm = pex3_armazenamento_dm.pex3_formatar_moeda_dm(pex3_centavos_valor_dm)
+    assert pex3_armazenamento_dm.pex3_centavos_dm(pex3_reais_texto_dm) == pex3_centavos_valor_dm
+    assert pex3_armazenamento_dm.pex3_centavos_dm(pex3_moeda_dm) == pex3_centavos_valor_dm
+
+
+def test_pex3_centavos_de_valores_antigos_em_float_dm():
+    """Floats gravados em reais viram o centavo que o usuário digitou (meio centavo para cima)"""
+    assert pex3_armazenamento_dm.pex3_centavos_dm(0.1 + 0.2) == 30
+    assert pex3_armazenamento_dm.pex3_centavos_dm(2.675) == 268
+    assert pex3_armazenamento_dm.pex3_centavos_dm(1.005) == 101
+    assert pex3_armazenamento_dm.pex3_centavos_dm('1.234,56') == 123456
+    assert sum(pex3_armazenamento_dm.pex3_centavos_dm(0.1) for _ in range(10)) == 100
+    assert pex3_armazenamento_dm.pex3_formatar_moeda_dm(123456789) == 'R$ 1.234.567,89'
+    assert pex3_armazenamento_dm.pex3_formatar_moeda_dm(-5) == 'R$ -0,05'
+    with pytest.raises(ValueError):
+        pex3_armazenamento_dm.pex3_centavos_dm(1e300)
+
+
+@pytest.mark.parametrize('pex3_texto_dm, pex3_esperado_dm', [
+    ('1.234,56', 123456), ('1234,56', 123456), ('1234.56', 123456), ('R$ 1.234.567,89', 123456789),
+    ('-1.234,5', -123450), ('0.125', 13), ('12,9', 1290), ('1.234,', 123400)])
+def test_pex3_centavos_de_textos_digitados_dm(pex3_texto_dm, pex3_esperado_dm):
+    assert pex3_armazenamento_dm.pex3_centavos_dm(pex3_texto_dm) == pex3_esperado_dm
+
+
+@pytest.mark.parametrize('pex3_texto_dm', ['1e30', '1,234.56', '1.234', '12.345.678', '1.23.4,5', '12.34,5',
+                                           '1,2,3', '100000000000,01', 'nan', 'abc', ''])
+def test_pex3_centavos_recusa_textos_ambiguos_ou_enormes_dm(pex3_texto_dm):
+    """Valores ambíguos ou absurdos viram ValueError (que as importações contam como linha inválida)"""
+    with pytest.raises(ValueError):
+        pex3_armazenamento_dm.pex3_centavos_dm(pex3_texto_dm)
+
+
+pex3_VENDA_ANTIGA_dm = {'id': 1, 'data': '2024-05-01 10:00:00', 'valor_bruto': 51.8, 'desconto': 0,
+                        'valor_total': 51.8, 'custo_total': 31.0, 'lucro': 20.8,
+                        'itens': [{'codigo_barras': '1', 'nome_produto': 'Arroz', 'quantidade': 2,
+                                   'preco_unitario': 25.9, 'preco_custo': 15.5, 'subtotal': 51.8}]}
+pex3_TRANSACOES_ANTIGAS_dm = [{'id': 1, 'tipo': 'receber', 'data_gasto': '2024-05-01', 'valor': 0.1},
+                              {'id': 2, 'tipo': 'pagar', 'data_gasto': '2024-05-02', 'valor': 1234.56}]
+
+
+def pex3_gravar_formato_antigo_dm(pex3_backend_dm, tmp_path):
+    """Dados em reais (float) como gravados antes dos centavos: arquivos sem '_formato' e
+    CSV sem as colunas _centavos ou, no SQLite, um banco sem a marca de formato"""
+    if pex3_backend_dm == 'sqlite':
+        pex3_armazenamento_dm.pex3_gravar_produtos_dm(str(tmp_path / 'produtos.csv'), [
+            {'codigo_barras': '1', 'nome': 'Arroz', 'saldo': 10.0, 'preco_venda': 25.9, 'preco_compra': 15.5,
+             'estoque_minimo': 5.0}])
+        pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', str(tmp_path / 'estoque_db.json'),
+                                                       {'vendas': [pex3_VENDA_ANTIGA_dm], 'compras': [], 'ajustes': []})
+        pex3_armazenamento_dm.pex3_salvar_documento_dm('financeiro', str(tmp_path / 'database.json'),
+                                                       {'transactions': pex3_TRANSACOES_ANTIGAS_dm})
+        pex3_conexao_dm = pex3_armazenamento_dm.pex3_sqlite_conexao_dm()
+        with pex3_conexao_dm:
+            pex3_conexao_dm.execute("DELETE FROM versoes WHERE nome LIKE 'formato:%'")
+        return
+    (tmp_path / 'produtos.csv').write_text(
+        'codigo_barras;nome;saldo;preco_venda;preco_compra\n1;Arroz;10.0;25.9;15.5\n', encoding='utf-8')
+    (tmp_path / 'estoque_db.json').write_text(
+        json.dumps({'vendas': [pex3_VENDA_ANTIGA_dm], 'compras': [], 'ajustes': []}), encoding='utf-8')
+    (tmp_path / 'database.json').write_text(json.dumps({'transactions': pex3_TRANSACOES_ANTIGAS_dm}), encoding='utf-8')
+
+
+def test_pex3_migracao_de_dados_antigos_para_centavos_dm(pex3_backend_dm, tmp_path):
+    """Produtos, vendas (com itens) e transações em reais são convertidos uma única vez"""
+    pex3_gravar_formato_antigo_dm(pex3_backend_dm, tmp_path)
+    pex3_arquivos_dm = [('produtos', str(tmp_path / 'produtos.csv')), ('estoque', str(tmp_path / 'estoque_db.json')),
+                        ('financeiro', str(tmp_path / 'database.json'))]
+
+    assert [pex3_armazenamento_dm.pex3_preparar_dm(pex3_tipo_dm, pex3_caminho_dm)
+            for pex3_tipo_dm, pex3_caminho_dm in pex3_arquivos_dm] == [1, 1, 2]
+    # Segunda inicialização: nada a converter (não multiplica por 100 de novo)
+    assert [pex3_armazenamento_dm.pex3_preparar_dm(pex3_tipo_dm, pex3_caminho_dm)
+            for pex3_tipo_dm, pex3_caminho_dm in pex3_arquivos_dm] == [0, 0, 0]
+
+    pex3_produto_dm, = pex3_armazenamento_dm.pex3_ler_produtos_dm(str(tmp_path / 'produtos.csv'))
+    assert (pex3_produto_dm['preco_venda'], pex3_produto_dm['preco_compra'], pex3_produto_dm['saldo']) == (2590, 1550, 10.0)
+    if pex3_backend_dm != 'sqlite':
+        assert (tmp_path / 'produtos.csv').read_text(encoding='utf-8').startswith(
+            ';'.join(pex3_armazenamento_dm.pex3_COLUNAS_CSV_PRODUTO_dm))
+
+    pex3_venda_dm, = pex3_armazenamento_dm.pex3_carregar_documento_dm('estoque', str(tmp_path / 'estoque_db.json'))['vendas']
+    assert [pex3_venda_dm[pex3_c_dm] for pex3_c_dm in ('valor_bruto', 'desconto', 'valor_total', 'custo_total', 'lucro')] == [
+        5180, 0, 5180, 3100, 2080]
+    pex3_item_dm, = pex3_venda_dm['itens']
+    assert (pex3_item_dm['preco_unitario'], pex3_item_dm['preco_custo'], pex3_item_dm['subtotal'], pex3_item_dm['quantidade']) == (
+        2590, 1550, 5180, 2)
+
+    pex3_transacoes_dm = pex3_armazenamento_dm.pex3_carregar_documento_dm('financeiro', str(tmp_path / 'database.json'))['transactions']
+    assert [pex3_t_dm['valor'] for pex3_t_dm in pex3_transacoes_dm] == [10, 123456]
+    assert all(type(pex3_t_dm['valor']) is int for pex3_t_dm in pex3_transacoes_dm)
+
+
+# ============== PAGINAÇÃO POR CURSOR ==============
+
+def pex3_percorrer_paginas_dm(pex3_chaves_dm, pex3_inicio_dm, pex3_fim_dm, pex3_por_pagina_dm):
+    """Segue os cursores 'antes' da página mais recente até a mais antiga"""
+    pex3_paginas_dm, pex3_antes_dm = [], None
+    while True:
+        pex3_registros_dm, pex3_pagina_dm = pex3_armazenamento_dm.pex3_paginar_dm(
+            pex3_chaves_dm, pex3_chaves_dm, pex3_inicio_dm, pex3_fim_dm, pex3_antes_dm, None, pex3_por_pagina_dm)
+        pex3_paginas_dm.append((pex3_registros_dm, pex3_pagina_dm))
+        pex3_antes_dm = pex3_pagina_dm['antes']
+        if pex3_antes_dm is None:
+            return pex3_paginas_dm
+
+
+@pytest.mark.parametrize('pex3_por_pagina_dm, pex3_tamanhos_dm', [(5, [5, 5]), (3, [3, 3, 3, 1]), (10, [10]), (11, [10])])
+def test_pex3_paginas_nos_limites_dm(pex3_por_pagina_dm, pex3_tamanhos_dm):
+    """Total múltiplo do tamanho da página, última página incompleta e página única:
+    nenhum registro repetido ou pulado e nenhum cursor para uma página vazia"""
+    # Dois registros por dia: o desempate entre eles é o id
+    pex3_chaves_dm = [(f'2025-01-{pex3_i_dm // 2 + 1:02d}', pex3_i_dm) for pex3_i_dm in range(10)]
+    pex3_paginas_dm = pex3_percorrer_paginas_dm(pex3_chaves_dm, 0, 10, pex3_por_pagina_dm)
+
+    assert [len(pex3_registros_dm) for pex3_registros_dm, _ in pex3_paginas_dm] == pex3_tamanhos_dm
+    assert [pex3_c_dm for pex3_registros_dm, _ in pex3_paginas_dm for pex3_c_dm in pex3_registros_dm] == pex3_chaves_dm[::-1]
+    assert pex3_paginas_dm[0][1]['depois'] is None
+    assert all(pex3_pagina_dm['depois'] is not None for _, pex3_pagina_dm in pex3_paginas_dm[1:])
+    assert all(pex3_pagina_dm['total'] == 10 for _, pex3_pagina_dm in pex3_paginas_dm)
+
+    # Voltando pelos cursores 'depois' chega-se às mesmas páginas
+    for pex3_anterior_dm, pex3_atual_dm in zip(pex3_paginas_dm, pex3_paginas_dm[1:]):
+        pex3_registros_dm, _ = pex3_armazenamento_dm.pex3_paginar_dm(
+            pex3_chaves_dm, pex3_chaves_dm, 0, 10, None, pex3_atual_dm[1]['depois'], pex3_por_pagina_dm)
+        assert pex3_registros_dm == pex3_anterior_dm[0]
+
+
+def test_pex3_pagina_dentro_da_faixa_e_cursor_invalido_dm():
+    """A página não sai da faixa [inicio, fim) do período; cursor inválido volta à mais recente"""
+    pex3_chaves_dm = [('2025-01-01', pex3_i_dm) for pex3_i_dm in range(10)]
+    pex3_paginas_dm = pex3_percorrer_paginas_dm(pex3_chaves_dm, 2, 7, 2)
+    assert [pex3_registros_dm for pex3_registros_dm, _ in pex3_paginas_dm] == [
+        pex3_chaves_dm[5:7][::-1], pex3_chaves_dm[3:5][::-1], pex3_chaves_dm[2:3]]
+
+    pex3_registros_dm, pex3_pagina_dm = pex3_armazenamento_dm.pex3_paginar_dm(
+        pex3_chaves_dm, pex3_chaves_dm, 2, 7, 'lixo', None, 2)
+    assert pex3_registros_dm == pex3_chaves_dm[5:7][::-1] and pex3_pagina_dm['depois'] is None
+
+    # Cursor além do começo da faixa: página vazia, sem cursores
+    pex3_registros_dm, pex3_pagina_dm = pex3_armazenamento_dm.pex3_paginar_dm(
+        pex3_chaves_dm, pex3_chaves_dm, 2, 7, '2025-01-01|2', None, 2)
+    assert pex3_registros_dm == [] and (pex3_pagina_dm['antes'], pex3_pagina_dm['depois']) == (None, None)
+
+
+# ============== ALOCADOR DE IDS ==============
+
+def test_pex3_proximo_id_parte_do_maior_e_reserva_blocos_dm(pex3_backend_dm, tmp_path):
+    """A sequência parte do maior id gravado (não da quantidade de registros) e reserva blocos"""
+    pex3_caminho_dm = str(tmp_path / 'estoque_db.json')
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('estoque', pex3_caminho_dm, {
+        'vendas': [{'id': 10, 'data': '2025-01-01 10:00:00'}, {'id': 3, 'data': '2025-01-02 10:00:00'}],
+        'compras': [], 'ajustes': []})
+
+    assert pex3_armazenamento_dm.pex3_proximo_id_dm('estoque', pex3_caminho_dm, 'vendas') == 11
+    assert pex3_armazenamento_dm.pex3_proximo_id_dm('estoque', pex3_caminho_dm, 'vendas', 5) == 12
+    assert pex3_armazenamento_dm.pex3_proximo_id_dm('estoque', pex3_caminho_dm, 'vendas') == 17
+    # Cada coleção tem a sua sequência
+    assert pex3_armazenamento_dm.pex3_proximo_id_dm('estoque', pex3_caminho_dm, 'compras') == 1
+
+    # Um id reservado e não usado não volta a ser entregue
+    pex3_armazenamento_dm.pex3_anexar_registro_dm('estoque', pex3_caminho_dm, 'vendas', {'data': '2025-01-03 10:00:00'}, True)
+    pex3_vendas_dm = pex3_armazenamento_dm.pex3_carregar_documento_dm('estoque', pex3_caminho_dm)['vendas']
+    assert pex3_ids_dm(pex3_vendas_dm) == [10, 3, 18]
+
+
+def test_pex3_proximo_id_sem_repeticao_entre_threads_dm(pex3_backend_dm, tmp_path):
+    """Threads reservando ids ao mesmo tempo recebem ids distintos e sem lacunas"""
+    pex3_caminho_dm = str(tmp_path / 'database.json')
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('financeiro', pex3_caminho_dm, {'transactions': []})
+    pex3_ids_dm = []
+
+    def pex3_reservar_dm():
+        for _ in range(25):
+            pex3_ids_dm.append(pex3_armazenamento_dm.pex3_proximo_id_dm('financeiro', pex3_caminho_dm, 'transactions'))
+
+    pex3_threads_dm = [threading.Thread(target=pex3_reservar_dm) for _ in range(8)]
+    for pex3_thread_dm in pex3_threads_dm:
+        pex3_thread_dm.start()
+    for pex3_thread_dm in pex3_threads_dm:
+        pex3_thread_dm.join()
+    assert sorted(pex3_ids_dm) == list(range(1, 201))
+
+
+# ============== TRAVAS ENTRE PROCESSOS E GRAVAÇÃO ATÔMICA ==============
+
+def pex3_anexar_em_outro_processo_dm(pex3_backend_dm, pex3_sqlite_db_dm, pex3_caminho_dm, pex3_quantidade_dm):
+    """Executada em outro processo: acrescenta transações, uma gravação por vez"""
+    pex3_armazenamento_dm.pex3_BACKEND_dm = pex3_backend_dm
+    pex3_armazenamento_dm.pex3_SQLITE_DB_dm = pex3_sqlite_db_dm
+    for _ in range(pex3_quantidade_dm):
+        pex3_armazenamento_dm.pex3_anexar_registro_dm('financeiro', pex3_caminho_dm, 'transactions', {
+            'tipo': 'receber', 'data_gasto': '2025-01-01', 'valor': 1}, True)
+
+
+def test_pex3_gravacoes_de_varios_processos_dm(pex3_backend_dm, tmp_path):
+    """Processos gravando o mesmo documento ao mesmo tempo: nenhuma gravação se perde e
+    nenhum id se repete"""
+    pex3_caminho_dm = str(tmp_path / 'database.json')
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('financeiro', pex3_caminho_dm, {'transactions': []})
+    pex3_contexto_dm = multiprocessing.get_context('spawn')
+    pex3_processos_dm = [pex3_contexto_dm.Process(target=pex3_anexar_em_outro_processo_dm, args=(
+        pex3_backend_dm, pex3_armazenamento_dm.pex3_SQLITE_DB_dm, pex3_caminho_dm, 20)) for _ in range(3)]
+    for pex3_processo_dm in pex3_processos_dm:
+        pex3_processo_dm.start()
+    for pex3_processo_dm in pex3_processos_dm:
+        pex3_processo_dm.join(60)
+    assert [pex3_processo_dm.exitcode for pex3_processo_dm in pex3_processos_dm] == [0, 0, 0]
+
+    pex3_transacoes_dm = pex3_armazenamento_dm.pex3_carregar_documento_dm('financeiro', pex3_caminho_dm)['transactions']
+    assert sorted(pex3_ids_dm(pex3_transacoes_dm)) == list(range(1, 61))
+
+
+@pytest.mark.parametrize('pex3_backend_dm', ['json', 'journal'], indirect=True)
+def test_pex3_falha_no_meio_da_gravacao_mantem_o_original_dm(pex3_backend_dm, tmp_path):
+    """Um erro durante a escrita não deixa arquivo pela metade nem temporário para trás"""
+    pex3_caminho_dm = str(tmp_path / 'database.json')
+    pex3_armazenamento_dm.pex3_salvar_documento_dm('financeiro', pex3_caminho_dm, {'transactions': [{'id': 1, 'valor': 100}]})
+    pex3_conteudo_dm = (tmp_path / 'database.json').read_bytes()
+
+    # O último registro não é serializável: o json.dump falha depois de escrever parte do arquivo
+    with pytest.raises(TypeError):
+        pex3_armazenamento_dm.pex3_salvar_documento_dm('financeiro', pex3_caminho_dm, {
+            'transactions': [{'id': pex3_id_dm, 'valor': 100} for pex3_id_dm in range(1, 500)] + [object()]})
+    assert (tmp_path / 'database.json').read_bytes() == pex3_conteudo_dm
+    assert not os.path.exists(pex3_caminho_dm + '.tmp')
+    assert pex3_ids_dm(pex3_armazenamento_dm.pex3_carregar_documento_dm('financeiro', pex3_caminho_dm)['transactions']) == [1]
+
+    pex3_produtos_csv_dm = str(tmp_path / 'produtos.csv')
+    pex3_armazenamento_dm.pex3_gravar_produtos_dm(pex3_produtos_csv_dm, [
+        {'codigo_barras': '1', 'nome': 'Arroz', 'saldo': 1.0, 'preco_venda': 100, 'preco_compra': 50, 'estoque_minimo': 5.0}])
+    pex3_conteudo_dm = (tmp_path / 'produtos.csv').read_bytes()
+    with pytest.raises(KeyError):
+        pex3_armazenamento_dm.pex3_gravar_produtos_dm(pex3_produtos_csv_dm, [
+            {'codigo_barras': '1', 'nome': 'Arroz', 'saldo': 2.0, 'preco_venda': 100, 'preco_compra': 50, 'estoque_minimo': 5.0},
+            {'codigo_barras': '2', 'nome': 'Sem preços'}])
+    assert (tmp_path / 'produtos.csv').read_bytes() == pex3_conteudo_dm
+    assert not os.path.exists(pex3_produtos_csv_dm + '.tmp')
+
+
+# ============== REGISTROS COMPACTOS ==============
+
+def test_pex3_registro_se_comporta_como_dict_dm():
+    """Campos em __slots__ e chaves extras respondem como num dict, inclusive ausências"""
+    pex3_dados_dm = {'id': 7, 'tipo': 'pagar', 'data_gasto': '2025-02-01', 'valor': 1290,
+                     'categoria': 'Aluguel', 'forma_pagamento': 'PIX', 'observacao': 'extra'}
+    pex3_t_dm = pex3_armazenamento_dm.pex3_Transacao_dm.pex3_de_dict_dm(pex3_dados_dm)
+
+    assert pex3_t_dm == pex3_dados_dm and pex3_t_dm.pex3_como_dict_dm() == pex3_dados_dm
+    assert len(pex3_t_dm) == len(pex3_dados_dm) and set(pex3_t_dm) == set(pex3_dados_dm)
+    assert pex3_t_dm.valor == pex3_t_dm['valor'] == 1290 and pex3_t_dm['observacao'] == 'extra'
+    assert 'descricao' not in pex3_t_dm and pex3_t_dm.get('descricao', '') == ''
+    with pytest.raises(KeyError):
+        pex3_t_dm['descricao']
+    with pytest.raises(KeyError):
+        pex3_t_dm['inexistente']
+    with pytest.raises(TypeError):
+        hash(pex3_t_dm)
+
+    pex3_copia_dm = pex3_t_dm.copy()
+    pex3_copia_dm['valor'] = 1
+    pex3_copia_dm['observacao'] = 'outra'
+    del pex3_copia_dm['categoria']
+    assert type(pex3_copia_dm) is pex3_armazenamento_dm.pex3_Transacao_dm
+    assert pex3_t_dm == pex3_dados_dm and pex3_copia_dm != pex3_t_dm
+    assert 'categoria' not in pex3_copia_dm and pex3_copia_dm.setdefault('categoria', 'Diversos') == 'Diversos'
+
+    del pex3_t_dm['observacao']
+    assert pex3_t_dm.pex3_extras_dm is None and 'observacao' not in pex3_t_dm
+    with pytest.raises(KeyError):
+        del pex3_t_dm['observacao']
+
+    assert json.loads(json.dumps({'transactions': [pex3_copia_dm]}, default=pex3_armazenamento_dm.pex3_json_padrao_dm)) == {
+        'transactions': [pex3_copia_dm.pex3_como_dict_dm()]}
+
+
+def test_pex3_documento_lido_com_registros_compactos_dm():
+    """Transações, ajustes e itens de vendas/compras viram registros; o resto continua dict"""
+    pex3_documento_dm = pex3_armazenamento_dm.pex3_compactar_documento_dm({
+        'transactions': [{'id': 1, 'valor': 100}],
+        'ajustes': [{'id': 1, 'quantidade': 2.0}],
+        'vendas': [{'id': 1, 'itens': [{'codigo_barras': '1', 'quantidade': 1.0}]}],
+        'categories': [{'nome': 'Venda', 'tipo': 'receita'}],
+        'payment_methods': ['PIX']})
+    assert isinstance(pex3_documento_dm['transactions'][0], pex3_armazenamento_dm.pex3_Transacao_dm)
+    assert isinstance(pex3_documento_dm['ajustes'][0], pex3_armazenamento_dm.pex3_Ajuste_dm)
+    assert type(pex3_documento_dm['vendas'][0]) is dict
+    assert isinstance(pex3_documento_dm['vendas'][0]['itens'][0], pex3_armazenamento_dm.pex3_ItemMovimentacao_dm)
+    assert type(pex3_documento_dm['categories'][0]) is dict and pex3_documento_dm['payment_methods'] == ['PIX']
@@ -0,0 +1,628 @@
+"""
+Testes do Sistema de Estoque (catálogo, movimentações e relatórios)
+Executar com: python -m pytest
+"""
+
+import decimal
+import io
+import json
+from collections import deque
+
+import pytest
+
+import armazenamento as pex3_armazenamento_dm
+
+pex3_CODIGO_1_dm = '7891234567890'  # produtos de exemplo criados por pex3_init_app_dm
+pex3_CODIGO_2_dm = '7891234567891'
+
+
+# ============== CATÁLOGO EM MEMÓRIA ==============
+
+def test_pex3_catalogo_relido_apos_gravacao_externa_dm(pex3_sistemas_dm, monkeypatch):
+    """Uma gravação de outro processo logo depois da nossa não pode ser encoberta pelo cache"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_gravar_dm = pex3_armazenamento_dm.pex3_backend_dm()['gravar_produtos']
+
+    def pex3_gravar_e_outro_processo_dm(pex3_caminho_dm, pex3_produtos_dm, pex3_alterados_dm=None, pex3_removidos_dm=()):
+        pex3_assinatura_dm = pex3_gravar_dm(pex3_caminho_dm, pex3_produtos_dm, pex3_alterados_dm, pex3_removidos_dm)
+        pex3_externo_dm = [pex3_p_dm.pex3_como_dict_dm() for pex3_p_dm in pex3_produtos_dm]
+        pex3_externo_dm.append({'codigo_barras': '999', 'nome': 'Externo', 'saldo': 1.0,
+                                'preco_venda': 100, 'preco_compra': 50})
+        pex3_gravar_dm(pex3_caminho_dm, pex3_externo_dm)
+        return pex3_assinatura_dm
+
+    monkeypatch.setitem(pex3_armazenamento_dm.pex3_backend_dm(), 'gravar_produtos', pex3_gravar_e_outro_processo_dm)
+    pex3_estoque_dm.pex3_atualizar_saldo_produto_dm(pex3_CODIGO_1_dm, 3, 'adicionar')
+
+    assert pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm('999')['nome'] == 'Externo'
+    assert pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm(pex3_CODIGO_1_dm)['saldo'] == 13.0
+
+
+def test_pex3_catalogo_sem_releitura_apos_gravacao_propria_dm(pex3_sistemas_dm, monkeypatch):
+    """Depois de gravar, o catálogo continua valendo sem reler o armazenamento"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_estoque_dm.pex3_atualizar_saldo_produto_dm(pex3_CODIGO_1_dm, 2, 'subtrair')
+
+    def pex3_sem_leitura_dm(pex3_caminho_dm):
+        raise AssertionError('catálogo relido sem ter mudado')
+
+    monkeypatch.setitem(pex3_armazenamento_dm.pex3_backend_dm(), 'ler_produtos', pex3_sem_leitura_dm)
+    assert pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm(pex3_CODIGO_1_dm)['saldo'] == 8.0
+
+
+def test_pex3_remover_produto_sem_comparar_registros_dm(pex3_sistemas_dm, monkeypatch):
+    """A remoção localiza o produto pela identidade, sem comparar campo a campo com os demais"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+
+    def pex3_sem_comparacao_dm(pex3_a_dm, pex3_b_dm):
+        raise AssertionError('produtos comparados campo a campo')
+
+    with monkeypatch.context() as pex3_patch_dm:
+        pex3_patch_dm.setattr(pex3_armazenamento_dm.pex3_Produto_dm, '__eq__', pex3_sem_comparacao_dm)
+        assert pex3_estoque_dm.pex3_remover_produto_dm(pex3_CODIGO_2_dm)
+        assert not pex3_estoque_dm.pex3_remover_produto_dm(pex3_CODIGO_2_dm)
+
+    assert pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm(pex3_CODIGO_2_dm) is None
+    pex3_gravados_dm = [pex3_p_dm['codigo_barras'] for pex3_p_dm in
+                        pex3_armazenamento_dm.pex3_ler_produtos_dm(pex3_estoque_dm.pex3_PRODUTOS_CSV_dm)]
+    assert pex3_CODIGO_1_dm in pex3_gravados_dm and pex3_CODIGO_2_dm not in pex3_gravados_dm
+
+
+def test_pex3_requisicao_nao_reconfere_formato_dos_arquivos_dm(pex3_sistemas_dm, monkeypatch):
+    """A conferência do journal e do formato (centavos) roda na inicialização, não a cada requisição"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+
+    def pex3_sem_preparar_dm(pex3_tipo_dm, pex3_caminho_dm):
+        raise AssertionError('arquivos conferidos de novo durante a requisição')
+
+    monkeypatch.setattr(pex3_armazenamento_dm, 'pex3_preparar_dm', pex3_sem_preparar_dm)
+    assert pex3_estoque_dm.pex3_load_estoque_db_dm()['vendas'] == []  # /relatorios/movimentacao
+
+
+# ============== VENDAS E COMPRAS (TUDO OU NADA) ==============
+
+def pex3_falhar_gravacao_dm(pex3_patch_dm, pex3_funcao_dm, pex3_tipo_dm=None):
+    """Faz a função do backend falhar (só para o conjunto de dados pex3_tipo_dm, se informado)"""
+    pex3_original_dm = pex3_armazenamento_dm.pex3_backend_dm()[pex3_funcao_dm]
+
+    def pex3_falha_dm(*pex3_args_dm):
+        if pex3_tipo_dm is None or pex3_args_dm[0] == pex3_tipo_dm:
+            raise OSError('disco cheio')
+        return pex3_original_dm(*pex3_args_dm)
+
+    pex3_patch_dm.setitem(pex3_armazenamento_dm.pex3_backend_dm(), pex3_funcao_dm, pex3_falha_dm)
+
+
+def pex3_situacao_dm(pex3_estoque_dm, pex3_financeiro_dm):
+    """Saldo e preço de compra gravados do produto 1, vendas, compras e lançamentos gravados"""
+    pex3_gravado_dm = {pex3_p_dm['codigo_barras']: pex3_p_dm for pex3_p_dm in
+                       pex3_armazenamento_dm.pex3_ler_produtos_dm(pex3_estoque_dm.pex3_PRODUTOS_CSV_dm)}
+    pex3_movimentacoes_dm = pex3_estoque_dm.pex3_load_estoque_db_dm()
+    return (pex3_gravado_dm[pex3_CODIGO_1_dm]['saldo'], pex3_gravado_dm[pex3_CODIGO_1_dm]['preco_compra'],
+            len(pex3_movimentacoes_dm['vendas']), len(pex3_movimentacoes_dm['compras']),
+            len(pex3_financeiro_dm.pex3_load_db_dm()['transactions']))
+
+
+def test_pex3_venda_grava_estoque_movimentacao_e_lancamento_dm(pex3_sistemas_dm):
+    pex3_estoque_dm, pex3_financeiro_dm = pex3_sistemas_dm
+    pex3_venda_dm, pex3_erro_dm = pex3_estoque_dm.pex3_registrar_venda_dm(
+        [(pex3_CODIGO_1_dm, 2, None), (pex3_CODIGO_1_dm, 1, 2000)], pex3_cliente_dm='Ana')
+
+    assert pex3_erro_dm is None
+    assert pex3_venda_dm['valor_total'] == 2 * 2590 + 2000
+    assert pex3_situacao_dm(pex3_estoque_dm, pex3_financeiro_dm) == (7.0, 1550, 1, 0, 1)
+    assert pex3_estoque_dm.pex3_buscar_movimentacao_dm('vendas', pex3_venda_dm['id'])['cliente'] == 'Ana'
+    pex3_lancamento_dm = pex3_financeiro_dm.pex3_load_db_dm()['transactions'][0]
+    assert (pex3_lancamento_dm['tipo'], pex3_lancamento_dm['valor']) == ('receber', 7180)
+    assert pex3_lancamento_dm['descricao'] == f"Venda #{pex3_venda_dm['id']} - Ana"
+
+
+def test_pex3_venda_com_saldo_insuficiente_nao_altera_nada_dm(pex3_sistemas_dm):
+    pex3_estoque_dm, pex3_financeiro_dm = pex3_sistemas_dm
+    pex3_venda_dm, pex3_erro_dm = pex3_estoque_dm.pex3_registrar_venda_dm(
+        [(pex3_CODIGO_1_dm, 6, None), (pex3_CODIGO_1_dm, 6, None)])
+
+    assert pex3_venda_dm is None and 'Estoque insuficiente' in pex3_erro_dm
+    assert pex3_situacao_dm(pex3_estoque_dm, pex3_financeiro_dm) == (10.0, 1550, 0, 0, 0)
+
+
+def test_pex3_venda_com_falha_ao_gravar_produtos_dm(pex3_sistemas_dm, monkeypatch):
+    """Falha na última gravação: o estoque não muda e nada da venda fica gravado"""
+    pex3_estoque_dm, pex3_financeiro_dm = pex3_sistemas_dm
+    with monkeypatch.context() as pex3_patch_dm, pytest.raises(OSError):
+        pex3_falhar_gravacao_dm(pex3_patch_dm, 'gravar_produtos')
+        pex3_estoque_dm.pex3_registrar_venda_dm([(pex3_CODIGO_1_dm, 4, None)])
+
+    pex3_saldo_dm, _, pex3_vendas_dm, _, pex3_lancamentos_dm = pex3_situacao_dm(pex3_estoque_dm, pex3_financeiro_dm)
+    assert pex3_saldo_dm == 10.0
+    assert pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm(pex3_CODIGO_1_dm)['saldo'] == 10.0
+    assert (pex3_vendas_dm, pex3_lancamentos_dm) == (0, 0)
+
+
+def test_pex3_venda_com_falha_ao_gravar_lancamento_dm(pex3_sistemas_dm, monkeypatch):
+    """Falha no lançamento: o estoque não é baixado e a venda já gravada é desfeita"""
+    pex3_estoque_dm, pex3_financeiro_dm = pex3_sistemas_dm
+    with monkeypatch.context() as pex3_patch_dm, pytest.raises(OSError):
+        pex3_falhar_gravacao_dm(pex3_patch_dm, 'anexar_registros', 'financeiro')
+        pex3_estoque_dm.pex3_registrar_venda_dm([(pex3_CODIGO_1_dm, 4, None)])
+
+    pex3_saldo_dm, _, pex3_vendas_dm, _, pex3_lancamentos_dm = pex3_situacao_dm(pex3_estoque_dm, pex3_financeiro_dm)
+    assert (pex3_saldo_dm, pex3_vendas_dm, pex3_lancamentos_dm) == (10.0, 0, 0)
+    assert pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm(pex3_CODIGO_1_dm)['saldo'] == 10.0
+
+
+def test_pex3_compra_grava_estoque_movimentacao_e_lancamento_dm(pex3_sistemas_dm):
+    pex3_estoque_dm, pex3_financeiro_dm = pex3_sistemas_dm
+    pex3_compra_dm, pex3_erro_dm = pex3_estoque_dm.pex3_registrar_compra_dm(
+        [(pex3_CODIGO_1_dm, 3, 1600), (pex3_CODIGO_1_dm, 2, 1700)], pex3_numero_nf_dm='123')
+
+    assert pex3_erro_dm is None
+    assert pex3_compra_dm['valor_total'] == 3 * 1600 + 2 * 1700
+    # O preço de compra fica o da última linha do produto
+    assert pex3_situacao_dm(pex3_estoque_dm, pex3_financeiro_dm) == (15.0, 1700, 0, 1, 1)
+    assert pex3_financeiro_dm.pex3_load_db_dm()['transactions'][0]['descricao'] == f"Compra #{pex3_compra_dm['id']} - NF: 123"
+
+
+def test_pex3_compra_com_falha_ao_gravar_produtos_dm(pex3_sistemas_dm, monkeypatch):
+    """Falha na última gravação: saldo e preço não mudam e nada da compra fica gravado"""
+    pex3_estoque_dm, pex3_financeiro_dm = pex3_sistemas_dm
+    with monkeypatch.context() as pex3_patch_dm, pytest.raises(OSError):
+        pex3_falhar_gravacao_dm(pex3_patch_dm, 'gravar_produtos')
+        pex3_estoque_dm.pex3_registrar_compra_dm([(pex3_CODIGO_1_dm, 3, 1600)])
+
+    pex3_saldo_dm, pex3_preco_dm, _, pex3_compras_dm, pex3_lancamentos_dm = pex3_situacao_dm(pex3_estoque_dm, pex3_financeiro_dm)
+    assert (pex3_saldo_dm, pex3_preco_dm) == (10.0, 1550)
+    pex3_produto_dm = pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm(pex3_CODIGO_1_dm)
+    assert (pex3_produto_dm['saldo'], pex3_produto_dm['preco_compra']) == (10.0, 1550)
+    assert (pex3_compras_dm, pex3_lancamentos_dm) == (0, 0)
+
+
+# ============== ÚLTIMAS MOVIMENTAÇÕES (DASHBOARD) ==============
+
+def test_pex3_ultimas_vendas_do_fim_do_indice_dm(pex3_sistemas_dm, monkeypatch):
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    for pex3_n_dm in range(1, 8):
+        pex3_estoque_dm.pex3_registrar_venda_dm([(pex3_CODIGO_2_dm, 0.5, 100 * pex3_n_dm)])
+    assert [pex3_v_dm['valor_total'] for pex3_v_dm in pex3_estoque_dm.pex3_ultimas_movimentacoes_dm('vendas')] == [
+        350, 300, 250, 200, 150]
+
+    # Uma venda nova deste processo entra no índice sem reler o arquivo de movimentações
+    pex3_leituras_dm = []
+    pex3_load_dm = json.load
+    monkeypatch.setattr(json, 'load', lambda f: pex3_leituras_dm.append(f.name) or pex3_load_dm(f))
+    pex3_estoque_dm.pex3_registrar_venda_dm([(pex3_CODIGO_2_dm, 0.5, 800)])
+
+    assert [pex3_v_dm['valor_total'] for pex3_v_dm in pex3_estoque_dm.pex3_ultimas_movimentacoes_dm('vendas', 2)] == [400, 350]
+    assert pex3_estoque_dm.pex3_ESTOQUE_DB_dm not in pex3_leituras_dm
+
+
+# ============== PÁGINAS DE VENDAS E COMPRAS ==============
+
+def test_pex3_paginas_de_vendas_pelo_cursor_dm(pex3_sistemas_dm):
+    """Páginas exatas (6 vendas, 3 por página) e uma venda nova entre uma página e outra:
+    a página seguinte continua do cursor, sem repetir nem pular vendas"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    for _ in range(6):
+        pex3_estoque_dm.pex3_registrar_venda_dm([(pex3_CODIGO_2_dm, 0.5, 100)])
+
+    pex3_primeira_dm, pex3_pagina_dm = pex3_estoque_dm.pex3_pagina_movimentacoes_dm('vendas', '', '', pex3_por_pagina_dm=3)
+    assert [pex3_v_dm['id'] for pex3_v_dm in pex3_primeira_dm] == [6, 5, 4]
+    assert pex3_pagina_dm['depois'] is None and pex3_pagina_dm['total'] == 6
+
+    pex3_estoque_dm.pex3_registrar_venda_dm([(pex3_CODIGO_2_dm, 0.5, 100)])
+    pex3_segunda_dm, pex3_pagina_dm = pex3_estoque_dm.pex3_pagina_movimentacoes_dm(
+        'vendas', '', '', pex3_pagina_dm['antes'], None, 3)
+    assert [pex3_v_dm['id'] for pex3_v_dm in pex3_segunda_dm] == [3, 2, 1]
+    assert pex3_pagina_dm['antes'] is None
+
+    # Voltando, a página mais nova agora traz a venda 7
+    pex3_volta_dm, pex3_pagina_dm = pex3_estoque_dm.pex3_pagina_movimentacoes_dm(
+        'vendas', '', '', None, pex3_pagina_dm['depois'], 3)
+    assert [pex3_v_dm['id'] for pex3_v_dm in pex3_volta_dm] == [6, 5, 4]
+    assert pex3_pagina_dm['depois'] is not None
+
+    pex3_cliente_dm = pex3_estoque_dm.pex3_app_dm.test_client()
+    pex3_resposta_dm = pex3_cliente_dm.get('/vendas', query_string={
+        'por_pagina': 3, 'antes': f"{pex3_volta_dm[-1]['data']}|4"})
+    assert pex3_resposta_dm.status_code == 200
+
+
+# ============== TOTAIS DO ESTOQUE ==============
+
+def test_pex3_conferir_totais_apos_venda_compra_e_ajuste_dm(pex3_sistemas_dm, monkeypatch):
+    """Os totais mantidos por diferença batem com o recálculo completo depois de cada operação"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    monkeypatch.setattr(pex3_estoque_dm, 'pex3_garantir_conferencia_dm', lambda: None)  # sem a thread de conferência
+
+    def pex3_esperados_dm():
+        pex3_produtos_dm = pex3_armazenamento_dm.pex3_ler_produtos_dm(pex3_estoque_dm.pex3_PRODUTOS_CSV_dm)
+        return dict(zip(pex3_estoque_dm.pex3_CAMPOS_TOTAIS_dm,
+                        pex3_estoque_dm.pex3_calcular_totais_dm(pex3_produtos_dm)['somas']))
+
+    pex3_iniciais_dm = pex3_estoque_dm.pex3_obter_totais_dm()
+    assert pex3_iniciais_dm == pex3_esperados_dm()
+    pex3_cliente_dm = pex3_estoque_dm.pex3_app_dm.test_client()
+    pex3_operacoes_dm = [
+        lambda: pex3_estoque_dm.pex3_registrar_venda_dm([(pex3_CODIGO_1_dm, 2, 2590)]),
+        lambda: pex3_estoque_dm.pex3_registrar_compra_dm([(pex3_CODIGO_2_dm, 3, 1234)]),
+        lambda: pex3_cliente_dm.post('/ajuste-estoque', data={'codigo_barras': pex3_CODIGO_1_dm, 'quantidade': '1.5',
+                                                              'tipo_ajuste': 'saida', 'motivo': 'avaria'}),
+    ]
+    for pex3_operacao_dm in pex3_operacoes_dm:
+        pex3_operacao_dm()
+        assert pex3_estoque_dm.pex3_obter_totais_dm() == pex3_esperados_dm()
+        assert pex3_estoque_dm.pex3_conferir_totais_dm()
+
+    # Venda de 2, ajuste de -1,5 e compra de 3: itens e valores mudaram de fato
+    pex3_finais_dm = pex3_estoque_dm.pex3_obter_totais_dm()
+    assert pex3_finais_dm['total_itens'] == pex3_iniciais_dm['total_itens'] - 2 - 1.5 + 3
+    assert pex3_finais_dm['valor_estoque'] != pex3_iniciais_dm['valor_estoque']
+
+    # Uma divergência injetada é detectada e corrigida pelo recálculo
+    pex3_estoque_dm.pex3_catalogo_dm['totais']['somas'][1] += 10
+    assert not pex3_estoque_dm.pex3_conferir_totais_dm()
+    assert pex3_estoque_dm.pex3_obter_totais_dm() == pex3_esperados_dm()
+
+
+# ============== IMPORTAÇÃO DE PRODUTOS ==============
+
+pex3_CSV_IMPORTACAO_dm = (
+    'codigo_barras;nome;saldo;preco_venda;preco_compra\n'
+    '100;Novo;3;2,50;1,25\n'               # 2: inserido
+    f'{pex3_CODIGO_1_dm};Arroz Novo;;30;20\n'  # 3: atualizado (saldo em branco: mantém)
+    ';Sem código;1;1;1\n'                  # 4: código vazio
+    '101;;1;1;1\n'                         # 5: sem nome
+    '100;Repetido;1;1;1\n'                 # 6: código repetido no arquivo
+    '102;Ruim;abc;1;1\n'                   # 7: número inválido
+    '103;Negativo;1;-1;1\n'                # 8: preço negativo
+    ';;;;\n'                               # 9: em branco (ignorada)
+    '104;Curta\n'                          # 10: colunas faltando
+)
+
+
+def test_pex3_importar_produtos_com_linhas_invalidas_dm(pex3_sistemas_dm):
+    """Linhas inválidas são relatadas com o número da linha e não impedem as válidas"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_resumo_dm = pex3_estoque_dm.pex3_importar_produtos_dm(io.StringIO(pex3_CSV_IMPORTACAO_dm))
+
+    assert {pex3_k_dm: pex3_resumo_dm[pex3_k_dm] for pex3_k_dm in ('linhas', 'inseridos', 'atualizados', 'invalidos')} == {
+        'linhas': 8, 'inseridos': 1, 'atualizados': 1, 'invalidos': 6}
+    assert [pex3_linha_dm for pex3_linha_dm, _ in pex3_resumo_dm['erros']] == [4, 5, 6, 7, 8, 10]
+    assert 'repetido' in pex3_resumo_dm['erros'][2][1] and 'saldo' in pex3_resumo_dm['erros'][3][1]
+
+    pex3_gravados_dm = {pex3_p_dm['codigo_barras']: pex3_p_dm for pex3_p_dm in
+                        pex3_armazenamento_dm.pex3_ler_produtos_dm(pex3_estoque_dm.pex3_PRODUTOS_CSV_dm)}
+    assert (pex3_gravados_dm['100']['nome'], pex3_gravados_dm['100']['saldo'],
+            pex3_gravados_dm['100']['preco_venda'], pex3_gravados_dm['100']['preco_compra']) == ('Novo', 3.0, 250, 125)
+    assert (pex3_gravados_dm[pex3_CODIGO_1_dm]['nome'], pex3_gravados_dm[pex3_CODIGO_1_dm]['saldo'],
+            pex3_gravados_dm[pex3_CODIGO_1_dm]['preco_venda']) == ('Arroz Novo', 10.0, 3000)
+    assert not {'101', '102', '103', '104'} & set(pex3_gravados_dm)
+
+
+def test_pex3_importar_produtos_valores_enormes_ou_ambiguos_dm(pex3_sistemas_dm, monkeypatch):
+    """Preços, saldos e centavos que não dão para converter invalidam só a sua linha"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_centavos_dm = pex3_armazenamento_dm.pex3_centavos_dm
+
+    def pex3_centavos_quebrando_dm(pex3_texto_dm):
+        if pex3_texto_dm == '7,77':
+            raise decimal.InvalidOperation(pex3_texto_dm)
+        return pex3_centavos_dm(pex3_texto_dm)
+
+    monkeypatch.setattr(pex3_armazenamento_dm, 'pex3_centavos_dm', pex3_centavos_quebrando_dm)
+    pex3_csv_dm = ('codigo_barras;nome;saldo;preco_venda;preco_compra;preco_venda_centavos;preco_compra_centavos\n'
+                   '200;Enorme;1;1e30;1;;\n'
+                   '201;Ambíguo;1;1.234;1;;\n'
+                   '202;Misturado;1;1,234.56;1;;\n'
+                   '203;Quebra;1;7,77;1;;\n'
+                   '204;Saldo infinito;1e400;1;1;;\n'
+                   '205;Centavos enormes;1;;;99999999999999999999;1\n'
+                   '206;Bom;1;1.234,56;1;;\n')
+    pex3_resumo_dm = pex3_estoque_dm.pex3_importar_produtos_dm(io.StringIO(pex3_csv_dm))
+    assert (pex3_resumo_dm['inseridos'], pex3_resumo_dm['invalidos']) == (1, 6)
+    assert [pex3_linha_dm for pex3_linha_dm, _ in pex3_resumo_dm['erros']] == [2, 3, 4, 5, 6, 7]
+    assert pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm('206')['preco_venda'] == 123456
+
+
+def test_pex3_importar_produtos_quantidades_com_ponto_dm(pex3_sistemas_dm):
+    """Saldo e estoque mínimo não passam pela regra de ambiguidade dos preços: o ponto é decimal"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_resumo_dm = pex3_estoque_dm.pex3_importar_produtos_dm(io.StringIO(
+        'codigo_barras;nome;saldo;estoque_minimo;preco_venda;preco_compra\n'
+        '210;Granel;1.000;10.500;2;1\n'
+        '211;Vírgula;1.234,5;2,25;2;1\n'
+        '212;Preço ambíguo;1;1;1.234;1\n'))
+    assert (pex3_resumo_dm['inseridos'], pex3_resumo_dm['invalidos']) == (2, 1)
+    assert 'preco_venda' in pex3_resumo_dm['erros'][0][1]
+    pex3_granel_dm = pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm('210')
+    assert (pex3_granel_dm['saldo'], pex3_granel_dm['estoque_minimo']) == (1.0, 10.5)
+    pex3_virgula_dm = pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm('211')
+    assert (pex3_virgula_dm['saldo'], pex3_virgula_dm['estoque_minimo']) == (1234.5, 2.25)
+
+
+def test_pex3_formularios_com_valor_ambiguo_voltam_ao_formulario_dm(pex3_sistemas_dm):
+    """Preços, descontos e quantidades recusados viram aviso no formulário, não erro 500"""
+    pex3_estoque_dm, pex3_financeiro_dm = pex3_sistemas_dm
+    pex3_cliente_dm = pex3_estoque_dm.pex3_app_dm.test_client()
+    pex3_item_dm = {'item_codigo[]': pex3_CODIGO_1_dm, 'item_quantidade[]': '1', 'item_preco[]': ''}
+    pex3_envios_dm = [
+        ('/produtos/cadastrar', {'codigo_barras': '300', 'nome': 'Novo', 'saldo': '1', 'preco_venda': '1.234', 'preco_compra': '1'}),
+        ('/produtos/cadastrar', {'codigo_barras': '300', 'nome': 'Novo', 'saldo': 'abc', 'preco_venda': '1', 'preco_compra': '1'}),
+        (f'/produtos/editar/{pex3_CODIGO_1_dm}', {'nome': 'Outro', 'preco_venda': '1,234.56', 'preco_compra': '1'}),
+        ('/vendas/nova', {**pex3_item_dm, 'desconto': '1.000'}),
+        ('/vendas/nova', {**pex3_item_dm, 'item_preco[]': '1e30'}),
+        ('/compras/nova', {**pex3_item_dm, 'item_preco[]': '2.500'}),
+        ('/compras/nova', {**pex3_item_dm, 'item_quantidade[]': 'dez'}),
+    ]
+    for pex3_rota_dm, pex3_dados_dm in pex3_envios_dm:
+        pex3_resposta_dm = pex3_cliente_dm.post(pex3_rota_dm, data=pex3_dados_dm)
+        assert pex3_resposta_dm.status_code == 302, pex3_rota_dm
+        assert pex3_resposta_dm.headers['Location'].endswith(pex3_rota_dm), pex3_rota_dm
+        with pex3_cliente_dm.session_transaction() as pex3_sessao_dm:
+            assert pex3_sessao_dm.pop('_flashes') == [('error', pex3_estoque_dm.pex3_VALOR_INVALIDO_dm)], pex3_rota_dm
+
+    assert pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm('300') is None
+    assert pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm(pex3_CODIGO_1_dm)['nome'] == 'Produto Exemplo 1'
+    assert pex3_situacao_dm(pex3_estoque_dm, pex3_financeiro_dm) == (10.0, 1550, 0, 0, 0)
+
+
+def test_pex3_rota_importar_produtos_solta_o_stream_apos_erro_dm(pex3_sistemas_dm, monkeypatch):
+    """Mesmo quando a importação falha, o wrapper de texto é desligado do upload"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_wrappers_dm = []
+
+    def pex3_importar_com_falha_dm(pex3_arquivo_dm, pex3_simular_dm=False):
+        pex3_wrappers_dm.append(pex3_arquivo_dm)
+        raise RuntimeError('falha inesperada')
+
+    monkeypatch.setattr(pex3_estoque_dm, 'pex3_importar_produtos_dm', pex3_importar_com_falha_dm)
+    pex3_resposta_dm = pex3_estoque_dm.pex3_app_dm.test_client().post('/produtos/importar', data={
+        'arquivo': (io.BytesIO(pex3_CSV_IMPORTACAO_dm.encode('utf-8')), 'produtos.csv')})
+    assert pex3_resposta_dm.status_code == 500
+    assert pex3_wrappers_dm[0].buffer is None  # desligado: não há mais stream por trás do wrapper
+
+
+def test_pex3_importar_produtos_cabecalho_invalido_e_simulacao_dm(pex3_sistemas_dm):
+    """Cabeçalho sem colunas obrigatórias não importa nada; a simulação só valida"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_antes_dm = pex3_armazenamento_dm.pex3_ler_produtos_dm(pex3_estoque_dm.pex3_PRODUTOS_CSV_dm)
+
+    pex3_resumo_dm = pex3_estoque_dm.pex3_importar_produtos_dm(io.StringIO('codigo;nome;preco\n1;A;2\n'))
+    assert (pex3_resumo_dm['inseridos'], pex3_resumo_dm['atualizados'], pex3_resumo_dm['invalidos']) == (0, 0, 1)
+    assert 'codigo_barras' in pex3_resumo_dm['erros'][0][1]
+
+    pex3_resumo_dm = pex3_estoque_dm.pex3_importar_produtos_dm(io.StringIO(pex3_CSV_IMPORTACAO_dm), pex3_simular_dm=True)
+    assert (pex3_resumo_dm['inseridos'], pex3_resumo_dm['atualizados'], pex3_resumo_dm['invalidos']) == (1, 1, 6)
+    assert pex3_armazenamento_dm.pex3_ler_produtos_dm(pex3_estoque_dm.pex3_PRODUTOS_CSV_dm) == pex3_antes_dm
+    assert pex3_estoque_dm.pex3_buscar_produto_por_codigo_dm('100') is None
+
+
+# ============== BUSCA DE PRODUTOS ==============
+
+pex3_NOMES_BUSCA_dm = ['Arroz Integral 1kg', 'Feijão Preto', 'Farinha de Arroz', 'Açúcar Cristal', 'Arroz Parboilizado',
+                       'Óleo de Soja', 'Macarrão de Arroz', 'Café Torrado', 'Biscoito de Arroz Integral', 'Sal Grosso',
+                       'Arroz Branco']
+pex3_TERMOS_BUSCA_dm = ['arroz', 'ARR', 'roz', 'acucar', 'de ar', 'integral arroz', 'ca', 'oz', 'oz bra', 'o', 'a d',
+                        '78900', '7890001', '0001', '00', 'xyz']
+
+
+def pex3_cadastrar_para_busca_dm(pex3_estoque_dm):
+    for pex3_i_dm, pex3_nome_dm in enumerate(pex3_NOMES_BUSCA_dm):
+        assert pex3_estoque_dm.pex3_inserir_produto_dm({
+            'codigo_barras': f'78900{pex3_i_dm:02d}', 'nome': pex3_nome_dm, 'saldo': 5.0,
+            'preco_venda': 100, 'preco_compra': 50})
+
+
+def pex3_busca_antiga_dm(pex3_estoque_dm, pex3_termo_dm):
+    """Códigos que a busca por trecho (anterior ao índice) encontrava"""
+    return {pex3_p_dm['codigo_barras'] for pex3_p_dm in pex3_estoque_dm.pex3_catalogo_dm['produtos']
+            if pex3_termo_dm.lower() in pex3_p_dm['nome'].lower() or pex3_termo_dm in pex3_p_dm['codigo_barras']}
+
+
+def pex3_busca_direta_dm(pex3_estoque_dm, pex3_termo_dm):
+    """Ranking da busca calculado produto a produto, com comparação por trecho (sem o índice)"""
+    pex3_codigo_termo_dm = pex3_termo_dm.strip()
+    pex3_nome_termo_dm = pex3_estoque_dm.pex3_nome_busca_dm(pex3_termo_dm)
+    pex3_ranking_dm = []
+    for pex3_p_dm in pex3_estoque_dm.pex3_catalogo_dm['produtos']:
+        pex3_codigo_dm = pex3_p_dm['codigo_barras']
+        pex3_nome_dm = pex3_estoque_dm.pex3_nome_busca_dm(pex3_p_dm['nome'])
+        if pex3_codigo_dm.startswith(pex3_codigo_termo_dm):
+            pex3_ranking_dm.append(((0, pex3_codigo_dm), pex3_codigo_dm))
+        elif pex3_nome_dm.startswith(pex3_nome_termo_dm):
+            pex3_ranking_dm.append(((1, pex3_nome_dm, pex3_codigo_dm), pex3_codigo_dm))
+        elif all(pex3_w_dm in pex3_nome_dm for pex3_w_dm in pex3_nome_termo_dm.split()):
+            pex3_ranking_dm.append(((2, (' ' + pex3_nome_termo_dm) not in (' ' + pex3_nome_dm),
+                                     pex3_nome_termo_dm not in pex3_nome_dm, ' ' + pex3_nome_dm, pex3_codigo_dm), pex3_codigo_dm))
+        elif pex3_codigo_termo_dm in pex3_codigo_dm:
+            pex3_ranking_dm.append(((3, pex3_codigo_dm), pex3_codigo_dm))
+    return [pex3_c_dm for _, pex3_c_dm in sorted(pex3_ranking_dm)]
+
+
+def test_pex3_buscar_produtos_igual_a_busca_direta_dm(pex3_sistemas_dm):
+    """O índice de trigramas e prefixos acha tudo o que a busca por trecho achava (palavras
+    curtas e trechos do código inclusive), no ranking calculado produto a produto, também
+    depois de inclusões, alterações e exclusões feitas com o índice montado"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_estoque_dm.pex3_buscar_produtos_dm('arroz')  # monta o índice antes das alterações
+    pex3_cadastrar_para_busca_dm(pex3_estoque_dm)
+    assert pex3_estoque_dm.pex3_alterar_produto_dm('7890003', nome='Arroz Doce')
+    assert pex3_estoque_dm.pex3_remover_produto_dm('7890000')
+
+    for pex3_termo_dm in pex3_TERMOS_BUSCA_dm:
+        pex3_esperado_dm = pex3_busca_direta_dm(pex3_estoque_dm, pex3_termo_dm)
+        pex3_achados_dm = [pex3_p_dm['codigo_barras'] for pex3_p_dm in pex3_estoque_dm.pex3_buscar_produtos_dm(pex3_termo_dm, None)]
+        assert pex3_achados_dm == pex3_esperado_dm, pex3_termo_dm
+        assert pex3_busca_antiga_dm(pex3_estoque_dm, pex3_termo_dm) <= set(pex3_achados_dm), pex3_termo_dm
+        pex3_limitados_dm = pex3_estoque_dm.pex3_buscar_produtos_dm(pex3_termo_dm, 3)
+        assert [pex3_p_dm['codigo_barras'] for pex3_p_dm in pex3_limitados_dm] == pex3_esperado_dm[:3], pex3_termo_dm
+
+    # Palavras curtas casam no meio das palavras do nome; trechos do código também contam
+    assert '7890010' in pex3_busca_direta_dm(pex3_estoque_dm, 'oz')
+    assert [pex3_p_dm['codigo_barras'] for pex3_p_dm in pex3_estoque_dm.pex3_buscar_produtos_dm('oz bra')] == ['7890010']
+    assert [pex3_p_dm['codigo_barras'] for pex3_p_dm in pex3_estoque_dm.pex3_buscar_produtos_dm('0001')] == ['7890001']
+
+    # O índice montado do zero responde igual ao mantido incrementalmente
+    pex3_incremental_dm = {pex3_t_dm: pex3_estoque_dm.pex3_buscar_produtos_dm(pex3_t_dm, None) for pex3_t_dm in pex3_TERMOS_BUSCA_dm}
+    pex3_estoque_dm.pex3_catalogo_dm['busca'] = None
+    assert {pex3_t_dm: pex3_estoque_dm.pex3_buscar_produtos_dm(pex3_t_dm, None)
+            for pex3_t_dm in pex3_TERMOS_BUSCA_dm} == pex3_incremental_dm
+    assert pex3_estoque_dm.pex3_buscar_produtos_dm('   ') == []
+
+
+class pex3_ListaContada_dm(list):
+    """Lista do índice que conta quantos itens foram lidos dela"""
+    pex3_lidos_dm = 0
+
+    def __iter__(self):
+        for pex3_item_dm in super().__iter__():
+            pex3_ListaContada_dm.pex3_lidos_dm += 1
+            yield pex3_item_dm
+
+    def __getitem__(self, pex3_posicao_dm):
+        pex3_ListaContada_dm.pex3_lidos_dm += 1
+        return super().__getitem__(pex3_posicao_dm)
+
+
+def test_pex3_buscar_produtos_nao_percorre_o_catalogo_dm(pex3_sistemas_dm):
+    """Termos sem resultado, trechos do código e palavras de 1-2 letras leem só as listas
+    do índice que os contêm, nunca o catálogo inteiro"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_linhas_dm = ['codigo_barras;nome;saldo;preco_venda;preco_compra']
+    for pex3_i_dm in range(400):
+        pex3_nome_dm = f'Sabão {pex3_i_dm} 1kg' if pex3_i_dm % 50 == 0 else f'Produto {pex3_i_dm:03d}'
+        pex3_linhas_dm.append(f'789{pex3_i_dm:05d};{pex3_nome_dm};1;2;1')
+    pex3_estoque_dm.pex3_importar_produtos_dm(io.StringIO('\n'.join(pex3_linhas_dm) + '\n'))
+
+    pex3_busca_dm = pex3_estoque_dm.pex3_obter_indice_busca_dm()
+    for pex3_chave_dm in ('ordenados', 'codigos'):
+        pex3_busca_dm[pex3_chave_dm] = pex3_ListaContada_dm(pex3_busca_dm[pex3_chave_dm])
+    for pex3_chave_dm in ('gramas_nome', 'gramas_codigo'):
+        for pex3_grama_dm, pex3_lista_dm in pex3_busca_dm[pex3_chave_dm].items():
+            pex3_busca_dm[pex3_chave_dm][pex3_grama_dm] = pex3_ListaContada_dm(pex3_lista_dm)
+
+    for pex3_termo_dm in ('xyzq', '0123', '78900123', 'kg', 'ab', 'sab'):
+        pex3_ListaContada_dm.pex3_lidos_dm = 0
+        pex3_achados_dm = [pex3_p_dm['codigo_barras'] for pex3_p_dm in pex3_estoque_dm.pex3_buscar_produtos_dm(pex3_termo_dm)]
+        assert pex3_achados_dm == pex3_busca_direta_dm(pex3_estoque_dm, pex3_termo_dm)[:10], pex3_termo_dm
+        assert pex3_ListaContada_dm.pex3_lidos_dm < 60, pex3_termo_dm
+
+
+def test_pex3_listar_produtos_com_busca_por_trecho_dm(pex3_sistemas_dm):
+    """/produtos?busca= mostra os mesmos produtos que a busca por trecho mostrava"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_cadastrar_para_busca_dm(pex3_estoque_dm)
+    pex3_cliente_dm = pex3_estoque_dm.pex3_app_dm.test_client()
+    for pex3_termo_dm in ('oz', 'oz bra', '0001'):
+        pex3_html_dm = pex3_cliente_dm.get('/produtos', query_string={'busca': pex3_termo_dm}).get_data(as_text=True)
+        for pex3_codigo_dm in pex3_busca_antiga_dm(pex3_estoque_dm, pex3_termo_dm):
+            assert pex3_codigo_dm in pex3_html_dm, (pex3_termo_dm, pex3_codigo_dm)
+
+
+# ============== ALERTAS DE ESTOQUE BAIXO ==============
+
+def pex3_abaixo_do_minimo_direto_dm(pex3_estoque_dm):
+    """Códigos abaixo do mínimo, do mais crítico ao menos crítico, percorrendo o catálogo"""
+    return [pex3_c_dm for _, pex3_c_dm in sorted(
+        (pex3_estoque_dm.pex3_folga_dm(pex3_p_dm), pex3_p_dm['codigo_barras'])
+        for pex3_p_dm in pex3_estoque_dm.pex3_catalogo_dm['produtos'] if pex3_estoque_dm.pex3_folga_dm(pex3_p_dm) < 0)]
+
+
+def test_pex3_alertas_incrementais_acompanham_a_lista_completa_dm(pex3_sistemas_dm, monkeypatch):
+    """Um painel que aplica só as mudanças (?desde=) fica com a mesma lista que a consulta
+    completa; com o histórico de mudanças esgotado, a resposta volta a ser completa"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_cliente_dm = pex3_estoque_dm.pex3_app_dm.test_client()
+    pex3_cadastrar_para_busca_dm(pex3_estoque_dm)
+
+    pex3_dados_dm = pex3_cliente_dm.get('/api/estoque/alertas').get_json()
+    assert pex3_dados_dm['completo'] and pex3_dados_dm['alertas'] == []
+    pex3_painel_dm = {}
+    pex3_versao_dm = pex3_dados_dm['versao']
+
+    pex3_operacoes_dm = [
+        lambda: pex3_estoque_dm.pex3_atualizar_saldo_produto_dm('7890001', 4, 'subtrair'),
+        lambda: pex3_estoque_dm.pex3_atualizar_saldo_produto_dm('7890002', 3, 'definir'),
+        lambda: pex3_estoque_dm.pex3_atualizar_saldo_produto_dm('7890001', 1, 'subtrair'),  # continua em alerta
+        lambda: pex3_estoque_dm.pex3_alterar_produto_dm('7890003', estoque_minimo=8.0),
+        lambda: pex3_estoque_dm.pex3_atualizar_saldo_produto_dm('7890002', 10, 'adicionar'),  # sai do alerta
+        lambda: pex3_estoque_dm.pex3_atualizar_saldo_produto_dm('7890004', 5, 'adicionar'),  # nunca entra
+        lambda: pex3_estoque_dm.pex3_remover_produto_dm('7890003'),
+        lambda: pex3_estoque_dm.pex3_inserir_produto_dm({
+            'codigo_barras': '7890099', 'nome': 'Novo', 'saldo': 1.0, 'preco_venda': 100, 'preco_compra': 50}),
+    ]
+    for pex3_operacao_dm in pex3_operacoes_dm:
+        pex3_operacao_dm()
+        pex3_dados_dm = pex3_cliente_dm.get('/api/estoque/alertas', query_string={'desde': pex3_versao_dm}).get_json()
+        assert not pex3_dados_dm['completo']
+        for pex3_codigo_dm in pex3_dados_dm['removidos']:
+            pex3_painel_dm.pop(pex3_codigo_dm, None)
+        pex3_painel_dm.update({pex3_p_dm['codigo_barras']: pex3_p_dm for pex3_p_dm in pex3_dados_dm['alertas']})
+        pex3_versao_dm = pex3_dados_dm['versao']
+
+        pex3_completa_dm = pex3_cliente_dm.get('/api/estoque/alertas').get_json()['alertas']
+        assert [pex3_p_dm['codigo_barras'] for pex3_p_dm in pex3_completa_dm] == pex3_abaixo_do_minimo_direto_dm(pex3_estoque_dm)
+        assert pex3_painel_dm == {pex3_p_dm['codigo_barras']: pex3_p_dm for pex3_p_dm in pex3_completa_dm}
+    assert sorted(pex3_painel_dm) == ['7890001', '7890099']
+
+    # Sem mudanças, a resposta incremental vem vazia e com a mesma versão
+    pex3_dados_dm = pex3_cliente_dm.get('/api/estoque/alertas', query_string={'desde': pex3_versao_dm}).get_json()
+    assert (pex3_dados_dm['versao'], pex3_dados_dm['alertas'], pex3_dados_dm['removidos']) == (pex3_versao_dm, [], [])
+
+    monkeypatch.setitem(pex3_estoque_dm.pex3_alertas_dm, 'mudancas', deque(maxlen=2))
+    for pex3_saldo_dm in (0, 1, 2):
+        pex3_estoque_dm.pex3_atualizar_saldo_produto_dm('7890005', pex3_saldo_dm, 'definir')
+    pex3_dados_dm = pex3_cliente_dm.get('/api/estoque/alertas', query_string={'desde': pex3_versao_dm}).get_json()
+    assert pex3_dados_dm['completo']
+    assert [pex3_p_dm['codigo_barras'] for pex3_p_dm in pex3_dados_dm['alertas']] == pex3_abaixo_do_minimo_direto_dm(pex3_estoque_dm)
+
+
+def test_pex3_alertas_apos_reiniciar_o_servidor_dm(pex3_sistemas_dm, monkeypatch):
+    """Uma versão guardada antes de reiniciar não vale depois: mesmo que o contador
+    recomece no mesmo número, o painel recebe a lista completa"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    pex3_cliente_dm = pex3_estoque_dm.pex3_app_dm.test_client()
+    pex3_versao_antiga_dm = pex3_cliente_dm.get('/api/estoque/alertas').get_json()['versao']
+
+    # Outro processo (ou este, antes de cair) deixa um produto abaixo do mínimo
+    pex3_estoque_dm.pex3_atualizar_saldo_produto_dm(pex3_CODIGO_1_dm, 0, 'definir')
+
+    # Reinício: catálogo, índice e contador de versões voltam ao estado inicial
+    monkeypatch.setattr(pex3_estoque_dm, 'pex3_catalogo_dm', {
+        'assinatura': None, 'produtos': [], 'indice': {}, 'busca': None, 'reposicao': None, 'totais': None})
+    monkeypatch.setattr(pex3_estoque_dm, 'pex3_alertas_dm', {
+        'epoca': None, 'versao': 0, 'base': 0, 'mudancas': deque(maxlen=pex3_estoque_dm.pex3_MAX_LOG_ALERTAS_dm)})
+
+    pex3_dados_dm = pex3_cliente_dm.get('/api/estoque/alertas', query_string={'desde': pex3_versao_antiga_dm}).get_json()
+    assert pex3_dados_dm['versao'].rpartition('.')[2] == pex3_versao_antiga_dm.rpartition('.')[2]
+    assert pex3_dados_dm['versao'] != pex3_versao_antiga_dm
+    assert pex3_dados_dm['completo']
+    assert [pex3_p_dm['codigo_barras'] for pex3_p_dm in pex3_dados_dm['alertas']] == [pex3_CODIGO_1_dm]
+
+    # Versões sem época (formato antigo) ou ilegíveis também recebem a lista completa
+    for pex3_desde_dm in ('1', 'x', pex3_dados_dm['versao'] + 'x'):
+        assert pex3_cliente_dm.get('/api/estoque/alertas', query_string={'desde': pex3_desde_dm}).get_json()['completo']
+
+
+# ============== EXPORTAÇÃO ==============
+
+def pex3_primeiro_pedaco_dm(pex3_cliente_dm, pex3_url_dm):
+    """Primeiro pedaço enviado pela resposta em fluxo (sem ler o restante)"""
+    pex3_resposta_dm = pex3_cliente_dm.get(pex3_url_dm, buffered=False)
+    try:
+        return next(pex3_resposta_dm.iter_encoded()).decode('utf-8')
+    finally:
+        pex3_resposta_dm.close()
+
+
+def test_pex3_exportar_movimentacoes_envia_o_primeiro_registro_logo_dm(pex3_sistemas_dm):
+    """O primeiro pedaço do CSV (cabeçalho + primeira venda) e do NDJSON já sai com um único registro"""
+    pex3_estoque_dm, _ = pex3_sistemas_dm
+    for _ in range(3):
+        pex3_estoque_dm.pex3_registrar_venda_dm([(pex3_CODIGO_1_dm, 1, None)])
+    pex3_cliente_dm = pex3_estoque_dm.pex3_app_dm.test_client()
+
+    pex3_csv_dm = pex3_primeiro_pedaco_dm(pex3_cliente_dm, '/exportar/vendas.csv').splitlines()
+    assert len(pex3_csv_dm) == 2 and pex3_csv_dm[0].startswith('id;data;')
+    pex3_ndjson_dm = pex3_primeiro_pedaco_dm(pex3_cliente_dm, '/exportar/vendas.ndjson').splitlines()
+    assert len(pex3_ndjson_dm) == 1 and json.loads(pex3_ndjson_dm[0])['id'] == 1
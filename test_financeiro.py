@@ -0,0 +1,521 @@
+"""
+Testes do Sistema Financeiro (índice de transações e agregados do Analytics)
+Executar com: python -m pytest
+"""
+
+import bisect
+import csv
+import decimal
+import io
+import json
+import random
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+import armazenamento as pex3_armazenamento_dm
+import financeiro as pex3_financeiro_dm
+
+pex3_MOTORES_dm = [False, pytest.param(True, marks=pytest.mark.skipif(pex3_financeiro_dm.np is None,
+                                                                      reason='NumPy não instalado'))]
+
+
+def pex3_transacoes_dm(pex3_quantidade_dm, pex3_primeiro_id_dm=1, pex3_semente_dm=0):
+    """Transações (em dict) espalhadas por dois anos"""
+    pex3_aleatorio_dm = random.Random(pex3_semente_dm)
+    return [{'id': pex3_id_dm,
+             'tipo': pex3_aleatorio_dm.choice(['receber', 'pagar']),
+             'data_gasto': (date(2024, 1, 1) + timedelta(days=pex3_aleatorio_dm.randrange(730))).isoformat(),
+             'data_criacao': '2024-01-01 00:00:00',
+             'valor': pex3_aleatorio_dm.randrange(1, 10000),
+             'categoria': pex3_aleatorio_dm.choice(['Venda', 'Aluguel', 'Diversos']),
+             'forma_pagamento': pex3_aleatorio_dm.choice(['PIX', 'Dinheiro']),
+             'descricao': ''}
+            for pex3_id_dm in range(pex3_primeiro_id_dm, pex3_primeiro_id_dm + pex3_quantidade_dm)]
+
+
+def pex3_indice_de_dm(pex3_dicts_dm):
+    """Índice montado do zero (como numa releitura completa) com as transações dadas"""
+    pex3_indice_dm = pex3_financeiro_dm.pex3_indice_vazio_dm()
+    pex3_indice_dm['transacoes'] = sorted(map(pex3_armazenamento_dm.pex3_Transacao_dm.pex3_de_dict_dm, pex3_dicts_dm),
+                                          key=pex3_financeiro_dm.pex3_chave_transacao_dm)
+    pex3_indice_dm['chaves'] = [pex3_financeiro_dm.pex3_chave_transacao_dm(pex3_t_dm) for pex3_t_dm in pex3_indice_dm['transacoes']]
+    pex3_financeiro_dm.pex3_construir_baldes_dm(pex3_indice_dm, False)
+    return pex3_indice_dm
+
+
+def pex3_retrato_dm(pex3_indice_dm):
+    """Conteúdo comparável do índice: ordem, dias/meses, baldes e saldo acumulado"""
+    def pex3_balde_dm(pex3_b_dm):
+        return (pex3_b_dm['receita'], pex3_b_dm['despesa'],
+                {pex3_k_dm: pex3_v_dm for pex3_k_dm, pex3_v_dm in pex3_b_dm['despesa_categoria'].items() if pex3_v_dm},
+                {pex3_k_dm: pex3_v_dm for pex3_k_dm, pex3_v_dm in pex3_b_dm['receita_pagamento'].items() if pex3_v_dm})
+    return (pex3_indice_dm['chaves'], [pex3_t_dm.id for pex3_t_dm in pex3_indice_dm['transacoes']],
+            pex3_indice_dm['lista_dias'], pex3_indice_dm['lista_meses'],
+            {pex3_d_dm: pex3_balde_dm(pex3_b_dm) for pex3_d_dm, pex3_b_dm in pex3_indice_dm['dias'].items()},
+            {pex3_m_dm: pex3_balde_dm(pex3_b_dm) for pex3_m_dm, pex3_b_dm in pex3_indice_dm['meses'].items()},
+            list(pex3_financeiro_dm.pex3_atualizar_prefixo_dm(pex3_indice_dm)))
+
+
+# ============== ÍNDICE DE TRANSAÇÕES ==============
+
+@pytest.mark.parametrize('pex3_usar_numpy_dm', pex3_MOTORES_dm)
+def test_pex3_lote_igual_a_insercao_uma_a_uma_dm(pex3_usar_numpy_dm):
+    """Um lote espalhado pelo período (dias novos no meio da lista inclusive) deixa o índice
+    igual à inserção uma a uma e igual a reconstruí-lo do zero"""
+    pex3_base_dm = pex3_transacoes_dm(300)
+    pex3_lote_dm = pex3_transacoes_dm(200, pex3_primeiro_id_dm=301, pex3_semente_dm=1)
+    pex3_lote_dm[0]['data_gasto'] = '2023-06-01'  # antes de tudo que já está no índice
+
+    pex3_um_a_um_dm = pex3_indice_de_dm(pex3_base_dm)
+    pex3_financeiro_dm.pex3_atualizar_prefixo_dm(pex3_um_a_um_dm)
+    for pex3_d_dm in pex3_lote_dm:
+        pex3_financeiro_dm.pex3_incorporar_transacao_dm(
+            pex3_um_a_um_dm, pex3_armazenamento_dm.pex3_Transacao_dm.pex3_de_dict_dm(pex3_d_dm))
+
+    pex3_em_lote_dm = pex3_indice_de_dm(pex3_base_dm)
+    pex3_financeiro_dm.pex3_atualizar_prefixo_dm(pex3_em_lote_dm)
+    pex3_financeiro_dm.pex3_incorporar_lote_dm(
+        pex3_em_lote_dm, [pex3_armazenamento_dm.pex3_Transacao_dm.pex3_de_dict_dm(pex3_d_dm) for pex3_d_dm in pex3_lote_dm],
+        pex3_usar_numpy_dm)
+
+    pex3_esperado_dm = pex3_retrato_dm(pex3_indice_de_dm(pex3_base_dm + pex3_lote_dm))
+    assert pex3_retrato_dm(pex3_um_a_um_dm) == pex3_esperado_dm
+    assert pex3_retrato_dm(pex3_em_lote_dm) == pex3_esperado_dm
+
+
+@pytest.mark.parametrize('pex3_usar_numpy_dm', pex3_MOTORES_dm)
+def test_pex3_lote_posterior_ao_indice_dm(pex3_usar_numpy_dm):
+    """Lote todo depois do último dia do índice: entra no fim das listas"""
+    pex3_base_dm = pex3_transacoes_dm(100)
+    pex3_lote_dm = pex3_transacoes_dm(100, pex3_primeiro_id_dm=101, pex3_semente_dm=2)
+    for pex3_d_dm in pex3_lote_dm:
+        pex3_d_dm['data_gasto'] = '2026-' + pex3_d_dm['data_gasto'][5:]
+
+    pex3_indice_dm = pex3_indice_de_dm(pex3_base_dm)
+    pex3_financeiro_dm.pex3_atualizar_prefixo_dm(pex3_indice_dm)
+    pex3_financeiro_dm.pex3_incorporar_lote_dm(
+        pex3_indice_dm, [pex3_armazenamento_dm.pex3_Transacao_dm.pex3_de_dict_dm(pex3_d_dm) for pex3_d_dm in pex3_lote_dm],
+        pex3_usar_numpy_dm)
+
+    assert pex3_retrato_dm(pex3_indice_dm) == pex3_retrato_dm(pex3_indice_de_dm(pex3_base_dm + pex3_lote_dm))
+
+
+def test_pex3_indice_incorpora_lote_gravado_depois_dm(pex3_backend_dm, monkeypatch):
+    """Um lote anexado ao banco depois da primeira leitura entra pelo caminho em lote
+    e os totais do período batem com a soma direta das transações"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_base_dm = pex3_transacoes_dm(10)
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('financeiro', pex3_financeiro_dm.pex3_DB_FILE_dm, 'transactions', pex3_base_dm)
+    pex3_financeiro_dm.pex3_obter_indice_transacoes_dm()
+
+    pex3_lotes_dm = []
+    pex3_incorporar_dm = pex3_financeiro_dm.pex3_incorporar_lote_dm
+    monkeypatch.setattr(pex3_financeiro_dm, 'pex3_incorporar_lote_dm',
+                        lambda pex3_indice_dm, pex3_novas_dm: pex3_lotes_dm.append(len(pex3_novas_dm))
+                        or pex3_incorporar_dm(pex3_indice_dm, pex3_novas_dm))
+    pex3_lote_dm = pex3_transacoes_dm(pex3_financeiro_dm.pex3_LOTE_INCREMENTAL_dm, pex3_primeiro_id_dm=11, pex3_semente_dm=3)
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('financeiro', pex3_financeiro_dm.pex3_DB_FILE_dm, 'transactions', pex3_lote_dm)
+
+    pex3_periodo_dm = pex3_financeiro_dm.pex3_agregar_periodo_dm('2024-03-15', '2025-03-15')
+    assert pex3_lotes_dm == [len(pex3_lote_dm)]
+    pex3_no_periodo_dm = [pex3_d_dm for pex3_d_dm in pex3_base_dm + pex3_lote_dm
+                          if '2024-03-15' <= pex3_d_dm['data_gasto'] <= '2025-03-15']
+    assert pex3_periodo_dm['total']['receita'] == sum(pex3_d_dm['valor'] for pex3_d_dm in pex3_no_periodo_dm
+                                                      if pex3_d_dm['tipo'] == 'receber')
+    assert pex3_periodo_dm['total']['despesa'] == sum(pex3_d_dm['valor'] for pex3_d_dm in pex3_no_periodo_dm
+                                                      if pex3_d_dm['tipo'] == 'pagar')
+    assert pex3_periodo_dm['evolucao'][-1][1] == (pex3_periodo_dm['total']['receita'] - pex3_periodo_dm['total']['despesa'])
+
+
+# ============== PÁGINAS DE LANÇAMENTOS ==============
+
+def test_pex3_paginas_de_lancamentos_no_periodo_dm(pex3_backend_dm):
+    """Páginas do período (limites inclusive) seguindo os cursores; uma transação nova
+    mais antiga que a página atual aparece na página seguinte"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('financeiro', pex3_financeiro_dm.pex3_DB_FILE_dm, 'transactions', [
+        {'id': pex3_id_dm, 'tipo': 'receber', 'data_gasto': pex3_data_dm, 'valor': 100,
+         'categoria': 'Venda', 'forma_pagamento': 'PIX', 'descricao': ''}
+        for pex3_id_dm, pex3_data_dm in enumerate(['2025-01-31', '2025-02-01', '2025-02-01', '2025-02-10',
+                                                  '2025-02-28', '2025-02-28', '2025-03-01'], 1)])
+
+    pex3_pagina1_dm, pex3_pagina_dm = pex3_financeiro_dm.pex3_pagina_transacoes_dm('2025-02-01', '2025-02-28', pex3_por_pagina_dm=2)
+    assert [pex3_t_dm['id'] for pex3_t_dm in pex3_pagina1_dm] == [6, 5]
+    assert pex3_pagina_dm['total'] == 5 and pex3_pagina_dm['depois'] is None
+
+    pex3_armazenamento_dm.pex3_anexar_registro_dm('financeiro', pex3_financeiro_dm.pex3_DB_FILE_dm, 'transactions', {
+        'id': 8, 'tipo': 'pagar', 'data_gasto': '2025-02-05', 'valor': 50,
+        'categoria': 'Diversos', 'forma_pagamento': 'PIX', 'descricao': ''})
+    pex3_ids_dm = []
+    pex3_antes_dm = pex3_pagina_dm['antes']
+    while pex3_antes_dm is not None:
+        pex3_registros_dm, pex3_pagina_dm = pex3_financeiro_dm.pex3_pagina_transacoes_dm(
+            '2025-02-01', '2025-02-28', pex3_antes_dm, None, 2)
+        pex3_ids_dm.append([pex3_t_dm['id'] for pex3_t_dm in pex3_registros_dm])
+        pex3_antes_dm = pex3_pagina_dm['antes']
+    assert pex3_ids_dm == [[4, 8], [3, 2]]
+
+    pex3_resposta_dm = pex3_financeiro_dm.pex3_app_dm.test_client().get('/lancamentos', query_string={
+        'data_inicio': '2025-02-01', 'data_fim': '2025-02-28', 'por_pagina': 2, 'antes': '2025-02-05|8'})
+    assert pex3_resposta_dm.status_code == 200
+
+
+def test_pex3_cadastrar_com_valor_ambiguo_volta_ao_formulario_dm(pex3_backend_dm):
+    """Um valor recusado pela conversão para centavos vira aviso no formulário, não erro 500"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_cliente_dm = pex3_financeiro_dm.pex3_app_dm.test_client()
+    pex3_formulario_dm = {'data_gasto': '2025-02-01', 'categoria': 'Diversos', 'forma_pagamento': 'PIX', 'descricao': 'x'}
+    for pex3_valor_dm in ('1.234', '1,234.56', '1e30', 'abc'):
+        pex3_resposta_dm = pex3_cliente_dm.post('/cadastrar/pagar', data={**pex3_formulario_dm, 'valor': pex3_valor_dm})
+        assert pex3_resposta_dm.status_code == 302
+        assert pex3_resposta_dm.headers['Location'].endswith('/cadastrar/pagar')
+    assert 'Valor inválido' in pex3_cliente_dm.get('/cadastrar/pagar').get_data(as_text=True)
+    assert pex3_financeiro_dm.pex3_load_db_dm()['transactions'] == []
+
+    pex3_cliente_dm.post('/cadastrar/pagar', data={**pex3_formulario_dm, 'valor': '1.234,50'})
+    assert [pex3_t_dm['valor'] for pex3_t_dm in pex3_financeiro_dm.pex3_load_db_dm()['transactions']] == [123450]
+
+
+# ============== API DO ANALYTICS (ETAG) ==============
+
+def test_pex3_api_analytics_304_com_etag_igual_dm(pex3_backend_dm, monkeypatch):
+    """If-None-Match com a ETag atual devolve 304 sem recalcular; uma transação nova
+    ou outros parâmetros mudam a ETag"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('financeiro', pex3_financeiro_dm.pex3_DB_FILE_dm, 'transactions',
+                                                   pex3_transacoes_dm(20))
+    pex3_cliente_dm = pex3_financeiro_dm.pex3_app_dm.test_client()
+
+    pex3_resposta_dm = pex3_cliente_dm.get('/api/analytics')
+    assert pex3_resposta_dm.status_code == 200
+    assert pex3_resposta_dm.headers['Cache-Control'] == 'no-cache'
+    pex3_etag_dm = pex3_resposta_dm.headers['ETag']
+    pex3_receitas_dm = pex3_resposta_dm.get_json()['receitas']
+
+    with monkeypatch.context() as pex3_patch_dm:
+        def pex3_sem_calculo_dm(*pex3_args_dm):
+            raise AssertionError('agregados recalculados para uma resposta 304')
+        pex3_patch_dm.setattr(pex3_financeiro_dm, 'pex3_dados_analytics_dm', pex3_sem_calculo_dm)
+        pex3_resposta_dm = pex3_cliente_dm.get('/api/analytics', headers={'If-None-Match': pex3_etag_dm})
+    assert pex3_resposta_dm.status_code == 304
+    assert pex3_resposta_dm.data == b''
+    assert pex3_resposta_dm.headers['ETag'] == pex3_etag_dm
+
+    # Outro período: outra ETag
+    pex3_resposta_dm = pex3_cliente_dm.get('/api/analytics', query_string={'data_inicio': '2025-01-01'},
+                                           headers={'If-None-Match': pex3_etag_dm})
+    assert pex3_resposta_dm.status_code == 200 and pex3_resposta_dm.headers['ETag'] != pex3_etag_dm
+
+    # Transação nova: a ETag antiga deixa de valer e a resposta traz o total novo
+    pex3_armazenamento_dm.pex3_anexar_registro_dm('financeiro', pex3_financeiro_dm.pex3_DB_FILE_dm, 'transactions', {
+        'id': 21, 'tipo': 'receber', 'data_gasto': '2025-06-01', 'valor': 700,
+        'categoria': 'Venda', 'forma_pagamento': 'PIX', 'descricao': ''})
+    pex3_resposta_dm = pex3_cliente_dm.get('/api/analytics', headers={'If-None-Match': pex3_etag_dm})
+    assert pex3_resposta_dm.status_code == 200
+    assert pex3_resposta_dm.headers['ETag'] != pex3_etag_dm
+    assert pex3_resposta_dm.get_json()['receitas'] == pex3_receitas_dm + 700
+
+
+# ============== IMPORTAÇÃO DE EXTRATO ==============
+
+pex3_EXTRATO_dm = (
+    'data;descricao;valor;tipo;categoria;forma_pagamento\n'
+    '2025-03-01;Salário março;1.500,00;receita;Salário;PIX\n'  # 2: receita
+    '05/03/2025;Mercado;-120,50;;Alimentação;Cartão\n'         # 3: negativo sem tipo = despesa
+    '06/03/25;Mercado;-120,50;;alimentacao;CARTAO\n'           # 4: sem acento e maiúsculas
+    '2025-13-40;X;10;;;\n'                                     # 5: data inválida
+    '2025-03-07;X;abc;;;\n'                                    # 6: valor inválido
+    '2025-03-07;X;0;;;\n'                                      # 7: valor zerado
+    '2025-03-07;X;10;talvez;;\n'                               # 8: tipo desconhecido
+    '2025-03-07;X;10;;Inexistente;\n'                          # 9: categoria não cadastrada
+    '2025-03-07;X;-10;;Salário;\n'                             # 10: categoria só de receita
+    '2025-03-07;X;10;;;Cheque\n'                               # 11: forma não cadastrada
+    ';;;;;\n'                                                  # 12: em branco (ignorada)
+    '2025-03-05;Mercado;-120,50;;Alimentação;Cartão\n'         # 13: igual à 3 (duas compras iguais)
+)
+
+
+def pex3_importadas_dm():
+    return sorted((pex3_t_dm['data_gasto'], pex3_t_dm['tipo'], pex3_t_dm['valor'], pex3_t_dm['categoria'],
+                   pex3_t_dm['forma_pagamento']) for pex3_t_dm in pex3_financeiro_dm.pex3_load_db_dm()['transactions'])
+
+
+def test_pex3_importar_extrato_com_linhas_invalidas_e_duplicadas_dm(pex3_backend_dm):
+    """Linhas inválidas são relatadas; reimportar o extrato não duplica; linhas iguais
+    contam uma vez cada contra as já gravadas"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_resumo_dm = pex3_financeiro_dm.pex3_importar_extrato_dm(io.StringIO(pex3_EXTRATO_dm))
+
+    assert {pex3_k_dm: pex3_resumo_dm[pex3_k_dm] for pex3_k_dm in ('linhas', 'importados', 'duplicados', 'ignorados')} == {
+        'linhas': 11, 'importados': 4, 'duplicados': 0, 'ignorados': 7}
+    assert [pex3_linha_dm for pex3_linha_dm, _ in pex3_resumo_dm['erros']] == [5, 6, 7, 8, 9, 10, 11]
+    assert pex3_importadas_dm() == [
+        ('2025-03-01', 'receber', 150000, 'Salário', 'PIX'),
+        ('2025-03-05', 'pagar', 12050, 'Alimentação', 'Cartão'),
+        ('2025-03-05', 'pagar', 12050, 'Alimentação', 'Cartão'),
+        ('2025-03-06', 'pagar', 12050, 'Alimentação', 'Cartão')]
+    pex3_ids_dm = [pex3_t_dm['id'] for pex3_t_dm in pex3_financeiro_dm.pex3_load_db_dm()['transactions']]
+    assert len(set(pex3_ids_dm)) == 4
+
+    pex3_resumo_dm = pex3_financeiro_dm.pex3_importar_extrato_dm(io.StringIO(pex3_EXTRATO_dm))
+    assert (pex3_resumo_dm['importados'], pex3_resumo_dm['duplicados'], pex3_resumo_dm['ignorados']) == (0, 4, 7)
+
+    # Três compras iguais contra duas gravadas: uma é nova
+    pex3_tres_dm = 'data;descricao;valor;categoria;forma_pagamento\n' + '2025-03-05;Mercado;-120,50;Alimentação;Cartão\n' * 3
+    pex3_resumo_dm = pex3_financeiro_dm.pex3_importar_extrato_dm(io.StringIO(pex3_tres_dm))
+    assert (pex3_resumo_dm['importados'], pex3_resumo_dm['duplicados']) == (1, 2)
+    assert len(pex3_importadas_dm()) == 5
+
+
+def test_pex3_importar_extrato_valores_enormes_ou_ambiguos_dm(pex3_backend_dm, monkeypatch):
+    """Valores que não dão para converter invalidam só a sua linha, seja qual for a exceção"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_centavos_dm = pex3_armazenamento_dm.pex3_centavos_dm
+
+    def pex3_centavos_quebrando_dm(pex3_texto_dm):
+        if pex3_texto_dm == '7,77':
+            raise decimal.InvalidOperation(pex3_texto_dm)
+        return pex3_centavos_dm(pex3_texto_dm)
+
+    monkeypatch.setattr(pex3_armazenamento_dm, 'pex3_centavos_dm', pex3_centavos_quebrando_dm)
+    pex3_extrato_dm = ('data;valor;categoria\n'
+                       '2025-03-01;1e30;Diversos\n'
+                       '2025-03-01;1,234.56;Diversos\n'
+                       '2025-03-01;1.234;Diversos\n'
+                       '2025-03-01;7,77;Diversos\n'
+                       '2025-03-01;12,34;Diversos\n')
+    pex3_resumo_dm = pex3_financeiro_dm.pex3_importar_extrato_dm(io.StringIO(pex3_extrato_dm))
+    assert (pex3_resumo_dm['importados'], pex3_resumo_dm['ignorados']) == (1, 4)
+    assert [pex3_linha_dm for pex3_linha_dm, _ in pex3_resumo_dm['erros']] == [2, 3, 4, 5]
+    assert pex3_importadas_dm() == [('2025-03-01', 'receber', 1234, 'Diversos', 'Outros')]
+
+
+def test_pex3_rota_importar_solta_o_stream_apos_erro_dm(pex3_backend_dm, monkeypatch):
+    """Mesmo quando a importação falha, o wrapper de texto é desligado do upload
+    (se fosse coletado ligado, fecharia o stream da requisição)"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_wrappers_dm = []
+
+    def pex3_importar_com_falha_dm(pex3_arquivo_dm, pex3_simular_dm=False):
+        pex3_wrappers_dm.append(pex3_arquivo_dm)
+        raise RuntimeError('falha inesperada')
+
+    monkeypatch.setattr(pex3_financeiro_dm, 'pex3_importar_extrato_dm', pex3_importar_com_falha_dm)
+    pex3_resposta_dm = pex3_financeiro_dm.pex3_app_dm.test_client().post('/importar', data={
+        'arquivo': (io.BytesIO(pex3_EXTRATO_dm.encode('utf-8')), 'extrato.csv')})
+    assert pex3_resposta_dm.status_code == 500
+    assert pex3_wrappers_dm[0].buffer is None  # desligado: não há mais stream por trás do wrapper
+
+
+def test_pex3_importar_extrato_cabecalho_invalido_e_simulacao_dm(pex3_backend_dm):
+    """Sem as colunas data e valor nada é importado; a simulação não grava"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_resumo_dm = pex3_financeiro_dm.pex3_importar_extrato_dm(io.StringIO('quando;quanto\n2025-03-01;10\n'))
+    assert (pex3_resumo_dm['importados'], pex3_resumo_dm['ignorados']) == (0, 1)
+    assert 'data' in pex3_resumo_dm['erros'][0][1] and 'valor' in pex3_resumo_dm['erros'][0][1]
+
+    pex3_resumo_dm = pex3_financeiro_dm.pex3_importar_extrato_dm(io.StringIO(pex3_EXTRATO_dm), pex3_simular_dm=True)
+    assert (pex3_resumo_dm['importados'], pex3_resumo_dm['ignorados']) == (4, 7)
+    assert pex3_importadas_dm() == []
+
+
+# ============== FILTRO POR PERÍODO ==============
+
+pex3_PERIODOS_dm = [('', ''), ('2024-03-01', '2024-03-31'), ('2024-03-15', '2025-02-10'), ('2024-01-01', ''),
+                    ('', '2024-06-30'), ('2025-12-31', ''), ('2024-07-04', '2024-07-04'), ('2030-01-01', '2030-12-31'),
+                    ('2024-05-01', '2024-04-01')]
+
+
+def pex3_no_periodo_dm(pex3_dicts_dm, pex3_data_inicio_dm, pex3_data_fim_dm):
+    """Filtro direto (sem índice) para comparar com as respostas do índice"""
+    return [pex3_d_dm for pex3_d_dm in pex3_dicts_dm
+            if (not pex3_data_inicio_dm or pex3_d_dm['data_gasto'] >= pex3_data_inicio_dm)
+            and (not pex3_data_fim_dm or pex3_d_dm['data_gasto'] <= pex3_data_fim_dm)]
+
+
+def test_pex3_filtrar_por_data_igual_ao_filtro_direto_dm(pex3_backend_dm):
+    """O índice ordenado responde igual a um filtro transação a transação, com limites
+    inclusivos, antes e depois de novas gravações e de uma regravação completa"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_dicts_dm = pex3_transacoes_dm(200)
+    pex3_caminho_dm = pex3_financeiro_dm.pex3_DB_FILE_dm
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('financeiro', pex3_caminho_dm, 'transactions', pex3_dicts_dm[:150])
+
+    def pex3_conferir_dm(pex3_gravadas_dm):
+        for pex3_inicio_dm, pex3_fim_dm in pex3_PERIODOS_dm:
+            pex3_filtradas_dm = pex3_financeiro_dm.pex3_filtrar_por_data_dm(pex3_inicio_dm, pex3_fim_dm)
+            pex3_esperadas_dm = sorted(pex3_no_periodo_dm(pex3_gravadas_dm, pex3_inicio_dm, pex3_fim_dm),
+                                       key=lambda pex3_d_dm: (pex3_d_dm['data_gasto'], pex3_d_dm['id']))
+            assert [pex3_t_dm['id'] for pex3_t_dm in pex3_filtradas_dm] == [pex3_d_dm['id'] for pex3_d_dm in pex3_esperadas_dm]
+
+    pex3_conferir_dm(pex3_dicts_dm[:150])
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('financeiro', pex3_caminho_dm, 'transactions', pex3_dicts_dm[150:])
+    pex3_conferir_dm(pex3_dicts_dm)
+
+    # Regravação completa (ex.: exclusão de transação): o índice é refeito
+    pex3_db_dm = pex3_financeiro_dm.pex3_load_db_dm()
+    pex3_db_dm['transactions'] = [pex3_t_dm for pex3_t_dm in pex3_db_dm['transactions'] if pex3_t_dm['id'] % 3]
+    pex3_financeiro_dm.pex3_save_db_dm(pex3_db_dm)
+    pex3_conferir_dm([pex3_d_dm for pex3_d_dm in pex3_dicts_dm if pex3_d_dm['id'] % 3])
+
+
+# ============== TOTAIS DO PERÍODO ==============
+
+def pex3_somas_diretas_dm(pex3_dicts_dm):
+    """Totais (receita, despesa, por categoria, por forma de pagamento) somados transação a transação"""
+    pex3_receita_dm, pex3_despesa_dm, pex3_categorias_dm, pex3_formas_dm = 0, 0, {}, {}
+    for pex3_d_dm in pex3_dicts_dm:
+        if pex3_d_dm['tipo'] == 'receber':
+            pex3_receita_dm += pex3_d_dm['valor']
+            pex3_formas_dm[pex3_d_dm['forma_pagamento']] = pex3_formas_dm.get(pex3_d_dm['forma_pagamento'], 0) + pex3_d_dm['valor']
+        else:
+            pex3_despesa_dm += pex3_d_dm['valor']
+            pex3_categorias_dm[pex3_d_dm['categoria']] = pex3_categorias_dm.get(pex3_d_dm['categoria'], 0) + pex3_d_dm['valor']
+    return pex3_receita_dm, pex3_despesa_dm, pex3_categorias_dm, pex3_formas_dm
+
+
+def pex3_somas_do_balde_dm(pex3_balde_dm):
+    """Mesmo formato de pex3_somas_diretas_dm, ignorando categorias/formas zeradas"""
+    return (pex3_balde_dm['receita'], pex3_balde_dm['despesa'],
+            {pex3_k_dm: pex3_v_dm for pex3_k_dm, pex3_v_dm in pex3_balde_dm['despesa_categoria'].items() if pex3_v_dm},
+            {pex3_k_dm: pex3_v_dm for pex3_k_dm, pex3_v_dm in pex3_balde_dm['receita_pagamento'].items() if pex3_v_dm})
+
+
+def test_pex3_agregar_periodo_com_meses_parciais_dm(pex3_backend_dm):
+    """Totais do período e de cada mês (inclusive meses cortados nas pontas) iguais à soma direta"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_dicts_dm = pex3_transacoes_dm(400)
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('financeiro', pex3_financeiro_dm.pex3_DB_FILE_dm, 'transactions', pex3_dicts_dm)
+
+    for pex3_inicio_dm, pex3_fim_dm in pex3_PERIODOS_dm:
+        pex3_no_dm = pex3_no_periodo_dm(pex3_dicts_dm, pex3_inicio_dm, pex3_fim_dm)
+        pex3_agregado_dm = pex3_financeiro_dm.pex3_agregar_periodo_dm(pex3_inicio_dm, pex3_fim_dm)
+        assert pex3_somas_do_balde_dm(pex3_agregado_dm['total']) == pex3_somas_diretas_dm(pex3_no_dm)
+
+        pex3_meses_dm = sorted({pex3_d_dm['data_gasto'][:7] for pex3_d_dm in pex3_no_dm})
+        assert list(pex3_agregado_dm['meses']) == pex3_meses_dm
+        for pex3_mes_dm in pex3_meses_dm:
+            assert pex3_somas_do_balde_dm(pex3_agregado_dm['meses'][pex3_mes_dm]) == pex3_somas_diretas_dm(
+                [pex3_d_dm for pex3_d_dm in pex3_no_dm if pex3_d_dm['data_gasto'][:7] == pex3_mes_dm])
+
+
+# ============== SÉRIE DE SALDO ==============
+
+def pex3_saldo_direto_dm(pex3_dicts_dm, pex3_data_inicio_dm, pex3_data_fim_dm):
+    """Saldo acumulado ao fim de cada dia do período, somado transação a transação"""
+    pex3_por_dia_dm = {}
+    for pex3_d_dm in pex3_no_periodo_dm(pex3_dicts_dm, pex3_data_inicio_dm, pex3_data_fim_dm):
+        pex3_sinal_dm = 1 if pex3_d_dm['tipo'] == 'receber' else -1
+        pex3_por_dia_dm[pex3_d_dm['data_gasto']] = pex3_por_dia_dm.get(pex3_d_dm['data_gasto'], 0) + pex3_sinal_dm * pex3_d_dm['valor']
+    pex3_serie_dm, pex3_saldo_dm = [], 0
+    for pex3_dia_dm in sorted(pex3_por_dia_dm):
+        pex3_saldo_dm += pex3_por_dia_dm[pex3_dia_dm]
+        pex3_serie_dm.append((pex3_dia_dm, pex3_saldo_dm))
+    return pex3_serie_dm
+
+
+def test_pex3_serie_saldo_apos_transacao_antiga_dm(pex3_backend_dm):
+    """Uma transação num dia antigo (novo ou já existente) invalida o saldo acumulado a partir
+    dele; a série continua igual à soma direta"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_dicts_dm = pex3_transacoes_dm(300)
+    pex3_caminho_dm = pex3_financeiro_dm.pex3_DB_FILE_dm
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('financeiro', pex3_caminho_dm, 'transactions', pex3_dicts_dm)
+    assert pex3_financeiro_dm.pex3_serie_saldo_dm() == pex3_saldo_direto_dm(pex3_dicts_dm, '', '')
+
+    for pex3_id_dm, pex3_data_dm in ((301, '2023-12-25'), (302, pex3_dicts_dm[0]['data_gasto'])):
+        pex3_nova_dm = dict(pex3_dicts_dm[0], id=pex3_id_dm, tipo='pagar', data_gasto=pex3_data_dm, valor=12345)
+        pex3_armazenamento_dm.pex3_anexar_registro_dm('financeiro', pex3_caminho_dm, 'transactions', pex3_nova_dm)
+        pex3_dicts_dm.append(pex3_nova_dm)
+        for pex3_inicio_dm, pex3_fim_dm in pex3_PERIODOS_dm:
+            assert pex3_financeiro_dm.pex3_serie_saldo_dm(pex3_inicio_dm, pex3_fim_dm) == \
+                pex3_saldo_direto_dm(pex3_dicts_dm, pex3_inicio_dm, pex3_fim_dm)
+
+
+def test_pex3_reduzir_serie_por_semana_mes_e_limite_dm():
+    """Semana/mês ficam com o saldo do último dia do grupo; a LTTB respeita o limite e as pontas"""
+    pex3_serie_dm = [((date(2024, 1, 1) + timedelta(days=pex3_i_dm)).isoformat(), pex3_i_dm * (-1) ** pex3_i_dm)
+                     for pex3_i_dm in range(0, 400, 3)]
+
+    pex3_por_mes_dm = pex3_financeiro_dm.pex3_reduzir_serie_dm(pex3_serie_dm, 'mes', 1000)
+    pex3_ultimo_do_mes_dm = {}
+    for pex3_dia_dm, pex3_saldo_dm in pex3_serie_dm:
+        pex3_ultimo_do_mes_dm[pex3_dia_dm[:7]] = pex3_saldo_dm
+    assert pex3_por_mes_dm == list(pex3_ultimo_do_mes_dm.items())
+
+    pex3_por_semana_dm = pex3_financeiro_dm.pex3_reduzir_serie_dm(pex3_serie_dm, 'semana', 1000)
+    pex3_semanas_dm = [date.fromisoformat(pex3_dia_dm).isocalendar()[:2] for pex3_dia_dm, _ in pex3_por_semana_dm]
+    assert len(set(pex3_semanas_dm)) == len(pex3_semanas_dm) == len(
+        {date.fromisoformat(pex3_dia_dm).isocalendar()[:2] for pex3_dia_dm, _ in pex3_serie_dm})
+    for pex3_ponto_dm in pex3_por_semana_dm:
+        pex3_semana_dm = date.fromisoformat(pex3_ponto_dm[0]).isocalendar()[:2]
+        assert pex3_ponto_dm == [pex3_p_dm for pex3_p_dm in pex3_serie_dm
+                                 if date.fromisoformat(pex3_p_dm[0]).isocalendar()[:2] == pex3_semana_dm][-1]
+
+    pex3_reduzida_dm = pex3_financeiro_dm.pex3_reduzir_serie_dm(pex3_serie_dm, 'dia', 20)
+    assert len(pex3_reduzida_dm) == 20
+    assert pex3_reduzida_dm[0] == pex3_serie_dm[0] and pex3_reduzida_dm[-1] == pex3_serie_dm[-1]
+    assert pex3_reduzida_dm == sorted(pex3_reduzida_dm) and set(pex3_reduzida_dm) <= set(pex3_serie_dm)
+    assert pex3_financeiro_dm.pex3_reduzir_serie_dm(pex3_serie_dm[:10], 'dia', 20) == pex3_serie_dm[:10]
+
+
+# ============== EXPORTAÇÃO ==============
+
+def test_pex3_exportar_transacoes_csv_e_ndjson_dm(pex3_backend_dm):
+    """As duas exportações trazem as transações do período em ordem crescente; o CSV
+    em reais com ';' e o NDJSON como gravado (centavos)"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_dicts_dm = pex3_transacoes_dm(150)
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('financeiro', pex3_financeiro_dm.pex3_DB_FILE_dm, 'transactions', pex3_dicts_dm)
+    pex3_esperadas_dm = sorted(pex3_no_periodo_dm(pex3_dicts_dm, '2024-03-15', '2025-02-10'),
+                               key=lambda pex3_d_dm: (pex3_d_dm['data_gasto'], pex3_d_dm['id']))
+    pex3_cliente_dm = pex3_financeiro_dm.pex3_app_dm.test_client()
+    pex3_periodo_dm = {'data_inicio': '2024-03-15', 'data_fim': '2025-02-10'}
+
+    pex3_resposta_dm = pex3_cliente_dm.get('/exportar/transacoes.csv', query_string=pex3_periodo_dm)
+    assert pex3_resposta_dm.status_code == 200 and pex3_resposta_dm.mimetype == 'text/csv'
+    pex3_linhas_dm = list(csv.DictReader(io.StringIO(pex3_resposta_dm.get_data(as_text=True)), delimiter=';'))
+    assert [(int(pex3_l_dm['id']), pex3_l_dm['data_gasto'], pex3_l_dm['valor']) for pex3_l_dm in pex3_linhas_dm] == [
+        (pex3_d_dm['id'], pex3_d_dm['data_gasto'], pex3_armazenamento_dm.pex3_reais_dm(pex3_d_dm['valor']))
+        for pex3_d_dm in pex3_esperadas_dm]
+
+    pex3_resposta_dm = pex3_cliente_dm.get('/exportar/transacoes.ndjson', query_string=pex3_periodo_dm)
+    pex3_objetos_dm = [json.loads(pex3_l_dm) for pex3_l_dm in pex3_resposta_dm.get_data(as_text=True).splitlines()]
+    assert [{pex3_k_dm: pex3_o_dm.get(pex3_k_dm) for pex3_k_dm in pex3_dicts_dm[0]} for pex3_o_dm in pex3_objetos_dm] == pex3_esperadas_dm
+
+    assert pex3_cliente_dm.get('/exportar/transacoes.xml').status_code == 404
+
+
+def test_pex3_exportar_transacoes_envia_o_primeiro_registro_logo_dm(pex3_backend_dm):
+    """O primeiro pedaço do CSV (cabeçalho + primeira transação) e do NDJSON já sai com
+    um único registro, sem esperar o bloco inteiro"""
+    pex3_financeiro_dm.pex3_init_db_dm()
+    pex3_armazenamento_dm.pex3_anexar_registros_dm('financeiro', pex3_financeiro_dm.pex3_DB_FILE_dm, 'transactions',
+                                                   pex3_transacoes_dm(50))
+    pex3_cliente_dm = pex3_financeiro_dm.pex3_app_dm.test_client()
+    for pex3_formato_dm, pex3_linhas_esperadas_dm in (('csv', 2), ('ndjson', 1)):
+        pex3_resposta_dm = pex3_cliente_dm.get(f'/exportar/transacoes.{pex3_formato_dm}', buffered=False)
+        try:
+            pex3_pedaco_dm = next(pex3_resposta_dm.iter_encoded()).decode('utf-8')
+        finally:
+            pex3_resposta_dm.close()
+        assert len(pex3_pedaco_dm.splitlines()) == pex3_linhas_esperadas_dm
+
+
+def test_pex3_iterar_em_blocos_com_insercoes_no_meio_dm():
+    """Registros inseridos entre blocos entram se ficarem depois do último enviado"""
+    pex3_chaves_dm = list(range(0, 100, 2))
+    pex3_trava_dm = threading.Lock()
+
+    def pex3_obter_faixa_dm():
+        return pex3_chaves_dm, pex3_chaves_dm, 0, len(pex3_chaves_dm)
+
+    pex3_enviados_dm = []
+    for pex3_chave_dm in pex3_armazenamento_dm.pex3_iterar_em_blocos_dm(pex3_trava_dm, pex3_obter_faixa_dm, 7):
+        pex3_enviados_dm.append(pex3_chave_dm)
+        if pex3_chave_dm == 20:
+            bisect.insort(pex3_chaves_dm, 3)   # antes do último enviado: fica de fora
+            bisect.insort(pex3_chaves_dm, 41)  # depois: entra
+    assert pex3_enviados_dm == sorted(set(range(0, 100, 2)) | {41})
@@ -132,6 +132,7 @@ pyinstaller_cmd = [
     '--hidden-import=csv',
     '--hidden-import=datetime',
     '--hidden-import=decimal',
+    '--hidden-import=sqlite3',
     
     # Módulos de sistema
     '--hidden-import=subprocess',